@@ -1,4 +1,3 @@
-import dmPython
 import pandas as pd
 
 from flask import Flask, jsonify, Response,request
@@ -8,14 +7,21 @@ from typing import List, Dict
 
 from datetime import datetime
 
-from xml.etree.ElementTree import Element, SubElement, tostring
-from xml.dom import minidom
+import dm_config
+from dm_router import NodeRouter
+from dm_server import serve
+from dm_stream import iter_row_batches
+from dm_xml import XmlWriter
 
-import xml.etree.ElementTree as ET
+# 数据库驱动（默认 dmPython，可用 DM_DRIVER_MODULE 替换为替身模块）
+dmPython = dm_config.load_driver()
 
 # 创建Flask应用实例
 app = Flask(__name__)
 
+# 数据库节点与各节点连接池（节点见 DM_NODES，未配置时为 dm_config.DM_CONN_PARAMS 的单个主库；只读过程见 DM_READONLY_PROCS）
+db_router = NodeRouter(dmPython)
+
 def convert_datetime(obj):
     """将datetime对象转换为字符串，以便JSON序列化"""
     if isinstance(obj, datetime):
@@ -23,28 +29,24 @@ def convert_datetime(obj):
     raise TypeError(f"Type {type(obj)} not serializable")
 
 def get_cursor(strSp,strParam):
-    # 数据库连接参数
-    conn_params = {
-        'server': '192.168.0.191',  # 服务器地址
-        'user': 'JZX',  # 用户名
-        'password': 'XFgs@345',  # 密码
-        'port': 5236,  # 端口号，默认5236
-        'autoCommit': True  # 是否自动提交
-    }
-
+    conn = None
+    discard_conn = False
     try:
-        # 建立连接
-        conn = dmPython.connect(**conn_params)
+        # 按过程选择节点，从该节点的连接池借出连接
+        conn = db_router.acquire(db_router.select(strSp))
         cursor = conn.cursor()
 
         # 调用返回多个结果集的存储过程
         # strSp "JZX.GET_TEST0"
-        cursor.callproc(strSp,(strParam))
+        cursor.callproc(strSp, (strParam,))
 
         #conn.commit()
 
         # 4. 提取所有隐式结果集（通过nextset()切换游标）
-        root = ET.Element("MultiResultSet")  # 根节点
+        # 增量写出XML（不再构建 ElementTree 再经 minidom 重新解析格式化）
+        writer = XmlWriter(indent="  ", declaration='<?xml version="1.0" ?>')
+        writer.start("MultiResultSet")  # 根节点
+        chunks = []
         table_index = 1  # 表序号
 
         while True:
@@ -55,23 +57,26 @@ def get_cursor(strSp,strParam):
                 # 无更多结果集时，description会报错
                 break
 
-            # 获取当前结果集的所有行数据
-            rows = cursor.fetchall()
-
             # 封装当前结果集为XML子节点
-            table_node = ET.SubElement(root, f"Table{table_index}")
+            writer.start(f"Table{table_index}")
 
             # 添加字段信息
-            cols_node = ET.SubElement(table_node, "Columns")
+            writer.start("Columns")
             for col in columns:
-                ET.SubElement(cols_node, "Column").text = col
-
-            # 添加行数据
-            rows_node = ET.SubElement(table_node, "Rows")
-            for row in rows:
-                row_node = ET.SubElement(rows_node, "Row")
-                for idx, value in enumerate(row):
-                    ET.SubElement(row_node, columns[idx]).text = str(value) if value is not None else ""
+                writer.element("Column", col)
+            writer.end("Columns")
+
+            # 按批读取行数据并写出
+            writer.start("Rows")
+            for rows in iter_row_batches(cursor):
+                for row in rows:
+                    writer.start("Row")
+                    for idx, value in enumerate(row):
+                        writer.element(columns[idx], str(value) if value is not None else "")
+                    writer.end("Row")
+                chunks.append(writer.flush())
+            writer.end("Rows")
+            writer.end(f"Table{table_index}")
 
             # 切换到下一个结果集（游标）
             if not cursor.nextset():
@@ -79,19 +84,32 @@ def get_cursor(strSp,strParam):
 
             table_index += 1
 
-        # 格式化XML
-        rough_xml = ET.tostring(root, 'utf-8')
-        parsed_xml = minidom.parseString(rough_xml)
-        formatted_xml = parsed_xml.toprettyxml(indent="  ")
+        writer.end("MultiResultSet")
+        chunks.append(writer.flush())
+        formatted_xml = "".join(chunks) + "\n"
 
         return formatted_xml
 
     except Exception as e:
         print(f"执行错误：{str(e)}")
+        if conn:
+            try:
+                conn.rollback()
+            except Exception:
+                discard_conn = True
         return f"<Error>{str(e)}</Error>"
     finally:
         if conn:
-            conn.close()
+            try:
+                cursor.close()
+            except Exception:
+                pass
+            db_router.release(conn, discard=discard_conn)
+
+# 连接池统计信息
+@app.route('/poolStats', methods=['GET'])
+def get_pool_stats():
+    return jsonify(db_router.stats())
 
 # 1.返回存储过程数据JSON格式 (GET POST请求)
 @app.route('/xmlService', methods=['GET', 'POST'])
@@ -139,5 +157,7 @@ def get_xml(encoding = "utf-8"):
         })
 # 启动服务
 if __name__ == '__main__':
-    # 允许外部访问，端口为5000，开启调试模式
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # 允许外部访问，默认生产模式：gunicorn/waitress（见 DM_WSGI_SERVER，都未安装时退化为 Werkzeug 预派生多进程并打印警告）；
+    # --serve dev 或 DM_SERVE_MODE=dev 恢复调试模式
+    # 连接池回收线程在每个工作进程 fork 之后启动
+    serve(app, on_worker_start=lambda worker_id: db_router.start())
\ No newline at end of file
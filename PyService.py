@@ -1,4 +1,3 @@
-import dmPython
 import pandas as pd
 
 from flask import Flask, jsonify, request
@@ -8,23 +7,26 @@ from typing import List, Dict
 
 from datetime import datetime
 
+import dm_config
+from dm_router import NodeRouter
+from dm_server import serve
+
+# 数据库驱动（默认 dmPython，可用 DM_DRIVER_MODULE 替换为替身模块）
+dmPython = dm_config.load_driver()
+
 # 创建Flask应用实例
 app = Flask(__name__)
 
-def get_multiple_result_sets():
-    # 数据库连接参数
-    conn_params = {
-        'server': '192.168.0.191',  # 服务器地址
-        'user': 'JZX',  # 用户名
-        'password': 'XFgs@345',  # 密码
-        'port': 5236,  # 端口号，默认5236
-        'autoCommit': True  # 是否自动提交
-    }
+# 数据库节点与各节点连接池（节点见 DM_NODES，未配置时为 dm_config.DM_CONN_PARAMS 的单个主库；只读过程见 DM_READONLY_PROCS）
+db_router = NodeRouter(dmPython)
 
+def get_multiple_result_sets():
     result_sets = []  # 存储所有结果集
+    conn = None
+    discard_conn = False
     try:
-        # 建立连接
-        conn = dmPython.connect(**conn_params)
+        # 按过程选择节点，从该节点的连接池借出连接
+        conn = db_router.acquire(db_router.select("JZX.GET_TEST0"))
         cursor = conn.cursor()
 
         # 调用返回多个结果集的存储过程
@@ -54,12 +56,16 @@ def get_multiple_result_sets():
 
     except Exception as e:
         print(f"操作错误: {str(e)}")
-        conn.rollback()
+        if conn:
+            try:
+                conn.rollback()
+            except Exception:
+                discard_conn = True
     finally:
         if 'cursor' in locals():
             cursor.close()
-        if 'conn' in locals() and conn:
-            conn.close()
+        if conn:
+            db_router.release(conn, discard=discard_conn)
 
     return result_sets
 
@@ -105,6 +111,12 @@ def get_users():
     return json_result
 
 
+# 连接池统计信息
+@app.route('/poolStats', methods=['GET'])
+def get_pool_stats():
+    return jsonify(db_router.stats())
+
+
 # 2. 获取单个用户 (GET请求，带参数)
 @app.route('/users/<int:user_id>', methods=['GET'])
 def get_user(user_id):
@@ -116,5 +128,7 @@ def get_user(user_id):
 
 # 启动服务
 if __name__ == '__main__':
-    # 允许外部访问，端口为5000，开启调试模式
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # 允许外部访问，默认生产模式：gunicorn/waitress（见 DM_WSGI_SERVER，都未安装时退化为 Werkzeug 预派生多进程并打印警告）；
+    # --serve dev 或 DM_SERVE_MODE=dev 恢复调试模式
+    # 连接池回收线程在每个工作进程 fork 之后启动
+    serve(app, on_worker_start=lambda worker_id: db_router.start())
\ No newline at end of file
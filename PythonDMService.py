@@ -1,76 +1,282 @@
-import dmPython
+import itertools
+import math
 import os
+import time
+from contextlib import contextmanager
 from flask import Flask, jsonify, Response, request
-import json
 from datetime import datetime
-from xml.etree.ElementTree import Element, SubElement, tostring
-from xml.dom import minidom
-import xml.etree.ElementTree as ET
+
+import dm_config
+from dm_admission import (ADMISSION_CLIENT_HEADER, INTERACTIVE, PRIORITIES, Admission, AdmissionRejected,
+                          set_request_client)
+from dm_batch import (BATCH_MAX_PARALLEL, BatchError, BatchResult, iter_json_batch, iter_xml_batch, parse_batch_items,
+                      run_batch)
+from dm_breaker import OPEN as BREAKER_OPEN, STATE_VALUES as BREAKER_STATE_VALUES, CircuitOpenError
+from dm_buffer import MemoryBudget
+from dm_bulk import (BULK_CHUNK_ROWS, BULK_COMMIT_ROWS, BULK_MAX_ERRORS, BULK_TIMEOUT, CSV as BULK_CSV, BulkError,
+                     BulkLoader, body_format, call_sql, check_identifier, insert_sql, is_bulk_table, iter_csv_rows,
+                     iter_jsonl_rows, iter_text_lines, parse_columns, parse_int_option, read_csv_header)
+from dm_cache import ResultCache
+from dm_compress import COMPRESS_ENABLED, compress_response, is_compressible, negotiate_encoding
+from dm_deadline import (DeadlineExceeded, clear_deadline, current_deadline, resolve_timeout, start_deadline,
+                         statement_deadline)
+from dm_export import (CONTENT_TYPES as EXPORT_CONTENT_TYPES, ENCODERS as EXPORT_ENCODERS, EXPORT_BATCH_SIZE,
+                       EXPORT_MAX_PARALLEL, EXPORT_MAX_PARTITIONS, EXPORT_PARALLEL, EXPORT_PARTITIONS_PER_WORKER,
+                       EXPORT_TIMEOUT,
+                       ExportError, ParallelExport, is_export_table, plan_export)
+from dm_etag import change_token_etag, fingerprint_enabled, result_sets_etag, version_proc_for
+from dm_jobs import JOBS_TIMEOUT, SUCCEEDED as JOB_SUCCEEDED, JobManager, JobQueueFull, iter_spooled_result_sets
+from dm_log import (REQUEST_ID_HEADER, annotate, begin_request, current_request, get_logger, log_stats, phase,
+                    setup_logging, timed_iter)
+from dm_metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, LabelLimiter, Registry
+from dm_paging import (NEXT_TOKEN_HEADER, CursorRegistry, PagedCursor, PagingError, parse_page_request,
+                       seek_result_set, skip_rows)
+from dm_pool import PoolTimeoutError
+from dm_preflight import Preflight
+from dm_prefetch import Prefetcher
+from dm_server import parse_serve_options, serve
+from dm_singleflight import SINGLEFLIGHT_USER_HEADER, SingleFlight
+from dm_resultset import ResultSet
+from dm_router import NodeRouter
+from dm_binary import (ARROW_CONTENT_TYPE, BINARY_MEDIA_TYPES, MSGPACK_CONTENT_TYPE, is_available,
+                       iter_arrow_result_sets, iter_msgpack_result_sets)
+from dm_stream import (FETCH_BATCH_SIZE, iter_described_result_sets, iter_json_result_sets,
+                       iter_columnar_json_result_sets)
+from dm_xml import iter_xml_result_sets
+
+# 数据库驱动（默认 dmPython，可用 DM_DRIVER_MODULE 替换为替身模块）
+dmPython = dm_config.load_driver()
 
 app = Flask(__name__)
 
+# 结构化日志（请求线程只入队，后台线程写出）
+setup_logging()
+log = get_logger('service')
 
-def convert_datetime(obj):
-    """将datetime对象转换为JSON可序列化字符串"""
-    if isinstance(obj, datetime):
-        return obj.strftime('%Y-%m-%d %H:%M:%S')
-    raise TypeError(f"类型 {type(obj)} 不支持JSON序列化")
+# 数据库节点（主库 + 备库，见 DM_NODES；未配置时只有 DM_SERVER 一个主库）与按过程路由（只读过程见 DM_READONLY_PROCS）。
+# 每个节点有独立的连接池（复用加密连接，避免每个请求重复建立TLS/加密握手）
+# 与熔断器（连接失败、超时、慢调用过多时快速失败，见 DM_BREAKER_*）
+db_router = NodeRouter(dmPython)
 
+# 启动预检与就绪状态（/healthz、/readyz），数据库检查针对主库
+preflight = Preflight(db_router.primary.pool)
 
-def get_multiple_result_sets(strSp, strParam):
-    """调用达梦存储过程（兼容不同dmPython版本的错误格式）"""
-    # 加密库检查
-    print("\n" + "=" * 50)
-    print("【加密库加载调试】- 开始检查依赖文件")
-    print(f"1. 当前运行目录：{os.getcwd()}")
-    print(f"2. LD_LIBRARY_PATH：{os.environ.get('LD_LIBRARY_PATH', '未设置')}")
-
-    required_dm_libs = [
-        "libcryptocme.so", "libdmcrypt.so", "libdmdpi.so", "libdmgmssl.so"
-    ]
-    missing_libs = []
-    for lib in required_dm_libs:
-        lib_path = os.path.join(os.getcwd(), lib)
-        if os.path.exists(lib_path) and os.path.getsize(lib_path) > 0:
-            print(f"✅ 找到有效加密库：{lib_path}（大小：{os.path.getsize(lib_path)}字节）")
-        else:
-            print(f"❌ 缺失或损坏的加密库：{lib_path}")
-            missing_libs.append(lib)
-
-    if missing_libs:
-        error_msg = f"【致命错误】缺失加密库：{', '.join(missing_libs)}，无法连接数据库"
-        print(error_msg)
-        raise Exception(error_msg)
-
-    # 数据库连接参数
-    conn_params = {
-        'server': '192.168.0.191',  # 已更新为日志中的服务器地址
-        'user': 'JZX',
-        'password': 'XFgs@345',
-        'port': 5236,
-        'autoCommit': True
-    }
-    result_sets = []
-    conn = None
-    cursor = None
+# 存储过程结果缓存（允许缓存的过程及TTL见 DM_CACHE_PROCS）
+result_cache = ResultCache()
+
+# 结果集内存预算（本进程所有调用在内存中保留的行共用，超出后溢出到临时文件）
+result_budget = MemoryBudget()
+
+# 并发相同调用合并（不合并的非幂等过程见 DM_SINGLEFLIGHT_EXCLUDE）
+single_flight = SingleFlight()
+
+# 准入控制：本进程同时执行的数据库调用数上限、按优先级加权的有界等待队列与按客户端/过程的令牌桶（见 DM_ADMISSION_*）
+admission = Admission()
+INTERACTIVE_ROUTES = ('/users', '/jsonService', '/xmlService')  # 其余接口与后台作业、预取按 batch 排队
+_admission_tickets = {}  # id(conn) -> 连接上的调用持有（或暂停时已交回）的准入名额，归还连接时交回
+
+# 运行指标（/metrics）
+metrics = Registry()
+procedure_label = LabelLimiter()
+METERED_ROUTES = ('/users', '/jsonService', '/xmlService', '/batch', '/bulk', '/export')
+request_counter = metrics.counter(
+    'dm_http_requests_total', '接口请求数', ('route', 'procedure', 'status'))
+request_latency = metrics.histogram(
+    'dm_http_request_duration_seconds', '接口请求耗时（含响应输出）', ('route', 'procedure'))
+phase_latency = metrics.histogram(
+    'dm_request_phase_duration_seconds', '请求各阶段耗时：connect/callproc/fetch/serialize', ('route', 'procedure', 'phase'))
+rows_counter = metrics.counter('dm_rows_returned_total', '返回的数据行数', ('route', 'procedure'))
+bytes_counter = metrics.counter('dm_response_bytes_total', '返回的响应字节数（压缩前）', ('route', 'procedure'))
+db_error_counter = metrics.counter(
+    'dm_db_errors_total', '数据库错误数（按阶段与达梦错误码）', ('procedure', 'stage', 'code'))
+spilled_bytes_counter = metrics.counter(
+    'dm_result_spilled_bytes_total', '超出内存预算、溢出到临时文件的结果集字节数', ('procedure',))
+prefetch_latency = metrics.histogram(
+    'dm_prefetch_refresh_duration_seconds', '预取刷新耗时', ('procedure',))
+prefetch_counter = metrics.counter('dm_prefetch_refreshes_total', '预取刷新次数', ('procedure', 'result'))
+page_counter = metrics.counter(
+    'dm_page_requests_total', '分页请求数（按来源：cursor/execute/reexecute/cache）', ('procedure', 'source'))
+bulk_rows_counter = metrics.counter(
+    'dm_bulk_rows_total', '批量写入行数：committed 已提交，failed 执行失败或回滚，rejected 无法解析', ('procedure', 'result'))
+bulk_throughput = metrics.histogram(
+    'dm_bulk_rows_per_second', '批量写入速度（已提交行数/秒）', ('procedure',),
+    buckets=(100, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000))
+admission_wait = metrics.histogram(
+    'dm_admission_wait_seconds', '数据库调用等待准入名额的时间', ('priority',))
+admission_rejected_counter = metrics.counter(
+    'dm_admission_rejected_total', '未准入的数据库调用数：client_rate/procedure_rate 限流，queue_full/queue_timeout 过载',
+    ('reason',))
+in_flight_gauge = metrics.gauge('dm_http_requests_in_flight', '正在处理的接口请求数', ('route',))
+compressed_bytes_counter = metrics.counter(
+    'dm_response_compressed_bytes_total', '压缩后的响应字节数', ('route', 'procedure', 'encoding'))
+compression_cpu_counter = metrics.counter(
+    'dm_response_compression_cpu_seconds_total', '响应压缩占用的CPU秒数', ('route', 'procedure', 'encoding'))
+compression_ratio = metrics.histogram(
+    'dm_response_compression_ratio', '响应压缩比（压缩前/压缩后字节数）', ('route', 'encoding'),
+    buckets=(1.5, 2, 3, 4, 6, 8, 12, 16, 24, 32, 64))
+
+
+def database_error_info(e):
+    """提取达梦错误码与描述（兼容不同dmPython版本：errno属性或args元组）"""
+    try:
+        # 尝试获取错误码（部分版本用errno）
+        return e.errno, e.strerror
+    except AttributeError:
+        # 若没有errno，从args提取（通常args[0]是错误码，args[1]是描述）
+        error_code = e.args[0] if len(e.args) > 0 else '未知'
+        error_desc = e.args[1] if len(e.args) > 1 else str(e)
+        return error_code, error_desc
+
+
+def is_transient_database_error(e):
+    """连接中断、网络错误等数据库侧问题（计入熔断器），区别于过程不存在、参数错误等调用方问题"""
+    return isinstance(e, tuple(getattr(dmPython, name) for name in ('OperationalError', 'InterfaceError')
+                               if hasattr(dmPython, name)))
+
+
+def find_database_error(e):
+    """沿异常链（raise ... from e）查找驱动抛出的 DatabaseError，找不到返回 None"""
+    while e is not None:
+        if isinstance(e, dmPython.DatabaseError):
+            return e
+        e = e.__cause__
+    return None
+
+
+def error_code_of(e):
+    """批量项与异步作业的错误码：TIMEOUT、CIRCUIT_OPEN、RATE_LIMITED、OVERLOADED 或达梦错误码（不是数据库错误时为 None）"""
+    if isinstance(e, DeadlineExceeded):
+        return 'TIMEOUT'
+    if isinstance(e, AdmissionRejected):
+        return 'RATE_LIMITED' if e.status == 429 else 'OVERLOADED'
+    if isinstance(e, CircuitOpenError):
+        return 'CIRCUIT_OPEN'
+    db_error = find_database_error(e)
+    return database_error_info(db_error)[0] if db_error is not None else None
+
+
+def error_status_of(e):
+    """异常对应的HTTP状态码（与 error_response 一致，用于批量项等不直接返回响应的日志汇总）"""
+    if isinstance(e, (PagingError, BulkError, ExportError)):
+        return 400
+    if isinstance(e, DeadlineExceeded):
+        return 504
+    if isinstance(e, AdmissionRejected):
+        return e.status
+    if isinstance(e, (CircuitOpenError, JobQueueFull)):
+        return 503
+    return 500
+
+
+def admit_call(strSp, deadline):
+    """取得数据库调用的准入名额（排队不超过请求截止时间），返回 Ticket；未准入时抛出 AdmissionRejected 或 DeadlineExceeded"""
+    timeout = None if deadline is None else deadline.bound(admission.queue_timeout)
+    try:
+        ticket = admission.admit(strSp, timeout)
+    except AdmissionRejected as e:
+        admission_rejected_counter.inc(e.reason)
+        log.warning(f"数据库调用未准入（{e.reason}）：{e}", extra={'fields': {'procedure': strSp}})
+        raise
+    except TimeoutError as e:
+        db_error_counter.inc(procedure_label(strSp), 'admission', 'deadline')
+        log.error(f"{e}")
+        raise DeadlineExceeded(f"等待数据库调用名额超过截止时间（{deadline.seconds:g} 秒）") from e
+    if admission.enabled:
+        admission_wait.observe(ticket.priority, value=ticket.waited)
+    if ticket.waited:
+        annotate(admission_wait_ms=round(ticket.waited * 1000, 3))
+    return ticket
+
+
+def suspend_call(conn):
+    """连接上的调用暂停（连接仍保留，如分页游标放回登记表、流式输出等待客户端读取）：交回准入名额"""
+    admission.release(_admission_tickets.get(id(conn)))
+
+
+def resume_call(conn):
+    """暂停的调用继续访问数据库前取回准入名额（不排队，见 Admission.resume；名额仍持有时不做任何事）"""
+    ticket = _admission_tickets.get(id(conn))
+    if ticket is not None and ticket.released:
+        _admission_tickets[id(conn)] = admission.resume(ticket)
+
+
+@contextmanager
+def executing(conn, deadline=None):
+    """连接上的一次数据库访问（execute、fetchmany 等）：持有准入名额并受截止时间限制，结束后交回名额"""
+    resume_call(conn)
+    try:
+        with statement_deadline(conn, deadline):
+            yield
+    finally:
+        suspend_call(conn)
+
+
+def executing_iter(iterable, conn, deadline=None):
+    """流式读取：每次取下一项（fetchmany、nextset）都在 executing 中进行，两次读取之间不占用准入名额"""
+    iterator = iter(iterable)
+    while True:
+        with executing(conn, deadline):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def acquire_connection(strSp, deadline, candidates=None):
+    """取得准入名额后按路由选择节点并借出连接，返回 (conn, node, breaker_call)
 
+    只读过程依次尝试可用的备库（在途请求最少者优先），最后回退到主库；节点熔断或连接失败时换下一个节点。
+    连接池借出超时不换节点（节点可用但繁忙，换到主库只会加重主库负担）。candidates 指定时不按过程路由（如写入只用主库）。
+    准入名额在 close_procedure_cursor 中交回（借出失败时立即交回）；调用暂停期间可先交回（见 suspend_call）。
+    """
+    ticket = admit_call(strSp, deadline)
     try:
-        print("\n【数据库操作】开始连接达梦数据库...")
-        print(f"连接参数：server={conn_params['server']}, port={conn_params['port']}, user={conn_params['user']}")
+        conn, node, breaker_call = _acquire_node_connection(strSp, deadline, candidates)
+    except BaseException:
+        admission.release(ticket)
+        raise
+    _admission_tickets[id(conn)] = ticket
+    return conn, node, breaker_call
+
+
+def _acquire_node_connection(strSp, deadline, candidates):
+    if candidates is None:
+        candidates = db_router.candidates(strSp)
+    for index, node in enumerate(candidates):
+        last = index == len(candidates) - 1
+        try:
+            breaker_call = node.breaker.begin()
+        except CircuitOpenError:
+            if last:
+                raise
+            continue
+        conn_params = node.conn_params
+        log.debug("从连接池获取达梦数据库连接", extra={'fields': {
+            'node': node.name, 'server': conn_params['server'], 'port': conn_params['port'],
+            'user': conn_params['user']}})
 
         # 连接阶段错误捕获（兼容不同dmPython版本）
         try:
-            conn = dmPython.connect(**conn_params)
+            with phase('connect'):
+                conn = db_router.acquire(
+                    node, None if deadline is None else deadline.bound(node.pool.checkout_timeout))
+            return conn, node, breaker_call
+        except PoolTimeoutError as e:
+            breaker_call.fail()
+            breaker_call.finish()
+            if deadline is not None and deadline.expired():
+                db_error_counter.inc(procedure_label(strSp), 'pool', 'deadline')
+                log.error(f"等待数据库连接超过截止时间：{e}")
+                raise DeadlineExceeded(f"等待数据库连接超过截止时间（{deadline.seconds:g} 秒）") from e
+            error_detail = f"获取数据库连接超时：{e}（节点 {node.name}，连接池统计：{node.pool.stats()}）"
+            db_error_counter.inc(procedure_label(strSp), 'pool', 'timeout')
+            log.error(error_detail)
+            raise Exception(error_detail) from e
         except dmPython.DatabaseError as e:
-            # 提取错误信息（兼容errno属性或args元组）
-            try:
-                # 尝试获取错误码（部分版本用errno）
-                error_code = e.errno
-                error_desc = e.strerror
-            except AttributeError:
-                # 若没有errno，从args提取（通常args[0]是错误码，args[1]是描述）
-                error_code = e.args[0] if len(e.args) > 0 else '未知'
-                error_desc = e.args[1] if len(e.args) > 1 else str(e)
+            breaker_call.fail()
+            breaker_call.finish()
+            error_code, error_desc = database_error_info(e)
 
             error_detail = (
                 f"达梦连接失败 [错误码: {error_code}]\n"
@@ -81,10 +287,29 @@ def get_multiple_result_sets(strSp, strParam):
                 f"  3. 数据库服务未启动或端口未开放\n"
                 f"  4. 加密库版本与数据库不兼容"
             )
-            print(f"❌ {error_detail}")
-            raise Exception(error_detail) from e
+            db_error_counter.inc(procedure_label(strSp), 'connect', error_code)
+            log.error(error_detail, extra={'fields': {'error_code': error_code, 'node': node.name}})
+            if last:
+                raise Exception(error_detail) from e
+            log.warning(f"节点 {node.name} 连接失败，改用下一个节点")
 
-        print("✅ 数据库连接成功（加密模块加载正常）")
+
+def open_procedure_cursor(strSp, strParam):
+    """借出连接并调用达梦存储过程（兼容不同dmPython版本的错误格式），返回 (conn, cursor)
+
+    调用失败时连接已归还；成功时由调用方读取结果集后调用 close_procedure_cursor。
+    连接与调用受所选节点的熔断器保护（断开时抛出 CircuitOpenError），callproc 超过请求截止时间时被取消（DeadlineExceeded）。
+    """
+    # 加密库检查（启动预检的缓存结果，请求路径不访问文件系统）
+    preflight.require_libs()
+
+    deadline = current_deadline()
+    conn, node, breaker_call = acquire_connection(strSp, deadline)
+    cursor = None
+    annotate(node=node.name)
+
+    try:
+        log.debug("数据库连接成功（加密模块加载正常）")
         cursor = conn.cursor()
 
         # 检查存储过程名
@@ -92,17 +317,19 @@ def get_multiple_result_sets(strSp, strParam):
             raise Exception("【参数错误】存储过程名（param1）不能为空")
 
         # 调用存储过程（兼容错误格式）
-        print(f"调用存储过程：{strSp}，参数：{strParam}")
+        log.debug("调用存储过程", extra={'fields': {'procedure': strSp, 'param': strParam}})
         try:
-            cursor.callproc(strSp, (strParam,))
+            with phase('callproc'), statement_deadline(conn, deadline):
+                cursor.callproc(strSp, strParam if isinstance(strParam, tuple) else (strParam,))
+        except DeadlineExceeded as e:
+            breaker_call.fail()
+            db_error_counter.inc(procedure_label(strSp), 'callproc', 'deadline')
+            log.error(f"存储过程 {strSp} {e}", extra={'fields': {'procedure': strSp}})
+            raise
         except dmPython.DatabaseError as e:
-            # 同样兼容错误码提取
-            try:
-                error_code = e.errno
-                error_desc = e.strerror
-            except AttributeError:
-                error_code = e.args[0] if len(e.args) > 0 else '未知'
-                error_desc = e.args[1] if len(e.args) > 1 else str(e)
+            if is_transient_database_error(e):
+                breaker_call.fail()
+            error_code, error_desc = database_error_info(e)
 
             error_detail = (
                 f"存储过程调用失败 [错误码: {error_code}]\n"
@@ -112,177 +339,1226 @@ def get_multiple_result_sets(strSp, strParam):
                 f"  2. 参数 {strParam} 格式错误或不合法\n"
                 f"  3. 存储过程内部执行出错"
             )
-            print(f"❌ {error_detail}")
+            db_error_counter.inc(procedure_label(strSp), 'callproc', error_code)
+            log.error(error_detail, extra={'fields': {'error_code': error_code, 'procedure': strSp}})
             raise Exception(error_detail) from e
 
-        # 获取结果集
+        return conn, cursor
+
+    except Exception as e:
+        log.debug(f"处理中断：{str(e)}")
+        close_procedure_cursor(conn, cursor, failed=True, discard=isinstance(e, DeadlineExceeded))
+        raise
+
+    finally:
+        breaker_call.finish()
+
+
+def close_procedure_cursor(conn, cursor, failed=False, discard=False):
+    """关闭游标并把连接归还所属节点的连接池；failed=True 时先回滚事务，discard=True 时不再放回连接池（如语句被取消过）"""
+    discard_conn = discard
+    if conn and failed:
+        try:
+            conn.rollback()
+            log.debug("事务已回滚")
+        except:
+            # 回滚失败说明连接已不可用，归还时直接丢弃
+            discard_conn = True
+    if cursor:
+        try:
+            cursor.close()
+            log.debug("游标已关闭")
+        except:
+            pass
+    if conn:
+        ticket = _admission_tickets.pop(id(conn), None)
+        db_router.release(conn, discard=discard_conn)
+        admission.release(ticket)
+        log.debug("数据库连接已归还连接池", extra={'fields': {'discarded': discard_conn}})
+
+
+def get_multiple_result_sets(strSp, strParam):
+    """调用达梦存储过程并读取全部结果集，返回 ResultSet 列表（列信息 + 行元组）
+
+    行保存在内存中时计入本进程的内存预算（DM_RESULT_MEMORY_BUDGET），超出后的行溢出到 mmap 临时文件。
+    """
+    conn, cursor = open_procedure_cursor(strSp, strParam)
+    result_sets = []
+    failed = True
+    cancelled = False
+    fingerprint = fingerprint_enabled(strSp)
+
+    try:
+        # 获取结果集（读取同样受请求截止时间限制）
         set_index = 1
-        while True:
-            if cursor.description:
-                columns = [col[0] for col in cursor.description]
-                rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
-                result_sets.append(rows)
-                print(f"✅ 获取结果集 {set_index}：{len(rows)} 行数据")
-                set_index += 1
-            if not cursor.nextset():
-                break
+        with statement_deadline(conn):
+            while True:
+                if cursor.description:
+                    with phase(f'fetch.{set_index}'):
+                        result_set = ResultSet.from_cursor(cursor, fingerprint=fingerprint, budget=result_budget)
+                    result_sets.append(result_set)
+                    log.debug(f"获取结果集 {set_index}：{result_set.row_count} 行数据")
+                    set_index += 1
+                if not cursor.nextset():
+                    break
 
         conn.commit()
-        print(f"✅ 所有结果集处理完成（共 {len(result_sets)} 个）")
+        failed = False
+        annotate(result_sets=len(result_sets), rows=[result_set.row_count for result_set in result_sets])
+        spilled = sum(result_set.spilled_bytes for result_set in result_sets)
+        if spilled:
+            annotate(spilled_bytes=spilled)
+            spilled_bytes_counter.inc(procedure_label(strSp), amount=spilled)
         return result_sets
 
     except Exception as e:
-        print(f"❌ 处理中断：{str(e)}")
-        if conn:
-            try:
-                conn.rollback()
-                print("ℹ️  事务已回滚")
-            except:
-                pass
+        if isinstance(e, DeadlineExceeded):
+            cancelled = True
+            db_error_counter.inc(procedure_label(strSp), 'fetch', 'deadline')
+            log.error(f"读取结果集中断：{str(e)}")
+        else:
+            if isinstance(e, dmPython.DatabaseError):
+                db_error_counter.inc(procedure_label(strSp), 'fetch', database_error_info(e)[0])
+            log.error(f"读取结果集中断：{str(e)}", exc_info=True)
         raise
 
     finally:
-        if cursor:
-            try:
-                cursor.close()
-                print("ℹ️  游标已关闭")
-            except:
-                pass
-        if conn:
+        close_procedure_cursor(conn, cursor, failed, discard=cancelled)
+
+
+def stream_multiple_result_sets(strSp, strParam, batch_size=FETCH_BATCH_SIZE):
+    """流式调用存储过程：连接与 callproc 立即执行（错误可直接返回500），
+    结果集以 (description, 批量行迭代器) 的生成器形式返回（列类型供编码器生成按列转换表），
+    生成器结束或被关闭时归还连接"""
+    conn, cursor = open_procedure_cursor(strSp, strParam)
+
+    request_log = current_request()
+    deadline = current_deadline()
+
+    def _generate():
+        failed = True
+        cancelled = False
+        try:
+            set_index = 1
+            rows = []
+            # 读取（fetchmany、nextset）同样受请求截止时间限制，超时时取消语句；
+            # 准入名额只在读取时持有，等待客户端接收数据期间交回
+            suspend_call(conn)
+            for description, batches in executing_iter(
+                    iter_described_result_sets(cursor, batch_size), conn, deadline):
+                # 读取（fetchmany）耗时单独计入 fetch.N，不计入序列化
+                rows.append(0)
+                batches = executing_iter(batches, conn, deadline)
+                yield description, _count_rows(timed_iter(batches, f'fetch.{set_index}', request_log), rows)
+                log.debug(f"已输出结果集 {set_index}")
+                set_index += 1
+            conn.commit()
+            failed = False
+            if request_log is not None:
+                request_log.fields.update(result_sets=set_index - 1, rows=rows)
+        except Exception as e:
+            if isinstance(e, DeadlineExceeded):
+                cancelled = True
+                db_error_counter.inc(procedure_label(strSp), 'fetch', 'deadline')
+            elif isinstance(e, dmPython.DatabaseError):
+                db_error_counter.inc(procedure_label(strSp), 'fetch', database_error_info(e)[0])
+            log.error(f"流式输出中断：{str(e)}", exc_info=True,
+                      extra={'request_id': request_log.request_id if request_log else None})
+            raise
+        finally:
+            close_procedure_cursor(conn, cursor, failed, discard=cancelled)
+
+    return _generate()
+
+
+def _count_rows(batches, rows):
+    """按批透传行，同时把行数累加到 rows 的最后一项"""
+    for batch in batches:
+        rows[-1] += len(batch)
+        yield batch
+
+
+def load_result_sets(strSp, strParam, user=None):
+    """读取全部结果集，返回 (result_sets, 状态 SNAPSHOT/STALE/HIT/MISS/BYPASS/SHARED)
+
+    配置了预取的过程直接返回后台刷新的快照（超过刷新间隔的快照状态为 STALE，同时触发刷新）；
+    允许缓存的过程先查缓存；需要执行时，相同过程、参数、用户上下文的并发请求合并为一次数据库执行，
+    跟随的请求共享领导者读取的结果（状态为 SHARED）。结果被多个请求共享，只读使用。
+    """
+    snapshot = prefetcher.get(strSp, strParam)
+    if snapshot is not None:
+        result_data, fresh = snapshot
+        return result_data, 'SNAPSHOT' if fresh else 'STALE'
+    shared = False
+
+    def _load():
+        nonlocal shared
+        result_data, shared = single_flight.do(
+            strSp, (strParam,), lambda: get_multiple_result_sets(strSp, strParam), user)
+        return result_data
+
+    if not result_cache.is_cacheable(strSp):
+        result_data = _load()
+        return result_data, 'SHARED' if shared else 'BYPASS'
+    result_data, hit = result_cache.get_or_load(strSp, (strParam,), _load)
+    if hit:
+        return result_data, 'HIT'
+    return result_data, 'SHARED' if shared else 'MISS'
+
+
+def prefetch_result_sets(strSp, strParam):
+    """预取刷新（在预取线程中执行）：与请求相同的连接、路由与熔断路径，截止时间按 /prefetch 配置"""
+    request_log = begin_request(None, prefetch=True, procedure=strSp, param=strParam)
+    start_deadline(resolve_timeout('/prefetch', strSp))
+    status = 500
+    try:
+        result_data = get_multiple_result_sets(strSp, strParam)
+        status = 200
+        return result_data
+    finally:
+        request_log.finish(log, status)
+
+
+def _record_prefetch(procedure, seconds, success):
+    prefetch_latency.observe(procedure_label(procedure), value=seconds)
+    prefetch_counter.inc(procedure_label(procedure), 'success' if success else 'failure')
+
+
+# 热点过程预取（DM_PREFETCH），/jsonService、/xmlService 与批量接口优先读取其快照
+prefetcher = Prefetcher(prefetch_result_sets, on_refresh=_record_prefetch)
+
+
+def request_user_context():
+    """区分用户上下文的请求头取值（不同用户的请求不合并）"""
+    return request.headers.get(SINGLEFLIGHT_USER_HEADER) if SINGLEFLIGHT_USER_HEADER else None
+
+
+def peek_cached_result_sets(strSp, strParam):
+    """流式请求只读取已有的快照或缓存，返回 (result_sets, 状态)；都没有时返回 None（走流式读取，不为写缓存而整体读取）"""
+    snapshot = prefetcher.get(strSp, strParam)
+    if snapshot is not None:
+        result_data, fresh = snapshot
+        return result_data, 'SNAPSHOT' if fresh else 'STALE'
+    if not result_cache.is_cacheable(strSp):
+        return None
+    result_data = result_cache.get(result_cache.make_key(strSp, (strParam,)))
+    return None if result_data is None else (result_data, 'HIT')
+
+
+def finish_paged_cursor(entry, failed=False, discard=False):
+    """读完、淘汰或过期的分页游标：提交并关闭游标，归还连接"""
+    if not failed:
+        try:
+            entry.conn.commit()
+        except Exception as e:
+            log.warning(f"分页游标提交失败：{str(e)}")
+            failed = True
+    close_procedure_cursor(entry.conn, entry.cursor, failed, discard=discard)
+
+
+# 分页的服务端游标（每个工作进程最多 DM_PAGE_MAX_CURSORS 个，空闲 DM_PAGE_CURSOR_TTL 秒后关闭）
+cursor_registry = CursorRegistry(finish_paged_cursor)
+
+
+def open_paged_cursor(page):
+    """调用过程并定位到 page 所在的结果集与起始行（偏移不为 0 时逐批读取并丢弃之前的行）"""
+    conn, cursor = open_procedure_cursor(page.procedure, page.params)
+    try:
+        with statement_deadline(conn):
+            if not seek_result_set(cursor, page.set_index):
+                raise PagingError(f"【参数错误】存储过程 {page.procedure} 没有第 {page.set_index} 个结果集")
+            if page.offset:
+                with phase('skip'):
+                    skip_rows(cursor, page.offset)
+    except Exception as e:
+        if isinstance(e, dmPython.DatabaseError):
+            db_error_counter.inc(procedure_label(page.procedure), 'fetch', database_error_info(e)[0])
+        close_procedure_cursor(conn, cursor, failed=True, discard=isinstance(e, DeadlineExceeded))
+        raise
+    return PagedCursor(conn, cursor, page.procedure, page.params, page.set_index, page.offset)
+
+
+def load_page(page):
+    """读取一页，返回 (只含该页的 ResultSet, 下一页的 PageRequest 或 None, 来源)
+
+    来源：cache 从快照或缓存的完整结果中截取；cursor 继续读取登记表中的游标；execute 首次执行；
+    reexecute 令牌对应的游标已不可用（淘汰、过期或在其他工作进程中）或指定了 offset，重新执行并跳过之前的行。
+    还有下一页时游标放回登记表，令牌带上游标ID。放回登记表的游标仍占用连接，但交回准入名额，
+    下一页继续读取前再取回（空闲的游标不占用同时执行的调用数）。
+    """
+    cached = peek_cached_result_sets(page.procedure, page.params)
+    if cached is not None:
+        result_data = cached[0]
+        if page.set_index > len(result_data):
+            raise PagingError(f"【参数错误】存储过程 {page.procedure} 没有第 {page.set_index} 个结果集")
+        result_set = result_data[page.set_index - 1]
+        rows = list(itertools.islice(result_set.rows, page.offset, page.offset + page.limit))
+        more = page.offset + len(rows) < result_set.row_count
+        return ResultSet(result_set.description, rows), page.next(len(rows)) if more else None, 'cache'
+
+    entry = cursor_registry.take(page)
+    if entry is None:
+        source = 'reexecute' if page.cursor_id or page.offset else 'execute'
+        entry = open_paged_cursor(page)
+    else:
+        source = 'cursor'
+        node = db_router.node_of(entry.conn)
+        annotate(node=node.name if node is not None else None)
+
+    try:
+        with executing(entry.conn), phase(f'fetch.{page.set_index}'):
+            rows, more = entry.fetch(page.limit)
+    except Exception as e:
+        if isinstance(e, dmPython.DatabaseError):
+            db_error_counter.inc(procedure_label(page.procedure), 'fetch', database_error_info(e)[0])
+        finish_paged_cursor(entry, failed=True, discard=isinstance(e, DeadlineExceeded))
+        raise
+    result_set = ResultSet(entry.description, rows)
+    if not more:
+        finish_paged_cursor(entry)
+        return result_set, None, source
+    if cursor_registry.put(entry):
+        return result_set, page.next(len(rows), entry.id), source
+    finish_paged_cursor(entry)
+    return result_set, page.next(len(rows)), source
+
+
+def paged_response(page, build):
+    """分页响应：响应体格式与不分页时相同（只含所请求结果集的这一页），续页令牌与页信息在响应头中"""
+    result_set, next_page, source = load_page(page)
+    annotate(page_set=page.set_index, page_offset=page.offset, page_source=source, rows=[result_set.row_count])
+    page_counter.inc(procedure_label(page.procedure), source)
+    response = build([result_set], None)
+    response.headers['X-Page-Source'] = source
+    response.headers['X-Page-Offset'] = str(page.offset)
+    if next_page is not None:
+        response.headers[NEXT_TOKEN_HEADER] = next_page.to_token()
+    return response
+
+
+def _json_encoder(columnar, indent):
+    if columnar:
+        return iter_columnar_json_result_sets
+    return lambda result_sets: iter_json_result_sets(result_sets, indent=indent)
+
+
+def get_change_token(strSp, strParam):
+    """调用过程配置的变更令牌过程（DM_ETAG_VERSION_PROCS），返回其第一行；未配置或调用失败时返回 None"""
+    version_proc = version_proc_for(strSp)
+    if version_proc is None:
+        return None
+    try:
+        with phase('version'):
+            conn, cursor = open_procedure_cursor(version_proc, strParam)
+            failed = True
             try:
-                conn.close()
-                print("ℹ️  数据库连接已关闭")
-            except:
-                pass
+                row = cursor.fetchone() if cursor.description else None
+                conn.commit()
+                failed = False
+            finally:
+                close_procedure_cursor(conn, cursor, failed)
+    except Exception as e:
+        log.warning(f"变更令牌过程 {version_proc} 调用失败，改用结果集指纹：{str(e)}")
+        return None
+    return None if row is None else tuple(row)
+
+
+def not_modified(etag, cache_status=None):
+    """304 响应（不含响应体）"""
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    if cache_status:
+        response.headers['X-Cache'] = cache_status
+    return response
+
+
+def etag_response(result_data, cache_status, variant, build, etag=None):
+    """按结果集指纹（或已取得的变更令牌 ETag）设置弱 ETag；与 If-None-Match 匹配时返回 304，不再序列化
+
+    build(result_data, cache_status) 生成完整响应；结果集没有指纹（过程不在 DM_ETAG_PROCS 中）时不设置 ETag。
+    """
+    if etag is None:
+        etag = result_sets_etag(result_data, variant)
+    if etag is not None and request.if_none_match.contains_weak(etag):
+        return not_modified(etag, cache_status)
+    response = build(result_data, cache_status)
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def conditional_result_response(strSp, strParam, variant, build):
+    """读取全部结果集并生成带 ETag 的响应
+
+    配置了变更令牌过程时先调用它：令牌生成的 ETag 与 If-None-Match 匹配则直接返回 304，不执行 callproc。
+    """
+    etag = None
+    token = get_change_token(strSp, strParam)
+    if token is not None:
+        etag = change_token_etag(strSp, strParam, token, variant)
+        if request.if_none_match.contains_weak(etag):
+            return not_modified(etag)
+    result_data, cache_status = load_result_sets(strSp, strParam, request_user_context())
+    return etag_response(result_data, cache_status, variant, build, etag)
+
+
+def json_response(result_data, cache_status=None, columnar=False, indent=None):
+    """由已读取的结果集生成JSON响应（逐批编码输出；默认紧凑格式，indent 指定缩进；columnar=True 时输出列式结构）"""
+    result_sets = ((result_set.description, result_set.iter_batches()) for result_set in result_data)
+    encoder = _json_encoder(columnar, indent)
+    return Response(
+        encoder(result_sets),
+        content_type='application/json; charset=utf-8',
+        headers={'X-Cache': cache_status} if cache_status else None
+    )
+
+
+def json_stream_response(strSp, strParam, batch_size, columnar=False, indent=None):
+    """流式JSON响应（fetchmany分批读取，边读边输出，格式与 json_response 一致）"""
+    result_sets = stream_multiple_result_sets(strSp, strParam, batch_size)
+    encoder = _json_encoder(columnar, indent)
+    return Response(
+        encoder(result_sets),
+        content_type='application/json; charset=utf-8'
+    )
+
+
+# 二进制格式 -> (编码器, Content-Type)
+BINARY_ENCODERS = {
+    'msgpack': (iter_msgpack_result_sets, MSGPACK_CONTENT_TYPE),
+    'arrow': (iter_arrow_result_sets, ARROW_CONTENT_TYPE),
+}
+
+
+def binary_response(result_data, fmt, cache_status=None):
+    """由已读取的结果集生成 MessagePack / Arrow IPC 响应（按结果集逐批编码输出）"""
+    encoder, content_type = BINARY_ENCODERS[fmt]
+    result_sets = ((result_set.description, result_set.iter_batches()) for result_set in result_data)
+    return Response(
+        encoder(result_sets),
+        content_type=content_type,
+        headers={'X-Cache': cache_status} if cache_status else None
+    )
+
+
+def binary_stream_response(strSp, strParam, batch_size, fmt):
+    """流式 MessagePack / Arrow IPC 响应（列类型取自 cursor.description，边读边输出）"""
+    encoder, content_type = BINARY_ENCODERS[fmt]
+    result_sets = stream_multiple_result_sets(strSp, strParam, batch_size)
+    return Response(encoder(result_sets), content_type=content_type)
+
+
+def xml_response(result_data, encoding="utf-8", indent='  ', cache_status=None):
+    """由已读取的结果集增量生成XML响应（结构与原 ElementTree 版本一致）"""
+    result_sets = (
+        (result_set.description, result_set.iter_batches(), result_set.row_count)
+        for result_set in result_data
+    )
+    return Response(
+        iter_xml_result_sets(result_sets, total_sets=len(result_data), encoding=encoding, indent=indent),
+        content_type=f'application/xml; charset={encoding}',
+        headers={'X-Cache': cache_status} if cache_status else None
+    )
+
+
+def xml_stream_response(strSp, strParam, batch_size, encoding="utf-8", indent='  '):
+    """流式XML响应：边 fetchmany 边输出；行数/结果集总数事先未知，不输出 row_count/total_sets 属性"""
+    result_sets = (
+        (description, batches, None)
+        for description, batches in stream_multiple_result_sets(strSp, strParam, batch_size)
+    )
+    return Response(
+        iter_xml_result_sets(result_sets, encoding=encoding, indent=indent),
+        content_type=f'application/xml; charset={encoding}'
+    )
+
+
+def get_request_data():
+    """读取请求参数：GET 取查询参数，POST 取JSON或表单"""
+    if request.method == 'GET':
+        return request.args
+    return request.get_json() or request.form.to_dict()
+
+
+def get_response_format(data):
+    """响应格式：优先取 format 参数，其次按 Accept 头协商二进制格式，缺省为 json"""
+    fmt = str(data.get('format', '') or '').strip().lower()
+    if fmt:
+        return fmt
+    best = request.accept_mimetypes.best_match(['application/json'] + list(BINARY_MEDIA_TYPES))
+    return BINARY_MEDIA_TYPES.get(best, 'json')
+
+
+def is_stream_request(data):
+    """请求是否开启流式输出（stream=1/true/yes）"""
+    return str(data.get('stream', '')).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def is_pretty_request(data, default=False):
+    """是否缩进输出（pretty=1/0，未指定时取 default）"""
+    value = str(data.get('pretty', '')).strip().lower()
+    if not value:
+        return default
+    return value in ('1', 'true', 'yes', 'on')
+
+
+def get_batch_size(data):
+    """流式读取的批大小（batch参数，缺省为 DM_FETCH_BATCH_SIZE）"""
+    try:
+        batch_size = int(data.get('batch', FETCH_BATCH_SIZE))
+    except (TypeError, ValueError):
+        batch_size = FETCH_BATCH_SIZE
+    return max(1, batch_size)
 
 
 # 接口定义
-@app.route('/users', methods=['GET', 'POST'])
-def get_users():
+@app.before_request
+def begin_request_log():
+    """为每个请求建立日志上下文（沿用调用方传入的 X-Request-ID）"""
+    begin_request(request.headers.get(REQUEST_ID_HEADER), method=request.method, path=request.path)
+    clear_deadline()
+    set_request_client(request.headers.get(ADMISSION_CLIENT_HEADER) or request.remote_addr,
+                       INTERACTIVE if request.path in INTERACTIVE_ROUTES else None)
+    if request.path in METERED_ROUTES:
+        in_flight_gauge.inc(request.path)
+
+
+def _metered_body(body, request_log, charset):
+    """输出响应片段：统一编码为字节并累计字节数，取片段的耗时计入 serialize"""
+    sent = 0
     try:
-        if request.method == 'GET':
-            param1 = request.args.get('param1', '')
-            param2 = request.args.get('param2', '')
-        else:
-            data = request.get_json() or request.form.to_dict()
-            param1 = data.get('param1', '')
-            param2 = data.get('param2', '')
-
-        print(f"\n【接口请求】/users - param1: {param1}, param2: {param2}")
-        result_data = get_multiple_result_sets(param1, param2)
-        return json.dumps(
-            result_data,
-            default=convert_datetime,
-            ensure_ascii=False,
-            indent=4
-        ), 200, {'Content-Type': 'application/json; charset=utf-8'}
+        for chunk in timed_iter(body, 'serialize', request_log):
+            if isinstance(chunk, str):
+                chunk = chunk.encode(charset)
+            sent += len(chunk)
+            yield chunk
+    finally:
+        request_log.fields['bytes'] = sent
+
+
+def record_request_metrics(route, request_log, status):
+    """请求结束时记录指标（阶段 fetch.N 合并为 fetch）"""
+    procedure = procedure_label(request_log.fields.get('procedure'))
+    in_flight_gauge.dec(route)
+    request_counter.inc(route, procedure, status)
+    request_latency.observe(route, procedure, value=time.perf_counter() - request_log.started)
+    phases = {}
+    for name, ms in request_log.phases.items():
+        name = name.split('.', 1)[0]
+        phases[name] = phases.get(name, 0.0) + ms
+    for name, ms in phases.items():
+        phase_latency.observe(route, procedure, name, value=ms / 1000)
+    rows = request_log.fields.get('rows')
+    if rows:
+        rows_counter.inc(route, procedure, amount=sum(rows))
+    bytes_counter.inc(route, procedure, amount=request_log.fields.get('bytes') or 0)
+    encoding = request_log.fields.get('encoding')
+    if encoding:
+        compressed = request_log.fields.get('compressed_bytes') or 0
+        compressed_bytes_counter.inc(route, procedure, encoding, amount=compressed)
+        compression_cpu_counter.inc(route, procedure, encoding, amount=request_log.fields['compress_cpu_ms'] / 1000)
+        if compressed:
+            compression_ratio.observe(route, encoding, value=request_log.fields['bytes'] / compressed)
+
+
+def _record_compression(request_log):
+    """压缩结束时把压缩后字节数与CPU耗时写入请求汇总"""
+    def _done(stats):
+        request_log.fields.update(encoding=stats['encoding'], compressed_bytes=stats['compressed_bytes'],
+                                  compress_cpu_ms=round(stats['cpu_seconds'] * 1000, 3))
+    return _done
+
+
+@app.after_request
+def finish_request_log(response):
+    """响应输出结束（流式响应在最后一个片段之后）时输出请求汇总并记录指标；输出阶段耗时计入 serialize
+
+    客户端接受 gzip/deflate 时压缩响应（流式响应逐片段压缩），字节数按压缩前统计，压缩后字节数与CPU耗时另行记录。
+    """
+    request_log = current_request()
+    if request_log is None:
+        return response
+    response.headers[REQUEST_ID_HEADER] = request_log.request_id
+    if response.headers.get('X-Cache'):
+        request_log.fields['cache'] = response.headers['X-Cache']
+    if response.is_streamed:
+        response.response = _metered_body(response.response, request_log, response.charset)
+    else:
+        request_log.fields['bytes'] = response.calculate_content_length()
+    if COMPRESS_ENABLED and is_compressible(response):
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate_encoding(request.accept_encodings)
+        if encoding:
+            compress_response(response, encoding, on_done=_record_compression(request_log))
+    status = response.status_code
+    route = request.path if request.path in METERED_ROUTES else None
+
+    def _finish():
+        if route is not None:
+            record_request_metrics(route, request_log, status)
+        request_log.finish(log, status)
+
+    response.call_on_close(_finish)
+    return response
+
+
+def collect_runtime_metrics():
+    """抓取时读取各节点连接池与熔断器、结果缓存、请求合并与日志队列的统计（本进程）"""
+    pools = [({'node': node.name, 'role': node.role}, node.pool.stats()) for node in db_router.nodes]
+    breakers = [({'breaker': node.name}, node.breaker.snapshot()) for node in db_router.nodes]
+    routing = db_router.stats()
+    cache = result_cache.stats()
+    flights = single_flight.stats()
+    logs = log_stats()
+    jobs = job_manager.stats()
+    prefetch = prefetcher.status()
+    cursors = cursor_registry.stats()
+    admitted = admission.stats()
+    budget = result_budget.stats()
+    return [
+        ('dm_result_memory_bytes', 'gauge', '保留在内存中的结果集行（估算字节数）', [({}, budget['used'])]),
+        ('dm_result_memory_spills_total', 'counter', '超出内存预算、开始溢出到临时文件的次数', [({}, budget['rejected'])]),
+        ('dm_admission_in_flight', 'gauge', '已取得准入名额、正在执行的数据库调用数', [({}, admitted['in_flight'])]),
+        ('dm_admission_queue_depth', 'gauge', '等待准入名额的数据库调用数',
+         [({'priority': priority}, admitted['queued_now'][priority]) for priority in PRIORITIES]),
+        ('dm_pool_connections', 'gauge', '连接池连接数',
+         [(dict(labels, state=state), pool[state]) for labels, pool in pools for state in ('idle', 'in_use')]),
+        ('dm_pool_waiting', 'gauge', '等待借出连接的线程数', [(labels, pool['waiting']) for labels, pool in pools]),
+        ('dm_pool_checkouts_total', 'counter', '连接借出次数', [(labels, pool['checkouts']) for labels, pool in pools]),
+        ('dm_pool_timeouts_total', 'counter', '借出连接超时次数', [(labels, pool['timeouts']) for labels, pool in pools]),
+        ('dm_pool_wait_seconds_total', 'counter', '借出连接累计等待秒数',
+         [(labels, pool['wait_time_total']) for labels, pool in pools]),
+        ('dm_pool_connections_created_total', 'counter', '新建连接数', [(labels, pool['created']) for labels, pool in pools]),
+        ('dm_node_up', 'gauge', '节点是否可参与路由（健康且未熔断）',
+         [({'node': node.name, 'role': node.role}, int(node.available())) for node in db_router.nodes]),
+        ('dm_node_outstanding', 'gauge', '路由到节点、尚未归还连接的调用数',
+         [({'node': node.name, 'role': node.role}, node.outstanding) for node in db_router.nodes]),
+        ('dm_route_decisions_total', 'counter', '路由决策数：replica 备库，primary 只在主库执行，fallback 无可用备库回退主库',
+         [({'target': 'replica'}, routing['routed_replica']), ({'target': 'primary'}, routing['routed_primary']),
+          ({'target': 'fallback'}, routing['fallback_primary'])]),
+        ('dm_cache_requests_total', 'counter', '结果缓存查询次数', [({'result': 'hit'}, cache['hits']),
+                                                         ({'result': 'miss'}, cache['misses'])]),
+        ('dm_cache_evictions_total', 'counter', '结果缓存淘汰数', [({}, cache['evictions'])]),
+        ('dm_cache_bytes', 'gauge', '结果缓存占用字节数（估算）', [({}, cache['bytes'])]),
+        ('dm_cache_entries', 'gauge', '结果缓存条目数', [({}, cache['entries'])]),
+        ('dm_singleflight_executions_total', 'counter', '合并后的实际执行次数', [({}, flights['executions'])]),
+        ('dm_singleflight_coalesced_total', 'counter', '共享进行中调用结果的请求数', [({}, flights['coalesced'])]),
+        ('dm_log_dropped_total', 'counter', '日志队列已满而丢弃的记录数', [({}, logs['dropped'])]),
+        ('dm_prefetch_snapshot_age_seconds', 'gauge', '预取快照的年龄（秒）',
+         [({'procedure': procedure_label(item['procedure'])}, item['age'])
+          for item in prefetch['targets'] if item['age'] is not None]),
+        ('dm_prefetch_requests_total', 'counter', '读取预取快照的请求数：fresh 新鲜，stale 过期但仍返回，too_stale 超过 max_stale',
+         [({'result': 'fresh'}, prefetch['hits']), ({'result': 'stale'}, prefetch['stale_hits']),
+          ({'result': 'too_stale'}, prefetch['too_stale'])]),
+        ('dm_page_cursors_open', 'gauge', '保留在本进程中的分页游标数', [({}, cursors['open'])]),
+        ('dm_page_cursors_closed_total', 'counter', '未读完即关闭的分页游标数：evicted 超出容量，expired 空闲过期',
+         [({'reason': 'evicted'}, cursors['evicted']), ({'reason': 'expired'}, cursors['expired'])]),
+        ('dm_jobs_pending', 'gauge', '本进程排队与执行中的异步作业数', [({}, jobs['pending'])]),
+        ('dm_jobs_total', 'counter', '异步作业数（按结果）',
+         [({'result': result}, jobs[result]) for result in ('succeeded', 'failed', 'rejected')]),
+        ('dm_breaker_state', 'gauge', '数据库熔断器状态：0 闭合，1 半开，2 断开',
+         [(labels, BREAKER_STATE_VALUES[breaker['state']]) for labels, breaker in breakers]),
+        ('dm_breaker_opened_total', 'counter', '熔断器断开次数', [(labels, breaker['opened']) for labels, breaker in breakers]),
+        ('dm_breaker_rejected_total', 'counter', '熔断期间被拒绝的调用数',
+         [(labels, breaker['rejected']) for labels, breaker in breakers]),
+    ]
+
+
+metrics.register_collector(collect_runtime_metrics)
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus 文本格式指标"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+@app.route('/poolStats', methods=['GET'])
+def get_pool_stats():
+    """连接池统计信息（各节点合计，nodes 为按节点的明细）"""
+    return jsonify(db_router.stats())
+
+
+@app.route('/nodes', methods=['GET'])
+def get_nodes():
+    """数据库节点状态：角色、地址、健康、熔断器状态与在途调用数"""
+    return jsonify(db_router.status())
+
+
+@app.route('/singleflightStats', methods=['GET'])
+def get_singleflight_stats():
+    """请求合并统计信息（coalesced 为共享了进行中调用结果的请求数）"""
+    return jsonify(single_flight.stats())
+
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """存活检查"""
+    return jsonify(preflight.liveness())
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """就绪检查（加密库、主库连通性、连接池预热由后台线程定期刷新；主库熔断器断开时不就绪）
+
+    备库不影响就绪状态（没有可用备库时只读过程回退到主库），只在 checks.nodes 中列出。
+    """
+    state = preflight.readiness()
+    breaker = db_router.primary.breaker.snapshot()
+    breaker['ok'] = breaker['state'] != BREAKER_OPEN
+    nodes = {'ok': True, 'nodes': db_router.status()}
+    state = dict(state, checks=dict(state.get('checks', {}), breaker=breaker, nodes=nodes))
+    state['ready'] = state['ready'] and breaker['ok']
+    return jsonify(state), 200 if state['ready'] else 503
+
+
+@app.route('/admin/prefetch', methods=['GET'])
+def admin_prefetch():
+    """预取状态：各过程快照的加载时间、年龄、最近一次刷新耗时与失败信息"""
+    return jsonify(prefetcher.status())
+
+
+@app.route('/admin/cursors', methods=['GET'])
+def admin_cursors():
+    """分页游标登记表统计：保留的游标数、继续读取（hits）与需重新执行（misses）的次数、淘汰与过期数"""
+    return jsonify(cursor_registry.stats())
+
+
+@app.route('/admin/admission', methods=['GET'])
+def admin_admission():
+    """准入控制统计：执行中与排队的调用数、准入与排队次数、累计等待时间与按原因的拒绝数"""
+    return jsonify(admission.stats())
+
+
+@app.route('/admin/cache', methods=['GET', 'POST', 'DELETE'])
+def admin_cache():
+    """缓存管理：GET 返回命中/未命中/淘汰统计；POST/DELETE 失效缓存
+
+    参数 procedure（存储过程名，缺省为全部）与 param（存储过程参数，缺省为该过程的全部键）
+    """
+    if request.method == 'GET':
+        return jsonify(result_cache.stats())
+    data = request.args.to_dict()
+    data.update(request.get_json(silent=True) or request.form.to_dict())
+    procedure = data.get('procedure') or None
+    params = (data['param'],) if procedure and 'param' in data else None
+    removed = result_cache.invalidate(procedure, params)
+    return jsonify({'success': True, 'invalidated': removed, 'procedure': procedure})
+
+
+def error_response(e, **fields):
+    """接口异常的JSON响应：分页、批量写入或导出参数错误 400，超过截止时间 504，
+    限流 429、数据库熔断、调用排队已满或作业已满 503（均带 Retry-After），其他 500
+    """
+    annotate(error=str(e))
+    status, headers = error_status_of(e), {}
+    if isinstance(e, (CircuitOpenError, JobQueueFull, AdmissionRejected)):
+        headers['Retry-After'] = str(max(1, math.ceil(e.retry_after)))
+    body = {
+        'success': False,
+        'message': str(e),
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    body.update(fields)
+    return jsonify(body), status, headers
+
+
+def handle_json_request(route):
+    """/users 与 /jsonService 的公共处理
+
+    format=columnar 输出列式JSON，format=msgpack/arrow（或 Accept 头）输出二进制格式，stream=1 流式输出；
+    limit（或续页令牌 token）分页读取第 set 个结果集（见 paged_response）
+    """
+    param1 = param2 = ''
+    try:
+        data = get_request_data()
+        param1 = data.get('param1', '')
+        param2 = data.get('param2', '')
+        page = parse_page_request(data, param1, param2)
+        if page is not None:
+            param1, param2 = page.procedure, page.params
+
+        annotate(procedure=param1, param=param2)
+        start_deadline(resolve_timeout(route, param1, data.get('timeout')))
+        fmt = get_response_format(data)
+        if fmt in BINARY_ENCODERS:
+            if not is_available(fmt):
+                return jsonify({
+                    'success': False,
+                    'message': f"服务端未安装 {'msgpack' if fmt == 'msgpack' else 'pyarrow'}，不支持 {fmt} 格式",
+                    'param1': param1,
+                    'param2': param2
+                }), 406
+            build = lambda result_data, cache_status: binary_response(result_data, fmt, cache_status)
+            if page is not None:
+                return paged_response(page, build)
+            if is_stream_request(data):
+                cached = peek_cached_result_sets(param1, param2)
+                if cached is None:
+                    return binary_stream_response(param1, param2, get_batch_size(data), fmt)
+                return etag_response(*cached, fmt, build)
+            return conditional_result_response(param1, param2, fmt, build)
+
+        columnar = fmt == 'columnar'
+        indent = 4 if is_pretty_request(data) else None
+        variant = 'columnar' if columnar else 'json-pretty' if indent else 'json'
+        build = lambda result_data, cache_status: json_response(result_data, cache_status, columnar, indent)
+        if page is not None:
+            return paged_response(page, build)
+        if is_stream_request(data):
+            cached = peek_cached_result_sets(param1, param2)
+            if cached is None:
+                return json_stream_response(param1, param2, get_batch_size(data), columnar, indent)
+            return etag_response(*cached, variant, build)
+        return conditional_result_response(param1, param2, variant, build)
 
     except Exception as e:
-        return jsonify({
-            'success': False,
-            'message': str(e),
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'param1': param1,
-            'param2': param2
-        }), 500
+        return error_response(e, param1=param1, param2=param2)
+
+
+@app.route('/users', methods=['GET', 'POST'])
+def get_users():
+    return handle_json_request('/users')
 
 
 @app.route('/jsonService', methods=['GET', 'POST'])
 def get_json():
+    return handle_json_request('/jsonService')
+
+
+@app.route('/xmlService', methods=['GET', 'POST'])
+def get_xml(encoding="utf-8"):
+    param1 = param2 = ''
     try:
-        if request.method == 'GET':
-            param1 = request.args.get('param1', '')
-            param2 = request.args.get('param2', '')
-        else:
-            data = request.get_json() or request.form.to_dict()
-            param1 = data.get('param1', '')
-            param2 = data.get('param2', '')
-
-        print(f"\n【接口请求】/jsonService - param1: {param1}, param2: {param2}")
-        result_data = get_multiple_result_sets(param1, param2)
-        return json.dumps(
-            result_data,
-            default=convert_datetime,
-            ensure_ascii=False,
-            indent=4
-        ), 200, {'Content-Type': 'application/json; charset=utf-8'}
+        data = get_request_data()
+        param1 = data.get('param1', '')
+        param2 = data.get('param2', '')
+        page = parse_page_request(data, param1, param2)
+        if page is not None:
+            param1, param2 = page.procedure, page.params
 
+        annotate(procedure=param1, param=param2)
+        start_deadline(resolve_timeout('/xmlService', param1, data.get('timeout')))
+        indent = '  ' if is_pretty_request(data, default=True) else None
+        variant = 'xml' if indent else 'xml-compact'
+        build = lambda result_data, cache_status: xml_response(result_data, encoding, indent, cache_status)
+        if page is not None:
+            return paged_response(page, build)
+        if is_stream_request(data):
+            cached = peek_cached_result_sets(param1, param2)
+            if cached is None:
+                return xml_stream_response(param1, param2, get_batch_size(data), encoding, indent)
+            return etag_response(*cached, variant, build)
+        return conditional_result_response(param1, param2, variant, build)
+
+    except Exception as e:
+        return error_response(e, param1=param1, param2=param2)
+
+
+def run_batch_item(item, user=None):
+    """执行批量请求中的一项（在批量线程中运行）；失败时记录错误码与错误信息，不抛出异常
+
+    每项有自己的日志上下文（沿用批量请求的请求ID），结束时输出该项的汇总记录（耗时、阶段、行数或错误）。
+    """
+    parent = current_request()
+    request_log = begin_request(parent.request_id if parent else None, batch_item=item.id,
+                                procedure=item.procedure, param=item.params)
+    start_deadline(resolve_timeout(None, item.procedure))
+    started = time.perf_counter()
+    status = 500
+    try:
+        result_data, cache_status = load_result_sets(item.procedure, item.params, user)
+        result = BatchResult(item, True, data=result_data, cache=cache_status)
+        annotate(cache=cache_status, rows=[result_set.row_count for result_set in result_data])
+        status = 200
     except Exception as e:
+        result = BatchResult(item, False, error_code=error_code_of(e), message=str(e))
+        annotate(error=str(e), error_code=result.error_code)
+        status = error_status_of(e)
+    finally:
+        request_log.finish(log, status)
+    result.duration_ms = (time.perf_counter() - started) * 1000
+    return result
+
+
+def _tally_batch(results, request_log):
+    """透传批量结果，同时把项数、失败数与行数计入请求汇总"""
+    items = failed = 0
+    rows = []
+    try:
+        for result in results:
+            items += 1
+            if result.success:
+                rows.extend(result_set.row_count for result_set in result.data)
+            else:
+                failed += 1
+            yield result
+    finally:
+        if request_log is not None:
+            request_log.fields.update(items=items, failed_items=failed, rows=rows)
+
+
+@app.route('/batch', methods=['POST'])
+def batch():
+    """批量调用：一次请求并发执行多个存储过程，结果按项 id 返回
+
+    请求体为 {"items": [{"id": "a", "procedure": "JZX.P1", "params": "x"}, ...], "format": "json|xml", "stream": 0|1}；
+    各项使用独立的池化连接并发执行（同时执行数见 DM_BATCH_MAX_PARALLEL），单项失败只体现在该项结果中。
+    stream=1 时按完成顺序边执行边输出，否则全部完成后按请求顺序输出。
+    """
+    try:
+        payload = request.get_json(silent=True)
+        if payload is None:
+            raise BatchError("【参数错误】请求体必须是JSON")
+        items = parse_batch_items(payload)
+    except BatchError as e:
         return jsonify({
             'success': False,
             'message': str(e),
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'param1': param1,
-            'param2': param2
-        }), 500
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }), 400
 
+    options = request.args.to_dict()
+    if isinstance(payload, dict):
+        options.update((key, value) for key, value in payload.items() if key != 'items')
+    fmt = get_response_format(options)
+    if fmt not in ('json', 'xml'):
+        return jsonify({
+            'success': False,
+            'message': f"【参数错误】批量接口只支持 json/xml 格式，当前：{fmt}",
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }), 400
 
-@app.route('/xmlService', methods=['GET', 'POST'])
-def get_xml(encoding="utf-8"):
+    start_deadline(resolve_timeout('/batch', None, options.get('timeout')))
+    user = request_user_context()
+    results = run_batch(items, lambda item: run_batch_item(item, user), BATCH_MAX_PARALLEL)
+    if not is_stream_request(options):
+        results = sorted(results, key=lambda result: result.item.index)
+    results = _tally_batch(results, current_request())
+
+    if fmt == 'xml':
+        indent = '  ' if is_pretty_request(options, default=True) else None
+        return Response(iter_xml_batch(results, indent=indent), content_type='application/xml; charset=utf-8')
+    indent = 4 if is_pretty_request(options) else None
+    return Response(iter_json_batch(results, indent=indent), content_type='application/json; charset=utf-8')
+
+
+def bulk_rows(options):
+    """按请求体格式逐行解析上传数据，返回 (行迭代器, 列名列表)；CSV 的列名行与 JSON 对象的键在读取时填入列名列表"""
+    columns = parse_columns(options.get('columns'))
+    lines = iter_text_lines(request.stream)
+    if body_format(options.get('format'), request.content_type) != BULK_CSV:
+        return iter_jsonl_rows(lines, columns), columns
+    if str(options.get('header', '1')).strip().lower() in ('0', 'false', 'no', 'off'):
+        return iter_csv_rows(lines), columns
+    header, lines = read_csv_header(lines)
+    return iter_csv_rows(lines, first_line=2), columns or header
+
+
+@app.route('/bulk', methods=['POST'])
+def bulk():
+    """批量写入：请求体为 JSON Lines（每行一个对象或数组）或 CSV（第一行为列名，header=0 时没有列名行）
+
+    参数（查询字符串）：procedure（逐行调用的过程）或 table（插入的表，须匹配 DM_BULK_TABLES）、columns（列顺序）、
+    format（jsonl/csv，缺省按 Content-Type）、chunk（每次 executemany 的行数）、commit（每提交一次的行数）、
+    max_errors（失败的批与无法解析的行超过该数时中止）、timeout。
+    只在主库执行；边读取请求体边写入，返回已提交/失败/拒绝的行数、各失败批的错误与每秒写入行数。
+    """
+    target = ''
+    loader = None
     try:
-        if request.method == 'GET':
-            param1 = request.args.get('param1', '')
-            param2 = request.args.get('param2', '')
+        options = request.args
+        procedure = options.get('procedure', '').strip()
+        table = options.get('table', '').strip()
+        if bool(procedure) == bool(table):
+            raise BulkError("【参数错误】须指定 procedure 或 table 之一")
+        target = check_identifier(procedure or table, '存储过程名' if procedure else '表名')
+        annotate(procedure=target)
+        if table and not is_bulk_table(table):
+            return jsonify({
+                'success': False,
+                'message': f"表 {table} 不允许批量插入（见 DM_BULK_TABLES）",
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }), 403
+        chunk_rows = parse_int_option(options.get('chunk'), BULK_CHUNK_ROWS, 'chunk', 1)
+        commit_rows = parse_int_option(options.get('commit'), BULK_COMMIT_ROWS, 'commit', 1)
+        max_errors = parse_int_option(options.get('max_errors'), BULK_MAX_ERRORS, 'max_errors')
+        rows, columns = bulk_rows(options)
+        if procedure:
+            make_sql = lambda count: call_sql(procedure, count)
         else:
-            data = request.get_json() or request.form.to_dict()
-            param1 = data.get('param1', '')
-            param2 = data.get('param2', '')
-
-        print(f"\n【接口请求】/xmlService - param1: {param1}, param2: {param2}")
-        result_data = get_multiple_result_sets(param1, param2)
-
-        # 生成XML
-        root = ET.Element("ResultSets")
-        root.set("generated_time", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-        root.set("total_sets", str(len(result_data)))
-
-        for set_idx, result_set in enumerate(result_data, 1):
-            if not result_set:
-                continue
-            columns = list(result_set[0].keys()) if result_set else []
-            set_node = ET.SubElement(root, "ResultSet")
-            set_node.set("id", str(set_idx))
-            set_node.set("row_count", str(len(result_set)))
-            set_node.set("column_count", str(len(columns)))
-
-            cols_node = ET.SubElement(set_node, "Columns")
-            for col in columns:
-                ET.SubElement(cols_node, "Column").text = col
-
-            rows_node = ET.SubElement(set_node, "Rows")
-            for row_idx, row in enumerate(result_set, 1):
-                row_node = ET.SubElement(rows_node, "Row")
-                row_node.set("index", str(row_idx))
-                for col_idx, col_name in enumerate(columns):
-                    cell_value = row[col_name]
-                    cell_text = cell_value.strftime('%Y-%m-%d %H:%M:%S') if isinstance(cell_value, datetime) else (
-                        str(cell_value) if cell_value is not None else "")
-                    cell_node = ET.SubElement(row_node, "Cell")
-                    cell_node.set("column", col_name)
-                    cell_node.set("column_index", str(col_idx))
-                    cell_node.text = cell_text
-
-        rough_xml = ET.tostring(root, encoding=encoding)
-        pretty_xml = minidom.parseString(rough_xml).toprettyxml(indent="  ", encoding=encoding)
-        clean_xml = "\n".join([line for line in pretty_xml.decode(encoding).split("\n") if line.strip()])
-        return Response(clean_xml, mimetype=f'application/xml; charset={encoding}')
+            make_sql = lambda count: insert_sql(table, columns, count)
+
+        start_deadline(resolve_timeout('/bulk', target, options.get('timeout'), default=BULK_TIMEOUT))
+        preflight.require_libs()
+        conn, node, breaker_call = acquire_connection(target, current_deadline(), [db_router.primary])
+        annotate(node=node.name)
+        failed = True
+        discard = False
+        try:
+            conn.autoCommit = False
+            loader = BulkLoader(conn, make_sql, dmPython.DatabaseError, database_error_info, chunk_rows, commit_rows,
+                                max_errors, guard=lambda: statement_deadline(conn))
+            with phase('write'):
+                report = loader.run(rows)
+            failed = False
+        except DeadlineExceeded:
+            breaker_call.fail()
+            discard = True
+            db_error_counter.inc(procedure_label(target), 'write', 'deadline')
+            raise
+        finally:
+            try:
+                conn.autoCommit = True
+            except Exception:
+                discard = True
+            close_procedure_cursor(conn, None, failed, discard=discard)
+            breaker_call.finish()
+            if loader is not None:
+                _record_bulk(target, loader.report)
+
+        data = report.to_dict()
+        annotate(written_rows=report.committed_rows, failed_rows=report.failed_rows,
+                 rejected_rows=report.rejected_rows, rows_per_sec=data['rows_per_sec'])
+        return jsonify(dict(data, success=report.error_count == 0, procedure=procedure or None, table=table or None))
 
     except Exception as e:
-        return jsonify({
-            'success': False,
-            'message': str(e),
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'param1': param1,
-            'param2': param2
-        }), 500
+        fields = {'report': loader.report.to_dict()} if loader is not None else {}
+        return error_response(e, target=target, **fields)
+
+
+def _record_bulk(target, report):
+    label = procedure_label(target)
+    bulk_rows_counter.inc(label, 'committed', amount=report.committed_rows)
+    bulk_rows_counter.inc(label, 'failed', amount=report.failed_rows)
+    bulk_rows_counter.inc(label, 'rejected', amount=report.rejected_rows)
+    if report.committed_rows:
+        bulk_throughput.observe(label, value=report.rows_per_sec)
+
+
+def export_connections(table, deadline):
+    """导出扫描线程的借还连接函数：按路由借出（受熔断器保护），归还时记录扫描是否失败"""
+    calls = {}
+
+    def acquire():
+        conn, node, breaker_call = acquire_connection(table, deadline)
+        calls[id(conn)] = breaker_call
+        # 扫描线程等待客户端读取（队列已满）时不占用准入名额，每次访问数据库时经 executing 取回
+        suspend_call(conn)
+        return conn
+
+    def release(conn, error):
+        breaker_call = calls.pop(id(conn))
+        if error is not None:
+            log.error(f"导出 {table} 扫描中断：{str(error)}")
+            if isinstance(error, DeadlineExceeded) or isinstance(error, dmPython.DatabaseError) \
+                    and is_transient_database_error(error):
+                breaker_call.fail()
+        breaker_call.finish()
+        close_procedure_cursor(conn, None, error is not None, discard=isinstance(error, DeadlineExceeded))
+
+    return acquire, release
+
+
+@app.route('/export', methods=['GET', 'POST'])
+def export_table():
+    """整表导出：按键列范围分区并发扫描，流式输出 CSV 或 JSON Lines
+
+    参数：table（须匹配 DM_EXPORT_TABLES）、key（分区键列，缺省为主键）、columns（导出的列）、format（csv/jsonl）、
+    parallel（并发扫描数，上限 DM_EXPORT_MAX_PARALLEL）、partitions（分区数，上限 DM_EXPORT_MAX_PARTITIONS）、
+    batch（fetchmany 行数）、order（unordered 按读取完成顺序输出，ordered 按键列顺序输出）、timeout。
+    分区计划（主键、最小/最大值）在输出前完成，出错时返回JSON错误；输出开始后扫描失败则中断响应（记录日志）。
+    """
+    table = ''
+    try:
+        data = get_request_data()
+        table = str(data.get('table', '') or '').strip()
+        annotate(procedure=table)
+        if not table:
+            raise ExportError("【参数错误】表名（table）不能为空")
+        if not is_export_table(table):
+            return jsonify({
+                'success': False,
+                'message': f"表 {table} 不允许导出（见 DM_EXPORT_TABLES）",
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }), 403
+        fmt = str(data.get('format', 'csv') or 'csv').strip().lower()
+        if fmt not in EXPORT_ENCODERS:
+            raise ExportError(f"【参数错误】导出只支持 csv/jsonl 格式，当前：{fmt}")
+        order = str(data.get('order', 'unordered') or 'unordered').strip().lower()
+        if order not in ('ordered', 'unordered'):
+            raise ExportError(f"【参数错误】order 只能是 ordered 或 unordered，当前：{order}")
+        parallel = min(parse_int_option(data.get('parallel'), EXPORT_PARALLEL, 'parallel', 1), EXPORT_MAX_PARALLEL)
+        default_partitions = min(parallel * EXPORT_PARTITIONS_PER_WORKER, EXPORT_MAX_PARTITIONS)
+        partitions = parse_int_option(data.get('partitions'), default_partitions, 'partitions', 1)
+        if partitions > EXPORT_MAX_PARTITIONS:
+            raise ExportError(f"【参数错误】partitions 不能大于 {EXPORT_MAX_PARTITIONS}")
+
+        start_deadline(resolve_timeout('/export', table, data.get('timeout'), default=EXPORT_TIMEOUT))
+        deadline = current_deadline()
+        preflight.require_libs()
+        conn, node, breaker_call = acquire_connection(table, deadline)
+        failed = True
+        try:
+            with phase('plan'), statement_deadline(conn, deadline):
+                plan = plan_export(conn, table, data.get('key') or None, data.get('columns'), partitions,
+                                   order == 'ordered')
+            failed = False
+        finally:
+            breaker_call.finish()
+            close_procedure_cursor(conn, None, failed)
+        annotate(partitions=len(plan.partitions), parallel=parallel, order=order)
+
+        acquire, release = export_connections(plan.table, deadline)
+        batch_size = parse_int_option(data.get('batch'), EXPORT_BATCH_SIZE, 'batch', 1)
+        export = ParallelExport(plan, acquire, release, parallel, batch_size,
+                                guard=lambda conn: executing(conn, deadline))
+        request_log = current_request()
+
+        def _generate():
+            try:
+                yield from EXPORT_ENCODERS[fmt](plan.description, timed_iter(export.iter_batches(), 'fetch', request_log))
+            finally:
+                if request_log is not None:
+                    request_log.fields.update(rows=[export.rows])
+
+        filename = f"{plan.table}.{fmt}"
+        return Response(_generate(), content_type=EXPORT_CONTENT_TYPES[fmt],
+                        headers={'Content-Disposition': f'attachment; filename="{filename}"',
+                                 'X-Export-Partitions': str(len(plan.partitions))})
+
+    except Exception as e:
+        return error_response(e, table=table)
+
+
+def run_job(job, spool):
+    """在作业线程中执行过程：结果集按批读取并写入落盘文件（读取同样受作业截止时间限制）"""
+    request_log = begin_request(None, job=job['id'], procedure=job['procedure'], param=job['params'])
+    start_deadline(resolve_timeout('/jobs', job['procedure'], job.get('timeout'), default=JOBS_TIMEOUT))
+    status = 500
+    try:
+        conn, cursor = open_procedure_cursor(job['procedure'], job['params'])
+        failed = True
+        cancelled = False
+        try:
+            with statement_deadline(conn):
+                set_index = 1
+                for description, batches in iter_described_result_sets(cursor):
+                    with phase(f'fetch.{set_index}'):
+                        spool.write_result_set(description, batches)
+                    set_index += 1
+            conn.commit()
+            failed = False
+        except DeadlineExceeded:
+            cancelled = True
+            db_error_counter.inc(procedure_label(job['procedure']), 'fetch', 'deadline')
+            raise
+        finally:
+            close_procedure_cursor(conn, cursor, failed, discard=cancelled)
+        annotate(result_sets=len(spool.row_counts), rows=spool.row_counts)
+        status = 200
+    except Exception as e:
+        annotate(error=str(e))
+        raise
+    finally:
+        request_log.finish(log, status)
+
+
+# 异步作业（状态与结果落盘在 DM_JOBS_SPOOL_DIR，各工作进程共享；并发数见 DM_JOBS_MAX_RUNNING/DM_JOBS_MAX_QUEUED）
+job_manager = JobManager(run_job, error_code_of)
+
+
+def job_status(job):
+    """作业状态的对外表示（结果可读取时附带结果地址）"""
+    data = {key: value for key, value in job.items() if key not in ('pid', 'expires')}
+    if job.get('expires'):
+        data['expires_at'] = datetime.fromtimestamp(job['expires']).strftime('%Y-%m-%d %H:%M:%S')
+    if job['status'] == JOB_SUCCEEDED:
+        data['result_url'] = f"/jobs/{job['id']}/result"
+    return data
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """提交异步作业：请求体为 {"procedure": "JZX.P1", "params": "x", "timeout": 600}，立即返回作业ID（202）"""
+    param1 = param2 = ''
+    try:
+        data = get_request_data()
+        param1 = data.get('procedure') or data.get('param1') or ''
+        param2 = data.get('params', data.get('param2', ''))
+        annotate(procedure=param1, param=param2)
+        if not param1:
+            return jsonify({
+                'success': False,
+                'message': "【参数错误】存储过程名（procedure）不能为空",
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }), 400
+        job = job_manager.submit(param1, param2, data.get('timeout'))
+        annotate(job=job['id'])
+        return jsonify(dict(job_status(job), success=True)), 202, {'Location': f"/jobs/{job['id']}"}
+    except Exception as e:
+        return error_response(e, param1=param1, param2=param2)
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """作业状态：queued/running/succeeded/failed，结束后附带结果集数、行数与过期时间"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': f"作业 {job_id} 不存在或已过期"}), 404
+    return jsonify(dict(job_status(job), success=True))
+
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """流式读取作业结果（format=json|xml，pretty 同 /jsonService 与 /xmlService）；作业未成功结束时返回 409"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': f"作业 {job_id} 不存在或已过期"}), 404
+    if job['status'] != JOB_SUCCEEDED:
+        return jsonify(dict(job_status(job), success=False, message=f"作业状态为 {job['status']}，没有可读取的结果")), 409
+    path = job_manager.result_path(job_id)
+    try:
+        # 先打开文件：结果在此之后被清理也能完整读出
+        spool_file = open(path, 'rb')
+    except OSError:
+        return jsonify({'success': False, 'message': f"作业 {job_id} 的结果已过期"}), 404
+    fmt = str(request.args.get('format', 'json')).strip().lower()
+    result_sets = iter_spooled_result_sets(spool_file, job.get('rows'))
+    if fmt == 'xml':
+        indent = '  ' if is_pretty_request(request.args, default=True) else None
+        body = iter_xml_result_sets(result_sets, total_sets=job.get('result_sets'), indent=indent)
+        content_type = 'application/xml; charset=utf-8'
+    elif fmt in ('json', 'columnar'):
+        indent = 4 if is_pretty_request(request.args) else None
+        encoder = _json_encoder(fmt == 'columnar', indent)
+        body = encoder((description, batches) for description, batches, _ in result_sets)
+        content_type = 'application/json; charset=utf-8'
+    else:
+        spool_file.close()
+        return jsonify({'success': False, 'message': f"【参数错误】作业结果只支持 json/columnar/xml 格式，当前：{fmt}"}), 400
+    return Response(body, content_type=content_type, headers={'X-Job-Id': job_id})
+
+
+def on_worker_start(worker_id):
+    """工作进程启动（prod 模式在 fork 之后执行）：预检、预热本进程的连接池并启动后台线程（含节点健康检查）"""
+    setup_logging()
+    metrics.start_flusher()
+    preflight.run(verbose=worker_id == 0)
+    preflight.start()
+    db_router.start()
+    job_manager.start()
+    prefetcher.start()
+    cursor_registry.start()
 
 
 if __name__ == '__main__':
+    options = parse_serve_options()
     print("=" * 60)
     print("【达梦API服务】启动中...")
     print(f"启动时间：{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"运行目录：{os.getcwd()}")
-    print("服务地址：http://0.0.0.0:5000")
-    print("可用接口：/users, /jsonService, /xmlService（支持GET/POST）")
+    print(f"服务地址：http://{options.host}:{options.port}（运行模式：{options.serve}）")
+    print("可用接口：/users, /jsonService, /xmlService（支持GET/POST）, /batch（POST）, /bulk（POST）, /export, /jobs（POST）, /jobs/<id>, /jobs/<id>/result, /poolStats, /nodes, /singleflightStats, /admin/cache, /admin/prefetch, /admin/cursors, /admin/admission, /metrics, /healthz, /readyz")
     print("=" * 60)
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    serve(app, on_worker_start=on_worker_start)
@@ -0,0 +1,319 @@
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlencode
+
+# 服务压测：使用 fake_dmPython 替身驱动启动 PythonDMService（多进程 prod 模式），
+# 对 /jsonService、/xmlService、/users 按不同数据量与并发数施压，输出 req/s、p50/p99 延迟与服务端峰值内存，
+# 并与保存的基准结果比较，超出阈值的退化以非零退出码报告。
+#
+#   python benchmarks/bench_service.py                           # 默认矩阵，与 baseline.json 比较
+#   python benchmarks/bench_service.py --rows 1,1000 --concurrency 1,16 --duration 3
+#   python benchmarks/bench_service.py --save-baseline           # 以本次结果覆盖基准（在基准机器上执行）
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+SERVICE_SCRIPT = os.path.join(REPO_DIR, 'PythonDMService.py')
+REQUIRED_DM_LIBS = ["libcryptocme.so", "libdmcrypt.so", "libdmdpi.so", "libdmgmssl.so"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='达梦API服务压测（fake_dmPython 替身驱动）')
+    parser.add_argument('--routes', default='/jsonService,/xmlService,/users', help='压测接口，逗号分隔')
+    parser.add_argument('--rows', default='1,100,10000,100000,1000000', help='每个结果集的行数，逗号分隔')
+    parser.add_argument('--sets', type=int, default=1, help='结果集数量')
+    parser.add_argument('--columns', default='int,str,datetime,float', help='列类型（见 fake_dmPython）')
+    parser.add_argument('--concurrency', default='1,8,32', help='并发数，逗号分隔')
+    parser.add_argument('--duration', type=float, default=5.0, help='每个组合的压测秒数')
+    parser.add_argument('--warmup', type=int, default=2, help='每个组合正式计时前的预热请求数')
+    parser.add_argument('--query', default='', help='附加到请求的查询参数，如 "stream=1" 或 "format=columnar"')
+    parser.add_argument('--workers', type=int, default=0, help='服务工作进程数（0 为服务默认值）')
+    parser.add_argument('--connect-latency', type=float, default=0.0, help='模拟建连延迟（秒）')
+    parser.add_argument('--query-latency', type=float, default=0.0, help='模拟 callproc 延迟（秒）')
+    parser.add_argument('--timeout', type=float, default=600.0, help='单个请求超时秒数')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基准结果文件')
+    parser.add_argument('--save-baseline', action='store_true', help='以本次结果覆盖基准文件')
+    parser.add_argument('--threshold', type=float, default=0.15, help='判定退化的相对阈值（默认 15%%）')
+    parser.add_argument('--output', default='', help='本次结果另存为 JSON 文件')
+    return parser.parse_args(argv)
+
+
+def _int_list(text):
+    return [int(item) for item in text.split(',') if item.strip()]
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# ---------------- 被测服务 ----------------
+
+class ServiceProcess:
+    """以替身驱动启动的被测服务（每种数据量单独启动，峰值内存互不影响）"""
+
+    def __init__(self, args, libs_dir):
+        self.args = args
+        self.libs_dir = libs_dir
+        self.port = free_port()
+        self.proc = None
+        self.output = None
+
+    def __enter__(self):
+        env = dict(os.environ)
+        env.update({
+            'DM_DRIVER_MODULE': 'fake_dmPython',
+            'PYTHONPATH': os.pathsep.join(filter(None, [BENCH_DIR, REPO_DIR, env.get('PYTHONPATH')])),
+            'DM_LIBS_DIR': self.libs_dir,
+            'DM_LOG_LEVEL': 'WARNING',
+            'FAKE_DM_CONNECT_LATENCY': str(self.args.connect_latency),
+            'FAKE_DM_QUERY_LATENCY': str(self.args.query_latency),
+        })
+        cmd = [sys.executable, SERVICE_SCRIPT, '--serve', 'prod', '--host', '127.0.0.1', '--port', str(self.port)]
+        if self.args.workers:
+            cmd += ['--workers', str(self.args.workers)]
+        # 服务输出写入临时文件（管道不读取会写满并阻塞服务）
+        self.output = tempfile.TemporaryFile()
+        self.proc = subprocess.Popen(cmd, env=env, cwd=self.libs_dir, stdout=self.output, stderr=subprocess.STDOUT)
+        self._wait_ready()
+        return self
+
+    def _wait_ready(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                self.output.seek(0)
+                raise RuntimeError(f"服务启动失败：{self.output.read().decode(errors='replace')}")
+            try:
+                status, _, _ = request_once(self.port, '/readyz', timeout=2)
+                if status == 200:
+                    return
+            except OSError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError('服务在超时时间内未就绪')
+
+    def peak_rss_kb(self):
+        """主进程与各工作进程的峰值常驻内存（VmHWM）中的最大值，非 Linux 平台返回 None"""
+        peaks = []
+        for pid in [self.proc.pid] + self._children():
+            try:
+                with open(f'/proc/{pid}/status') as f:
+                    for line in f:
+                        if line.startswith('VmHWM:'):
+                            peaks.append(int(line.split()[1]))
+            except OSError:
+                continue
+        return max(peaks) if peaks else None
+
+    def _children(self):
+        try:
+            with open(f'/proc/{self.proc.pid}/task/{self.proc.pid}/children') as f:
+                return [int(pid) for pid in f.read().split()]
+        except OSError:
+            return []
+
+    def __exit__(self, *exc):
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        self.output.close()
+
+
+def make_libs_dir():
+    """预检要求的加密库占位文件（替身驱动不加载它们）"""
+    libs_dir = tempfile.mkdtemp(prefix='dm-bench-')
+    for lib in REQUIRED_DM_LIBS:
+        with open(os.path.join(libs_dir, lib), 'wb') as f:
+            f.write(b'\0')
+    return libs_dir
+
+
+# ---------------- 施压 ----------------
+
+def request_once(port, path, timeout=600.0):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        size = 0
+        while True:
+            chunk = response.read(65536)
+            if not chunk:
+                break
+            size += len(chunk)
+        return response.status, size, response.getheader('Content-Type')
+    finally:
+        conn.close()
+
+
+def run_load(port, path, concurrency, duration, warmup, timeout):
+    """concurrency 个线程在 duration 秒内循环请求（每个线程至少完成一次），返回统计结果"""
+    for _ in range(warmup):
+        request_once(port, path, timeout)
+
+    latencies = []
+    errors = []
+    sizes = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def _worker():
+        first = True
+        while first or time.perf_counter() < deadline:
+            first = False
+            start = time.perf_counter()
+            try:
+                status, size, _ = request_once(port, path, timeout)
+            except OSError as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            elapsed = time.perf_counter() - start
+            with lock:
+                if status == 200:
+                    latencies.append(elapsed)
+                    sizes.append(size)
+                else:
+                    errors.append(f'HTTP {status}')
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=_worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': round(len(latencies) / wall, 2) if wall > 0 else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+        'bytes': sizes[0] if sizes else 0,
+        'first_error': errors[0] if errors else None,
+    }
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+# ---------------- 基准比较 ----------------
+
+def result_key(route, rows, concurrency, query):
+    return f"{route}?{query}|rows={rows}|c={concurrency}" if query else f"{route}|rows={rows}|c={concurrency}"
+
+
+def compare(results, baseline, threshold):
+    """与基准比较：req/s 下降、p99 或峰值内存上升超过阈值即判定为退化"""
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        checks = [
+            ('rps', current['rps'] < base['rps'] * (1 - threshold)),
+            ('p99_ms', current['p99_ms'] > base['p99_ms'] * (1 + threshold)),
+        ]
+        if current.get('peak_rss_kb') and base.get('peak_rss_kb'):
+            checks.append(('peak_rss_kb', current['peak_rss_kb'] > base['peak_rss_kb'] * (1 + threshold)))
+        for name, regressed in checks:
+            if regressed:
+                regressions.append((key, name, base[name], current[name]))
+    return regressions
+
+
+def load_baseline(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f).get('results', {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_results(path, results, args):
+    data = {
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': sys.platform,
+        'cpu_count': os.cpu_count(),
+        'settings': {'sets': args.sets, 'columns': args.columns, 'duration': args.duration,
+                     'workers': args.workers, 'query': args.query},
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    routes = [route.strip() for route in args.routes.split(',') if route.strip()]
+    libs_dir = make_libs_dir()
+    results = {}
+
+    print(f"{'接口':<16}{'行数':>9}{'并发':>6}{'请求数':>8}{'req/s':>10}{'p50(ms)':>11}{'p99(ms)':>11}"
+          f"{'响应字节':>12}{'峰值RSS(MB)':>13}{'错误':>6}")
+    for rows in _int_list(args.rows):
+        param = f"rows={rows};sets={args.sets};cols={args.columns.replace(',', ':')}"
+        with ServiceProcess(args, libs_dir) as service:
+            for route in routes:
+                query = urlencode({'param1': 'BENCH', 'param2': param}) + (f"&{args.query}" if args.query else '')
+                path = f"{route}?{query}"
+                for concurrency in _int_list(args.concurrency):
+                    stats = run_load(service.port, path, concurrency, args.duration, args.warmup, args.timeout)
+                    stats['peak_rss_kb'] = service.peak_rss_kb()
+                    results[result_key(route, rows, concurrency, args.query)] = stats
+                    rss = f"{stats['peak_rss_kb'] / 1024:.1f}" if stats['peak_rss_kb'] else '-'
+                    print(f"{route:<16}{rows:>9}{concurrency:>6}{stats['requests']:>8}{stats['rps']:>10}"
+                          f"{stats['p50_ms']:>11}{stats['p99_ms']:>11}{stats['bytes']:>12}{rss:>13}"
+                          f"{stats['errors']:>6}", flush=True)
+                    if stats['first_error']:
+                        print(f"  首个错误：{stats['first_error']}")
+
+    if args.output:
+        save_results(args.output, results, args)
+    if args.save_baseline:
+        save_results(args.baseline, results, args)
+        print(f"基准已保存：{args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if not baseline:
+        print("未找到基准结果，跳过退化检查（可用 --save-baseline 生成）")
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    if not regressions:
+        print(f"与基准相比无退化（阈值 {args.threshold:.0%}）")
+        return 0
+    print(f"发现 {len(regressions)} 项退化（阈值 {args.threshold:.0%}）：")
+    for key, name, base, current in regressions:
+        print(f"  {key} {name}: 基准 {base} -> 本次 {current}")
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,432 @@
+import datetime
+import math
+import os
+import re
+import threading
+import time
+from decimal import Decimal
+
+# dmPython 替身：实现服务用到的 DB-API 接口（connect/cursor/callproc/description/fetchmany/fetchall/nextset 等），
+# 不需要达梦数据库即可在本机压测。结果集数量、行数、列类型与延迟由环境变量设定，
+# 也可通过存储过程参数按次覆盖，例如 param2="rows=1000;sets=2;cols=int:str:datetime;query_latency=0.01"
+#
+# 环境变量：
+#   FAKE_DM_SETS            结果集数量（默认 1）
+#   FAKE_DM_ROWS            每个结果集的行数（默认 100）
+#   FAKE_DM_COLUMNS         列类型，逗号或冒号分隔：int/bigint/float/decimal/str/clob/datetime/date/time/bool/null
+#   FAKE_DM_CONNECT_LATENCY 建立连接的延迟秒数（模拟加密握手）
+#   FAKE_DM_QUERY_LATENCY   callproc 的延迟秒数
+#   FAKE_DM_FETCH_LATENCY   每次 fetchmany/fetchall 的延迟秒数
+#   FAKE_DM_ERROR           callproc 固定返回的错误码（调试错误路径）
+#   FAKE_DM_TABLE_ROWS      execute 查询的模拟表的行数（默认 1000）
+#
+# execute 支持整表导出（dm_export）用到的语句：主键查询（主键为 ID）、SELECT 列 FROM 表 WHERE 1 = 0（列信息）、
+# SELECT MIN(列), MAX(列)、按键列范围（列 >= ? AND 列 < ?/<= ?）或 列 IS NULL 的扫描（可带 ORDER BY）。
+# 任何表名都对应同一张模拟表：ID（整数主键 1..N）加 FAKE_DM_COLUMNS 的各列（列名为 类型_序号，从 2 开始）。
+# 其他语句（如连接池的校验语句）返回单行 (1,)
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+apilevel = '2.0'
+threadsafety = 1
+paramstyle = 'qmark'
+
+
+# ---------------- 异常（DB-API 层级，args 为 (错误码, 描述)，与 dmPython 一致） ----------------
+
+class Warning(Exception):
+    pass
+
+
+class Error(Exception):
+    pass
+
+
+class InterfaceError(Error):
+    pass
+
+
+class DatabaseError(Error):
+    pass
+
+
+class OperationalError(DatabaseError):
+    pass
+
+
+class ProgrammingError(DatabaseError):
+    pass
+
+
+class IntegrityError(DatabaseError):
+    pass
+
+
+class DataError(DatabaseError):
+    pass
+
+
+class InternalError(DatabaseError):
+    pass
+
+
+class NotSupportedError(DatabaseError):
+    pass
+
+
+# ---------------- 类型对象（description 的 type_code 与 dmPython 一样是类型对象） ----------------
+
+def _type(name):
+    return type(name, (), {})
+
+
+STRING = _type('STRING')
+FIXED_STRING = _type('FIXED_STRING')
+LONG_STRING = _type('LONG_STRING')
+NUMBER = _type('NUMBER')
+BIGINT = _type('BIGINT')
+INT = _type('INT')
+DOUBLE = _type('DOUBLE')
+DECIMAL = _type('DECIMAL')
+DATETIME = _type('DATETIME')
+DATE = _type('DATE')
+TIME = _type('TIME')
+BLOB = _type('BLOB')
+CLOB = _type('CLOB')
+BOOLEAN = _type('BOOLEAN')
+
+_BASE_TIME = datetime.datetime(2024, 1, 1, 8, 0, 0)
+_TEMPLATE_ROWS = 1024  # 行数据按模板循环复用，生成成本不计入被测服务
+
+# 列类型 -> (type_code, precision, scale, 第 i 行的取值)
+_COLUMN_KINDS = {
+    'int': (INT, 10, 0, lambda i: i),
+    'bigint': (BIGINT, 19, 0, lambda i: i * 1000003),
+    'float': (DOUBLE, 53, None, lambda i: i / 7),
+    'decimal': (DECIMAL, 18, 2, lambda i: Decimal(i * 37).scaleb(-2)),
+    'str': (STRING, 50, None, lambda i: f'名称-{i}'),
+    'clob': (CLOB, None, None, lambda i: '说明文字' * 32 + str(i)),
+    'datetime': (DATETIME, 26, 6, lambda i: _BASE_TIME + datetime.timedelta(seconds=i)),
+    'date': (DATE, 10, None, lambda i: (_BASE_TIME + datetime.timedelta(days=i % 3650)).date()),
+    'time': (TIME, 8, None, lambda i: datetime.time(i % 24, i % 60, i % 60)),
+    'bool': (BOOLEAN, 1, None, lambda i: bool(i % 2)),
+    'null': (STRING, 50, None, lambda i: None),
+}
+
+DEFAULT_SETS = _env_int('FAKE_DM_SETS', 1)
+DEFAULT_ROWS = _env_int('FAKE_DM_ROWS', 100)
+DEFAULT_COLUMNS = os.environ.get('FAKE_DM_COLUMNS') or 'int,str,datetime,float'
+CONNECT_LATENCY = _env_float('FAKE_DM_CONNECT_LATENCY', 0)
+QUERY_LATENCY = _env_float('FAKE_DM_QUERY_LATENCY', 0)
+FETCH_LATENCY = _env_float('FAKE_DM_FETCH_LATENCY', 0)
+FORCED_ERROR = os.environ.get('FAKE_DM_ERROR') or None
+TABLE_ROWS = _env_int('FAKE_DM_TABLE_ROWS', 1000)
+
+_stats_lock = threading.Lock()
+stats = {'connects': 0, 'callprocs': 0, 'fetches': 0, 'rows': 0, 'executemany_rows': 0}
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        stats[name] += amount
+
+
+def _split(text):
+    return [item.strip().lower() for item in text.replace(':', ',').split(',') if item.strip()]
+
+
+def parse_options(param):
+    """解析 "rows=1000;sets=2;cols=int:str" 形式的参数；不含 '=' 的参数按默认配置处理"""
+    options = {
+        'rows': DEFAULT_ROWS, 'sets': DEFAULT_SETS, 'cols': _split(DEFAULT_COLUMNS),
+        'query_latency': QUERY_LATENCY, 'fetch_latency': FETCH_LATENCY, 'error': FORCED_ERROR,
+    }
+    if not isinstance(param, str) or '=' not in param:
+        return options
+    for item in param.split(';'):
+        key, _, value = item.partition('=')
+        key = key.strip().lower()
+        value = value.strip()
+        if key in ('rows', 'sets'):
+            options[key] = int(value)
+        elif key in ('cols', 'columns'):
+            options['cols'] = _split(value)
+        elif key in ('query_latency', 'fetch_latency'):
+            options[key] = float(value)
+        elif key == 'error':
+            options['error'] = value or None
+    return options
+
+
+class _ResultSet:
+    __slots__ = ('description', 'template', 'row_count')
+
+    def __init__(self, set_index, columns, row_count):
+        description = []
+        makers = []
+        for col_index, kind in enumerate(columns):
+            if kind not in _COLUMN_KINDS:
+                raise ProgrammingError(-2007, f'不支持的列类型：{kind}')
+            type_code, precision, scale, maker = _COLUMN_KINDS[kind]
+            description.append((f'{kind.upper()}_{col_index + 1}', type_code, precision, precision,
+                                precision, scale, 1))
+            makers.append(maker)
+        self.description = description
+        offset = set_index * 100000
+        self.template = [tuple(maker(offset + i) for maker in makers)
+                         for i in range(min(row_count, _TEMPLATE_ROWS))]
+        self.row_count = row_count
+
+
+class _Rows:
+    """execute 的查询结果（与 _ResultSet 相同的读取接口，template 即全部行）"""
+    __slots__ = ('description', 'template', 'row_count')
+
+    def __init__(self, description, rows):
+        self.description = description
+        self.template = rows
+        self.row_count = len(rows)
+
+
+_PRIMARY_KEY_SQL = re.compile(r'\bALL_CONSTRAINTS\b', re.I)
+_SELECT_SQL = re.compile(r'^\s*SELECT\s+(?P<select>.+?)\s+FROM\s+(?P<table>[\w$#.]+)'
+                         r'(?:\s+WHERE\s+(?P<where>.+?))?(?:\s+ORDER\s+BY\s+(?P<order>[\w$#]+))?\s*$', re.I | re.S)
+_MIN_MAX = re.compile(r'^MIN\(\s*([\w$#]+)\s*\)\s*,\s*MAX\(\s*([\w$#]+)\s*\)$', re.I)
+_RANGE = re.compile(r'^([\w$#]+)\s*>=\s*\?\s+AND\s+([\w$#]+)\s*(<=?)\s*\?$', re.I)
+_IS_NULL = re.compile(r'^([\w$#]+)\s+IS\s+NULL$', re.I)
+
+
+class _Table:
+    """模拟表：第 i 行（1..N）为 (i, 各列的第 i 个取值)"""
+
+    def __init__(self, row_count=TABLE_ROWS, columns=DEFAULT_COLUMNS):
+        self.description = [('ID', INT, 10, 10, 10, 0, 0)]
+        self.makers = []
+        for col_index, kind in enumerate(_split(columns)):
+            type_code, precision, scale, maker = _COLUMN_KINDS[kind]
+            self.description.append((f'{kind.upper()}_{col_index + 2}', type_code, precision, precision,
+                                     precision, scale, 1))
+            self.makers.append(maker)
+        self.row_count = row_count
+        self.names = [col[0] for col in self.description]
+
+    def index(self, name):
+        try:
+            return self.names.index(name.upper())
+        except ValueError:
+            raise ProgrammingError(-2111, f'无效的列名：{name}')
+
+    def row(self, i):
+        return (i,) + tuple(maker(i) for maker in self.makers)
+
+    def rows(self, key=None, start=None, end=None, inclusive=False, is_null=False):
+        """按键列条件取行；ID 列的范围直接计算，其他列逐行比较"""
+        if key is not None and self.index(key) == 0:
+            if is_null:
+                return []
+            first = max(1, math.ceil(start))
+            last = min(self.row_count, math.floor(end) if inclusive else math.ceil(end) - 1)
+            return [self.row(i) for i in range(first, last + 1)]
+        rows = [self.row(i) for i in range(1, self.row_count + 1)]
+        if key is None:
+            return rows
+        idx = self.index(key)
+        if is_null:
+            return [row for row in rows if row[idx] is None]
+        return [row for row in rows if row[idx] is not None and start <= row[idx]
+                and (row[idx] <= end if inclusive else row[idx] < end)]
+
+    def query(self, sql, params):
+        """执行导出用到的 SELECT，返回 _Rows；不认识的语句返回 None"""
+        match = _SELECT_SQL.match(sql)
+        if match is None:
+            return None
+        select, where, order = match.group('select').strip(), (match.group('where') or '').strip(), match.group('order')
+        bounds = _MIN_MAX.match(select)
+        if bounds:
+            idx = self.index(bounds.group(1))
+            values = [value for value in (row[idx] for row in self.rows()) if value is not None]
+            description = [(f'MIN({self.names[idx]})',) + self.description[idx][1:],
+                           (f'MAX({self.names[idx]})',) + self.description[idx][1:]]
+            return _Rows(description, [(min(values), max(values)) if values else (None, None)])
+        indexes = list(range(len(self.names))) if select == '*' else [self.index(name.strip())
+                                                                      for name in select.split(',')]
+        description = [self.description[idx] for idx in indexes]
+        if re.match(r'^1\s*=\s*0$', where):
+            rows = []
+        elif not where:
+            rows = self.rows()
+        elif _RANGE.match(where):
+            key, _, op = _RANGE.match(where).groups()
+            rows = self.rows(key, params[0], params[1], inclusive=op == '<=')
+        elif _IS_NULL.match(where):
+            rows = self.rows(_IS_NULL.match(where).group(1), is_null=True)
+        else:
+            raise NotSupportedError(-2007, f'模拟驱动不支持的条件：{where}')
+        if order:
+            idx = self.index(order)
+            rows.sort(key=lambda row: (row[idx] is None, row[idx] if row[idx] is not None else 0))
+        return _Rows(description, [tuple(row[idx] for idx in indexes) for row in rows])
+
+
+_table = None
+
+
+def _get_table():
+    global _table
+    if _table is None:
+        _table = _Table()
+    return _table
+
+
+class Cursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.arraysize = 1
+        self.rowcount = -1
+        self._sets = []
+        self._set_index = 0
+        self._pos = 0
+        self._fetch_latency = 0
+        self._closed = False
+
+    @property
+    def description(self):
+        current = self._current()
+        return current.description if current else None
+
+    def _current(self):
+        if 0 <= self._set_index < len(self._sets):
+            return self._sets[self._set_index]
+        return None
+
+    def _check(self):
+        if self._closed or self.connection.closed:
+            raise InterfaceError(-70028, '游标或连接已关闭')
+
+    def callproc(self, name, params=()):
+        self._check()
+        options = parse_options(params[0] if params else None)
+        if options['query_latency'] > 0:
+            self.connection._sleep(options['query_latency'])
+        if options['error']:
+            raise DatabaseError(int(options['error']), f'模拟的存储过程错误：{name}')
+        _count('callprocs')
+        self._sets = [_ResultSet(i, options['cols'], options['rows']) for i in range(options['sets'])]
+        self._set_index = 0
+        self._pos = 0
+        self._fetch_latency = options['fetch_latency']
+        self.rowcount = options['rows']
+        return params
+
+    def execute(self, sql, params=None):
+        """执行导出用到的查询（见模块说明）；其他语句返回单行 (1,)"""
+        self._check()
+        if _PRIMARY_KEY_SQL.search(sql):
+            result = _Rows([('COLUMN_NAME', STRING, 128, 128, 128, None, 0)], [('ID',)])
+        else:
+            result = _get_table().query(sql, params or ()) or _Rows([('1', INT, 10, 10, 10, 0, 0)], [(1,)])
+        self._sets = [result]
+        self._set_index = 0
+        self._pos = 0
+        self._fetch_latency = 0
+        self.rowcount = result.row_count
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._check()
+        count = sum(1 for _ in seq_of_params)
+        _count('executemany_rows', count)
+        self._sets = []
+        self.rowcount = count
+        return self
+
+    def _take(self, size):
+        current = self._current()
+        if current is None:
+            return []
+        if self._fetch_latency > 0:
+            self.connection._sleep(self._fetch_latency)
+        end = min(self._pos + size, current.row_count)
+        template = current.template
+        n = len(template)
+        rows = [template[i % n] for i in range(self._pos, end)]
+        self._pos = end
+        _count('fetches')
+        _count('rows', len(rows))
+        return rows
+
+    def fetchone(self):
+        self._check()
+        rows = self._take(1)
+        return rows[0] if rows else None
+
+    def fetchmany(self, size=None):
+        self._check()
+        return self._take(size or self.arraysize)
+
+    def fetchall(self):
+        self._check()
+        current = self._current()
+        if current is None:
+            return []
+        return self._take(current.row_count - self._pos)
+
+    def nextset(self):
+        self._check()
+        self._set_index += 1
+        self._pos = 0
+        return True if self._current() else None
+
+    def close(self):
+        self._closed = True
+
+
+class Connection:
+    def __init__(self, **params):
+        self.params = params
+        self.closed = False
+        self._cancelled = threading.Event()
+
+    def _sleep(self, seconds):
+        """可被 cancel() 打断的等待（模拟长时间执行的语句）"""
+        if self._cancelled.wait(seconds):
+            self._cancelled.clear()
+            raise OperationalError(-6407, '语句执行已被取消')
+
+    def cursor(self):
+        if self.closed:
+            raise InterfaceError(-70028, '连接已关闭')
+        return Cursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def close(self):
+        self.closed = True
+
+
+def connect(*args, **kwargs):
+    if CONNECT_LATENCY > 0:
+        time.sleep(CONNECT_LATENCY)
+    _count('connects')
+    return Connection(**kwargs)
@@ -0,0 +1,296 @@
+import contextvars
+import fnmatch
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+
+import dm_config
+
+# 准入控制：每次数据库调用（借出连接之前）先取得准入名额，调用结束时交回。名额只在调用实际访问数据库期间持有：
+# 借出连接后暂停执行的调用（分页游标放回登记表、流式输出与导出等待客户端读取）先交回名额，
+# 继续读取时直接取回（resume：不排队、不计限流，必要时暂时超出 max_in_flight）。暂停的调用仍占着连接，
+# 若让它排在新调用之后，新调用持有名额等待连接、暂停的调用等待名额，两者会互相阻塞到借出超时；
+# 超出的数量不超过暂停中的调用数，这些调用的连接已计在连接池上限内。
+# - 全局：本进程同时执行的数据库调用数不超过 max_in_flight，其余排队等待（队列有界，等待有超时），
+#   队列已满或等待超时时快速失败（503 + Retry-After），不再让突发请求占满 DM 会话
+# - 优先级：排队的调用分为 interactive（/users、/jsonService、/xmlService）与 batch（批量、写入、导出、作业、预取等），
+#   名额空出时按权重轮流分配（加权轮询），交互请求不会被批量任务饿死，批量任务也不会完全得不到名额
+# - 限流：按客户端（DM_ADMISSION_CLIENT_HEADER，缺省取客户端地址）与按过程的令牌桶，超出时 429 + Retry-After。
+# 名额与令牌桶都在各工作进程内各自计算
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+PRIORITIES = (INTERACTIVE, BATCH)
+
+
+def parse_weights(text):
+    """解析 "interactive=4,batch=1" 形式的优先级权重（未列出的取 1）"""
+    weights = {priority: 1 for priority in PRIORITIES}
+    for item in (text or '').split(','):
+        name, _, value = item.partition('=')
+        name = name.strip().lower()
+        if name in weights:
+            try:
+                weights[name] = max(int(value), 1)
+            except ValueError:
+                pass
+    return weights
+
+
+def parse_rates(text):
+    """解析 "JZX.RPT_*=2:5,JZX.GET_*=50" 形式的按过程限流：[(过程名模式, 每秒调用数, 突发数)]，突发数缺省等于每秒调用数"""
+    rates = []
+    for item in (text or '').split(','):
+        pattern, _, spec = item.strip().rpartition('=')
+        rate, _, burst = spec.partition(':')
+        try:
+            rate = float(rate)
+            burst = float(burst) if burst.strip() else rate
+        except ValueError:
+            continue
+        if pattern.strip() and rate > 0:
+            rates.append((pattern.strip().upper(), rate, max(burst, 1.0)))
+    return rates
+
+
+ADMISSION_ENABLED = dm_config.env_bool('DM_ADMISSION', True)
+ADMISSION_MAX_IN_FLIGHT = dm_config.env_int('DM_ADMISSION_MAX_IN_FLIGHT', dm_config.POOL_MAX_SIZE)  # 同时执行的数据库调用数
+ADMISSION_MAX_QUEUE = dm_config.env_int('DM_ADMISSION_MAX_QUEUE', 50)  # 排队等待的调用数上限
+ADMISSION_QUEUE_TIMEOUT = dm_config.env_float('DM_ADMISSION_QUEUE_TIMEOUT', dm_config.POOL_CHECKOUT_TIMEOUT)  # 最长排队秒数
+ADMISSION_WEIGHTS = parse_weights(dm_config.env_str('DM_ADMISSION_WEIGHTS', 'interactive=4,batch=1'))
+ADMISSION_CLIENT_HEADER = dm_config.env_str('DM_ADMISSION_CLIENT_HEADER', 'X-Client-Id')  # 区分客户端的请求头
+CLIENT_RATE = dm_config.env_float('DM_CLIENT_RATE', 0)  # 每个客户端每秒数据库调用数，0 表示不限
+CLIENT_BURST = dm_config.env_float('DM_CLIENT_BURST', 0)  # 客户端突发数，0 表示等于 DM_CLIENT_RATE
+PROC_RATES = parse_rates(dm_config.env_str('DM_PROC_RATES', ''))  # 按过程的限流
+_MAX_BUCKETS = 10000  # 每个限流器保留的令牌桶数（超出时淘汰最久未用的）
+
+# 当前请求的客户端与优先级（请求开始时设置，批量项与导出线程继承；后台作业与预取没有客户端，按 batch 排队）
+_client = contextvars.ContextVar('dm_admission_client', default=(None, BATCH))
+
+
+def set_request_client(client, priority):
+    _client.set((client, priority if priority in PRIORITIES else BATCH))
+
+
+def current_client():
+    return _client.get()
+
+
+class AdmissionRejected(Exception):
+    """调用未被准入：status 为 429（限流）或 503（过载），retry_after 为建议的重试等待秒数，reason 为原因"""
+
+    def __init__(self, message, status, reason, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """令牌桶：每秒补充 rate 个令牌，最多 burst 个"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now):
+        """取一个令牌，成功返回 0，否则返回需要等待的秒数"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """按键（客户端或过程名）的令牌桶集合（调用方持锁）"""
+
+    def __init__(self, max_buckets=_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+
+    def take(self, key, rate, burst, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, burst, now)
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket.take(now)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class Ticket:
+    """一个准入名额（release 时交回）；waited 为排队秒数"""
+
+    __slots__ = ('priority', 'waited', 'granted', 'event', 'released')
+
+    def __init__(self, priority):
+        self.priority = priority
+        self.waited = 0.0
+        self.granted = False
+        self.event = None
+        self.released = False
+
+
+class Admission:
+    """本进程的准入控制（线程安全）
+
+    admit(procedure, timeout) 依次检查客户端与过程的令牌桶，再取得名额（没有空闲名额时按优先级排队），
+    返回 Ticket；调用结束或暂停时 release(ticket)，暂停的调用继续执行前 resume(ticket) 取回名额。
+    未准入时抛出 AdmissionRejected，timeout 比排队超时短（请求截止时间将到）且等待到期时抛出 TimeoutError。
+    """
+
+    def __init__(self, enabled=ADMISSION_ENABLED, max_in_flight=ADMISSION_MAX_IN_FLIGHT,
+                 max_queue=ADMISSION_MAX_QUEUE, queue_timeout=ADMISSION_QUEUE_TIMEOUT, weights=None,
+                 client_rate=CLIENT_RATE, client_burst=CLIENT_BURST, proc_rates=None, clock=time.monotonic):
+        self.enabled = enabled
+        self.max_in_flight = max(max_in_flight, 1)
+        self.max_queue = max(max_queue, 0)
+        self.queue_timeout = queue_timeout
+        self.weights = dict(ADMISSION_WEIGHTS if weights is None else weights)
+        self.client_rate = client_rate
+        self.client_burst = max(client_burst or client_rate, 1.0)
+        self.proc_rates = list(PROC_RATES if proc_rates is None else proc_rates)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._queues = {priority: deque() for priority in PRIORITIES}
+        self._credits = {priority: 0 for priority in PRIORITIES}  # 加权轮询的当前值
+        self._clients = RateLimiter()
+        self._procedures = RateLimiter()
+        self._stats = {'admitted': 0, 'resumed': 0, 'queued': 0, 'wait_time_total': 0.0,
+                       'rejected': {'client_rate': 0, 'procedure_rate': 0, 'queue_full': 0, 'queue_timeout': 0}}
+
+    def proc_rate(self, procedure):
+        name = (procedure or '').upper()
+        for pattern, rate, burst in self.proc_rates:
+            if fnmatch.fnmatchcase(name, pattern):
+                return rate, burst
+        return None
+
+    def admit(self, procedure=None, timeout=None):
+        client, priority = current_client()
+        ticket = Ticket(priority)
+        if not self.enabled:
+            ticket.granted = True
+            return ticket
+        wait_limit = self.queue_timeout if timeout is None else min(timeout, self.queue_timeout)
+        with self._lock:
+            now = self.clock()
+            if client is not None and self.client_rate > 0:
+                retry_after = self._clients.take(client, self.client_rate, self.client_burst, now)
+                if retry_after:
+                    self._reject('client_rate')
+                    raise AdmissionRejected(f"客户端 {client} 调用过于频繁，请稍后重试", 429, 'client_rate', retry_after)
+            rate = self.proc_rate(procedure)
+            if rate is not None:
+                retry_after = self._procedures.take(procedure.upper(), rate[0], rate[1], now)
+                if retry_after:
+                    self._reject('procedure_rate')
+                    raise AdmissionRejected(f"存储过程 {procedure} 调用过于频繁，请稍后重试", 429, 'procedure_rate',
+                                            retry_after)
+        return self._acquire(ticket, wait_limit, 'admitted')
+
+    def resume(self, ticket):
+        """暂停的调用（已交回 ticket 的名额，仍占用连接）继续执行前取回名额，返回新的 Ticket
+
+        立即取得，不排队、不计入限流（名额已满时暂时超出 max_in_flight，见模块说明）；
+        名额数回到上限以内之前，交回的名额不转给排队的调用。
+        """
+        ticket = Ticket(ticket.priority)
+        ticket.granted = True
+        if self.enabled:
+            with self._lock:
+                self._in_flight += 1
+                self._stats['resumed'] += 1
+        return ticket
+
+    def _acquire(self, ticket, wait_limit, counter):
+        """取得名额：有空闲名额且没有排队时直接取得，否则排队等待（release 时按权重转交），排队已满即拒绝"""
+        with self._lock:
+            if self._in_flight < self.max_in_flight and not any(self._queues.values()):
+                self._in_flight += 1
+                self._stats[counter] += 1
+                ticket.granted = True
+                return ticket
+            if sum(len(waiters) for waiters in self._queues.values()) >= self.max_queue:
+                self._reject('queue_full')
+                raise AdmissionRejected("数据库调用排队已满，请稍后重试", 503, 'queue_full', self._retry_after())
+            ticket.event = threading.Event()
+            self._queues[ticket.priority].append(ticket)
+            self._stats['queued'] += 1
+
+        started = self.clock()
+        ticket.event.wait(wait_limit)
+        with self._lock:
+            ticket.waited = self.clock() - started
+            self._stats['wait_time_total'] += ticket.waited
+            if ticket.granted:
+                self._stats[counter] += 1
+                return ticket
+            self._queues[ticket.priority].remove(ticket)
+            if wait_limit < self.queue_timeout:
+                raise TimeoutError(f"等待数据库调用名额 {ticket.waited:.1f} 秒后超过截止时间")
+            self._reject('queue_timeout')
+        raise AdmissionRejected(f"等待数据库调用名额超过 {self.queue_timeout:g} 秒，请稍后重试", 503, 'queue_timeout',
+                                self._retry_after())
+
+    def release(self, ticket):
+        """交回名额：有排队的调用时直接转给按权重选出的下一个（名额数超出上限时只减少，不转交）"""
+        if ticket is None or not ticket.granted or ticket.released or not self.enabled:
+            return
+        ticket.released = True
+        with self._lock:
+            waiter = self._next_waiter() if self._in_flight <= self.max_in_flight else None
+            if waiter is None:
+                self._in_flight -= 1
+                return
+            waiter.granted = True
+            waiter.event.set()
+
+    def _next_waiter(self):
+        """平滑加权轮询：各有排队的优先级累加其权重，取当前值最大者并减去权重总和（调用方持锁）"""
+        ready = [priority for priority in PRIORITIES if self._queues[priority]]
+        if not ready:
+            return None
+        total = 0
+        for priority in ready:
+            self._credits[priority] += self.weights[priority]
+            total += self.weights[priority]
+        chosen = max(ready, key=lambda priority: self._credits[priority])
+        self._credits[chosen] -= total
+        return self._queues[chosen].popleft()
+
+    def _reject(self, reason):
+        self._stats['rejected'][reason] += 1
+
+    def _retry_after(self):
+        # 过载时的重试间隔：按当前排队长度粗略估计（至少 1 秒）
+        queued = sum(len(waiters) for waiters in self._queues.values())
+        return max(1, math.ceil(queued / self.max_in_flight))
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats, rejected=dict(self._stats['rejected']))
+            data.update({
+                'enabled': self.enabled,
+                'in_flight': self._in_flight,
+                'max_in_flight': self.max_in_flight,
+                'queued_now': {priority: len(waiters) for priority, waiters in self._queues.items()},
+                'max_queue': self.max_queue,
+                'queue_timeout': self.queue_timeout,
+                'weights': dict(self.weights),
+                'clients': len(self._clients),
+                'wait_time_total': round(self._stats['wait_time_total'], 6),
+            })
+        return data
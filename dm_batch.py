@@ -0,0 +1,180 @@
+import contextvars
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+import dm_config
+from dm_stream import iter_json_result_sets
+from dm_xml import XmlWriter, write_result_sets
+
+# 批量调用：一次请求并发执行多个存储过程（每项使用独立的池化连接），单项失败不影响其他项
+
+BATCH_MAX_ITEMS = dm_config.env_int('DM_BATCH_MAX_ITEMS', 20)  # 单次批量请求的最大项数
+BATCH_MAX_PARALLEL = dm_config.env_int('DM_BATCH_MAX_PARALLEL', 4)  # 单次批量请求同时执行的项数
+BATCH_POOL_SIZE = dm_config.env_int('DM_BATCH_POOL_SIZE', dm_config.POOL_MAX_SIZE)  # 进程内批量执行线程总数
+
+
+class BatchError(ValueError):
+    """批量请求格式错误"""
+
+
+class BatchItem:
+    __slots__ = ('index', 'id', 'procedure', 'params')
+
+    def __init__(self, index, item_id, procedure, params):
+        self.index = index
+        self.id = item_id
+        self.procedure = procedure
+        self.params = params
+
+
+class BatchResult:
+    """单项执行结果：成功时 data 为 ResultSet 列表，失败时有 error_code 与 message"""
+
+    __slots__ = ('item', 'success', 'data', 'cache', 'error_code', 'message', 'duration_ms')
+
+    def __init__(self, item, success, data=None, cache=None, error_code=None, message=None, duration_ms=0.0):
+        self.item = item
+        self.success = success
+        self.data = data
+        self.cache = cache
+        self.error_code = error_code
+        self.message = message
+        self.duration_ms = duration_ms
+
+    def header(self):
+        """结果的元信息（不含数据）"""
+        head = {'success': self.success, 'procedure': self.item.procedure,
+                'duration_ms': round(self.duration_ms, 3)}
+        if self.success:
+            head['cache'] = self.cache
+        else:
+            head['error_code'] = self.error_code
+            head['message'] = self.message
+        return head
+
+
+def parse_batch_items(payload, max_items=BATCH_MAX_ITEMS):
+    """解析批量请求：{"items": [{"id", "procedure", "params"}, ...]} 或直接为数组
+
+    procedure 也可写作 param1，params 也可写作 param2；params 为数组时按多个参数调用。
+    id 缺省为项的序号（从 0 开始），同一请求中不能重复。
+    """
+    items = payload.get('items') if isinstance(payload, dict) else payload
+    if not isinstance(items, list) or not items:
+        raise BatchError("【参数错误】items 必须是非空数组")
+    if len(items) > max_items:
+        raise BatchError(f"【参数错误】单次最多 {max_items} 项，当前 {len(items)} 项")
+
+    parsed = []
+    seen = set()
+    for index, raw in enumerate(items):
+        if not isinstance(raw, dict):
+            raise BatchError(f"【参数错误】第 {index} 项必须是对象")
+        procedure = raw.get('procedure', raw.get('param1'))
+        if not procedure or not isinstance(procedure, str):
+            raise BatchError(f"【参数错误】第 {index} 项缺少存储过程名（procedure）")
+        params = raw.get('params', raw.get('param2', ''))
+        if isinstance(params, list):
+            params = tuple('' if value is None else value for value in params)
+        elif params is None:
+            params = ''
+        item_id = str(raw.get('id', index))
+        if item_id in seen:
+            raise BatchError(f"【参数错误】项 id 重复：{item_id}")
+        seen.add(item_id)
+        parsed.append(BatchItem(index, item_id, procedure, params))
+    return parsed
+
+
+_executor_lock = threading.Lock()
+_executor = {'pid': None, 'pool': None}
+
+
+def get_executor():
+    """进程内共享的批量执行线程池（fork 出的工作进程中首次使用时创建）"""
+    with _executor_lock:
+        if _executor['pid'] != os.getpid():
+            _executor['pool'] = ThreadPoolExecutor(max_workers=max(BATCH_POOL_SIZE, 1),
+                                                   thread_name_prefix='dm-batch')
+            _executor['pid'] = os.getpid()
+        return _executor['pool']
+
+
+def run_batch(items, run_item, max_parallel=BATCH_MAX_PARALLEL, executor=None):
+    """并发执行各项，按完成顺序产出 BatchResult；同时执行的项数不超过 max_parallel
+
+    run_item(item) 返回 BatchResult 且不应抛出异常；各项在调用方的 contextvars 上下文副本中执行。
+    """
+    executor = executor or get_executor()
+    pending = {}
+    remaining = iter(items)
+
+    def _submit_next():
+        item = next(remaining, None)
+        if item is not None:
+            context = contextvars.copy_context()
+            pending[executor.submit(context.run, run_item, item)] = item
+
+    for _ in range(max(max_parallel, 1)):
+        _submit_next()
+    try:
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.pop(future)
+                _submit_next()
+                yield future.result()
+    finally:
+        # 客户端提前断开时不再提交剩余项，已提交的项执行完后释放连接
+        for future in pending:
+            future.cancel()
+
+
+def iter_json_batch(results, indent=None):
+    """批量结果的JSON片段：{"success": true, "results": {id: {..., "data": [...]}}, "total_items", "failed_items"}
+
+    results 按产出顺序写出（流式时为完成顺序）；data 与 /jsonService 的结构相同（indent 为其缩进）。
+    """
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    yield '{"success": true, "results": {'
+    total = failed = 0
+    for result in results:
+        head = result.header()
+        text = ('' if total == 0 else ',') + '\n' + encode(result.item.id) + ': ' + encode(head)[:-1]
+        total += 1
+        if not result.success:
+            failed += 1
+            yield text + '}'
+            continue
+        yield text + ', "data": '
+        yield from iter_json_result_sets(
+            ((result_set.description, result_set.iter_batches()) for result_set in result.data), indent=indent)
+        yield '}'
+    yield '\n}, "total_items": %d, "failed_items": %d}' % (total, failed)
+
+
+def iter_xml_batch(results, encoding='utf-8', indent='  '):
+    """批量结果的XML：BatchResult/Item（属性为元信息，失败项含 Error 元素，成功项含 ResultSet 元素）"""
+    writer = XmlWriter(indent, declaration=f'<?xml version="1.0" encoding="{encoding}"?>')
+    writer.start('BatchResult', {'generated_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
+    for result in results:
+        attrs = {'id': result.item.id}
+        attrs.update((key, str(value).lower() if isinstance(value, bool) else str(value))
+                     for key, value in result.header().items() if key != 'message' and value is not None)
+        if result.success:
+            attrs['total_sets'] = str(len(result.data))
+        writer.start('Item', attrs)
+        if result.success:
+            result_sets = ((result_set.description, result_set.iter_batches(), result_set.row_count)
+                           for result_set in result.data)
+            for text in write_result_sets(writer, result_sets):
+                yield text.encode(encoding, 'xmlcharrefreplace')
+        else:
+            writer.element('Error', result.message)
+        writer.end('Item')
+        yield writer.flush().encode(encoding, 'xmlcharrefreplace')
+    writer.end('BatchResult')
+    yield writer.flush().encode(encoding, 'xmlcharrefreplace')
@@ -0,0 +1,178 @@
+import io
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+
+from dm_types import column_kinds, peek_batches, resolve_kinds
+
+# 二进制结果编码：MessagePack 与 Apache Arrow IPC 流，按结果集逐批输出。
+# msgpack / pyarrow 为可选依赖，未安装时对应格式不可用（接口返回 406）
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - 可选依赖
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - 可选依赖
+    pa = None
+
+MSGPACK_CONTENT_TYPE = 'application/msgpack'
+ARROW_CONTENT_TYPE = 'application/vnd.apache.arrow.stream'
+
+# Accept 头中可识别的媒体类型 -> format 名称
+BINARY_MEDIA_TYPES = {
+    'application/msgpack': 'msgpack',
+    'application/x-msgpack': 'msgpack',
+    'application/vnd.msgpack': 'msgpack',
+    'application/vnd.apache.arrow.stream': 'arrow',
+    'application/x-apache-arrow-stream': 'arrow',
+}
+
+
+def is_available(fmt):
+    """对应的可选依赖是否已安装"""
+    if fmt == 'msgpack':
+        return msgpack is not None
+    if fmt == 'arrow':
+        return pa is not None
+    return False
+
+
+# ---------------- MessagePack ----------------
+
+def _msgpack_default(value):
+    """msgpack 不能直接表示的类型：datetime/date 转为 Timestamp 扩展类型（无时区视为UTC墙上时间），
+    Decimal 与超出 64 位的整数转为字符串以保持精度，time 转为 ISO 字符串"""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return msgpack.Timestamp.from_datetime(value)
+    if isinstance(value, date):
+        return msgpack.Timestamp.from_datetime(datetime(value.year, value.month, value.day, tzinfo=timezone.utc))
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, time):
+        return value.isoformat()
+    if isinstance(value, memoryview):
+        return value.tobytes()
+    return str(value)
+
+
+def iter_msgpack_result_sets(result_sets):
+    """MessagePack 流：连续的 msgpack 对象，可用 msgpack.Unpacker 流式读取
+
+    每个结果集依次输出：
+      1. 头部映射 {"set": 序号, "columns": [列名...], "types": [列类别...]}
+      2. 零到多个行批次数组 [[行值...], ...]
+      3. nil，表示该结果集结束
+    result_sets 的每一项为 (description, batches)。
+    """
+    packer = msgpack.Packer(default=_msgpack_default, use_bin_type=True)
+    for set_idx, (description, batches) in enumerate(result_sets, 1):
+        first, batches = peek_batches(batches)
+        kinds = resolve_kinds(column_kinds(description), first)
+        yield packer.pack({
+            'set': set_idx,
+            'columns': [col[0] for col in description],
+            'types': kinds,
+        })
+        for rows in batches:
+            try:
+                yield packer.pack(rows)
+            except OverflowError:
+                # 超出 64 位范围的整数
+                yield packer.pack([[str(v) if isinstance(v, int) and not isinstance(v, bool) and
+                                    not -2 ** 63 <= v < 2 ** 64 else v for v in row] for row in rows])
+        yield packer.pack(None)
+
+
+# ---------------- Arrow IPC ----------------
+
+class _ChunkSink(io.RawIOBase):
+    """收集 Arrow 写出的字节，按批取出"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_field(col, kind):
+    name = col[0]
+    if kind == 'int':
+        return pa.field(name, pa.int64())
+    if kind == 'float':
+        return pa.field(name, pa.float64())
+    if kind == 'decimal':
+        scale = col[5] if len(col) > 5 else None
+        if isinstance(scale, int) and 0 <= scale <= 38:
+            return pa.field(name, pa.decimal128(38, scale))
+        return pa.field(name, pa.string())
+    if kind == 'datetime':
+        return pa.field(name, pa.timestamp('us'))
+    if kind == 'date':
+        return pa.field(name, pa.date32())
+    if kind == 'time':
+        return pa.field(name, pa.time64('us'))
+    if kind == 'bytes':
+        return pa.field(name, pa.binary())
+    if kind == 'bool':
+        return pa.field(name, pa.bool_())
+    return pa.field(name, pa.string())
+
+
+def _arrow_column(values, field):
+    """构建一列 Arrow 数组；驱动返回的值与列类型不完全一致时（如整数列返回 Decimal）按列类型转换"""
+    try:
+        return pa.array(values, type=field.type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError) as e:
+        error = e
+    field_type = field.type
+    if pa.types.is_integer(field_type):
+        convert = int
+    elif pa.types.is_floating(field_type):
+        convert = float
+    elif pa.types.is_decimal(field_type):
+        quantum = Decimal(1).scaleb(-field_type.scale)
+        convert = lambda v: Decimal(v).quantize(quantum)
+    elif pa.types.is_string(field_type):
+        convert = str
+    else:
+        raise error
+    return pa.array([None if v is None else convert(v) for v in values], type=field_type)
+
+
+def iter_arrow_result_sets(result_sets):
+    """Arrow IPC 流：每个结果集输出一个完整的 IPC 流（schema + 记录批次 + 结束标记），多个结果集首尾相接；
+    读取时对同一输入依次调用 pyarrow.ipc.open_stream 即可逐个读出。
+
+    result_sets 的每一项为 (description, batches)。
+    """
+    for description, batches in result_sets:
+        first, batches = peek_batches(batches)
+        kinds = resolve_kinds(column_kinds(description), first)
+        fields = [_arrow_field(col, kind) for col, kind in zip(description, kinds)]
+        schema = pa.schema(fields)
+        sink = _ChunkSink()
+        writer = pa.ipc.new_stream(sink, schema)
+        try:
+            for rows in batches:
+                columns = list(zip(*rows)) if rows else [() for _ in fields]
+                arrays = [_arrow_column(list(values), field) for values, field in zip(columns, fields)]
+                writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
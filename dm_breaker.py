@@ -0,0 +1,189 @@
+import math
+import threading
+import time
+from collections import deque
+
+import dm_config
+
+# 数据库熔断器：统计最近一段时间内连接/执行的失败率与慢调用比例，超过阈值时断开（open），
+# 之后的请求直接失败（503 + Retry-After），不再占用工作线程等待数据库；
+# 断开一段时间后进入半开（half_open），只放行少量探测调用，探测全部成功则恢复（closed），否则重新断开。
+# 每个工作进程各有一个熔断器
+
+BREAKER_ENABLED = dm_config.env_bool('DM_BREAKER', True)
+BREAKER_WINDOW = dm_config.env_float('DM_BREAKER_WINDOW', 30)  # 统计窗口（秒）
+BREAKER_MIN_CALLS = dm_config.env_int('DM_BREAKER_MIN_CALLS', 20)  # 窗口内调用数达到该值才判断
+BREAKER_ERROR_RATE = dm_config.env_float('DM_BREAKER_ERROR_RATE', 0.5)  # 失败率阈值
+BREAKER_SLOW_CALL = dm_config.env_float('DM_BREAKER_SLOW_CALL', 10)  # 超过该秒数的调用计为慢调用
+BREAKER_SLOW_RATE = dm_config.env_float('DM_BREAKER_SLOW_RATE', 0.8)  # 慢调用比例阈值
+BREAKER_OPEN_SECONDS = dm_config.env_float('DM_BREAKER_OPEN_SECONDS', 15)  # 断开后多久进入半开
+BREAKER_HALF_OPEN_CALLS = dm_config.env_int('DM_BREAKER_HALF_OPEN_CALLS', 3)  # 半开时的探测调用数
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}  # 指标中的状态取值
+
+
+class CircuitOpenError(Exception):
+    """熔断器断开，调用被拒绝；retry_after 为建议的重试等待秒数"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class BreakerCall:
+    """一次受熔断器保护的调用：默认记为成功，调用方对连接失败、超时等调用 fail()，结束时调用 finish()"""
+
+    __slots__ = ('breaker', 'probe', 'started', 'failed', '_finished')
+
+    def __init__(self, breaker, probe):
+        self.breaker = breaker
+        self.probe = probe
+        self.started = time.monotonic()
+        self.failed = False
+        self._finished = False
+
+    def fail(self):
+        self.failed = True
+
+    def finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        self.breaker.record(not self.failed, time.monotonic() - self.started, self.probe)
+
+
+class CircuitBreaker:
+    """按秒分桶的滑动窗口熔断器（线程安全）"""
+
+    def __init__(self, name='database', enabled=BREAKER_ENABLED, window=BREAKER_WINDOW,
+                 min_calls=BREAKER_MIN_CALLS, error_rate=BREAKER_ERROR_RATE, slow_call=BREAKER_SLOW_CALL,
+                 slow_rate=BREAKER_SLOW_RATE, open_seconds=BREAKER_OPEN_SECONDS,
+                 half_open_calls=BREAKER_HALF_OPEN_CALLS, clock=time.monotonic):
+        self.name = name
+        self.enabled = enabled
+        self.window = window
+        self.min_calls = max(min_calls, 1)
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = max(half_open_calls, 1)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._buckets = deque()  # [秒, 调用数, 失败数, 慢调用数]
+        self._probes = 0  # 半开状态下在途的探测调用数
+        self._probe_successes = 0
+        self._stats = {'rejected': 0, 'opened': 0, 'calls': 0, 'failures': 0, 'slow_calls': 0}
+        self._last_reason = None
+
+    def begin(self):
+        """开始一次调用：断开时抛出 CircuitOpenError，否则返回 BreakerCall"""
+        if not self.enabled:
+            return BreakerCall(self, False)
+        with self._lock:
+            now = self.clock()
+            if self._state == OPEN:
+                if now - self._opened_at < self.open_seconds:
+                    self._stats['rejected'] += 1
+                    retry_after = self.open_seconds - (now - self._opened_at)
+                    raise CircuitOpenError(
+                        f"数据库熔断中（{self._last_reason}），{math.ceil(retry_after)} 秒后重试", retry_after)
+                self._state = HALF_OPEN
+                self._probes = 0
+                self._probe_successes = 0
+            if self._state == HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    self._stats['rejected'] += 1
+                    raise CircuitOpenError("数据库熔断恢复探测中，请稍后重试", 1)
+                self._probes += 1
+                return BreakerCall(self, True)
+        return BreakerCall(self, False)
+
+    def record(self, success, duration, probe=False):
+        slow = duration >= self.slow_call
+        with self._lock:
+            now = self.clock()
+            self._stats['calls'] += 1
+            self._stats['failures'] += not success
+            self._stats['slow_calls'] += slow
+            if probe:
+                self._probes -= 1
+            if self._state == HALF_OPEN:
+                if not probe:
+                    return
+                if not success or slow:
+                    self._open(now, '恢复探测失败' if not success else '恢复探测仍为慢调用')
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_calls:
+                        self._state = CLOSED
+                        self._buckets.clear()
+                return
+            if self._state == OPEN:
+                # 断开前开始的调用，结果不再计入
+                return
+            self._add(now, success, slow)
+            calls, failures, slow_calls = self._totals(now)
+            if calls < self.min_calls:
+                return
+            if failures / calls >= self.error_rate:
+                self._open(now, f'失败率 {failures}/{calls}')
+            elif slow_calls / calls >= self.slow_rate:
+                self._open(now, f'慢调用 {slow_calls}/{calls}')
+
+    def _add(self, now, success, slow):
+        second = int(now)
+        if self._buckets and self._buckets[-1][0] == second:
+            bucket = self._buckets[-1]
+        else:
+            bucket = [second, 0, 0, 0]
+            self._buckets.append(bucket)
+        bucket[1] += 1
+        bucket[2] += not success
+        bucket[3] += slow
+
+    def _totals(self, now):
+        horizon = now - self.window
+        while self._buckets and self._buckets[0][0] < horizon:
+            self._buckets.popleft()
+        calls = failures = slow_calls = 0
+        for _, c, f, s in self._buckets:
+            calls += c
+            failures += f
+            slow_calls += s
+        return calls, failures, slow_calls
+
+    def _open(self, now, reason):
+        self._state = OPEN
+        self._opened_at = now
+        self._last_reason = reason
+        self._buckets.clear()
+        self._stats['opened'] += 1
+
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and self.clock() - self._opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def snapshot(self):
+        """当前状态与统计（用于 /readyz 与 /metrics）"""
+        state = self.state()
+        with self._lock:
+            calls, failures, slow_calls = self._totals(self.clock())
+            data = dict(self._stats)
+            data.update({
+                'name': self.name,
+                'enabled': self.enabled,
+                'state': state,
+                'window_calls': calls,
+                'window_failures': failures,
+                'window_slow_calls': slow_calls,
+                'reason': self._last_reason if state != CLOSED else None,
+            })
+        return data
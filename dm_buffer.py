@@ -0,0 +1,180 @@
+import mmap
+import pickle
+import sys
+import tempfile
+import threading
+
+import dm_config
+from dm_stream import FETCH_BATCH_SIZE
+
+# 结果集内存预算：整体读取（XML 行数、缓存、请求合并共享）时，行先保存在内存中，
+# 本进程所有调用保留在内存中的行（含仍被缓存或响应引用的结果集）共用一份预算，
+# 超出预算后，正在读取的结果集之后的行（连同它已在内存中的行）按批序列化写入临时文件，
+# 读取时通过 mmap 按批还原，行数、列数与多次遍历不受影响，而堆内存只保留每批的偏移索引。
+# 内存中的行在结果集对象被回收时归还预算
+
+RESULT_MEMORY_BUDGET = dm_config.env_int('DM_RESULT_MEMORY_BUDGET', 128 * 1024 * 1024)  # 每个工作进程在内存中保留的行（估算字节数），0 表示不限
+RESULT_SPILL_DIR = dm_config.env_str('DM_RESULT_SPILL_DIR', tempfile.gettempdir())  # 溢出临时文件目录
+_SAMPLE_ROWS = 32  # 每批抽样估算行大小的行数
+
+
+def estimate_rows_size(rows):
+    """估算一批行占用的字节数（抽样若干行的 sys.getsizeof 之和按行数放大，避免逐值计算）"""
+    count = len(rows)
+    if not count:
+        return 0
+    step = max(count // _SAMPLE_ROWS, 1)
+    sampled = 0
+    size = 0
+    for index in range(0, count, step):
+        row = rows[index]
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+        sampled += 1
+    return size * count // sampled + sys.getsizeof(rows)
+
+
+class MemoryBudget:
+    """本进程各调用共享的内存预算（线程安全）；limit 为 0 或负数时不限（仍统计用量）"""
+
+    def __init__(self, limit=RESULT_MEMORY_BUDGET):
+        self.limit = limit
+        self.used = 0
+        self.peak = 0
+        self.rejected = 0  # 预留失败（导致溢出）的次数
+        self._lock = threading.Lock()
+
+    def reserve(self, size):
+        """预留 size 字节，超出预算时不预留并返回 False"""
+        with self._lock:
+            if self.limit > 0 and self.used + size > self.limit:
+                self.rejected += 1
+                return False
+            self.used += size
+            self.peak = max(self.peak, self.used)
+            return True
+
+    def release(self, size):
+        with self._lock:
+            self.used -= size
+
+    def stats(self):
+        with self._lock:
+            return {'used': self.used, 'limit': self.limit, 'peak': self.peak, 'rejected': self.rejected}
+
+
+class SpilledRows:
+    """写入临时文件的行：文件按批保存 pickle 序列化的行列表，通过 mmap 读取（只读，可多线程同时遍历）
+
+    支持 len()、遍历与按批遍历；临时文件在对象回收时删除（TemporaryFile 不在目录中留名）。
+    """
+
+    __slots__ = ('_file', '_mmap', '_chunks', '_count', 'nbytes')
+
+    def __init__(self, file, chunks, count):
+        file.flush()
+        self._file = file
+        self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._chunks = chunks  # [(偏移, 字节数)]
+        self._count = count
+        self.nbytes = self._mmap.size()
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for chunk in self.iter_chunks():
+            yield from chunk
+
+    def iter_chunks(self):
+        """按写入时的批还原行（每批为行元组列表）"""
+        view = memoryview(self._mmap)
+        try:
+            for offset, size in self._chunks:
+                yield pickle.loads(view[offset:offset + size])
+        finally:
+            view.release()
+
+    def iter_batches(self, batch_size):
+        """按 batch_size 重新分批（写入时的批大小与之不同时合并/拆分）"""
+        pending = []
+        for chunk in self.iter_chunks():
+            if not pending and len(chunk) == batch_size:
+                yield chunk
+                continue
+            pending.extend(chunk)
+            while len(pending) >= batch_size:
+                yield pending[:batch_size]
+                del pending[:batch_size]
+        if pending:
+            yield pending
+
+    def estimated_size(self):
+        """占用的字节数：临时文件（mmap）大小加上堆中的偏移索引"""
+        return self.nbytes + sys.getsizeof(self._chunks) + len(self._chunks) * 72
+
+
+class RowBuffer:
+    """按批收集一个结果集的行：预算内保存在列表中，超出预算后溢出到临时文件
+
+    行中不能再有驱动的 LOB 对象（调用方读取时先用 dm_types.lob_reader 读出，见 ResultSet.from_cursor）。
+    finish() 返回行列表或 SpilledRows；返回行列表时，其预留的预算（reserved）由持有行的对象在回收时归还，
+    读取失败时调用 discard() 归还。
+    """
+
+    def __init__(self, budget=None, spill_dir=RESULT_SPILL_DIR):
+        self.budget = budget
+        self.spill_dir = spill_dir
+        self.rows = []
+        self.count = 0
+        self._reserved = 0
+        self._file = None
+        self._chunks = []
+
+    def extend(self, batch):
+        self.count += len(batch)
+        if self._file is None:
+            size = estimate_rows_size(batch) if self.budget is not None else 0
+            if self.budget is None or self.budget.reserve(size):
+                self._reserved += size
+                self.rows.extend(batch)
+                return
+            self._spill()
+        self._write(batch)
+
+    def finish(self):
+        if self._file is None:
+            return self.rows
+        return SpilledRows(self._file, self._chunks, self.count)
+
+    def discard(self):
+        """放弃已读取的行并归还内存预算（读取中途失败时）"""
+        self.rows = []
+        self._release()
+        if self._file is not None:
+            self._file.close()
+
+    @property
+    def reserved(self):
+        return self._reserved
+
+    @property
+    def spilled(self):
+        return self._file is not None
+
+    def _release(self):
+        if self.budget is not None and self._reserved:
+            self.budget.release(self._reserved)
+        self._reserved = 0
+
+    def _spill(self):
+        """开始溢出：打开临时文件，把已在内存中的行写入，并归还其内存预算"""
+        self._file = tempfile.TemporaryFile(prefix='dm_rows_', dir=self.spill_dir)
+        rows, self.rows = self.rows, []
+        for start in range(0, len(rows), FETCH_BATCH_SIZE):
+            self._write(rows[start:start + FETCH_BATCH_SIZE])
+        self._release()
+
+    def _write(self, batch):
+        data = pickle.dumps(batch, protocol=pickle.HIGHEST_PROTOCOL)
+        self._chunks.append((self._file.tell(), len(data)))
+        self._file.write(data)
@@ -0,0 +1,351 @@
+import csv
+import fnmatch
+import json
+import re
+import time
+from contextlib import nullcontext
+
+import dm_config
+from dm_router import parse_patterns
+
+# 批量写入：请求体为 JSON Lines 或 CSV，边读取边按批（executemany 数组绑定）调用存储过程或插入表，
+# 每 N 行提交一次事务；单批失败回滚当前事务并记录错误后继续（超过错误数上限时中止）。
+# 请求体按行读取、每批执行后即丢弃，内存占用只与批大小相关，与上传数据量无关
+
+BULK_CHUNK_ROWS = dm_config.env_int('DM_BULK_CHUNK_ROWS', 1000)  # 每次 executemany 绑定的行数
+BULK_COMMIT_ROWS = dm_config.env_int('DM_BULK_COMMIT_ROWS', 10000)  # 每提交一次事务的行数（按整批取整）
+BULK_MAX_ERRORS = dm_config.env_int('DM_BULK_MAX_ERRORS', 10)  # 失败的批与无法解析的行超过该数时中止
+BULK_TABLES = parse_patterns(dm_config.env_str('DM_BULK_TABLES', ''))  # 允许直接插入的表（支持通配符），为空时不允许
+BULK_TIMEOUT = dm_config.env_float('DM_BULK_TIMEOUT', 1800)  # 批量写入请求的缺省截止时间（秒）
+_MAX_REPORTED_ERRORS = 100  # 响应中列出的错误数上限
+
+JSONL = 'jsonl'
+CSV = 'csv'
+_FORMATS = {
+    'application/x-ndjson': JSONL, 'application/jsonl': JSONL, 'application/json-lines': JSONL,
+    'application/x-jsonlines': JSONL, 'text/csv': CSV, 'application/csv': CSV,
+}
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_$#]*(\.[A-Za-z_][A-Za-z0-9_$#]*)?$')
+
+
+class BulkError(ValueError):
+    """批量写入请求格式错误（400）"""
+
+
+class BodyReadError(BulkError):
+    """请求体无法继续读取（如不是有效的文本编码），line 为出错的行号；已读取的行照常处理，加载中止"""
+
+    def __init__(self, message, line):
+        super().__init__(message)
+        self.line = line
+
+
+def check_identifier(name, what):
+    """过程名、表名、列名只允许 [模式.]标识符，拼入语句前校验"""
+    if not _IDENTIFIER.match(name or ''):
+        raise BulkError(f"【参数错误】{what}格式错误：{name}")
+    return name
+
+
+def parse_columns(text):
+    """解析 "ID,NAME,CREATED" 形式的列名列表"""
+    return [check_identifier(name.strip(), '列名') for name in (text or '').split(',') if name.strip()]
+
+
+def parse_int_option(value, default, name, minimum=0):
+    """整数参数（缺省取 default）"""
+    if value is None or str(value).strip() == '':
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise BulkError(f"【参数错误】{name} 必须是整数")
+    if value < minimum:
+        raise BulkError(f"【参数错误】{name} 不能小于 {minimum}")
+    return value
+
+
+def is_bulk_table(table, patterns=BULK_TABLES):
+    name = table.upper()
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+
+
+def body_format(fmt, content_type):
+    """请求体格式：format 参数（jsonl/csv）优先，其次按 Content-Type"""
+    fmt = (fmt or '').strip().lower()
+    if fmt in ('jsonl', 'ndjson', 'json'):
+        return JSONL
+    if fmt == CSV:
+        return CSV
+    if fmt:
+        raise BulkError(f"【参数错误】批量写入只支持 jsonl/csv 格式，当前：{fmt}")
+    media_type = (content_type or '').split(';', 1)[0].strip().lower()
+    if media_type not in _FORMATS:
+        raise BulkError(f"【参数错误】无法识别请求体格式（Content-Type：{media_type or '未指定'}），请指定 format=jsonl|csv")
+    return _FORMATS[media_type]
+
+
+def iter_text_lines(stream, encoding='utf-8'):
+    """逐行读取请求体（二进制流）并解码，保留行尾换行（CSV 字段中的换行由 csv 模块拼接）"""
+    first = True
+    line_no = 0
+    while True:
+        line = stream.readline()
+        if not line:
+            return
+        line_no += 1
+        try:
+            text = line.decode(encoding)
+        except UnicodeDecodeError:
+            raise BodyReadError(f"第 {line_no} 行不是有效的 {encoding} 文本", line_no)
+        if first:
+            text = text.lstrip('\ufeff')
+            first = False
+        yield text
+
+
+def iter_jsonl_rows(lines, columns):
+    """解析 JSON Lines：每行一个对象（按列名取值）或数组（按位置），产出 (行号, 值元组, 错误信息)
+
+    对象行的列顺序取自 columns（列表），为空时按第一个对象的键顺序填入（供生成插入语句）；
+    对象中缺少的列取 None。空行跳过。
+    """
+    for line_no, text in enumerate(lines, 1):
+        if not text.strip():
+            continue
+        try:
+            value = json.loads(text)
+        except ValueError as e:
+            yield line_no, None, f"JSON 格式错误：{e}"
+            continue
+        if isinstance(value, dict):
+            if not columns:
+                columns.extend(check_identifier(str(name), '列名') for name in value)
+            yield line_no, tuple(value.get(name) for name in columns), None
+        elif isinstance(value, list):
+            yield line_no, tuple(value), None
+        else:
+            yield line_no, None, "每行必须是 JSON 对象或数组"
+
+
+def iter_csv_rows(lines, first_line=1):
+    """解析 CSV：产出 (行号, 值元组, 错误信息)，空字段作为 NULL（None）；first_line 为 lines 第一行的行号
+
+    格式错误的记录（如字段超长）只拒绝该记录，从下一行继续解析；读取没有进展时抛出 BodyReadError。
+    """
+    reader = csv.reader(lines)
+    while True:
+        line_num = reader.line_num
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            if reader.line_num == line_num:
+                raise BodyReadError(f"CSV 格式错误：{e}", reader.line_num + first_line)
+            yield reader.line_num + first_line - 1, None, f"CSV 格式错误：{e}"
+            continue
+        if row:
+            yield reader.line_num + first_line - 1, tuple(value if value != '' else None for value in row), None
+
+
+def read_csv_header(lines):
+    """读取 CSV 第一行作为列名，返回 (列名列表, 剩余行的迭代器)，剩余行从第 2 行开始"""
+    lines = iter(lines)
+    try:
+        first = next(lines)
+    except StopIteration:
+        return [], lines
+    columns = next(csv.reader([first]), [])
+    return [check_identifier(name.strip(), '列名') for name in columns], lines
+
+
+def call_sql(procedure, count):
+    return f"CALL {procedure}({', '.join('?' * count)})"
+
+
+def insert_sql(table, columns, count):
+    if columns and len(columns) != count:
+        raise BulkError(f"【参数错误】数据为 {count} 列，与列名（{', '.join(columns)}）个数不一致")
+    values = ', '.join('?' * count)
+    if columns:
+        return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({values})"
+    return f"INSERT INTO {table} VALUES ({values})"
+
+
+class BulkReport:
+    """批量写入结果：行数统计、各失败批与被拒绝行的错误（最多列出 _MAX_REPORTED_ERRORS 条）"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.rows = 0  # 读到的数据行数（含被拒绝的行）
+        self.committed_rows = 0
+        self.failed_rows = 0  # 所在批失败或随失败的事务回滚的行数
+        self.rejected_rows = 0  # 无法解析或列数不一致、未执行的行数
+        self.chunks = 0
+        self.failed_chunks = 0
+        self.commits = 0
+        self.error_count = 0
+        self.errors = []
+        self.aborted = False
+        self.duration = 0.0
+
+    def add_error(self, error):
+        self.error_count += 1
+        if len(self.errors) < _MAX_REPORTED_ERRORS:
+            self.errors.append(error)
+
+    @property
+    def rows_per_sec(self):
+        return self.committed_rows / self.duration if self.duration > 0 else 0.0
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'committed_rows': self.committed_rows,
+            'failed_rows': self.failed_rows,
+            'rejected_rows': self.rejected_rows,
+            'chunks': self.chunks,
+            'failed_chunks': self.failed_chunks,
+            'commits': self.commits,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'aborted': self.aborted,
+            'duration_ms': round(self.duration * 1000, 3),
+            'rows_per_sec': round(self.rows_per_sec, 1),
+        }
+
+
+class BulkLoader:
+    """在一个连接上按批执行 executemany 并分段提交（调用方负责关闭自动提交）
+
+    make_sql(列数) 由第一行的列数生成语句；errors 为驱动的数据库异常类型（批失败时回滚并记录，继续下一批），
+    请求体无法继续读取（BodyReadError）时记录错误并中止（aborted），此前读到的行照常执行与提交；
+    其他异常（如 DeadlineExceeded）回滚后向上抛出，已提交的行保留，report 中为截至当时的结果；
+    error_info(e) 返回 (错误码, 描述)；guard() 返回包住每条语句的上下文（如截止时间）。
+    """
+
+    def __init__(self, conn, make_sql, errors, error_info, chunk_rows=BULK_CHUNK_ROWS,
+                 commit_rows=BULK_COMMIT_ROWS, max_errors=BULK_MAX_ERRORS, guard=nullcontext):
+        self.conn = conn
+        self.make_sql = make_sql
+        self.errors = errors
+        self.error_info = error_info
+        self.chunk_rows = max(chunk_rows, 1)
+        self.commit_rows = max(commit_rows, self.chunk_rows)
+        self.max_errors = max(max_errors, 0)
+        self.guard = guard
+        self.report = BulkReport()
+        self._sql = None
+        self._width = None
+        self._cursor = None
+        self._pending = []  # 本事务中已执行、未提交的批 [(批序号, 行数)]
+
+    def run(self, rows):
+        """执行 rows（iter_jsonl_rows / iter_csv_rows 的输出），返回 BulkReport"""
+        report = self.report
+        self._cursor = self.conn.cursor()
+        try:
+            self._load(rows)
+            if self._pending:
+                self._commit()
+        except BaseException:
+            self._rollback()
+            raise
+        finally:
+            report.duration = time.perf_counter() - report.started
+            try:
+                self._cursor.close()
+            except Exception:
+                pass
+        return report
+
+    def _load(self, rows):
+        report = self.report
+        chunk = []
+        first_line = line_no = None
+        try:
+            for line_no, row, error in rows:
+                report.rows += 1
+                if error is None:
+                    if self._sql is None:
+                        self._width = len(row)
+                        self._sql = self.make_sql(self._width)
+                    elif len(row) != self._width:
+                        error = f"列数为 {len(row)}，应为 {self._width}"
+                if error is not None:
+                    report.rejected_rows += 1
+                    report.add_error({'line': line_no, 'message': error})
+                    if self._too_many_errors():
+                        return
+                    continue
+                if not chunk:
+                    first_line = line_no
+                chunk.append(row)
+                if len(chunk) >= self.chunk_rows:
+                    self._execute(chunk, first_line, line_no)
+                    chunk = []
+                    if self._too_many_errors():
+                        return
+        except BodyReadError as e:
+            # 后面的行无法读取：已读到的行照常执行，加载中止
+            report.add_error({'line': e.line, 'message': str(e)})
+            report.aborted = True
+        if chunk:
+            self._execute(chunk, first_line, line_no)
+
+    def _too_many_errors(self):
+        if self.report.error_count > self.max_errors:
+            self.report.aborted = True
+        return self.report.aborted
+
+    def _execute(self, chunk, first_line, last_line):
+        report = self.report
+        report.chunks += 1
+        index = report.chunks
+        try:
+            with self.guard():
+                self._cursor.executemany(self._sql, chunk)
+        except self.errors as e:
+            report.failed_chunks += 1
+            report.failed_rows += len(chunk)
+            rolled_back = self._rollback()
+            code, desc = self.error_info(e)
+            report.add_error({'chunk': index, 'first_line': first_line, 'last_line': last_line, 'rows': len(chunk),
+                              'error_code': code, 'message': str(desc), 'rolled_back_rows': rolled_back})
+            return
+        self._pending.append((index, len(chunk)))
+        if sum(rows for _, rows in self._pending) >= self.commit_rows:
+            self._commit()
+
+    def _commit(self):
+        report = self.report
+        rows = sum(count for _, count in self._pending)
+        try:
+            with self.guard():
+                self.conn.commit()
+        except self.errors as e:
+            chunks = [index for index, _ in self._pending]
+            self._rollback()
+            code, desc = self.error_info(e)
+            report.add_error({'chunks': chunks, 'rows': rows, 'error_code': code,
+                              'message': f"提交失败：{desc}", 'rolled_back_rows': rows})
+            return
+        report.committed_rows += rows
+        report.commits += 1
+        self._pending = []
+
+    def _rollback(self):
+        """回滚当前事务，返回随之回滚的已执行行数（计入 failed_rows）
+
+        回滚失败时不抛出（连接由调用方按失败处理：再次回滚，仍失败则丢弃）。
+        """
+        rows = sum(count for _, count in self._pending)
+        self._pending = []
+        try:
+            self.conn.rollback()
+        except Exception:
+            pass
+        self.report.failed_rows += rows
+        return rows
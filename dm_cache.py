@@ -0,0 +1,163 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import dm_config
+
+# 存储过程结果缓存：按 (存储过程, 参数) 缓存已读取的结果集，JSON/XML 输出共用同一份缓存
+
+
+def parse_proc_ttls(text):
+    """解析 "JZX.GET_TEST0=30,JZX.GET_TEST1=10" 形式的缓存配置（过程名不区分大小写）"""
+    ttls = {}
+    for item in (text or '').split(','):
+        name, _, ttl = item.strip().partition('=')
+        if not name.strip():
+            continue
+        try:
+            ttls[name.strip().upper()] = float(ttl) if ttl.strip() else CACHE_DEFAULT_TTL
+        except ValueError:
+            continue
+    return ttls
+
+
+CACHE_DEFAULT_TTL = dm_config.env_float('DM_CACHE_DEFAULT_TTL', 10)  # 未单独指定TTL的过程使用的秒数
+CACHE_MAX_BYTES = dm_config.env_int('DM_CACHE_MAX_BYTES', 64 * 1024 * 1024)  # 缓存总大小上限（估算字节数）
+CACHE_PROCS = parse_proc_ttls(dm_config.env_str('DM_CACHE_PROCS', ''))  # 允许缓存的过程及其TTL
+
+
+def estimate_size(value):
+    """估算结果集占用的字节数（容器 + 元素的 sys.getsizeof 之和，键名等共享对象可能重复计算）"""
+    if hasattr(value, 'estimated_size'):
+        return value.estimated_size()
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += sys.getsizeof(key) + estimate_size(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += estimate_size(item)
+    return size
+
+
+class _CacheEntry:
+    __slots__ = ('value', 'size', 'expires_at', 'procedure')
+
+    def __init__(self, value, size, expires_at, procedure):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.procedure = procedure
+
+
+class ResultCache:
+    """线程安全的结果缓存
+
+    - 只缓存 proc_ttls（允许列表）中的过程，TTL 按过程单独配置
+    - 总大小超过 max_bytes 时按 LRU 淘汰；单个结果超过上限时不缓存
+    - 缓存值被多个请求共享，调用方不得修改
+    """
+
+    def __init__(self, proc_ttls=None, max_bytes=CACHE_MAX_BYTES, size_func=estimate_size):
+        self.proc_ttls = dict(CACHE_PROCS if proc_ttls is None else proc_ttls)
+        self.max_bytes = max_bytes
+        self.size_func = size_func
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> _CacheEntry，末尾为最近使用
+        self._bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0,
+                       'invalidations': 0, 'stores': 0, 'rejected_too_large': 0}
+
+    @staticmethod
+    def make_key(procedure, params):
+        return (procedure or '').upper(), tuple(params)
+
+    def ttl_for(self, procedure):
+        """过程对应的TTL；不在允许列表中返回 None"""
+        return self.proc_ttls.get((procedure or '').upper())
+
+    def is_cacheable(self, procedure):
+        ttl = self.ttl_for(procedure)
+        return ttl is not None and ttl > 0
+
+    def get(self, key):
+        """命中返回缓存值，未命中/已过期返回 None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            if entry.expires_at <= now:
+                self._remove(key)
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry.value
+
+    def put(self, key, value):
+        """写入缓存（过程不在允许列表或结果过大时忽略）"""
+        ttl = self.ttl_for(key[0])
+        if ttl is None or ttl <= 0:
+            return False
+        size = self.size_func(value)
+        with self._lock:
+            if size > self.max_bytes:
+                self._stats['rejected_too_large'] += 1
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _CacheEntry(value, size, time.monotonic() + ttl, key[0])
+            self._bytes += size
+            self._stats['stores'] += 1
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats['evictions'] += 1
+        return True
+
+    def get_or_load(self, procedure, params, loader):
+        """先查缓存，未命中时调用 loader() 读取并写入缓存；返回 (结果, 是否命中)"""
+        if not self.is_cacheable(procedure):
+            return loader(), False
+        key = self.make_key(procedure, params)
+        value = self.get(key)
+        if value is not None:
+            return value, True
+        value = loader()
+        self.put(key, value)
+        return value, False
+
+    def invalidate(self, procedure=None, params=None):
+        """失效缓存：指定过程+参数失效单个键；只指定过程失效该过程全部键；都不指定清空全部"""
+        with self._lock:
+            if procedure is None:
+                keys = list(self._entries)
+            elif params is not None:
+                key = self.make_key(procedure, params)
+                keys = [key] if key in self._entries else []
+            else:
+                name = procedure.upper()
+                keys = [key for key, entry in self._entries.items() if entry.procedure == name]
+            for key in keys:
+                self._remove(key)
+            self._stats['invalidations'] += len(keys)
+        return len(keys)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data.update({
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'procedures': dict(self.proc_ttls),
+            })
+        return data
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
@@ -0,0 +1,120 @@
+import time
+import zlib
+
+import dm_config
+
+# 响应压缩：按 Accept-Encoding 协商 gzip/deflate。流式响应逐片段压缩输出（不缓冲整个响应体），
+# 累计输入达到 DM_COMPRESS_FLUSH_SIZE 时做一次同步刷新，客户端可以边收边解压。
+# 流式响应不预读开头判断大小（预读会在 after_request 中执行查询与编码，推迟首字节，出错时也无法返回JSON错误），一律压缩
+
+
+def parse_type_list(text):
+    """解析 "application/json,application/xml" 形式的媒体类型列表（不区分大小写）"""
+    return {item.strip().lower() for item in (text or '').split(',') if item.strip()}
+
+
+COMPRESS_ENABLED = dm_config.env_bool('DM_COMPRESS', True)
+COMPRESS_LEVEL = dm_config.env_int('DM_COMPRESS_LEVEL', 6)  # zlib 压缩级别 1-9（1 最快，9 压缩率最高）
+COMPRESS_MIN_SIZE = dm_config.env_int('DM_COMPRESS_MIN_SIZE', 1024)  # 小于该字节数的非流式响应不压缩
+COMPRESS_FLUSH_SIZE = dm_config.env_int('DM_COMPRESS_FLUSH_SIZE', 64 * 1024)  # 流式压缩的同步刷新间隔（输入字节数）
+COMPRESS_TYPES = parse_type_list(dm_config.env_str(
+    'DM_COMPRESS_TYPES', 'application/json,application/xml,text/xml,text/plain,application/msgpack'))
+
+# 编码 -> zlib wbits（HTTP 的 deflate 为 zlib 格式）
+_WBITS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+
+def negotiate_encoding(accept_encodings):
+    """按 Accept-Encoding（werkzeug 的 Accept 对象）选择 gzip 或 deflate；质量相同时优先 gzip，都不接受时返回 None"""
+    best, best_quality = None, 0
+    for encoding in ('gzip', 'deflate'):
+        quality = accept_encodings.quality(encoding)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def is_compressible(response, types=COMPRESS_TYPES):
+    """响应是否适合压缩：媒体类型在允许列表中、尚未编码、且有响应体"""
+    if response.status_code in (204, 304) or response.status_code < 200:
+        return False
+    if 'Content-Encoding' in response.headers or 'Content-Range' in response.headers:
+        return False
+    return (response.mimetype or '').lower() in types
+
+
+class StreamCompressor:
+    """增量压缩器：记录压缩前后的字节数与压缩占用的 CPU 时间（当前线程）"""
+
+    def __init__(self, encoding, level=COMPRESS_LEVEL):
+        self.encoding = encoding
+        self._zlib = zlib.compressobj(level, zlib.DEFLATED, _WBITS[encoding])
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self.cpu_seconds = 0.0
+
+    def _run(self, func, *args):
+        start = time.thread_time()
+        data = func(*args)
+        self.cpu_seconds += time.thread_time() - start
+        self.compressed_bytes += len(data)
+        return data
+
+    def compress(self, data):
+        self.raw_bytes += len(data)
+        return self._run(self._zlib.compress, data)
+
+    def flush(self):
+        """同步刷新：已输入的数据全部输出，客户端可以立即解压"""
+        return self._run(self._zlib.flush, zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._run(self._zlib.flush, zlib.Z_FINISH)
+
+    def stats(self):
+        return {'encoding': self.encoding, 'raw_bytes': self.raw_bytes,
+                'compressed_bytes': self.compressed_bytes, 'cpu_seconds': self.cpu_seconds}
+
+
+def iter_compressed(chunks, compressor, flush_size=COMPRESS_FLUSH_SIZE, on_done=None):
+    """逐片段压缩字节流；结束或被关闭时调用 on_done(compressor.stats())，并关闭被包装的迭代器"""
+    pending = 0
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            pending += len(chunk)
+            if pending >= flush_size:
+                data += compressor.flush()
+                pending = 0
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+        if on_done is not None:
+            on_done(compressor.stats())
+
+
+def compress_response(response, encoding, level=COMPRESS_LEVEL, min_size=COMPRESS_MIN_SIZE,
+                      flush_size=COMPRESS_FLUSH_SIZE, on_done=None):
+    """按指定编码压缩响应（就地修改），返回是否压缩
+
+    非流式响应小于 min_size 时不压缩；流式响应总是压缩，此处只包装响应体，不读取任何片段
+    （片段在发送响应体时才生成并逐片段压缩），片段必须已是字节（见 _metered_body）。
+    """
+    response.vary.add('Accept-Encoding')  # 是否压缩取决于请求头，缓存须按 Accept-Encoding 区分
+    if not response.is_streamed:
+        data = response.get_data()
+        if len(data) < min_size:
+            return False
+        compressor = StreamCompressor(encoding, level)
+        response.set_data(compressor.compress(data) + compressor.finish())
+        if on_done is not None:
+            on_done(compressor.stats())
+    else:
+        response.response = iter_compressed(response.response, StreamCompressor(encoding, level), flush_size, on_done)
+        response.headers.pop('Content-Length', None)
+    response.headers['Content-Encoding'] = encoding
+    return True
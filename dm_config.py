@@ -0,0 +1,66 @@
+import importlib
+import os
+
+# 达梦服务公共配置（可通过环境变量覆盖，便于打包后的程序在不同环境部署）
+
+
+def env_str(name, default):
+    """读取字符串类型环境变量"""
+    value = os.environ.get(name)
+    return value if value not in (None, '') else default
+
+
+def env_int(name, default):
+    """读取整数类型环境变量，格式错误时使用默认值"""
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_float(name, default):
+    """读取浮点类型环境变量，格式错误时使用默认值"""
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_bool(name, default):
+    """读取布尔类型环境变量（1/true/yes/on 视为开启）"""
+    value = os.environ.get(name)
+    if value is None or value == '':
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+# 数据库连接参数
+DM_CONN_PARAMS = {
+    'server': env_str('DM_SERVER', '192.168.0.191'),  # 服务器地址
+    'user': env_str('DM_USER', 'JZX'),  # 用户名
+    'password': env_str('DM_PASSWORD', 'XFgs@345'),  # 密码
+    'port': env_int('DM_PORT', 5236),  # 端口号，默认5236
+    'autoCommit': True  # 是否自动提交
+}
+
+# 连接池参数
+POOL_MIN_SIZE = env_int('DM_POOL_MIN', 1)  # 常驻最小连接数
+POOL_MAX_SIZE = env_int('DM_POOL_MAX', 10)  # 最大连接数
+POOL_IDLE_TIMEOUT = env_float('DM_POOL_IDLE_TIMEOUT', 300)  # 空闲超过该秒数的连接被回收（保留最小连接数）
+POOL_MAX_LIFETIME = env_float('DM_POOL_MAX_LIFETIME', 1800)  # 连接最长存活秒数，到期后重建
+POOL_CHECKOUT_TIMEOUT = env_float('DM_POOL_CHECKOUT_TIMEOUT', 10)  # 借出连接的最长等待秒数
+POOL_PING_AFTER = env_float('DM_POOL_PING_AFTER', 1)  # 空闲超过该秒数的连接借出前先做校验（0 表示每次都校验）
+POOL_VALIDATION_SQL = env_str('DM_POOL_VALIDATION_SQL', 'SELECT 1')  # 校验语句
+POOL_REAP_INTERVAL = env_float('DM_POOL_REAP_INTERVAL', 30)  # 后台回收线程的巡检间隔
+
+# 数据库驱动模块（默认 dmPython；压测/本地调试可指向实现相同接口的替身模块，如 benchmarks/fake_dmPython.py）
+DRIVER_MODULE = env_str('DM_DRIVER_MODULE', 'dmPython')
+
+
+def load_driver(name=None):
+    """加载数据库驱动模块"""
+    name = name or DRIVER_MODULE
+    if name == 'dmPython':
+        import dmPython  # 显式导入，便于 PyInstaller 打包时识别
+        return dmPython
+    return importlib.import_module(name)
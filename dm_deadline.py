@@ -0,0 +1,185 @@
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import dm_config
+
+# 请求截止时间：按请求参数 timeout、过程、接口依次确定本次请求可用的秒数，
+# 语句执行超过截止时间时由后台看门狗线程调用 conn.cancel() 中断，请求返回超时错误（504）。
+# 建立连接（dmPython.connect）无法中断，只能由连接池借出超时与熔断器兜底
+
+
+def parse_timeouts(text):
+    """解析 "/xmlService=60,JZX.GET_BIG=120" 形式的超时配置（秒）；过程名不区分大小写"""
+    timeouts = {}
+    for item in (text or '').split(','):
+        name, _, seconds = item.partition('=')
+        name = name.strip()
+        if not name:
+            continue
+        try:
+            timeouts[name if name.startswith('/') else name.upper()] = float(seconds)
+        except ValueError:
+            continue
+    return timeouts
+
+
+QUERY_TIMEOUT = dm_config.env_float('DM_QUERY_TIMEOUT', 60)  # 缺省截止时间（秒），0 表示不限
+ROUTE_TIMEOUTS = parse_timeouts(dm_config.env_str('DM_ROUTE_TIMEOUTS', ''))  # 按接口路径
+PROC_TIMEOUTS = parse_timeouts(dm_config.env_str('DM_PROC_TIMEOUTS', ''))  # 按存储过程，优先于接口
+MAX_TIMEOUT = dm_config.env_float('DM_MAX_TIMEOUT', 300)  # 请求参数 timeout 的上限
+
+
+class DeadlineExceeded(Exception):
+    """请求已超过截止时间（语句已被取消或未开始执行）"""
+
+
+class Deadline:
+    __slots__ = ('seconds', 'expires_at')
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return self.expires_at - time.monotonic()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def bound(self, timeout):
+        """不超过剩余时间的等待秒数（用于连接池借出等）"""
+        return max(0.0, min(timeout, self.remaining()))
+
+
+_current_deadline = contextvars.ContextVar('dm_deadline', default=None)
+
+
+def resolve_timeout(route=None, procedure=None, requested=None, default=None):
+    """本次请求的超时秒数：请求参数 timeout（不超过 DM_MAX_TIMEOUT）> 过程配置 > 接口配置 > 缺省；0 或负数表示不限
+
+    default 为接口自己的缺省值（如异步作业），未指定时为 DM_QUERY_TIMEOUT。
+    """
+    if requested not in (None, ''):
+        try:
+            seconds = float(requested)
+        except (TypeError, ValueError):
+            seconds = 0
+        if seconds > 0:
+            return min(seconds, MAX_TIMEOUT) if MAX_TIMEOUT > 0 else seconds
+    procedure = (procedure or '').upper()
+    if procedure in PROC_TIMEOUTS:
+        return PROC_TIMEOUTS[procedure]
+    if route in ROUTE_TIMEOUTS:
+        return ROUTE_TIMEOUTS[route]
+    return QUERY_TIMEOUT if default is None else default
+
+
+def start_deadline(seconds):
+    """为当前上下文设置截止时间（seconds 不大于 0 时清除），不会晚于外层已有的截止时间"""
+    deadline = Deadline(seconds) if seconds and seconds > 0 else None
+    outer = _current_deadline.get()
+    if outer is not None and (deadline is None or outer.expires_at < deadline.expires_at):
+        deadline = outer
+    _current_deadline.set(deadline)
+    return deadline
+
+
+def clear_deadline():
+    _current_deadline.set(None)
+
+
+def current_deadline():
+    return _current_deadline.get()
+
+
+class _Watchdog:
+    """到期回调线程：所有在执行的语句共用一个线程，按到期时间堆排序"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._pid = None
+
+    def schedule(self, expires_at, callback):
+        entry = [expires_at, next(self._seq), callback]
+        with self._cond:
+            if self._pid != os.getpid():
+                # fork 出的工作进程中首次使用时启动线程
+                self._heap = []
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name='dm-deadline', daemon=True).start()
+            heapq.heappush(self._heap, entry)
+            self._cond.notify()
+        return entry
+
+    def discard(self, entry):
+        # 不从堆中删除，只置空回调，到期时跳过
+        entry[2] = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._cond.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                callback = heapq.heappop(self._heap)[2]
+            if callback is not None:
+                try:
+                    callback()
+                except Exception:
+                    pass
+
+
+_watchdog = _Watchdog()
+
+
+def _cancel(conn):
+    cancel = getattr(conn, 'cancel', None)
+    if cancel is not None:
+        cancel()
+
+
+@contextmanager
+def statement_deadline(conn, deadline=None):
+    """在截止时间内执行语句：到期时取消 conn 上正在执行的语句，并抛出 DeadlineExceeded
+
+    没有截止时间时不做任何事；截止时间已过时直接抛出，不执行语句。
+    到期取消过的连接可能残留取消状态，调用方应丢弃而不是归还连接池。
+    """
+    deadline = deadline or _current_deadline.get()
+    if deadline is None:
+        yield
+        return
+    if deadline.expired():
+        raise DeadlineExceeded(f"请求已超过截止时间（{deadline.seconds:g} 秒）")
+    fired = []
+    done = []
+    lock = threading.Lock()
+
+    def _on_expire():
+        # 与语句结束互斥：语句已结束（连接可能已被他人借出）时不再取消
+        with lock:
+            if done:
+                return
+            fired.append(True)
+            _cancel(conn)
+
+    entry = _watchdog.schedule(deadline.expires_at, _on_expire)
+    try:
+        yield
+    except Exception as e:
+        if fired:
+            raise DeadlineExceeded(f"执行超过截止时间（{deadline.seconds:g} 秒），语句已取消") from e
+        raise
+    finally:
+        with lock:
+            done.append(True)
+        _watchdog.discard(entry)
+    if fired:
+        raise DeadlineExceeded(f"执行超过截止时间（{deadline.seconds:g} 秒）")
+
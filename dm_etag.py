@@ -0,0 +1,94 @@
+import hashlib
+import pickle
+
+import dm_config
+from dm_types import type_name
+
+# 结果集指纹与条件请求：读取结果集时按批增量计算指纹，由指纹生成弱 ETag，
+# 客户端带 If-None-Match 再次请求且数据未变时返回 304，省去序列化与传输。
+# 计算指纹需要逐值序列化（datetime/DECIMAL 较多时约为 JSON 编码耗时的一半），只对 DM_ETAG_PROCS 中的过程启用；
+# 也可为过程配置一个廉价的“变更令牌”过程（如返回版本号/最后修改时间），令牌未变时连 callproc 都不执行
+
+
+def parse_proc_map(text):
+    """解析 "JZX.GET_DATA=JZX.GET_DATA_VERSION,..." 形式的过程映射（过程名不区分大小写）"""
+    mapping = {}
+    for item in (text or '').split(','):
+        name, _, target = item.partition('=')
+        if name.strip() and target.strip():
+            mapping[name.strip().upper()] = target.strip()
+    return mapping
+
+
+def parse_name_list(text):
+    """解析 "JZX.P1,JZX.P2" 形式的过程列表（不区分大小写）"""
+    return {name.strip().upper() for name in (text or '').split(',') if name.strip()}
+
+
+ETAG_PROCS = parse_name_list(dm_config.env_str('DM_ETAG_PROCS', ''))  # 计算结果集指纹的过程，* 表示全部
+# 过程 -> 变更令牌过程（以相同参数调用，返回单行；该行取值即为令牌）
+ETAG_VERSION_PROCS = parse_proc_map(dm_config.env_str('DM_ETAG_VERSION_PROCS', ''))
+
+_DIGEST_SIZE = 16
+
+
+class Fingerprint:
+    """单个结果集的增量指纹（BLAKE2b）：列名与列类型 + 按批读取的行
+
+    每批行以关闭 memo 的 pickle 序列化后直接写入哈希（C 实现，比逐值 repr 快，且结果只取决于取值、
+    与对象是否共享无关，各工作进程对相同数据得到相同指纹）；批大小相同时同样的数据指纹一致。
+    驱动返回无法序列化的值（如 LOB 对象）时该批改用 repr。
+    """
+
+    __slots__ = ('_hash',)
+
+    def __init__(self, description):
+        self._hash = hashlib.blake2b(digest_size=_DIGEST_SIZE)
+        header = '\x1f'.join(f'{col[0]}:{type_name(col[1])}' for col in description)
+        self._hash.update(header.encode('utf-8', 'surrogatepass'))
+
+    def update(self, rows):
+        if not rows:
+            return
+        pickler = pickle.Pickler(self, protocol=4)
+        pickler.fast = True
+        try:
+            pickler.dump(rows)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            self.write(repr(rows).encode('utf-8', 'surrogatepass'))
+
+    def write(self, data):
+        # 作为 pickle 的输出文件：序列化结果直接写入哈希，不生成中间字节串
+        self._hash.update(data)
+
+    def digest(self):
+        return self._hash.digest()
+
+
+def result_sets_etag(result_sets, variant):
+    """由各结果集的指纹生成 ETag（不含引号）；variant 区分同一数据的不同表示（格式、缩进等）
+
+    任一结果集没有指纹（未启用或未按批读取）时返回 None。
+    """
+    combined = hashlib.blake2b(digest_size=_DIGEST_SIZE)
+    for result_set in result_sets:
+        digest = getattr(result_set, 'digest', None)
+        if digest is None:
+            return None
+        combined.update(digest)
+    return f'{combined.hexdigest()}-{variant}'
+
+
+def change_token_etag(procedure, params, token, variant):
+    """由变更令牌生成 ETag：同一过程、参数与令牌得到相同的 ETag"""
+    digest = hashlib.blake2b(repr(((procedure or '').upper(), params, token)).encode('utf-8', 'surrogatepass'),
+                             digest_size=_DIGEST_SIZE)
+    return f'v{digest.hexdigest()}-{variant}'
+
+
+def version_proc_for(procedure):
+    return ETAG_VERSION_PROCS.get((procedure or '').upper())
+
+
+def fingerprint_enabled(procedure, procs=ETAG_PROCS):
+    return '*' in procs or (procedure or '').upper() in procs
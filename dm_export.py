@@ -0,0 +1,388 @@
+import argparse
+import contextvars
+import csv
+import fnmatch
+import io
+import json
+import queue
+import re
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from decimal import Decimal, localcontext
+
+import dm_config
+from dm_router import parse_patterns
+from dm_stream import FETCH_BATCH_SIZE
+from dm_types import (column_kinds, json_default, json_ready_batches, lob_reader, peek_batches, resolve_kinds,
+                      row_converter, text_converters)
+
+# 整表导出：按主键（或指定的数值列）的取值范围把表切分为若干分区，多个扫描线程各用一个池化连接并发读取，
+# 读到的批经有界队列合并后以 CSV 或 JSON Lines 流式输出。
+# ordered 合并按分区顺序输出（分区内 ORDER BY 键列，整体按键有序），unordered 按读取完成的先后输出（更快）；
+# 队列有界，输出跟不上时扫描线程等待，内存占用只与并发数、队列深度与批大小相关
+
+EXPORT_TABLES = parse_patterns(dm_config.env_str('DM_EXPORT_TABLES', ''))  # 允许导出的表（支持通配符），为空时不允许
+EXPORT_PARALLEL = dm_config.env_int('DM_EXPORT_PARALLEL', 4)  # 缺省并发扫描数（每个占用一个池化连接）
+EXPORT_MAX_PARALLEL = dm_config.env_int('DM_EXPORT_MAX_PARALLEL', 8)  # 请求参数 parallel 的上限
+EXPORT_PARTITIONS_PER_WORKER = dm_config.env_int('DM_EXPORT_PARTITIONS_PER_WORKER', 4)  # 缺省分区数 = 并发数 × 该值
+EXPORT_MAX_PARTITIONS = dm_config.env_int('DM_EXPORT_MAX_PARTITIONS', 1024)  # 请求参数 partitions 的上限（超出时 400）
+EXPORT_BATCH_SIZE = dm_config.env_int('DM_EXPORT_BATCH_SIZE', FETCH_BATCH_SIZE)  # 每次 fetchmany 的行数
+EXPORT_QUEUE_DEPTH = dm_config.env_int('DM_EXPORT_QUEUE_DEPTH', 4)  # 每个扫描线程可领先输出的批数
+EXPORT_TIMEOUT = dm_config.env_float('DM_EXPORT_TIMEOUT', 3600)  # 导出请求的缺省截止时间（秒）
+
+CSV = 'csv'
+JSONL = 'jsonl'
+CONTENT_TYPES = {CSV: 'text/csv; charset=utf-8', JSONL: 'application/x-ndjson; charset=utf-8'}
+
+# 主键列（DM 兼容 Oracle 的数据字典视图）
+PRIMARY_KEY_SQL = (
+    "SELECT c.COLUMN_NAME FROM ALL_CONSTRAINTS k "
+    "JOIN ALL_CONS_COLUMNS c ON c.OWNER = k.OWNER AND c.CONSTRAINT_NAME = k.CONSTRAINT_NAME "
+    "WHERE k.CONSTRAINT_TYPE = 'P' AND k.OWNER = ? AND k.TABLE_NAME = ? ORDER BY c.POSITION"
+)
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_$#]*$')
+_POLL_INTERVAL = 0.5  # 队列等待时检查取消/出错的间隔
+
+
+class ExportError(ValueError):
+    """导出参数错误（400）"""
+
+
+def parse_table(name):
+    """校验 "模式.表" 形式的表名，返回 (模式, 表)；省略模式时为连接用户（DM_USER）"""
+    parts = (name or '').strip().split('.')
+    if len(parts) > 2 or not all(_IDENTIFIER.match(part) for part in parts):
+        raise ExportError(f"【参数错误】表名格式错误：{name}")
+    if len(parts) == 1:
+        parts.insert(0, dm_config.DM_CONN_PARAMS['user'])
+    return parts[0].upper(), parts[1].upper()
+
+
+def parse_columns(text):
+    """解析 "ID,NAME" 形式的导出列列表（为空表示全部列）"""
+    columns = [name.strip() for name in (text or '').split(',') if name.strip()]
+    for name in columns:
+        if not _IDENTIFIER.match(name):
+            raise ExportError(f"【参数错误】列名格式错误：{name}")
+    return columns
+
+
+def is_export_table(table, patterns=EXPORT_TABLES):
+    name = '.'.join(parse_table(table))
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+
+
+def split_range(low, high, count):
+    """把键的取值范围 [low, high] 等宽切分为最多 count 段，返回 [(起, 止, 是否含止)]
+
+    整数键（含整数值的 Decimal）按整数切分且段数不超过取值个数；非整数的 DECIMAL/NUMERIC 键按 Decimal 精确切分
+    （首尾边界就是最小/最大值本身，不经浮点舍入），浮点键按浮点切分；后两者最后一段包含上界。
+    相邻分区共用同一个边界值（前段不含、后段含），边界的舍入不会造成遗漏或重复。
+    """
+    if low is None or high is None:
+        return []
+    if isinstance(low, Decimal) and isinstance(high, Decimal) \
+            and low == low.to_integral_value() and high == high.to_integral_value():
+        low, high = int(low), int(high)
+    if isinstance(low, int) and isinstance(high, int):
+        span = high - low + 1
+        count = max(1, min(count, span))
+        bounds = [low + span * i // count for i in range(count)] + [high + 1]
+        return [(bounds[i], bounds[i + 1], False) for i in range(count)]
+    count = max(1, count) if high > low else 1
+    if isinstance(low, Decimal) or isinstance(high, Decimal):
+        low, high = Decimal(low), Decimal(high)
+        # 中间边界取到与最小/最大值相同的小数位数（与列的精度一致，可直接绑定），只影响各段宽度
+        quantum = Decimal(1).scaleb(min(low.as_tuple().exponent, high.as_tuple().exponent))
+        with localcontext() as context:
+            context.prec = max(context.prec, 80)
+            step = (high - low) / count
+            bounds = [low] + [(low + step * i).quantize(quantum) for i in range(1, count)] + [high]
+    else:
+        low, high = float(low), float(high)
+        step = (high - low) / count
+        bounds = [low] + [low + step * i for i in range(1, count)] + [high]
+    # 浮点步长过小时相邻边界可能相等，去掉空段
+    bounds = [bound for index, bound in enumerate(bounds) if index == 0 or bound > bounds[index - 1]]
+    last = len(bounds) - 2
+    return [(bounds[i], bounds[i + 1], i == last) for i in range(len(bounds) - 1)] or [(low, high, True)]
+
+
+class Partition:
+    """一个扫描分区：键列条件与绑定参数"""
+
+    __slots__ = ('index', 'condition', 'params')
+
+    def __init__(self, index, condition, params=()):
+        self.index = index
+        self.condition = condition
+        self.params = params
+
+
+class ExportPlan:
+    """导出计划：表、键列、输出列、列信息（cursor.description）与分区"""
+
+    def __init__(self, table, key, columns, description, partitions, ordered=False):
+        self.table = table
+        self.key = key
+        self.columns = columns
+        self.description = description
+        self.partitions = partitions
+        self.ordered = ordered
+
+    def query(self, partition):
+        select = ', '.join(self.columns) if self.columns else '*'
+        sql = f"SELECT {select} FROM {self.table} WHERE {partition.condition}"
+        if self.ordered:
+            sql += f" ORDER BY {self.key}"
+        return sql
+
+
+def primary_key(cursor, owner, table):
+    """表的单列主键；没有主键或为联合主键时抛出 ExportError（需指定 key）"""
+    cursor.execute(PRIMARY_KEY_SQL, (owner, table))
+    columns = [row[0] for row in cursor.fetchall()]
+    if len(columns) != 1:
+        reason = '没有主键' if not columns else f"主键为多列（{', '.join(columns)}）"
+        raise ExportError(f"【参数错误】表 {owner}.{table} {reason}，请用 key 指定数值列")
+    return columns[0]
+
+
+def plan_export(conn, table, key=None, columns=None, partitions=EXPORT_PARALLEL * EXPORT_PARTITIONS_PER_WORKER,
+                ordered=False):
+    """在 conn 上生成导出计划：确定键列、读取其最小/最大值并切分分区
+
+    key 未指定时取主键；指定的列不是主键时另加一个 "键列 IS NULL" 分区（ordered 时排在最后）。
+    """
+    owner, name = parse_table(table)
+    table = f'{owner}.{name}'
+    columns = parse_columns(columns) if isinstance(columns, str) else list(columns or [])
+    cursor = conn.cursor()
+    try:
+        pk = None
+        if not key:
+            key = pk = primary_key(cursor, owner, name)
+        elif not _IDENTIFIER.match(key):
+            raise ExportError(f"【参数错误】键列格式错误：{key}")
+        select = ', '.join(columns) if columns else '*'
+        cursor.execute(f"SELECT {select} FROM {table} WHERE 1 = 0")
+        description = tuple(tuple(col) for col in cursor.description)
+        cursor.fetchall()
+        cursor.execute(f"SELECT MIN({key}), MAX({key}) FROM {table}")
+        low, high = cursor.fetchone()
+    finally:
+        cursor.close()
+    for value in (low, high):
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float, Decimal))):
+            raise ExportError(f"【参数错误】键列 {key} 不是数值类型，无法按范围切分")
+    plan = [Partition(index, f"{key} >= ? AND {key} {'<=' if inclusive else '<'} ?", (start, end))
+            for index, (start, end, inclusive) in enumerate(split_range(low, high, partitions))]
+    if pk is None:
+        plan.append(Partition(len(plan), f"{key} IS NULL"))
+    return ExportPlan(table, key, columns, description, plan, ordered)
+
+
+class ParallelExport:
+    """按导出计划并发扫描各分区，合并产出行的批
+
+    acquire() 借出连接（在扫描线程中调用，每个线程一个连接，依次扫描领取到的分区），
+    release(conn, error) 归还（error 为扫描失败的异常，成功时为 None）；guard(conn) 返回包住每次数据库访问
+    （execute、fetchmany）的上下文（如截止时间、准入名额），等待输出队列时不在其中。
+    扫描线程在调用方 contextvars 上下文的副本中运行。任一分区失败时停止其他扫描，iter_batches() 抛出该异常；
+    调用方提前关闭 iter_batches() 时扫描线程在当前批结束后退出并归还连接。
+    """
+
+    def __init__(self, plan, acquire, release, parallel=EXPORT_PARALLEL, batch_size=EXPORT_BATCH_SIZE,
+                 queue_depth=EXPORT_QUEUE_DEPTH, guard=None):
+        self.plan = plan
+        self.acquire = acquire
+        self.release = release
+        self.parallel = max(1, min(parallel, len(plan.partitions) or 1))
+        self.batch_size = max(batch_size, 1)
+        self.queue_depth = max(queue_depth, 1)
+        self.guard = guard or (lambda conn: nullcontext())
+        self.rows = 0
+        self._next = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._error = None
+        self._read_lobs = lob_reader(plan.description)
+        if plan.ordered:
+            self._queues = [queue.Queue(self.queue_depth) for _ in plan.partitions]
+        else:
+            shared = queue.Queue(self.queue_depth * self.parallel)
+            self._queues = [shared] * len(plan.partitions)
+
+    def iter_batches(self):
+        """产出各批行（ordered 时按分区顺序，否则按读取完成顺序）"""
+        if not self.plan.partitions:
+            return
+        for number in range(self.parallel):
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(self._scan,), name=f'dm-export-{number}', daemon=True).start()
+        try:
+            if self.plan.ordered:
+                for index in range(len(self.plan.partitions)):
+                    yield from self._drain(self._queues[index], 1)
+            else:
+                yield from self._drain(self._queues[0], len(self.plan.partitions))
+        finally:
+            self._stop.set()
+
+    def _drain(self, source, partitions):
+        """从队列取批，直到收到 partitions 个分区结束标记"""
+        while partitions:
+            try:
+                kind, value = source.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                if self._error is not None:
+                    raise self._error
+                continue
+            if kind == 'rows':
+                self.rows += len(value)
+                yield value
+            elif kind == 'done':
+                partitions -= 1
+            else:
+                raise value
+
+    def _take(self):
+        with self._lock:
+            if self._stop.is_set() or self._next >= len(self.plan.partitions):
+                return None
+            partition = self.plan.partitions[self._next]
+            self._next += 1
+            return partition
+
+    def _put(self, partition, item):
+        """放入分区对应的队列；已停止时返回 False"""
+        target = self._queues[partition.index]
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _scan(self):
+        conn = None
+        error = None
+        partition = None
+        try:
+            while True:
+                partition = self._take()
+                if partition is None:
+                    return
+                if conn is None:
+                    conn = self.acquire()
+                if not self._scan_partition(conn, partition):
+                    return
+        except Exception as e:
+            error = e
+            if self._error is None:
+                self._error = e
+            self._stop.set()
+            if partition is not None:
+                try:
+                    self._queues[partition.index].put_nowait(('error', e))
+                except queue.Full:
+                    pass
+        finally:
+            if conn is not None:
+                self.release(conn, error)
+
+    def _scan_partition(self, conn, partition):
+        cursor = conn.cursor()
+        try:
+            with self.guard(conn):
+                cursor.execute(self.plan.query(partition), partition.params)
+            while True:
+                with self.guard(conn):
+                    rows = cursor.fetchmany(self.batch_size)
+                    if rows and self._read_lobs is not None:
+                        rows = [self._read_lobs(row) for row in rows]
+                if not rows:
+                    break
+                if not self._put(partition, ('rows', rows)):
+                    return False
+            return self._put(partition, ('done', None))
+        finally:
+            cursor.close()
+
+
+def iter_csv_export(description, batches, header=True):
+    """CSV 输出（第一行为列名）：空值为空字段，datetime 为 %Y-%m-%d %H:%M:%S，二进制为 Base64；每批一个片段"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow([col[0] for col in description])
+        yield buffer.getvalue()
+    first, batches = peek_batches(batches)
+    convert_row = row_converter(text_converters(description, resolve_kinds(column_kinds(description), first)))
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows if convert_row is None else (convert_row(row) for row in rows))
+        yield buffer.getvalue()
+
+
+def iter_jsonl_export(description, batches):
+    """JSON Lines 输出：每行一个 {列名: 值} 对象（取值转换与 /jsonService 一致）；每批一个片段"""
+    columns = [col[0] for col in description]
+    encode = json.JSONEncoder(default=json_default, ensure_ascii=False, separators=(',', ':')).encode
+    for rows in json_ready_batches(description, batches):
+        yield ''.join(encode(dict(zip(columns, row))) + '\n' for row in rows)
+
+
+ENCODERS = {CSV: iter_csv_export, JSONL: iter_jsonl_export}
+
+
+def main(argv=None):
+    """命令行导出：python dm_export.py JZX.CDPORT --format csv --parallel 4 -o cdport.csv（连接参数取自 DM_* 环境变量）"""
+    from dm_pool import ConnectionPool
+
+    parser = argparse.ArgumentParser(description='达梦整表并发导出（按键列范围分区）')
+    parser.add_argument('table', help='表名（模式.表）')
+    parser.add_argument('--key', help='分区键列（数值类型），缺省为主键')
+    parser.add_argument('--columns', help='导出的列（逗号分隔），缺省为全部列')
+    parser.add_argument('--format', choices=sorted(ENCODERS), default=CSV)
+    parser.add_argument('--parallel', type=int, default=EXPORT_PARALLEL, help='并发扫描数')
+    parser.add_argument('--partitions', type=int, help='分区数，缺省为并发数 × DM_EXPORT_PARTITIONS_PER_WORKER')
+    parser.add_argument('--batch', type=int, default=EXPORT_BATCH_SIZE, help='每次 fetchmany 的行数')
+    parser.add_argument('--ordered', action='store_true', help='按键列顺序输出')
+    parser.add_argument('-o', '--output', help='输出文件，缺省为标准输出')
+    args = parser.parse_args(argv)
+
+    parallel = max(args.parallel, 1)
+    if args.partitions is not None and not 1 <= args.partitions <= EXPORT_MAX_PARTITIONS:
+        parser.error(f'--partitions 须在 1 到 {EXPORT_MAX_PARTITIONS} 之间（DM_EXPORT_MAX_PARTITIONS）')
+    pool = ConnectionPool(dm_config.load_driver(), dm_config.DM_CONN_PARAMS, min_size=0, max_size=parallel + 1)
+    started = time.perf_counter()
+    try:
+        with pool.connection() as conn:
+            plan = plan_export(conn, args.table, args.key, args.columns,
+                               args.partitions or parallel * EXPORT_PARTITIONS_PER_WORKER, args.ordered)
+        export = ParallelExport(plan, pool.acquire, lambda conn, error: pool.release(conn, discard=error is not None),
+                                parallel, args.batch)
+        output = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+        try:
+            for text in ENCODERS[args.format](plan.description, export.iter_batches()):
+                output.write(text)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+    except ExportError as e:
+        parser.exit(2, f"{e}\n")
+    finally:
+        pool.close()
+    seconds = time.perf_counter() - started
+    print(f"导出 {plan.table}：{export.rows} 行，{len(plan.partitions)} 个分区，并发 {export.parallel}，"
+          f"耗时 {seconds:.2f} 秒（{export.rows / seconds if seconds > 0 else 0:.0f} 行/秒）", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
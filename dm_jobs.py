@@ -0,0 +1,322 @@
+import contextvars
+import json
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import dm_config
+from dm_types import lob_reader
+
+# 异步作业：耗时较长的过程提交到后台线程池执行，结果集边读取边按批写入落盘文件，
+# 客户端凭作业ID查询状态并流式读取结果，不必一直占用请求与工作线程。
+# 作业状态保存在落盘目录的 JSON 文件中，多个工作进程共享同一目录，任一进程都能查询状态与读取结果
+
+JOBS_SPOOL_DIR = dm_config.env_str('DM_JOBS_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'dm_jobs'))
+JOBS_MAX_RUNNING = dm_config.env_int('DM_JOBS_MAX_RUNNING', 2)  # 每个工作进程同时执行的作业数
+JOBS_MAX_QUEUED = dm_config.env_int('DM_JOBS_MAX_QUEUED', 20)  # 每个工作进程排队等待的作业数上限
+JOBS_TTL = dm_config.env_float('DM_JOBS_TTL', 3600)  # 作业结束后结果保留的秒数
+JOBS_TIMEOUT = dm_config.env_float('DM_JOBS_TIMEOUT', 1800)  # 作业的缺省截止时间（秒）
+JOBS_CLEANUP_INTERVAL = dm_config.env_float('DM_JOBS_CLEANUP_INTERVAL', 60)  # 过期清理间隔
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+FINISHED = (SUCCEEDED, FAILED)
+
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class JobQueueFull(Exception):
+    """本进程的作业数已达上限；retry_after 为建议的重试等待秒数"""
+
+    def __init__(self, message, retry_after=5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class SpoolWriter:
+    """把结果集逐批写入落盘文件（pickle 记录序列：('set', description)、('rows', 批)、('end', 行数)）
+
+    写入临时文件，commit() 时改名为正式文件；CLOB 列的 LOB 对象写入前读出为字符串。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._tmp_path = f'{path}.{os.getpid()}.tmp'
+        self._file = open(self._tmp_path, 'wb')
+        self.row_counts = []
+
+    def write_result_set(self, description, batches):
+        description = tuple(tuple(col) for col in description)
+        read_lobs = lob_reader(description)
+        self._dump(('set', description))
+        count = 0
+        for batch in batches:
+            if read_lobs is not None:
+                batch = [read_lobs(row) for row in batch]
+            self._dump(('rows', batch))
+            count += len(batch)
+        self._dump(('end', count))
+        self.row_counts.append(count)
+        return count
+
+    def _dump(self, record):
+        # 每条记录独立序列化（不跨记录共享 memo），读取时逐条还原，无需保留已读记录
+        pickle.dump(record, self._file, protocol=4)
+
+    def commit(self):
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+
+def iter_spooled_result_sets(f, row_counts=None):
+    """读取落盘文件（以二进制方式打开的文件对象，读完或生成器关闭时关闭），产出 (description, batches, row_count)
+
+    调用方须在取下一个结果集前消费完 batches；row_counts 为作业状态中记录的各结果集行数。
+    """
+    with f:
+        index = 0
+        while True:
+            try:
+                kind, value = pickle.load(f)
+            except EOFError:
+                return
+            if kind != 'set':
+                continue
+            row_count = row_counts[index] if row_counts and index < len(row_counts) else None
+            batches = _iter_spooled_batches(f)
+            yield value, batches, row_count
+            # 调用方未读完的批次在此跳过
+            for _ in batches:
+                pass
+            index += 1
+
+
+def _iter_spooled_batches(f):
+    while True:
+        kind, value = pickle.load(f)
+        if kind == 'end':
+            return
+        yield value
+
+
+class JobStore:
+    """落盘目录中的作业状态（<id>.json）与结果（<id>.spool）"""
+
+    def __init__(self, directory=JOBS_SPOOL_DIR, ttl=JOBS_TTL):
+        self.directory = directory
+        self.ttl = ttl
+
+    def ensure_dir(self):
+        os.makedirs(self.directory, exist_ok=True)
+
+    def meta_path(self, job_id):
+        return os.path.join(self.directory, f'{job_id}.json')
+
+    def spool_path(self, job_id):
+        return os.path.join(self.directory, f'{job_id}.spool')
+
+    def save(self, job):
+        self.ensure_dir()
+        path = self.meta_path(job['id'])
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+
+    def load(self, job_id):
+        """读取作业状态；ID 格式不对或不存在时返回 None。执行进程已退出的未完成作业报告为失败"""
+        if not _JOB_ID.match(job_id or ''):
+            return None
+        try:
+            with open(self.meta_path(job_id), encoding='utf-8') as f:
+                job = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if job['status'] not in FINISHED and not _pid_alive(job['pid']):
+            job.update(status=FAILED, error='执行作业的工作进程已退出', error_code='WORKER_EXITED',
+                       finished_at=_now(), expires=time.time() + self.ttl)
+            try:
+                self.save(job)
+            except OSError:
+                pass
+        return job
+
+    def remove(self, job_id):
+        for path in (self.meta_path(job_id), self.spool_path(job_id)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def cleanup(self, now=None):
+        """删除已过期作业（结束超过 TTL）的状态与结果文件，以及遗留的结果/临时文件，返回删除的作业数"""
+        now = time.time() if now is None else now
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return 0
+        removed = 0
+        for name in names:
+            job_id, _, suffix = name.partition('.')
+            path = os.path.join(self.directory, name)
+            if suffix == 'json':
+                job = self.load(job_id)
+                if job is not None and job['status'] in FINISHED and job.get('expires', now) <= now:
+                    self.remove(job_id)
+                    removed += 1
+            elif suffix == 'spool' or suffix.endswith('tmp'):
+                # 状态文件已不存在的结果文件与临时文件
+                try:
+                    if now - os.path.getmtime(path) > self.ttl and not os.path.exists(self.meta_path(job_id)):
+                        os.remove(path)
+                except OSError:
+                    pass
+        return removed
+
+
+class JobManager:
+    """作业提交与执行（每个工作进程一个有界线程池）
+
+    run_job(job, spool) 在后台线程中执行过程并把结果集写入 spool（SpoolWriter），异常表示作业失败；
+    error_code(e) 把异常转为作业的错误码。
+    """
+
+    def __init__(self, run_job, error_code=None, store=None, max_running=JOBS_MAX_RUNNING,
+                 max_queued=JOBS_MAX_QUEUED, cleanup_interval=JOBS_CLEANUP_INTERVAL):
+        self.run_job = run_job
+        self.error_code = error_code or (lambda e: None)
+        self.store = store or JobStore()
+        self.max_running = max(max_running, 1)
+        self.max_queued = max(max_queued, 0)
+        self.cleanup_interval = cleanup_interval
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._pending = 0  # 本进程排队 + 执行中的作业数
+        self._cleaner = None
+        self._stats = {'submitted': 0, 'rejected': 0, 'succeeded': 0, 'failed': 0}
+
+    def submit(self, procedure, params, timeout=None):
+        """提交作业，返回作业状态；本进程作业数已满时抛出 JobQueueFull"""
+        with self._lock:
+            if self._pending >= self.max_running + self.max_queued:
+                self._stats['rejected'] += 1
+                raise JobQueueFull(f"作业数已达上限（执行中 + 排队：{self._pending}），请稍后重试")
+            self._pending += 1
+            self._stats['submitted'] += 1
+            executor = self._get_executor()
+        job = {
+            'id': uuid.uuid4().hex,
+            'procedure': procedure,
+            'params': params,
+            'timeout': timeout,
+            'status': QUEUED,
+            'pid': os.getpid(),
+            'created_at': _now(),
+            'started_at': None,
+            'finished_at': None,
+            'expires': None,
+        }
+        try:
+            self.store.save(job)
+            # 作业在全新的上下文中执行（不继承提交请求的日志上下文与截止时间）
+            executor.submit(contextvars.Context().run, self._run, job)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            self.store.remove(job['id'])
+            raise
+        return job
+
+    def get(self, job_id):
+        return self.store.load(job_id)
+
+    def result_path(self, job_id):
+        return self.store.spool_path(job_id)
+
+    def _get_executor(self):
+        # 调用方持有锁；fork 出的工作进程中首次使用时创建
+        if self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_running, thread_name_prefix='dm-job')
+            self._pid = os.getpid()
+            self._pending = 1
+        return self._executor
+
+    def _run(self, job):
+        started = time.perf_counter()
+        job.update(status=RUNNING, started_at=_now())
+        spool = None
+        try:
+            self.store.save(job)
+            spool = SpoolWriter(self.store.spool_path(job['id']))
+            self.run_job(job, spool)
+            spool.commit()
+            job.update(status=SUCCEEDED, result_sets=len(spool.row_counts), rows=spool.row_counts,
+                       spool_bytes=os.path.getsize(self.store.spool_path(job['id'])))
+        except Exception as e:
+            if spool is not None:
+                spool.abort()
+            job.update(status=FAILED, error=str(e), error_code=self.error_code(e))
+        finally:
+            job.update(finished_at=_now(), expires=time.time() + self.store.ttl,
+                       duration_ms=round((time.perf_counter() - started) * 1000, 3))
+            with self._lock:
+                self._pending -= 1
+                self._stats['succeeded' if job['status'] == SUCCEEDED else 'failed'] += 1
+            try:
+                self.store.save(job)
+            except OSError:
+                pass
+
+    def start(self):
+        """启动过期作业清理线程（守护线程）"""
+        self.store.ensure_dir()
+        if self._cleaner is not None or self.cleanup_interval <= 0:
+            return
+
+        def _run():
+            while True:
+                time.sleep(self.cleanup_interval)
+                try:
+                    self.store.cleanup()
+                except Exception:
+                    pass
+
+        self._cleaner = threading.Thread(target=_run, name='dm-job-cleanup', daemon=True)
+        self._cleaner.start()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data.update({'pending': self._pending if self._pid == os.getpid() else 0,
+                         'max_running': self.max_running, 'max_queued': self.max_queued})
+        return data
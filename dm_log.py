@@ -0,0 +1,261 @@
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+import dm_config
+
+# 结构化日志：请求线程只把日志记录放入内存队列（队列满时丢弃并计数，不阻塞），
+# 由后台线程统一格式化为 JSON Lines（或文本）写出；每条记录带请求ID，请求结束时输出一条含各阶段耗时的汇总
+
+LOG_LEVEL = dm_config.env_str('DM_LOG_LEVEL', 'INFO').upper()  # DEBUG 时输出连接、调用、结果集等明细
+LOG_FORMAT = dm_config.env_str('DM_LOG_FORMAT', 'json').lower()  # json 或 text
+LOG_FILE = dm_config.env_str('DM_LOG_FILE', '')  # 为空时写标准输出
+LOG_QUEUE_SIZE = dm_config.env_int('DM_LOG_QUEUE_SIZE', 10000)  # 待写出记录上限，超出的记录被丢弃
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# 记录中除标准属性外的结构化字段放在 extra={'fields': {...}} 中
+_current_request = contextvars.ContextVar('dm_request_log', default=None)
+
+_state_lock = threading.Lock()
+_state = {'pid': None, 'handler': None}
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """每条记录一行 JSON：ts、level、logger、pid、request_id、msg，以及 fields 与异常信息"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'pid': record.process,
+            'request_id': getattr(record, 'request_id', None),
+            'msg': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """便于在控制台阅读的单行文本格式"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        text = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            text += ' ' + json.dumps(fields, ensure_ascii=False, default=str)
+        return text
+
+
+class _RequestIdFilter(logging.Filter):
+    """在请求线程中为记录附加当前请求ID（入队之前执行；记录已显式指定时保留）"""
+
+    def filter(self, record):
+        if getattr(record, 'request_id', None) is None:
+            request_log = _current_request.get()
+            record.request_id = request_log.request_id if request_log else '-'
+        return True
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """非阻塞的队列处理器：队列满时丢弃记录并计数；关闭时停止后台写出线程并写完剩余记录"""
+
+    def __init__(self, log_queue, listener_handler):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.enqueued = 0
+        self._reported = 0
+        self.listener = logging.handlers.QueueListener(log_queue, listener_handler, respect_handler_level=True)
+
+    def prepare(self, record):
+        # 在请求线程中只合并消息参数、展开异常文本，格式化交给后台线程
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        super().emit(record)
+        # 丢弃数增加后，在队列有空间时补记一条警告
+        if self.dropped != self._reported and self.queue.qsize() < self.queue.maxsize // 2:
+            dropped, self._reported = self.dropped - self._reported, self.dropped
+            warning = logging.LogRecord(record.name, logging.WARNING, __file__, 0,
+                                        '日志队列已满，丢弃了 %d 条记录', (dropped,), None)
+            warning.request_id = '-'
+            self.enqueue(self.prepare(warning))
+
+    def close(self):
+        try:
+            if self.listener._thread is not None:
+                self.listener.stop()
+        finally:
+            super().close()
+
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, log_file=LOG_FILE, queue_size=LOG_QUEUE_SIZE):
+    """配置 dm 日志器（每个进程一次；fork 出的工作进程中再次调用会重建队列与后台线程）"""
+    with _state_lock:
+        if _state['pid'] == os.getpid():
+            return
+        logger = logging.getLogger('dm')
+        old = _state['handler']
+        if old is not None:
+            # fork 之前的后台线程在子进程中不存在，丢弃旧处理器即可
+            old.listener._thread = None
+            logger.removeHandler(old)
+
+        output = logging.handlers.WatchedFileHandler(log_file, encoding='utf-8') if log_file \
+            else logging.StreamHandler(sys.stdout)
+        output.setFormatter(TextFormatter() if fmt == 'text' else JsonLinesFormatter())
+
+        handler = _DroppingQueueHandler(queue.Queue(maxsize=max(queue_size, 1)), output)
+        handler.addFilter(_RequestIdFilter())
+        logger.addHandler(handler)
+        logger.setLevel(level)
+        logger.propagate = False
+        handler.listener.start()
+        _state.update(pid=os.getpid(), handler=handler)
+
+
+def log_stats():
+    handler = _state['handler']
+    if handler is None:
+        return {'enqueued': 0, 'dropped': 0, 'queued': 0, 'capacity': 0}
+    return {'enqueued': handler.enqueued, 'dropped': handler.dropped,
+            'queued': handler.queue.qsize(), 'capacity': handler.queue.maxsize}
+
+
+def get_logger(name):
+    return logging.getLogger('dm.' + name)
+
+
+# ---------------- 请求上下文与阶段耗时 ----------------
+
+class RequestLog:
+    """单个请求的日志上下文：请求ID、阶段耗时（毫秒，同名阶段累加）与汇总字段
+
+    阶段计时为独占时间：嵌套阶段的耗时不计入外层阶段，各阶段之和约等于被计时的总时间。
+    """
+
+    def __init__(self, request_id, **fields):
+        self.request_id = request_id
+        self.fields = fields
+        self.phases = {}
+        self.started = time.perf_counter()
+        self._stack = []
+        self._token = None
+        self._finished = False
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds * 1000
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        self._stack.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.add(name, elapsed - self._stack.pop())
+            if self._stack:
+                self._stack[-1] += elapsed
+
+    def finish(self, logger, status, **fields):
+        """输出请求汇总（只输出一次）并清除当前请求上下文"""
+        if self._finished:
+            return
+        self._finished = True
+        summary = dict(self.fields)
+        summary.update(fields)
+        summary['status'] = status
+        summary['duration_ms'] = round((time.perf_counter() - self.started) * 1000, 3)
+        summary['phases'] = {name: round(ms, 3) for name, ms in self.phases.items()}
+        level = logging.ERROR if status >= 500 else logging.WARNING if status >= 400 else logging.INFO
+        logger.log(level, '请求完成', extra={'fields': summary, 'request_id': self.request_id})
+        if self._token is not None:
+            try:
+                _current_request.reset(self._token)
+            except ValueError:
+                # 在其他上下文中结束（如流式响应由服务器在别处关闭），直接清空
+                _current_request.set(None)
+            self._token = None
+
+
+def begin_request(request_id=None, **fields):
+    """开始记录一个请求，返回 RequestLog 并设为当前请求上下文"""
+    request_log = RequestLog(request_id or uuid.uuid4().hex[:16], **fields)
+    request_log._token = _current_request.set(request_log)
+    return request_log
+
+
+def current_request():
+    return _current_request.get()
+
+
+def annotate(**fields):
+    """为当前请求的汇总记录补充字段"""
+    request_log = _current_request.get()
+    if request_log is not None:
+        request_log.fields.update(fields)
+
+
+@contextmanager
+def phase(name):
+    """记录当前请求的一个阶段耗时（不在请求中时不计时）"""
+    request_log = _current_request.get()
+    if request_log is None:
+        yield
+        return
+    with request_log.phase(name):
+        yield
+
+
+def timed_iter(iterable, name, request_log=None):
+    """包装迭代器：每次取下一项的耗时计入指定阶段（用于流式输出的读取/序列化计时）"""
+    request_log = request_log or _current_request.get()
+    iterator = iter(iterable)
+    if request_log is None:
+        yield from iterator
+        return
+    try:
+        while True:
+            with request_log.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+    finally:
+        # 提前关闭时同样关闭被包装的生成器（归还连接等清理依赖于此）
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            close()
@@ -0,0 +1,292 @@
+import bisect
+import json
+import math
+import os
+import threading
+import time
+
+import dm_config
+
+# 运行指标：计数器/仪表/直方图，按 Prometheus 文本格式（0.0.4）输出。
+# 不依赖 prometheus_client（打包环境中少一个依赖）；记录一次观测只需一次加锁与一次二分查找。
+# 多进程（prod）模式下每个工作进程各有一份指标；设置 DM_METRICS_DIR 后各进程定期把快照写入该目录，
+# /metrics 汇总所有进程（已退出进程的计数与直方图保留，仪表只取存活进程；服务启动前应清空该目录）
+
+METRICS_DIR = dm_config.env_str('DM_METRICS_DIR', '')  # 多进程汇总使用的共享目录，为空时只输出本进程
+METRICS_FLUSH_INTERVAL = dm_config.env_float('DM_METRICS_FLUSH_INTERVAL', 5)  # 快照写出间隔（秒）
+METRICS_MAX_PROCEDURES = dm_config.env_int('DM_METRICS_MAX_PROCEDURES', 200)  # 过程名标签上限，超出后记为 other
+
+# 延迟直方图默认分桶（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+        return tuple(str(value) for value in labels)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), self._copy(value)] for key, value in self._values.items()]
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    def render(self, samples):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for key, value in samples:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    @staticmethod
+    def merge(a, b):
+        return a + b
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, *labels, value):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    @staticmethod
+    def merge(a, b):
+        return a + b
+
+
+class Histogram(_Metric):
+    """累积分桶直方图；每组标签保存 [各桶计数..., 总和, 总数]"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *labels, value):
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            data[idx] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    @staticmethod
+    def _copy(value):
+        return list(value)
+
+    @staticmethod
+    def merge(a, b):
+        return [x + y for x, y in zip(a, b)]
+
+    def _render_sample(self, key, value):
+        lines = []
+        cumulative = 0
+        bounds = self.buckets + (math.inf,)
+        for bound, count in zip(bounds, value[:len(bounds)]):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f'{self.name}_sum{labels} {_format_value(value[-2])}')
+        lines.append(f'{self.name}_count{labels} {value[-1]}')
+        return lines
+
+
+class Registry:
+    """指标注册表；collector 为抓取时调用的函数，返回 [(名称, 类型, 说明, [(标签字典, 值), ...]), ...]"""
+
+    def __init__(self, directory=METRICS_DIR, flush_interval=METRICS_FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics = []
+        self._collectors = []
+        self._flusher_pid = None
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        self._collectors.append(collector)
+
+    # ---------- 多进程快照 ----------
+
+    def _snapshot_path(self, pid):
+        return os.path.join(self.directory, f'metrics-{pid}.json')
+
+    def write_snapshot(self):
+        """把本进程指标写入共享目录（先写临时文件再替换，读取方不会读到半个文件）"""
+        if not self.directory:
+            return
+        data = {'pid': os.getpid(), 'metrics': {metric.name: metric.snapshot() for metric in self._metrics}}
+        path = self._snapshot_path(os.getpid())
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def start_flusher(self):
+        """启动快照写出线程（每个进程一次；未配置共享目录时不启动）"""
+        if not self.directory or self._flusher_pid == os.getpid():
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._flusher_pid = os.getpid()
+
+        def _loop():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.write_snapshot()
+                except OSError:
+                    pass
+
+        threading.Thread(target=_loop, name='dm-metrics-flusher', daemon=True).start()
+
+    def _read_snapshots(self):
+        snapshots = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return snapshots
+        for name in names:
+            if not (name.startswith('metrics-') and name.endswith('.json')):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    @staticmethod
+    def _is_alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            return True
+        return True
+
+    def _merged_samples(self):
+        """各指标的样本；配置了共享目录时合并所有进程的快照（本进程使用实时值）"""
+        local = {metric.name: metric.snapshot() for metric in self._metrics}
+        if not self.directory:
+            return local
+        merged = {name: {tuple(key): value for key, value in samples} for name, samples in local.items()}
+        by_name = {metric.name: metric for metric in self._metrics}
+        for snapshot in self._read_snapshots():
+            pid = snapshot.get('pid')
+            if pid == os.getpid():
+                continue
+            alive = self._is_alive(pid)
+            for name, samples in snapshot.get('metrics', {}).items():
+                metric = by_name.get(name)
+                if metric is None or (metric.kind == 'gauge' and not alive):
+                    continue
+                target = merged[name]
+                for key, value in samples:
+                    key = tuple(key)
+                    target[key] = metric.merge(target[key], value) if key in target else value
+        return {name: sorted(samples.items()) for name, samples in merged.items()}
+
+    def render(self):
+        lines = []
+        samples = self._merged_samples()
+        for metric in self._metrics:
+            lines.extend(metric.render(samples.get(metric.name, [])))
+        for collector in self._collectors:
+            for name, kind, documentation, values in collector():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in values:
+                    lines.append(f'{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class LabelLimiter:
+    """限制标签取值的种类数（过程名来自请求参数，避免任意输入导致指标无限增长）"""
+
+    def __init__(self, limit=METRICS_MAX_PROCEDURES, overflow='other'):
+        self.limit = limit
+        self.overflow = overflow
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, value):
+        value = (value or '').upper()
+        if value in self._seen:
+            return value
+        with self._lock:
+            if len(self._seen) < self.limit:
+                self._seen.add(value)
+                return value
+        return self.overflow
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
@@ -0,0 +1,243 @@
+import base64
+import binascii
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import dm_config
+from dm_stream import FETCH_BATCH_SIZE
+from dm_types import lob_reader
+
+# 服务端游标分页：请求带 limit（或上一页返回的续页令牌）时只返回一个结果集中的一页。
+# 读到一页后游标（连同借出的连接）保留在本进程的游标登记表中，下一页直接 fetchmany 继续读取，不再重新 callproc；
+# 登记表有容量上限并按空闲时间淘汰。游标已被淘汰、过期或在其他工作进程中时，按令牌中的过程、参数与偏移重新执行并跳过已读的行
+
+# 每个工作进程保留的游标数，0 表示不保留。保留的游标各占用一个池化连接（连接池可用连接相应减少），
+# 但空闲期间不占用准入名额（DM_ADMISSION_MAX_IN_FLIGHT），应明显小于 DM_POOL_MAX
+PAGE_MAX_CURSORS = dm_config.env_int('DM_PAGE_MAX_CURSORS', 4)
+PAGE_CURSOR_TTL = dm_config.env_float('DM_PAGE_CURSOR_TTL', 60)  # 游标空闲超过该秒数后关闭
+PAGE_MAX_LIMIT = dm_config.env_int('DM_PAGE_MAX_LIMIT', 10000)  # 每页行数上限
+PAGE_REAP_INTERVAL = dm_config.env_float('DM_PAGE_REAP_INTERVAL', 5)  # 过期游标巡检间隔
+
+NEXT_TOKEN_HEADER = 'X-Next-Token'
+
+
+class PagingError(Exception):
+    """分页参数或续页令牌错误（400）"""
+
+
+class PageRequest:
+    """一页的位置：过程、参数、结果集序号（从 1 开始）、起始行偏移与行数；cursor_id 为可继续读取的服务端游标"""
+
+    __slots__ = ('procedure', 'params', 'set_index', 'offset', 'limit', 'cursor_id')
+
+    def __init__(self, procedure, params, set_index=1, offset=0, limit=PAGE_MAX_LIMIT, cursor_id=None):
+        self.procedure = procedure
+        self.params = params
+        self.set_index = set_index
+        self.offset = offset
+        self.limit = limit
+        self.cursor_id = cursor_id
+
+    def next(self, rows, cursor_id=None):
+        """读取 rows 行之后的下一页"""
+        return PageRequest(self.procedure, self.params, self.set_index, self.offset + rows, self.limit, cursor_id)
+
+    def to_token(self):
+        data = {'p': self.procedure, 'a': self.params, 's': self.set_index, 'o': self.offset, 'l': self.limit}
+        if self.cursor_id:
+            data['c'] = self.cursor_id
+        text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+        return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii').rstrip('=')
+
+    @classmethod
+    def from_token(cls, token):
+        try:
+            text = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode('utf-8')
+            data = json.loads(text)
+            page = cls(str(data['p']), data.get('a') or '', int(data['s']), int(data['o']), int(data['l']),
+                       data.get('c') or None)
+            # 参数与游标ID须是字符串（用作缓存、请求合并与游标登记表的键）
+            if not isinstance(page.params, str) or not isinstance(page.cursor_id, (str, type(None))):
+                raise ValueError(page.params)
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError, AttributeError):
+            raise PagingError("【参数错误】续页令牌（token）无效")
+        if page.set_index < 1 or page.offset < 0 or page.limit < 1:
+            raise PagingError("【参数错误】续页令牌（token）无效")
+        return page
+
+
+def _int_param(data, name, default, minimum):
+    value = data.get(name)
+    if value is None or str(value).strip() == '':
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise PagingError(f"【参数错误】{name} 必须是整数")
+    if value < minimum:
+        raise PagingError(f"【参数错误】{name} 不能小于 {minimum}")
+    return value
+
+
+def parse_page_request(data, procedure, params, max_limit=PAGE_MAX_LIMIT):
+    """由请求参数（set、limit、offset、token）得到 PageRequest；没有 limit 与 token 时返回 None（不分页）
+
+    带 token 时过程、参数、结果集与偏移取自令牌，limit 可另行指定；param1 与令牌中的过程不一致时报错。
+    """
+    token = str(data.get('token', '') or '').strip()
+    if token:
+        page = PageRequest.from_token(token)
+        if procedure and procedure.upper() != page.procedure.upper():
+            raise PagingError("【参数错误】续页令牌与存储过程名（param1）不一致")
+        page.limit = min(_int_param(data, 'limit', page.limit, 1), max_limit)
+        return page
+    if data.get('limit') in (None, ''):
+        return None
+    return PageRequest(procedure, params, _int_param(data, 'set', 1, 1), _int_param(data, 'offset', 0, 0),
+                       min(_int_param(data, 'limit', max_limit, 1), max_limit))
+
+
+def seek_result_set(cursor, set_index):
+    """把刚执行过的游标移到第 set_index 个结果集（只计有列信息的结果集），不存在时返回 False"""
+    index = 0
+    while True:
+        if cursor.description:
+            index += 1
+            if index == set_index:
+                return True
+        if not cursor.nextset():
+            return False
+
+
+def skip_rows(cursor, count, batch_size=FETCH_BATCH_SIZE):
+    """按批读取并丢弃 count 行（重新执行后跳过已返回的行），返回实际跳过的行数"""
+    skipped = 0
+    while skipped < count:
+        rows = cursor.fetchmany(min(batch_size, count - skipped))
+        if not rows:
+            break
+        skipped += len(rows)
+    return skipped
+
+
+class PagedCursor:
+    """停在某个结果集中间的游标：连接、游标、已读行数与预读的一行（用于判断是否还有下一页）"""
+
+    __slots__ = ('id', 'conn', 'cursor', 'description', 'procedure', 'params', 'set_index', 'offset',
+                 '_pending', '_read_lobs', 'expires')
+
+    def __init__(self, conn, cursor, procedure, params, set_index, offset):
+        self.id = uuid.uuid4().hex
+        self.conn = conn
+        self.cursor = cursor
+        self.description = tuple(tuple(col) for col in cursor.description)
+        self.procedure = procedure
+        self.params = params
+        self.set_index = set_index
+        self.offset = offset
+        self._pending = []
+        self._read_lobs = lob_reader(self.description)
+        self.expires = None
+
+    def matches(self, page):
+        return (self.procedure.upper() == page.procedure.upper() and self.params == page.params
+                and self.set_index == page.set_index and self.offset == page.offset)
+
+    def fetch(self, limit):
+        """读取最多 limit 行，返回 (行列表, 是否还有下一页)
+
+        多读一行判断是否还有剩余（留到下一页返回）；CLOB 值在此读出为字符串，
+        游标归还登记表后连接可能被下一页的请求使用，响应编码时不再访问数据库。
+        """
+        rows = self._pending
+        if len(rows) < limit:
+            rows += self.cursor.fetchmany(limit - len(rows))
+        self._pending = rows[limit:] or (self.cursor.fetchmany(1) if len(rows) >= limit else [])
+        rows = rows[:limit]
+        if self._read_lobs is not None:
+            rows = [self._read_lobs(row) for row in rows]
+        self.offset += len(rows)
+        return rows, bool(self._pending)
+
+
+class CursorRegistry:
+    """本进程的服务端游标登记表（线程安全）
+
+    take() 取出（独占）与令牌位置一致的游标，读完一页后 put() 放回；超出容量时关闭最久未用的游标，
+    空闲超过 ttl 的游标由巡检线程关闭。close(entry) 负责关闭游标并归还连接（在锁外调用）。
+    """
+
+    def __init__(self, close, max_cursors=PAGE_MAX_CURSORS, ttl=PAGE_CURSOR_TTL, reap_interval=PAGE_REAP_INTERVAL):
+        self.close = close
+        self.max_cursors = max(max_cursors, 0)
+        self.ttl = ttl
+        self.reap_interval = reap_interval
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # 游标ID -> PagedCursor（按最近使用排序）
+        self._thread = None
+        self._stats = {'hits': 0, 'misses': 0, 'evicted': 0, 'expired': 0}
+
+    def take(self, page):
+        """取出可继续读取 page 的游标；不存在、已过期或位置不一致（如重放旧令牌）时返回 None"""
+        if not page.cursor_id:
+            return None
+        with self._lock:
+            entry = self._entries.get(page.cursor_id)
+            if entry is None or not entry.matches(page) or entry.expires <= time.monotonic():
+                self._stats['misses'] += 1
+                return None
+            del self._entries[page.cursor_id]
+            self._stats['hits'] += 1
+        return entry
+
+    def put(self, entry):
+        """放回游标供下一页继续读取，返回是否保留（容量为 0 时不保留，由调用方关闭）"""
+        if self.max_cursors <= 0:
+            return False
+        evicted = []
+        with self._lock:
+            entry.expires = time.monotonic() + self.ttl
+            self._entries[entry.id] = entry
+            while len(self._entries) > self.max_cursors:
+                evicted.append(self._entries.popitem(last=False)[1])
+            self._stats['evicted'] += len(evicted)
+        for old in evicted:
+            self.close(old)
+        return True
+
+    def reap(self, now=None):
+        """关闭空闲超过 ttl 的游标，返回关闭的个数"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = [entry for entry in self._entries.values() if entry.expires <= now]
+            for entry in expired:
+                del self._entries[entry.id]
+            self._stats['expired'] += len(expired)
+        for entry in expired:
+            self.close(entry)
+        return len(expired)
+
+    def start(self):
+        """启动过期游标巡检线程（守护线程）"""
+        if self._thread is not None or self.max_cursors <= 0 or self.reap_interval <= 0:
+            return
+
+        def _run():
+            while True:
+                time.sleep(self.reap_interval)
+                try:
+                    self.reap()
+                except Exception:
+                    pass
+
+        self._thread = threading.Thread(target=_run, name='dm-page-reaper', daemon=True)
+        self._thread.start()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data.update({'open': len(self._entries), 'max_cursors': self.max_cursors, 'ttl': self.ttl})
+        return data
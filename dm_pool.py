@@ -0,0 +1,292 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import dm_config
+
+
+class PoolTimeoutError(Exception):
+    """在 checkout_timeout 内没有借到连接"""
+
+
+class _PooledConnection:
+    """连接池内部记录：原始连接 + 创建/最近使用时间"""
+
+    __slots__ = ('conn', 'created_at', 'last_used')
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """线程安全的达梦连接池
+
+    - 连接数量限制在 [min_size, max_size]，超过上限的借用请求排队等待，超时抛出 PoolTimeoutError
+    - 空闲超过 idle_timeout 的连接被回收（保留 min_size 个），存活超过 max_lifetime 的连接被重建
+    - 空闲超过 ping_after 秒的连接在借出前执行 validation_sql 校验，失败则丢弃重取
+    - driver 为 dmPython 模块（或实现 connect()/DatabaseError 的替身模块，便于本地测试）
+    """
+
+    def __init__(self, driver, conn_params,
+                 min_size=dm_config.POOL_MIN_SIZE,
+                 max_size=dm_config.POOL_MAX_SIZE,
+                 idle_timeout=dm_config.POOL_IDLE_TIMEOUT,
+                 max_lifetime=dm_config.POOL_MAX_LIFETIME,
+                 checkout_timeout=dm_config.POOL_CHECKOUT_TIMEOUT,
+                 ping_after=dm_config.POOL_PING_AFTER,
+                 validation_sql=dm_config.POOL_VALIDATION_SQL):
+        if max_size < 1:
+            raise ValueError("max_size 必须大于 0")
+        self.driver = driver
+        self.conn_params = dict(conn_params)
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.checkout_timeout = checkout_timeout
+        self.ping_after = ping_after
+        self.validation_sql = validation_sql
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # 右端为最近归还的连接（LIFO 借出，让多余连接自然空闲过期）
+        self._in_use = {}  # id(conn) -> _PooledConnection
+        self._size = 0  # 空闲 + 借出 + 正在创建的连接总数
+        self._waiting = 0
+        self._closed = False
+        self._reaper = None
+        self._stats = {
+            'created': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'timeouts': 0,
+            'validation_failures': 0,
+            'recycled_lifetime': 0,
+            'evicted_idle': 0,
+            'wait_time_total': 0.0,
+        }
+
+    # ---------------- 借出 / 归还 ----------------
+
+    def acquire(self, timeout=None):
+        """借出一个连接；timeout 为 None 时使用 checkout_timeout"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        while True:
+            item, expired = self._take(deadline)
+            self._close_all(expired)
+
+            if item is None:
+                # 已预留名额，新建连接（在锁外进行，避免阻塞其他线程）
+                try:
+                    item = _PooledConnection(self.driver.connect(**self.conn_params))
+                except BaseException:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._stats['created'] += 1
+            elif not self._validate(item):
+                self._discard(item)
+                continue
+
+            item.last_used = time.monotonic()
+            with self._cond:
+                self._in_use[id(item.conn)] = item
+                self._stats['checkouts'] += 1
+                self._stats['wait_time_total'] += item.last_used - start
+            return item.conn
+
+    def release(self, conn, discard=False):
+        """归还连接；discard=True 表示连接已不可用，直接关闭"""
+        with self._cond:
+            item = self._in_use.pop(id(conn), None)
+        if item is None:
+            return
+        now = time.monotonic()
+        if discard or self._closed or now - item.created_at >= self.max_lifetime:
+            if not discard and not self._closed:
+                with self._cond:
+                    self._stats['recycled_lifetime'] += 1
+            self._discard(item)
+            return
+        item.last_used = now
+        with self._cond:
+            self._idle.append(item)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """with pool.connection() as conn: ... 异常时回滚，回滚失败则丢弃连接"""
+        conn = self.acquire(timeout)
+        discard = False
+        try:
+            yield conn
+        except BaseException:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    # ---------------- 维护 ----------------
+
+    def fill(self):
+        """预热：补足 min_size 个空闲连接（启动时调用）"""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                item = _PooledConnection(self.driver.connect(**self.conn_params))
+            except BaseException:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats['created'] += 1
+                self._idle.append(item)
+                self._cond.notify()
+
+    def reap(self):
+        """回收空闲过期 / 超过存活时间的空闲连接"""
+        with self._cond:
+            expired = self._collect_expired(time.monotonic())
+        self._close_all(expired)
+        return len(expired)
+
+    def start_reaper(self, interval=dm_config.POOL_REAP_INTERVAL):
+        """启动后台回收线程（守护线程，进程退出时自动结束）"""
+        if self._reaper is not None or interval <= 0:
+            return
+
+        def _run():
+            while not self._closed:
+                time.sleep(interval)
+                try:
+                    self.reap()
+                    self.fill()
+                except Exception:
+                    pass
+
+        self._reaper = threading.Thread(target=_run, name='dm-pool-reaper', daemon=True)
+        self._reaper.start()
+
+    def close(self):
+        """关闭连接池及所有空闲连接；借出中的连接在归还时关闭"""
+        with self._cond:
+            self._closed = True
+            items = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        self._close_all(items)
+
+    def stats(self):
+        """连接池统计信息"""
+        with self._cond:
+            data = dict(self._stats)
+            data.update({
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'waiting': self._waiting,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            })
+        data['wait_time_total'] = round(data['wait_time_total'], 6)
+        return data
+
+    # ---------------- 内部方法 ----------------
+
+    def _take(self, deadline):
+        """在锁内取出一个空闲连接，或预留新建名额（返回 None）；同时收集需关闭的过期连接"""
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeoutError("连接池已关闭")
+                expired = self._collect_expired(time.monotonic())
+                if self._idle:
+                    return self._idle.pop(), expired
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, expired
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f"获取数据库连接超时（连接池已满：{self._size}/{self.max_size}）")
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+    def _collect_expired(self, now):
+        """从空闲队列中摘除过期连接（调用方持有锁），并扣减计数"""
+        if not self._idle:
+            return []
+        keep = deque()
+        expired = []
+        # 从最近使用的一端开始保留，最久未用的连接优先被回收
+        for item in reversed(self._idle):
+            if now - item.created_at >= self.max_lifetime:
+                self._stats['recycled_lifetime'] += 1
+                expired.append(item)
+            elif (now - item.last_used >= self.idle_timeout
+                  and self._size - len(expired) > self.min_size):
+                self._stats['evicted_idle'] += 1
+                expired.append(item)
+            else:
+                keep.appendleft(item)
+        self._idle = keep
+        self._size -= len(expired)
+        if expired:
+            self._cond.notify(len(expired))
+        return expired
+
+    def _validate(self, item):
+        """空闲超过 ping_after 的连接执行校验语句"""
+        if time.monotonic() - item.last_used < self.ping_after:
+            return True
+        cursor = None
+        try:
+            cursor = item.conn.cursor()
+            cursor.execute(self.validation_sql)
+            cursor.fetchall()
+            return True
+        except Exception:
+            with self._cond:
+                self._stats['validation_failures'] += 1
+            return False
+        finally:
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+
+    def _discard(self, item):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+        self._close_all([item])
+
+    def _close_all(self, items):
+        for item in items:
+            try:
+                item.conn.close()
+            except Exception:
+                pass
+        if items:
+            with self._cond:
+                self._stats['closed'] += len(items)
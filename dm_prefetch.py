@@ -0,0 +1,209 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import dm_config
+
+# 热点过程预取：按配置的 (过程, 参数) 在后台定期重新执行，保存最新的结果快照并整体替换，
+# 请求直接读取快照（stale-while-revalidate）：快照超过刷新间隔仍可在 max_stale 秒内返回，同时立即触发一次刷新，
+# 第一个请求不再承担执行耗时。快照保存在各工作进程内存中，每个工作进程各自刷新
+
+
+def parse_targets(text, default_interval=30.0):
+    """解析预取配置，返回 [(过程, 参数, 刷新间隔秒数)]
+
+    支持 JSON 列表 '[{"procedure": "JZX.GET_TEST0", "params": "", "interval": 30}]'，
+    或简写 "JZX.GET_TEST0=30,JZX.GET_TEST1:参数=60"（参数中不能含逗号）。
+    """
+    text = (text or '').strip()
+    if not text:
+        return []
+    if text.startswith('['):
+        return [(item['procedure'], str(item.get('params', '')), float(item.get('interval', default_interval)))
+                for item in json.loads(text)]
+    targets = []
+    for item in text.split(','):
+        spec, sep, interval = item.strip().rpartition('=')
+        if not sep:
+            spec, interval = interval, ''
+        procedure, _, params = spec.partition(':')
+        if not procedure.strip():
+            continue
+        try:
+            seconds = float(interval) if interval.strip() else default_interval
+        except ValueError:
+            continue
+        targets.append((procedure.strip(), params, seconds))
+    return targets
+
+
+PREFETCH_TARGETS = parse_targets(dm_config.env_str('DM_PREFETCH', ''))  # 预取的过程、参数与刷新间隔
+PREFETCH_MAX_STALE = dm_config.env_float('DM_PREFETCH_MAX_STALE', 300)  # 快照过期后仍可返回的秒数
+PREFETCH_RETRY_INTERVAL = dm_config.env_float('DM_PREFETCH_RETRY_INTERVAL', 5)  # 刷新失败后的重试间隔上限
+PREFETCH_WORKERS = dm_config.env_int('DM_PREFETCH_WORKERS', 2)  # 每个工作进程同时刷新的过程数
+
+
+class Snapshot:
+    """一次刷新的结果（只读，被多个请求共享）"""
+
+    __slots__ = ('value', 'loaded_at', 'loaded_time')
+
+    def __init__(self, value):
+        self.value = value
+        self.loaded_at = time.monotonic()
+        self.loaded_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    def age(self, now=None):
+        return (time.monotonic() if now is None else now) - self.loaded_at
+
+
+class _Target:
+    __slots__ = ('procedure', 'params', 'interval', 'snapshot', 'next_due', 'refreshing',
+                 'refreshes', 'failures', 'last_error', 'last_duration')
+
+    def __init__(self, procedure, params, interval):
+        self.procedure = procedure
+        self.params = params
+        self.interval = max(interval, 0.1)
+        self.snapshot = None
+        self.next_due = 0.0
+        self.refreshing = False
+        self.refreshes = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_duration = None
+
+
+class Prefetcher:
+    """预取调度器（线程安全）
+
+    loader(procedure, params) 在后台线程的全新上下文中执行并返回结果；
+    on_refresh(procedure, seconds, success) 在每次刷新结束时调用（用于指标）。
+    """
+
+    def __init__(self, loader, targets=None, max_stale=PREFETCH_MAX_STALE,
+                 retry_interval=PREFETCH_RETRY_INTERVAL, workers=PREFETCH_WORKERS, on_refresh=None):
+        self.loader = loader
+        self.max_stale = max_stale
+        self.retry_interval = retry_interval
+        self.workers = max(workers, 1)
+        self.on_refresh = on_refresh
+        self._targets = {}
+        for procedure, params, interval in (PREFETCH_TARGETS if targets is None else targets):
+            self._targets[self.make_key(procedure, params)] = _Target(procedure, params, interval)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._executor = None
+        self._stats = {'hits': 0, 'stale_hits': 0, 'too_stale': 0}
+
+    @staticmethod
+    def make_key(procedure, params):
+        return (procedure or '').upper(), params
+
+    def get(self, procedure, params):
+        """读取快照，返回 (结果, 是否新鲜)；未配置预取、尚无快照或超过 max_stale 时返回 None
+
+        快照超过刷新间隔时仍返回（不新鲜），并立即安排一次刷新。
+        """
+        target = self._targets.get(self.make_key(procedure, params))
+        if target is None:
+            return None
+        snapshot = target.snapshot
+        if snapshot is None:
+            return None
+        age = snapshot.age()
+        if age <= target.interval:
+            with self._cond:
+                self._stats['hits'] += 1
+            return snapshot.value, True
+        with self._cond:
+            if not target.refreshing and target.next_due > time.monotonic():
+                target.next_due = 0.0
+                self._cond.notify()
+            if age > target.interval + self.max_stale:
+                self._stats['too_stale'] += 1
+                return None
+            self._stats['stale_hits'] += 1
+        return snapshot.value, False
+
+    def refresh(self, target):
+        """执行一次刷新，成功时整体替换快照（在调度线程池中调用）"""
+        started = time.monotonic()
+        success = False
+        try:
+            value = contextvars.Context().run(self.loader, target.procedure, target.params)
+            target.snapshot = Snapshot(value)
+            target.last_error = None
+            success = True
+        except Exception as e:
+            target.last_error = str(e)
+        duration = time.monotonic() - started
+        with self._cond:
+            target.refreshing = False
+            target.last_duration = duration
+            target.refreshes += 1
+            if success:
+                # 提前一个刷新耗时开始下一次刷新，使快照在到达刷新间隔前被替换
+                target.next_due = time.monotonic() + max(target.interval - duration, 0)
+            else:
+                target.failures += 1
+                target.next_due = time.monotonic() + min(target.interval, self.retry_interval)
+            self._cond.notify()
+        if self.on_refresh is not None:
+            self.on_refresh(target.procedure, duration, success)
+
+    def start(self):
+        """启动调度线程（守护线程）；首次刷新立即执行，各工作进程错开启动时间，避免同时刷新"""
+        if self._thread is not None or not self._targets:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='dm-prefetch')
+        offset = (os.getpid() % 10) / 10
+        with self._cond:
+            for target in self._targets.values():
+                target.next_due = time.monotonic() + offset * min(target.interval, 1)
+        self._thread = threading.Thread(target=self._run, name='dm-prefetch', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                due = [target for target in self._targets.values()
+                       if not target.refreshing and target.next_due <= now]
+                for target in due:
+                    target.refreshing = True
+                if not due:
+                    waiting = [target.next_due for target in self._targets.values() if not target.refreshing]
+                    self._cond.wait(min(waiting) - now if waiting else None)
+                    continue
+            for target in due:
+                self._executor.submit(self.refresh, target)
+
+    def status(self):
+        """各预取项的快照时间、年龄与最近一次刷新耗时（用于 /admin/prefetch 与 /metrics）"""
+        now = time.monotonic()
+        items = []
+        with self._cond:
+            stats = dict(self._stats)
+            for target in self._targets.values():
+                snapshot = target.snapshot
+                items.append({
+                    'procedure': target.procedure,
+                    'params': target.params,
+                    'interval': target.interval,
+                    'loaded_time': snapshot.loaded_time if snapshot else None,
+                    'age': round(snapshot.age(now), 3) if snapshot else None,
+                    'fresh': snapshot is not None and snapshot.age(now) <= target.interval,
+                    'refreshing': target.refreshing,
+                    'last_duration': round(target.last_duration, 6) if target.last_duration is not None else None,
+                    'refreshes': target.refreshes,
+                    'failures': target.failures,
+                    'last_error': target.last_error,
+                })
+        stats['targets'] = items
+        stats['max_stale'] = self.max_stale
+        return stats
@@ -0,0 +1,172 @@
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+import dm_config
+
+# 启动预检：加密库检查与连接池预热只在启动时执行一次，之后由后台线程定期刷新，
+# 请求路径只读取缓存的检查结果，不再访问文件系统
+
+REQUIRED_DM_LIBS = ["libcryptocme.so", "libdmcrypt.so", "libdmdpi.so", "libdmgmssl.so"]
+PREFLIGHT_REFRESH_INTERVAL = dm_config.env_float('DM_PREFLIGHT_REFRESH_INTERVAL', 15)  # 就绪状态后台刷新间隔（秒）
+
+
+def lib_search_dirs():
+    """加密库查找目录：DM_LIBS_DIR、运行目录、运行目录下的 dm_libs、PyInstaller 解包目录、脚本目录"""
+    dirs = []
+    if os.environ.get('DM_LIBS_DIR'):
+        dirs.append(os.environ['DM_LIBS_DIR'])
+    dirs.append(os.getcwd())
+    dirs.append(os.path.join(os.getcwd(), 'dm_libs'))
+    if getattr(sys, '_MEIPASS', None):
+        dirs.append(sys._MEIPASS)
+    dirs.append(os.path.dirname(os.path.abspath(sys.argv[0] if sys.argv and sys.argv[0] else __file__)))
+    unique = []
+    for path in dirs:
+        if path not in unique:
+            unique.append(path)
+    return unique
+
+
+def check_libs(required_libs=REQUIRED_DM_LIBS, search_dirs=None):
+    """检查加密库，返回 {库名: {'path': 路径, 'size': 字节数}}，缺失或为空的库 path 为 None"""
+    search_dirs = lib_search_dirs() if search_dirs is None else search_dirs
+    result = {}
+    for lib in required_libs:
+        found = {'path': None, 'size': 0}
+        for directory in search_dirs:
+            lib_path = os.path.join(directory, lib)
+            try:
+                size = os.path.getsize(lib_path)
+            except OSError:
+                continue
+            if size > 0:
+                found = {'path': lib_path, 'size': size}
+                break
+        result[lib] = found
+    return result
+
+
+class Preflight:
+    """启动预检与就绪状态
+
+    run() 在启动时执行一次：检查加密库、预热连接池并打印报告；
+    start() 启动后台线程定期刷新就绪状态（加密库 + 数据库连通性 + 连接池预热）；
+    require_libs() 供请求路径使用，只读内存中的检查结果。
+    """
+
+    def __init__(self, pool, required_libs=REQUIRED_DM_LIBS, refresh_interval=PREFLIGHT_REFRESH_INTERVAL):
+        self.pool = pool
+        self.required_libs = list(required_libs)
+        self.refresh_interval = refresh_interval
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._missing_libs = None  # None 表示尚未检查
+        self._state = {'ready': False, 'checked_at': None, 'checks': {}}
+
+    def run(self, verbose=True):
+        """执行一次完整预检（启动时调用），返回就绪状态"""
+        libs = check_libs(self.required_libs)
+        if verbose:
+            print("\n" + "=" * 50)
+            print("【启动预检】检查加密库依赖文件")
+            print(f"1. 当前运行目录：{os.getcwd()}")
+            print(f"2. LD_LIBRARY_PATH：{os.environ.get('LD_LIBRARY_PATH', '未设置')}")
+            for lib, info in libs.items():
+                if info['path']:
+                    print(f"✅ 找到有效加密库：{info['path']}（大小：{info['size']}字节）")
+                else:
+                    print(f"❌ 缺失或损坏的加密库：{lib}（查找目录：{', '.join(lib_search_dirs())}）")
+        state = self.refresh(libs)
+        if verbose:
+            if state['ready']:
+                print(f"✅ 预检通过，连接池已预热（{self.pool.stats()['size']} 个连接）")
+            else:
+                failed = [name for name, check in state['checks'].items() if not check['ok']]
+                print(f"❌ 预检未通过：{', '.join(failed)}（后台每 {self.refresh_interval} 秒重试）")
+            print("=" * 50)
+        return state
+
+    def refresh(self, libs=None):
+        """重新检查加密库、数据库连通性与连接池预热状态，更新缓存的就绪状态"""
+        libs = check_libs(self.required_libs) if libs is None else libs
+        missing = [lib for lib, info in libs.items() if not info['path']]
+        checks = {
+            'libs': {'ok': not missing, 'missing': missing},
+        }
+
+        if missing:
+            checks['database'] = {'ok': False, 'error': '加密库缺失，跳过数据库检查'}
+        else:
+            checks['database'] = self._check_database()
+
+        pool_stats = self.pool.stats()
+        checks['pool'] = {
+            'ok': pool_stats['size'] >= pool_stats['min_size'],
+            'size': pool_stats['size'],
+            'min_size': pool_stats['min_size'],
+        }
+
+        state = {
+            'ready': all(check['ok'] for check in checks.values()),
+            'checked_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'checks': checks,
+        }
+        with self._lock:
+            self._missing_libs = missing
+            self._state = state
+        return state
+
+    def start(self):
+        """启动后台刷新线程（守护线程）"""
+        if self._thread is not None or self.refresh_interval <= 0:
+            return
+
+        def _run():
+            while True:
+                time.sleep(self.refresh_interval)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    with self._lock:
+                        self._state = dict(self._state, ready=False, error=str(e))
+
+        self._thread = threading.Thread(target=_run, name='dm-preflight', daemon=True)
+        self._thread.start()
+
+    def require_libs(self):
+        """请求路径调用：加密库缺失时抛出异常（首次调用前未预检时补做一次检查）"""
+        with self._lock:
+            missing = self._missing_libs
+        if missing is None:
+            missing = [lib for lib, info in check_libs(self.required_libs).items() if not info['path']]
+            with self._lock:
+                self._missing_libs = missing
+        if missing:
+            raise Exception(f"【致命错误】缺失加密库：{', '.join(missing)}，无法连接数据库")
+
+    def liveness(self):
+        return {'status': 'ok', 'uptime': round(time.time() - self.started_at, 3)}
+
+    def readiness(self):
+        with self._lock:
+            return dict(self._state)
+
+    def _check_database(self):
+        """借出连接执行校验语句，同时补足连接池最小连接数"""
+        start = time.monotonic()
+        try:
+            self.pool.fill()
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(self.pool.validation_sql)
+                    cursor.fetchall()
+                finally:
+                    cursor.close()
+        except Exception as e:
+            return {'ok': False, 'error': str(e)}
+        return {'ok': True, 'latency_ms': round((time.monotonic() - start) * 1000, 3)}
@@ -0,0 +1,111 @@
+import sys
+import weakref
+
+from dm_buffer import RowBuffer, SpilledRows
+from dm_etag import Fingerprint
+from dm_stream import FETCH_BATCH_SIZE, iter_row_batches
+from dm_types import lob_reader
+
+# 紧凑结果集：列信息只保存一次，行以元组保存，不再为每行构建字典；
+# 字典形式的JSON、列式JSON与XML都由同一对象按需（惰性）生成。
+# 读取时超出内存预算的结果集，行保存在 mmap 临时文件中（见 dm_buffer），接口不变
+
+
+class ResultSet:
+    """单个结果集
+
+    columns 为列名列表，description 为 cursor.description 原样保存（列类型等信息），
+    rows 为行元组列表（或溢出到临时文件的 SpilledRows，同样支持 len() 与遍历），
+    digest 为读取时计算的数据指纹（用于 ETag，未计算时为 None）。
+    对象可能被缓存并在多个请求间共享，只读使用。
+    """
+
+    __slots__ = ('columns', 'description', 'rows', 'digest', '__weakref__')
+
+    def __init__(self, description, rows=None, digest=None):
+        self.description = tuple(tuple(col) for col in description)
+        self.columns = [col[0] for col in self.description]
+        self.rows = rows if rows is not None else []
+        self.digest = digest
+
+    @classmethod
+    def from_cursor(cls, cursor, batch_size=FETCH_BATCH_SIZE, fingerprint=False, budget=None):
+        """按批读取游标当前结果集的全部行
+
+        fingerprint=True 时边读边计算指纹；budget（MemoryBudget）为本进程的内存预算，超出后的行溢出到临时文件，
+        保留在内存中的行在结果集对象被回收时归还预算。
+        CLOB 列的 LOB 对象在读取时即读出为字符串（连接随后归还连接池，之后不能再从 LOB 对象读取）。
+        """
+        description = cursor.description
+        hasher = Fingerprint(description) if fingerprint else None
+        buffer = RowBuffer(budget)
+        read_lobs = lob_reader(description)
+        try:
+            for batch in iter_row_batches(cursor, batch_size):
+                if read_lobs is not None:
+                    batch = [read_lobs(row) for row in batch]
+                buffer.extend(batch)
+                if hasher is not None:
+                    hasher.update(batch)
+        except BaseException:
+            buffer.discard()
+            raise
+        result_set = cls(description, buffer.finish(), hasher.digest() if hasher is not None else None)
+        if budget is not None and buffer.reserved:
+            weakref.finalize(result_set, budget.release, buffer.reserved)
+        return result_set
+
+    @property
+    def spilled_bytes(self):
+        """溢出到临时文件的字节数（未溢出时为 0）"""
+        return self.rows.nbytes if isinstance(self.rows, SpilledRows) else 0
+
+    @property
+    def row_count(self):
+        return len(self.rows)
+
+    @property
+    def column_count(self):
+        return len(self.columns)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def iter_batches(self, batch_size=FETCH_BATCH_SIZE):
+        """按批产出行（供流式编码器使用，控制单个输出片段的大小）"""
+        rows = self.rows
+        if isinstance(rows, SpilledRows):
+            yield from rows.iter_batches(batch_size)
+            return
+        for start in range(0, len(rows), batch_size):
+            yield rows[start:start + batch_size]
+
+    def iter_dicts(self):
+        """逐行生成 {列名: 值} 字典"""
+        columns = self.columns
+        for row in self.rows:
+            yield dict(zip(columns, row))
+
+    def to_dicts(self):
+        return list(self.iter_dicts())
+
+    def column_arrays(self):
+        """按列转置：返回与 columns 对应的各列取值列表"""
+        if not self.rows:
+            return [[] for _ in self.columns]
+        return [list(values) for values in zip(*self.rows)]
+
+    def to_columnar(self):
+        """列式结构 {'columns': [...], 'data': [[行值...], ...]}"""
+        return {'columns': list(self.columns), 'data': [list(row) for row in self.rows]}
+
+    def estimated_size(self):
+        """估算占用字节数（供结果缓存统计大小；溢出的行按临时文件大小计算）"""
+        if isinstance(self.rows, SpilledRows):
+            return self.rows.estimated_size() + sum(sys.getsizeof(col) for col in self.columns)
+        size = sys.getsizeof(self.rows) + sum(sys.getsizeof(col) for col in self.columns)
+        for row in self.rows:
+            size += sys.getsizeof(row)
+            for value in row:
+                size += sys.getsizeof(value)
+        return size
@@ -0,0 +1,252 @@
+import fnmatch
+import itertools
+import threading
+import time
+from datetime import datetime
+
+import dm_config
+from dm_breaker import OPEN as BREAKER_OPEN, CircuitBreaker
+from dm_pool import ConnectionPool
+
+# 多节点路由：主库（primary）与备库/只读副本（standby/replica）各有独立的连接池、熔断器与健康状态。
+# 只读过程分摊到健康的备库（选在途请求最少的节点），没有健康备库时回退到主库；其余过程只在主库执行。
+# 健康状态由后台线程定期校验（借出连接执行校验语句），请求中连接失败的节点立即标记为不健康，直到下次校验通过
+
+PRIMARY = 'primary'
+STANDBY = 'standby'
+REPLICA = 'replica'
+ROLES = (PRIMARY, STANDBY, REPLICA)
+
+
+def parse_nodes(text, default_port=dm_config.DM_CONN_PARAMS['port']):
+    """解析 "dm1=primary@192.168.0.191:5236,dm2=standby@192.168.0.192" 形式的节点列表
+
+    返回 [(名称, 角色, 地址, 端口)]；名称省略时为 "地址:端口"，端口省略时为 DM_PORT。
+    """
+    nodes = []
+    for item in (text or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, spec = item.rpartition('=')
+        role, _, address = spec.partition('@')
+        role = role.strip().lower()
+        if role not in ROLES or not address.strip():
+            raise ValueError(f"节点配置格式错误：{item}（应为 [名称=]primary|standby|replica@地址[:端口]）")
+        server, _, port = address.strip().partition(':')
+        try:
+            port = int(port) if port else default_port
+        except ValueError:
+            raise ValueError(f"节点端口格式错误：{item}")
+        nodes.append((name.strip() or f'{server}:{port}', role, server, port))
+    return nodes
+
+
+def parse_patterns(text):
+    """解析 "JZX.RPT_*,JZX.GET_DATA" 形式的过程名模式列表（支持通配符，不区分大小写）"""
+    return [name.strip().upper() for name in (text or '').split(',') if name.strip()]
+
+
+# 节点列表，未配置时只有一个主库（DM_SERVER:DM_PORT）
+NODES = dm_config.env_str('DM_NODES', '')
+READONLY_PROCS = parse_patterns(dm_config.env_str('DM_READONLY_PROCS', ''))  # 只读过程，可在备库执行
+READWRITE_PROCS = parse_patterns(dm_config.env_str('DM_READWRITE_PROCS', ''))  # 例外：即使匹配只读模式也只在主库执行
+NODE_CHECK_INTERVAL = dm_config.env_float('DM_NODE_CHECK_INTERVAL', 5)  # 节点健康校验间隔（秒）
+
+
+class Node:
+    """一个数据库节点：连接参数 + 独立的连接池与熔断器 + 健康状态"""
+
+    def __init__(self, name, role, conn_params, driver, pool_factory=ConnectionPool):
+        self.name = name
+        self.role = role
+        self.conn_params = dict(conn_params)
+        self.pool = pool_factory(driver, self.conn_params)
+        self.breaker = CircuitBreaker(name=name)
+        self.outstanding = 0  # 路由到该节点、尚未归还连接的调用数
+        self.healthy = True  # 最近一次校验或连接是否成功
+        self.last_error = None
+        self.checked_at = None
+
+    @property
+    def read_only(self):
+        return self.role != PRIMARY
+
+    def available(self):
+        """可参与路由：健康且熔断器未断开"""
+        return self.healthy and self.breaker.state() != BREAKER_OPEN
+
+    def address(self):
+        return f"{self.conn_params['server']}:{self.conn_params['port']}"
+
+    def status(self):
+        """节点状态（用于 /readyz 与 /nodes）"""
+        breaker = self.breaker.snapshot()
+        return {
+            'role': self.role,
+            'address': self.address(),
+            'healthy': self.healthy,
+            'available': self.healthy and breaker['state'] != BREAKER_OPEN,
+            'outstanding': self.outstanding,
+            'breaker': breaker['state'],
+            'last_error': self.last_error,
+            'checked_at': self.checked_at,
+        }
+
+
+class NodeRouter:
+    """按过程把调用路由到主库或备库（线程安全）
+
+    candidates(procedure) 给出按优先顺序排列的节点：只读过程为可用备库（在途请求数从少到多，相同时轮流），
+    最后是主库；其他过程只有主库。acquire/release 借还连接并维护各节点的在途请求数。
+    """
+
+    def __init__(self, driver, nodes=NODES, conn_params=dm_config.DM_CONN_PARAMS,
+                 readonly=READONLY_PROCS, readwrite=READWRITE_PROCS, check_interval=NODE_CHECK_INTERVAL,
+                 pool_factory=ConnectionPool):
+        specs = parse_nodes(nodes) if isinstance(nodes, str) else list(nodes)
+        if not specs:
+            specs = [(f"{conn_params['server']}:{conn_params['port']}", PRIMARY,
+                      conn_params['server'], conn_params['port'])]
+        primaries = [spec for spec in specs if spec[1] == PRIMARY]
+        if len(primaries) != 1:
+            raise ValueError(f"节点配置必须有且只有一个主库（当前 {len(primaries)} 个）")
+        self.nodes = [
+            Node(name, role, dict(conn_params, server=server, port=port), driver, pool_factory)
+            for name, role, server, port in specs
+        ]
+        self.primary = next(node for node in self.nodes if node.role == PRIMARY)
+        self.replicas = [node for node in self.nodes if node.read_only]
+        self.readonly = list(readonly)
+        self.readwrite = list(readwrite)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._checked_out = {}  # id(conn) -> Node
+        self._turn = itertools.count()
+        self._thread = None
+        self._stats = {'routed_replica': 0, 'routed_primary': 0, 'fallback_primary': 0}
+
+    # ---------------- 路由 ----------------
+
+    def is_read_only(self, procedure):
+        name = (procedure or '').upper()
+        if any(fnmatch.fnmatchcase(name, pattern) for pattern in self.readwrite):
+            return False
+        return any(fnmatch.fnmatchcase(name, pattern) for pattern in self.readonly)
+
+    def candidates(self, procedure):
+        """按优先顺序排列的候选节点"""
+        if not self.replicas or not self.is_read_only(procedure):
+            with self._lock:
+                self._stats['routed_primary'] += 1
+            return [self.primary]
+        replicas = [node for node in self.replicas if node.available()]
+        with self._lock:
+            if replicas:
+                self._stats['routed_replica'] += 1
+                # 在途请求数相同时从不同的起点开始，避免总是选中第一个
+                turn = next(self._turn)
+                replicas = [replicas[(turn + i) % len(replicas)] for i in range(len(replicas))]
+                replicas.sort(key=lambda node: node.outstanding)
+            else:
+                self._stats['fallback_primary'] += 1
+        return replicas + [self.primary]
+
+    def select(self, procedure):
+        """首选节点（不做失败转移的简单调用方使用）"""
+        return self.candidates(procedure)[0]
+
+    def acquire(self, node, timeout=None):
+        """从节点的连接池借出连接；连接失败时把节点标记为不健康"""
+        with self._lock:
+            node.outstanding += 1
+        try:
+            conn = node.pool.acquire(timeout)
+        except BaseException as e:
+            with self._lock:
+                node.outstanding -= 1
+            if isinstance(e, getattr(node.pool.driver, 'DatabaseError', ())):
+                self.mark_down(node, e)
+            raise
+        with self._lock:
+            self._checked_out[id(conn)] = node
+        return conn
+
+    def release(self, conn, discard=False):
+        """归还连接到借出它的节点"""
+        with self._lock:
+            node = self._checked_out.pop(id(conn), None)
+            if node is not None:
+                node.outstanding -= 1
+        if node is not None:
+            node.pool.release(conn, discard=discard)
+
+    def node_of(self, conn):
+        with self._lock:
+            return self._checked_out.get(id(conn))
+
+    def mark_down(self, node, error):
+        node.healthy = False
+        node.last_error = str(error)
+
+    # ---------------- 健康检查 ----------------
+
+    def check(self, node):
+        """借出连接执行校验语句，同时补足连接池最小连接数；更新节点健康状态"""
+        try:
+            node.pool.fill()
+            with node.pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(node.pool.validation_sql)
+                    cursor.fetchall()
+                finally:
+                    cursor.close()
+        except Exception as e:
+            self.mark_down(node, e)
+        else:
+            node.healthy = True
+            node.last_error = None
+        node.checked_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return node.healthy
+
+    def check_all(self):
+        for node in self.nodes:
+            self.check(node)
+
+    def start(self):
+        """启动各节点连接池的回收线程与健康检查线程（守护线程）"""
+        for node in self.nodes:
+            node.pool.start_reaper()
+        if self._thread is not None or self.check_interval <= 0:
+            return
+
+        def _run():
+            while True:
+                time.sleep(self.check_interval)
+                try:
+                    self.check_all()
+                except Exception:
+                    pass
+
+        self._thread = threading.Thread(target=_run, name='dm-node-check', daemon=True)
+        self._thread.start()
+
+    # ---------------- 统计 ----------------
+
+    def stats(self):
+        """各节点连接池统计与合计（合计的键与单个连接池相同）"""
+        nodes = {node.name: dict(node.pool.stats(), role=node.role) for node in self.nodes}
+        total = {}
+        for data in nodes.values():
+            for key, value in data.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    total[key] = total.get(key, 0) + value
+        total['wait_time_total'] = round(total.get('wait_time_total', 0), 6)
+        with self._lock:
+            total.update(self._stats)
+        total['nodes'] = nodes
+        return total
+
+    def status(self):
+        return {node.name: node.status() for node in self.nodes}
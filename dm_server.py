@@ -0,0 +1,377 @@
+import argparse
+import logging
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+
+import dm_config
+
+# 生产部署模式（prod）按 DM_WSGI_SERVER 选择 WSGI 服务器，auto 时依次尝试：
+# - gunicorn：预派生多进程（gthread 工作进程），工作进程处理指定请求数后回收，SIGHUP 平滑重启，SIGTERM 平滑关闭
+# - waitress：单进程多线程（不支持 fork 的平台也可用），请求读写与空闲连接有超时
+# - werkzeug：都未安装时的退化方案（启动时打印警告）。预派生主进程 + N 个工作进程共享同一个监听套接字，
+#   每个工作进程内部仍是 Werkzeug 开发服务器：每个连接一个线程（不限线程数），只有套接字读写超时
+#   （DM_HTTP_TIMEOUT），没有请求体/慢客户端限速与连接数上限，不适合直接暴露给外部流量（应放在 nginx 等反向代理之后）
+# dev 模式保留原来的 app.run(debug=True)。
+
+SERVE_MODE = dm_config.env_str('DM_SERVE_MODE', 'prod')  # prod / dev
+HTTP_HOST = dm_config.env_str('DM_HTTP_HOST', '0.0.0.0')
+HTTP_PORT = dm_config.env_int('DM_HTTP_PORT', 5000)
+WORKERS = dm_config.env_int('DM_WORKERS', min(4, os.cpu_count() or 1))
+MAX_REQUESTS = dm_config.env_int('DM_MAX_REQUESTS', 0)  # 工作进程处理该数量请求后回收（0 表示不回收）
+MAX_REQUESTS_JITTER = dm_config.env_int('DM_MAX_REQUESTS_JITTER', 0)  # 回收阈值随机抖动，避免所有进程同时重启
+GRACEFUL_TIMEOUT = dm_config.env_float('DM_GRACEFUL_TIMEOUT', 30)  # 平滑关闭时等待在途请求完成的秒数
+WSGI_SERVER = dm_config.env_str('DM_WSGI_SERVER', 'auto')  # auto / gunicorn / waitress / werkzeug
+THREADS = dm_config.env_int('DM_THREADS', 8)  # 每个进程的请求线程数（gunicorn、waitress）
+HTTP_TIMEOUT = dm_config.env_float('DM_HTTP_TIMEOUT', 60)  # 连接读写/空闲超时秒数
+KEEPALIVE = dm_config.env_float('DM_KEEPALIVE', 5)  # 保持连接的空闲秒数（gunicorn）
+WSGI_SERVERS = ('gunicorn', 'waitress', 'werkzeug')
+
+
+def parse_serve_options(argv=None):
+    """解析命令行启动参数（未识别的参数忽略），缺省值取环境变量"""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--serve', choices=['prod', 'dev'], default=SERVE_MODE)
+    parser.add_argument('--host', default=HTTP_HOST)
+    parser.add_argument('--port', type=int, default=HTTP_PORT)
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--max-requests', type=int, default=MAX_REQUESTS)
+    parser.add_argument('--max-requests-jitter', type=int, default=MAX_REQUESTS_JITTER)
+    parser.add_argument('--graceful-timeout', type=float, default=GRACEFUL_TIMEOUT)
+    parser.add_argument('--server', choices=('auto',) + WSGI_SERVERS, default=WSGI_SERVER)
+    parser.add_argument('--threads', type=int, default=THREADS)
+    options, _ = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    return options
+
+
+class _RequestCounter:
+    """WSGI 中间件：统计在途请求数与已处理请求数，达到上限时通知工作进程退出"""
+
+    def __init__(self, app, max_requests, on_limit):
+        self.app = app
+        self.max_requests = max_requests
+        self.on_limit = on_limit
+        self.handled = 0
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.in_flight += 1
+            self.handled += 1
+            reached = self.max_requests > 0 and self.handled == self.max_requests
+        if reached:
+            self.on_limit()
+        try:
+            result = self.app(environ, start_response)
+        except BaseException:
+            self._done()
+            raise
+        return _ClosingIterator(result, self._done)
+
+    def _done(self):
+        with self._lock:
+            self.in_flight -= 1
+
+
+class _ClosingIterator:
+    """包装响应迭代器：迭代结束/连接关闭时回调（流式响应在输出完成后才算请求结束）"""
+
+    def __init__(self, iterable, callback):
+        self._iterable = iterable
+        self._iterator = iter(iterable)
+        self._callback = callback
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._iterator)
+
+    def close(self):
+        try:
+            if hasattr(self._iterable, 'close'):
+                self._iterable.close()
+        finally:
+            callback, self._callback = self._callback, None
+            if callback:
+                callback()
+
+
+class PreforkServer:
+    """预派生多进程服务器（未安装 gunicorn/waitress 时的退化方案）
+
+    主进程只负责监听套接字与工作进程管理（不连接数据库），每个工作进程在 fork 之后调用
+    on_worker_start(worker_id) 初始化自己的连接池、后台线程等，再以 Werkzeug 多线程服务器处理请求
+    （每个连接一个线程，套接字读写超过 DM_HTTP_TIMEOUT 秒时断开）。
+    """
+
+    def __init__(self, app, host=HTTP_HOST, port=HTTP_PORT, workers=WORKERS,
+                 max_requests=MAX_REQUESTS, max_requests_jitter=MAX_REQUESTS_JITTER,
+                 graceful_timeout=GRACEFUL_TIMEOUT, on_worker_start=None):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = max(1, workers)
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.on_worker_start = on_worker_start
+        self.sock = None
+        self._children = {}  # pid -> (worker_id, 启动时间)
+        self._retiring = set()  # 平滑重启时等待退出的旧工作进程
+        self._signals = []
+
+    # ---------------- 主进程 ----------------
+
+    def run(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(1024)
+        self.sock.set_inheritable(True)
+
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, lambda signum, frame: self._signals.append(signum))
+
+        print(f"【主进程 {os.getpid()}】监听 http://{self.host}:{self.port}，工作进程数：{self.workers}"
+              f"，单进程最大请求数：{self.max_requests or '不限'}")
+        for worker_id in range(self.workers):
+            self._spawn(worker_id)
+
+        try:
+            while True:
+                while self._signals:
+                    signum = self._signals.pop(0)
+                    if signum == signal.SIGHUP:
+                        self._reload()
+                    else:
+                        self._shutdown()
+                        return
+                self._reap()
+                time.sleep(0.2)
+        finally:
+            self.sock.close()
+
+    def _spawn(self, worker_id):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._run_worker(worker_id)
+            except BaseException as e:
+                print(f"❌ 工作进程 {os.getpid()} 异常退出：{str(e)}")
+                code = 1
+            finally:
+                logging.shutdown()  # 写完日志队列中剩余的记录
+                sys.stdout.flush()
+                os._exit(code)
+        self._children[pid] = (worker_id, time.monotonic())
+        return pid
+
+    def _reap(self):
+        """回收已退出的工作进程并补齐（快速崩溃时退避，避免循环重启）"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker_id, started = self._children.pop(pid, (None, 0))
+            if pid in self._retiring:
+                self._retiring.discard(pid)
+                continue
+            if worker_id is None:
+                continue
+            if time.monotonic() - started < 1:
+                time.sleep(1)
+            print(f"ℹ️  工作进程 {pid} 已退出（状态 {status}），重新启动")
+            self._spawn(worker_id)
+
+    def _reload(self):
+        """平滑重启：先启动新一批工作进程，再通知旧进程处理完在途请求后退出"""
+        old = [pid for pid in self._children if pid not in self._retiring]
+        print(f"ℹ️  收到 SIGHUP，平滑重启 {len(old)} 个工作进程")
+        for worker_id in range(self.workers):
+            self._spawn(worker_id)
+        for pid in old:
+            self._retiring.add(pid)
+            self._kill(pid, signal.SIGTERM)
+
+    def _shutdown(self):
+        """平滑关闭：通知所有工作进程退出，超时后强制结束"""
+        print(f"ℹ️  正在关闭服务（最长等待 {self.graceful_timeout} 秒）")
+        for pid in list(self._children):
+            self._kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self._children and time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                self._children.pop(pid, None)
+            else:
+                time.sleep(0.1)
+        for pid in list(self._children):
+            self._kill(pid, signal.SIGKILL)
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self._children.clear()
+
+    @staticmethod
+    def _kill(pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    # ---------------- 工作进程 ----------------
+
+    def _run_worker(self, worker_id):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class _TimeoutRequestHandler(WSGIRequestHandler):
+            # 慢客户端（迟迟不发完请求或不读取响应）超时后断开，不再无限占用线程
+            timeout = HTTP_TIMEOUT or None
+
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, signal.SIG_DFL)
+
+        if self.on_worker_start:
+            self.on_worker_start(worker_id)
+
+        stopping = threading.Event()
+        max_requests = self.max_requests
+        if max_requests > 0 and self.max_requests_jitter > 0:
+            max_requests += random.randint(0, self.max_requests_jitter)
+
+        def _stop():
+            if not stopping.is_set():
+                stopping.set()
+                # shutdown() 会等待 serve_forever 退出，必须在其他线程中调用
+                threading.Thread(target=server.shutdown, daemon=True).start()
+
+        counter = _RequestCounter(self.app, max_requests, _stop)
+        server = make_server(self.host, self.port, counter, threaded=True, fd=self.sock.fileno(),
+                             request_handler=_TimeoutRequestHandler)
+        signal.signal(signal.SIGTERM, lambda signum, frame: _stop())
+        signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C 由主进程统一处理
+
+        server.serve_forever()
+
+        # 等待在途请求（包括流式响应）完成
+        deadline = time.monotonic() + self.graceful_timeout
+        while counter.in_flight > 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        print(f"ℹ️  工作进程 {os.getpid()} 退出（已处理 {counter.handled} 个请求）")
+
+
+def _available(module):
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+
+def resolve_server(name, can_fork=hasattr(os, 'fork')):
+    """确定使用的 WSGI 服务器：指定的服务器未安装时报错，auto 依次尝试 gunicorn（需要 fork）、waitress、werkzeug"""
+    if name == 'auto':
+        if can_fork and _available('gunicorn'):
+            return 'gunicorn'
+        return 'waitress' if _available('waitress') else 'werkzeug'
+    if name == 'gunicorn' and not can_fork:
+        raise RuntimeError("gunicorn 需要支持 fork 的平台，请改用 waitress")
+    if name != 'werkzeug' and not _available(name):
+        raise RuntimeError(f"未安装 {name}（pip install {name}）")
+    return name
+
+
+def _serve_gunicorn(app, options, on_worker_start):
+    from gunicorn.app.base import BaseApplication
+
+    def post_fork(server, worker):
+        # worker.age 从 1 开始递增（重启的工作进程取新值），只有第一个工作进程打印预检详情
+        if on_worker_start:
+            on_worker_start(worker.age - 1)
+
+    config = {
+        'bind': f"{options.host}:{options.port}",
+        'workers': max(1, options.workers),
+        'worker_class': 'gthread',
+        'threads': max(1, options.threads),
+        'max_requests': options.max_requests,
+        'max_requests_jitter': options.max_requests_jitter,
+        'graceful_timeout': options.graceful_timeout,
+        'timeout': HTTP_TIMEOUT,
+        'keepalive': KEEPALIVE,
+        'post_fork': post_fork,
+    }
+
+    class _Application(BaseApplication):
+        def load_config(self):
+            for key, value in config.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    _Application().run()
+
+
+def _serve_waitress(app, options, on_worker_start):
+    from waitress import serve as waitress_serve
+
+    if on_worker_start:
+        on_worker_start(0)
+    waitress_serve(app, host=options.host, port=options.port, threads=max(1, options.threads),
+                   channel_timeout=HTTP_TIMEOUT)
+
+
+def serve(app, on_worker_start=None, argv=None):
+    """按启动参数运行服务：prod 使用 gunicorn/waitress（都未安装时退化为 Werkzeug 预派生多进程），dev 为调试模式"""
+    options = parse_serve_options(argv)
+
+    if options.serve == 'dev':
+        if on_worker_start:
+            on_worker_start(0)
+        app.run(host=options.host, port=options.port, debug=True)
+        return
+
+    server = resolve_server(options.server)
+    print(f"ℹ️  WSGI 服务器：{server}")
+    if server == 'gunicorn':
+        _serve_gunicorn(app, options, on_worker_start)
+        return
+    if server == 'waitress':
+        _serve_waitress(app, options, on_worker_start)
+        return
+
+    print("⚠️  未安装 gunicorn 或 waitress，使用 Werkzeug 开发服务器（没有慢客户端防护与连接数上限，"
+          "不适合直接对外提供服务）；生产环境请 pip install gunicorn（Linux）或 waitress（Windows）")
+    if not hasattr(os, 'fork'):
+        print("ℹ️  当前平台不支持 fork，以单进程多线程模式运行")
+        if on_worker_start:
+            on_worker_start(0)
+        from werkzeug.serving import run_simple
+        run_simple(options.host, options.port, app, threaded=True)
+        return
+
+    PreforkServer(
+        app,
+        host=options.host,
+        port=options.port,
+        workers=options.workers,
+        max_requests=options.max_requests,
+        max_requests_jitter=options.max_requests_jitter,
+        graceful_timeout=options.graceful_timeout,
+        on_worker_start=on_worker_start,
+    ).run()
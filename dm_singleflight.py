@@ -0,0 +1,122 @@
+import threading
+
+import dm_config
+from dm_deadline import DeadlineExceeded, current_deadline
+
+# 请求合并（single-flight）：相同过程、相同参数、相同用户上下文的并发调用只执行一次数据库调用，
+# 其余并发请求等待并共享同一份结果（或同一个异常）。跟随者的等待不超过自己的请求截止时间
+
+
+def parse_name_list(text):
+    """解析 "JZX.P1,JZX.P2" 形式的过程列表（不区分大小写）"""
+    return {name.strip().upper() for name in (text or '').split(',') if name.strip()}
+
+
+SINGLEFLIGHT_ENABLED = dm_config.env_bool('DM_SINGLEFLIGHT', True)
+SINGLEFLIGHT_EXCLUDE = parse_name_list(dm_config.env_str('DM_SINGLEFLIGHT_EXCLUDE', ''))  # 非幂等过程，不合并
+SINGLEFLIGHT_USER_HEADER = dm_config.env_str('DM_SINGLEFLIGHT_USER_HEADER', 'Authorization')  # 区分用户上下文的请求头
+SINGLEFLIGHT_WAIT_TIMEOUT = dm_config.env_float('DM_SINGLEFLIGHT_WAIT_TIMEOUT', 0)  # 跟随者最长等待秒数，0 为不限
+
+
+class _Call:
+    __slots__ = ('event', 'value', 'error', 'followers')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """线程安全的并发调用合并器
+
+    同一个键同时只有一个调用（领导者）真正执行，执行期间到达的同键调用（跟随者）等待其完成后
+    共享结果；执行结束即移除，之后的调用重新执行（不做缓存）。共享的结果只读使用。
+    """
+
+    def __init__(self, exclude=None, enabled=SINGLEFLIGHT_ENABLED, wait_timeout=SINGLEFLIGHT_WAIT_TIMEOUT):
+        self.exclude = set(SINGLEFLIGHT_EXCLUDE if exclude is None else (name.upper() for name in exclude))
+        self.enabled = enabled
+        self.wait_timeout = wait_timeout if wait_timeout and wait_timeout > 0 else None
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {'calls': 0, 'executions': 0, 'coalesced': 0, 'shared_errors': 0,
+                       'wait_timeouts': 0, 'deadline_timeouts': 0, 'bypassed': 0, 'max_followers': 0}
+
+    @staticmethod
+    def make_key(procedure, params, user=None):
+        return (procedure or '').upper(), tuple(params), user
+
+    def is_coalescable(self, procedure):
+        return self.enabled and (procedure or '').upper() not in self.exclude
+
+    def do(self, procedure, params, fn, user=None):
+        """执行 fn() 或等待同键的进行中调用，返回 (结果, 是否为共享结果)；fn 的异常同样共享给跟随者
+
+        跟随者最多等待到当前请求的截止时间，到期时抛出 DeadlineExceeded（领导者继续执行）。
+        """
+        if not self.is_coalescable(procedure):
+            with self._lock:
+                self._stats['calls'] += 1
+                self._stats['bypassed'] += 1
+            return fn(), False
+
+        key = self.make_key(procedure, params, user)
+        with self._lock:
+            self._stats['calls'] += 1
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+            else:
+                call.followers += 1
+                leader = False
+
+        if not leader:
+            deadline = current_deadline()
+            timeout = self.wait_timeout
+            if deadline is not None:
+                timeout = deadline.bound(deadline.remaining() if timeout is None else timeout)
+            if not call.event.wait(timeout):
+                if deadline is not None and deadline.expired():
+                    with self._lock:
+                        call.followers -= 1
+                        self._stats['deadline_timeouts'] += 1
+                    raise DeadlineExceeded(f"等待进行中的相同调用超过截止时间（{deadline.seconds:g} 秒）")
+                # 领导者迟迟未完成：不再等待，自行执行
+                with self._lock:
+                    call.followers -= 1
+                    self._stats['wait_timeouts'] += 1
+                return fn(), False
+            with self._lock:
+                self._stats['coalesced'] += 1
+                if call.error is not None:
+                    self._stats['shared_errors'] += 1
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+                self._stats['executions'] += 1
+                self._stats['max_followers'] = max(self._stats['max_followers'], call.followers)
+            call.event.set()
+        return call.value, False
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data.update({
+                'in_flight': len(self._calls),
+                'waiting': sum(call.followers for call in self._calls.values()),
+                'enabled': self.enabled,
+                'excluded': sorted(self.exclude),
+            })
+        return data
@@ -0,0 +1,121 @@
+import json
+
+import dm_config
+from dm_types import json_default, json_ready_batches
+
+# 流式读取与输出：按 fetchmany 批量读取结果集，边读边生成 JSON 片段，内存占用只与批大小相关
+
+FETCH_BATCH_SIZE = dm_config.env_int('DM_FETCH_BATCH_SIZE', 1000)
+
+
+def iter_row_batches(cursor, batch_size=FETCH_BATCH_SIZE):
+    """按批读取当前结果集的行（每批为行元组列表）"""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield rows
+
+
+def iter_described_result_sets(cursor, batch_size=FETCH_BATCH_SIZE):
+    """依次遍历存储过程返回的所有结果集（通过nextset()切换）
+
+    每个结果集产出 (description, batches)，batches 为按批读取行的迭代器；
+    调用方必须在取下一个结果集前消费完 batches（游标只能顺序前进）。
+    """
+    while True:
+        if cursor.description:
+            yield cursor.description, iter_row_batches(cursor, batch_size)
+        if not cursor.nextset():
+            break
+
+
+def iter_result_sets(cursor, batch_size=FETCH_BATCH_SIZE):
+    """同 iter_described_result_sets，但每个结果集产出 (columns, batches)"""
+    for description, batches in iter_described_result_sets(cursor, batch_size):
+        yield [col[0] for col in description], batches
+
+
+def iter_json_result_sets(result_sets, default=json_default, indent=None):
+    """将 iter_described_result_sets 的输出编码为 JSON 片段
+
+    输出与 json.dumps([[dict(zip(columns, row)), ...], ...], ensure_ascii=False) 的结果一致：
+    indent 为 None 时为紧凑格式（separators=(',', ':')），否则按 indent 缩进。
+    列值按 cursor.description 生成的转换表预先转换，default 只处理与列类型不一致的个别值；
+    紧凑格式下每批行一次编码，每批产出一个片段。
+    """
+    if indent is None:
+        yield from _iter_compact_json(result_sets, default)
+        return
+
+    row_prefix = '\n' + ' ' * (indent * 2)
+    set_prefix = '\n' + ' ' * indent
+    encode_row = json.JSONEncoder(default=default, ensure_ascii=False, indent=indent).encode
+
+    first_set = True
+    for description, batches in result_sets:
+        columns = [col[0] for col in description]
+        parts = ['[' if first_set else ',', set_prefix, '[']
+        first_set = False
+        first_row = True
+        for rows in json_ready_batches(description, batches):
+            for row in rows:
+                text = encode_row(dict(zip(columns, row)))
+                parts.append(row_prefix if first_row else ',' + row_prefix)
+                parts.append(text.replace('\n', row_prefix))
+                first_row = False
+            yield ''.join(parts)
+            parts = []
+        parts.append(']' if first_row else set_prefix + ']')
+        yield ''.join(parts)
+
+    yield '[]' if first_set else '\n]'
+
+
+def _iter_compact_json(result_sets, default):
+    encode = json.JSONEncoder(default=default, ensure_ascii=False, separators=(',', ':')).encode
+
+    first_set = True
+    for description, batches in result_sets:
+        columns = [col[0] for col in description]
+        parts = ['[' if first_set else ',', '[']
+        first_set = False
+        first_row = True
+        for rows in json_ready_batches(description, batches):
+            if not rows:
+                continue
+            text = encode([dict(zip(columns, row)) for row in rows])
+            parts.append(text[1:-1] if first_row else ',' + text[1:-1])
+            first_row = False
+            yield ''.join(parts)
+            parts = []
+        parts.append(']')
+        yield ''.join(parts)
+
+    yield '[]' if first_set else ']'
+
+
+def iter_columnar_json_result_sets(result_sets, default=json_default):
+    """将 iter_described_result_sets 的输出编码为列式 JSON 片段
+
+    结构为 [{"columns": [列名...], "data": [[行值...], ...]}, ...]，列名每个结果集只输出一次，
+    每行数据占一行；列值的转换同 iter_json_result_sets。
+    """
+    encode = json.JSONEncoder(default=default, ensure_ascii=False, separators=(',', ':')).encode
+
+    first_set = True
+    for description, batches in result_sets:
+        parts = ['[' if first_set else ',', '\n{"columns":', encode([col[0] for col in description]), ',"data":[']
+        first_set = False
+        first_row = True
+        for rows in json_ready_batches(description, batches):
+            if rows:
+                parts.append('\n' if first_row else ',\n')
+                parts.append(',\n'.join(map(encode, rows)))
+                first_row = False
+            yield ''.join(parts)
+            parts = []
+        parts.append(']}' if first_row else '\n]}')
+        yield ''.join(parts)
+
+    yield '[]' if first_set else '\n]'
@@ -0,0 +1,262 @@
+import base64
+from datetime import date, datetime, time
+from decimal import Decimal, InvalidOperation
+from itertools import chain
+
+import dm_config
+
+# 列类型映射：根据 cursor.description 的类型码（dmPython 类型对象）确定每列的值类别，
+# 每个结果集只解析一次，生成按列的转换函数表，供 JSON / XML / 二进制编码按列处理类型，而不是逐值判断
+
+# 类型码名称 -> 值类别
+_KIND_BY_TYPE_NAME = {
+    'BIGINT': 'int', 'INTEGER': 'int', 'INT': 'int', 'SMALLINT': 'int', 'TINYINT': 'int', 'BYTE': 'int',
+    'DECIMAL': 'decimal', 'NUMERIC': 'decimal', 'DEC': 'decimal',
+    'REAL': 'float', 'FLOAT': 'float', 'DOUBLE': 'float', 'DOUBLE_PRECISION': 'float', 'NATIVE_FLOAT': 'float',
+    'DATETIME': 'datetime', 'TIMESTAMP': 'datetime', 'DATETIME_TZ': 'datetime', 'TIMESTAMP_TZ': 'datetime',
+    'DATE': 'date',
+    'TIME': 'time', 'TIME_TZ': 'time',
+    'STRING': 'str', 'FIXED_STRING': 'str', 'VARCHAR': 'str', 'VARCHAR2': 'str', 'CHAR': 'str',
+    'NCHAR': 'str', 'NVARCHAR': 'str', 'ROWID': 'str', 'INTERVAL': 'str',
+    'CLOB': 'clob', 'LONG_STRING': 'clob', 'TEXT': 'clob', 'LONGVARCHAR': 'clob',
+    'BLOB': 'bytes', 'BINARY': 'bytes', 'FIXED_BINARY': 'bytes', 'LONG_BINARY': 'bytes',
+    'VARBINARY': 'bytes', 'BFILE': 'bytes', 'IMAGE': 'bytes',
+    'BOOLEAN': 'bool', 'BIT': 'bool',
+}
+
+
+def type_name(type_code):
+    """类型码名称（dmPython 的类型码是类型对象，取其 __name__）"""
+    name = getattr(type_code, '__name__', None) or str(type_code)
+    return name.rsplit('.', 1)[-1].strip("'<> ").upper()
+
+
+def column_kind(col):
+    """单列的值类别：int/float/decimal/datetime/date/time/str/clob/bytes/bool，无法识别时为 None
+
+    NUMBER 类型按小数位数区分：scale 为 0 视为整数，否则为 decimal。
+    """
+    name = type_name(col[1])
+    if name == 'NUMBER':
+        scale = col[5] if len(col) > 5 else None
+        return 'int' if scale == 0 else 'decimal'
+    kind = _KIND_BY_TYPE_NAME.get(name)
+    if kind is None and name.startswith('INTERVAL'):
+        kind = 'str'
+    return kind
+
+
+def column_kinds(description):
+    return [column_kind(col) for col in description]
+
+
+def infer_kind(value):
+    """根据取值推断类别（类型码无法识别时使用）"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, int):
+        return 'int'
+    if isinstance(value, float):
+        return 'float'
+    if isinstance(value, Decimal):
+        return 'decimal'
+    if isinstance(value, datetime):
+        return 'datetime'
+    if isinstance(value, date):
+        return 'date'
+    if isinstance(value, time):
+        return 'time'
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return 'bytes'
+    return 'str'
+
+
+def resolve_kinds(kinds, rows):
+    """补全无法从类型码识别的列：取该列第一个非空值推断，全为空时按字符串处理"""
+    resolved = list(kinds)
+    for idx, kind in enumerate(resolved):
+        if kind is not None:
+            continue
+        for row in rows:
+            kind = infer_kind(row[idx])
+            if kind is not None:
+                break
+        resolved[idx] = kind or 'str'
+    return resolved
+
+
+def peek_batches(batches):
+    """取出第一批行（用于推断未知列类型），返回 (第一批, 完整批次迭代器)"""
+    batches = iter(batches)
+    first = next(batches, None)
+    if first is None:
+        return [], iter(())
+    return first, chain((first,), batches)
+
+
+# ---------------- 按列的值转换 ----------------
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+EXACT_FLOAT_DIGITS = 15  # 不超过该精度的 DECIMAL 转为 JSON 数字不丢失精度
+# DECIMAL/NUMERIC 列的 JSON 表示（按列确定，同一列各行类型一致）：小数位数为 0 的列输出整数；
+# string 时其余列按列的小数位数输出定点字符串（1.10 保持为 "1.10"）；
+# number 时精度不超过 15 位的列输出数字（不保留末尾的 0），其他列仍输出定点字符串
+JSON_DECIMAL = dm_config.env_str('DM_JSON_DECIMAL', 'string').lower()
+
+
+def format_datetime(value):
+    """datetime 输出为 %Y-%m-%d %H:%M:%S（无时区时用 isoformat，比 strftime 快）"""
+    if value.tzinfo is None and value.year >= 1000:
+        return value.isoformat(' ', 'seconds')
+    return value.strftime(DATETIME_FORMAT)
+
+
+def read_lob(value):
+    """CLOB 取值：驱动返回 LOB 对象时读出全部内容"""
+    if isinstance(value, str):
+        return value
+    read = getattr(value, 'read', None)
+    return read() if read is not None else str(value)
+
+
+def read_blob(value):
+    """BLOB 取值：驱动返回 LOB 对象时读出全部内容（bytes）"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return value
+    read = getattr(value, 'read', None)
+    return read() if read is not None else value
+
+
+def encode_bytes(value):
+    """二进制值输出为 Base64 文本"""
+    return base64.b64encode(value).decode('ascii')
+
+
+def decimal_to_json(value):
+    """Decimal 转为 JSON 字符串（定点表示，不用科学计数法），用于列信息中没有小数位数的值"""
+    return format(_as_decimal(value), 'f')
+
+
+def _as_decimal(value):
+    # 驱动对 DECIMAL 列也可能返回 int/float
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def decimal_converter(precision, scale, mode=JSON_DECIMAL):
+    """由列的精度与小数位数确定 DECIMAL 列的 JSON 转换函数（整列使用同一种表示）"""
+    if scale == 0:
+        return _decimal_to_int
+    if mode == 'number' and isinstance(precision, int) and 0 < precision <= EXACT_FLOAT_DIGITS:
+        return float
+    if isinstance(scale, int) and scale > 0:
+        quantum = Decimal(1).scaleb(-scale)
+
+        def to_fixed(value):
+            try:
+                return format(_as_decimal(value).quantize(quantum), 'f')
+            except InvalidOperation:
+                return decimal_to_json(value)
+
+        return to_fixed
+    return decimal_to_json
+
+
+def _decimal_to_int(value):
+    value = _as_decimal(value)
+    return int(value) if value.is_finite() else str(value)
+
+
+def json_default(value):
+    """JSON 编码的兜底转换（驱动返回的值与列类型不一致、或未按列转换时逐值调用）"""
+    if isinstance(value, datetime):
+        return format_datetime(value)
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return decimal_to_json(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return encode_bytes(value)
+    if hasattr(value, 'read'):
+        return read_lob(value)
+    raise TypeError(f"类型 {type(value)} 不支持JSON序列化")
+
+
+def _json_converter(col, kind):
+    if kind == 'datetime':
+        return format_datetime
+    if kind in ('date', 'time'):
+        return _isoformat
+    if kind == 'decimal':
+        return decimal_converter(col[4] if len(col) > 4 else None, col[5] if len(col) > 5 else None)
+    if kind == 'bytes':
+        return encode_bytes
+    if kind == 'clob':
+        return read_lob
+    return None  # int/float/str/bool 由 json 的 C 编码器直接处理
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+def _text_converter(col, kind):
+    if kind == 'datetime':
+        return format_datetime
+    if kind == 'bytes':
+        return encode_bytes
+    if kind == 'clob':
+        return read_lob
+    return str
+
+
+def json_converters(description, kinds):
+    """各列转为 JSON 可编码值的函数（None 表示原样输出）"""
+    return [_json_converter(col, kind) for col, kind in zip(description, kinds)]
+
+
+def text_converters(description, kinds):
+    """各列转为文本（XML 单元格）的函数；datetime 为 %Y-%m-%d %H:%M:%S，二进制为 Base64"""
+    return [_text_converter(col, kind) for col, kind in zip(description, kinds)]
+
+
+def row_converter(converters):
+    """由按列转换函数生成行转换函数（只处理需要转换的列，空值不转换）；无需转换时返回 None"""
+    targets = [(idx, convert) for idx, convert in enumerate(converters) if convert is not None]
+    if not targets:
+        return None
+
+    def convert_row(row):
+        row = list(row)
+        for idx, convert in targets:
+            value = row[idx]
+            if value is not None:
+                row[idx] = convert(value)
+        return row
+
+    return convert_row
+
+
+def json_ready_batches(description, batches):
+    """按列类型转换各批行，使其可直接由 json 的 C 编码器输出（转换表每个结果集只生成一次）"""
+    first, batches = peek_batches(batches)
+    kinds = resolve_kinds(column_kinds(description), first)
+    convert_row = row_converter(json_converters(description, kinds))
+    if convert_row is None:
+        return batches
+    return ([convert_row(row) for row in rows] for rows in batches)
+
+
+_LOB_READERS = {'clob': read_lob, 'bytes': read_blob}
+
+
+def lob_reader(description):
+    """CLOB/BLOB 列的 LOB 对象读出为字符串/字节串的行转换函数；没有这类列时返回 None
+
+    读取结果集时使用：LOB 对象只能在连接归还连接池之前读取，也无法序列化（落盘、溢出到临时文件）。
+    """
+    convert_row = row_converter([_LOB_READERS.get(kind) for kind in column_kinds(description)])
+    if convert_row is None:
+        return None
+    return lambda row: tuple(convert_row(row))
@@ -0,0 +1,183 @@
+from datetime import datetime
+
+from dm_types import column_kinds, format_datetime, peek_batches, resolve_kinds, text_converters
+
+# 增量XML写出：单次遍历生成XML片段，不构建 ElementTree/minidom 文档树
+
+
+def escape_text(text):
+    """转义元素文本（与 minidom 输出一致：& < > \"）"""
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    if '"' in text:
+        text = text.replace('"', '&quot;')
+    return text
+
+
+def escape_attr(value):
+    """转义属性值（额外转义换行/制表符，保证解析后取值不变）"""
+    value = escape_text(value)
+    if '\n' in value:
+        value = value.replace('\n', '&#10;')
+    if '\r' in value:
+        value = value.replace('\r', '&#13;')
+    if '\t' in value:
+        value = value.replace('\t', '&#9;')
+    return value
+
+
+def format_cell(value):
+    """单元格文本：datetime 格式化为 %Y-%m-%d %H:%M:%S，None 输出为空"""
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return format_datetime(value)
+    return str(value)
+
+
+class XmlWriter:
+    """增量XML写出器
+
+    start/end/element 把标签写入内部缓冲，flush() 取出已生成的片段。
+    indent 为缩进字符串（None 表示不换行不缩进）；空元素输出为 <tag/>，
+    只含文本的元素输出在同一行，与 minidom.toprettyxml 的格式一致。
+    """
+
+    def __init__(self, indent='  ', declaration='<?xml version="1.0" encoding="utf-8"?>'):
+        self._indent = indent or ''
+        self._pretty = indent is not None
+        self._parts = []
+        self._stack = []
+        self._pending = False  # 最近一个开始标签尚未写出 '>'（可能成为空元素）
+        self._written = False
+        if declaration:
+            self._parts.append(declaration)
+            self._written = True
+
+    def start(self, tag, attrs=None):
+        self._open_child()
+        self._parts.append('<' + tag + self._attrs(attrs))
+        self._pending = True
+        self._stack.append(tag)
+
+    def end(self, tag=None):
+        tag = self._stack.pop()
+        if self._pending:
+            self._parts.append('/>')
+            self._pending = False
+        else:
+            self._newline()
+            self._parts.append('</' + tag + '>')
+
+    def element(self, tag, text=None, attrs=None):
+        """写出一个只含文本（或为空）的元素"""
+        self._open_child()
+        if text:
+            self._parts.append('<' + tag + self._attrs(attrs) + '>' + escape_text(text) + '</' + tag + '>')
+        else:
+            self._parts.append('<' + tag + self._attrs(attrs) + '/>')
+
+    def flush(self):
+        """取出当前已生成的XML片段"""
+        if self._pending:
+            # 开始标签后续还会写入子元素，这里只能先写出 '>'，之后该元素不再视为空元素
+            self._parts.append('>')
+            self._pending = False
+        text = ''.join(self._parts)
+        self._parts = []
+        return text
+
+    def _open_child(self):
+        if self._pending:
+            self._parts.append('>')
+            self._pending = False
+        self._newline()
+
+    def _newline(self):
+        if self._pretty and self._written:
+            self._parts.append('\n' + self._indent * len(self._stack))
+        self._written = True
+
+    @staticmethod
+    def _attrs(attrs):
+        """属性文本；传入字符串时视为已转义好的属性文本（重复使用的属性只需生成一次）"""
+        if not attrs:
+            return ''
+        if isinstance(attrs, str):
+            return attrs
+        return ''.join(f' {name}="{escape_attr(value)}"' for name, value in attrs.items())
+
+
+def write_result_sets(writer, result_sets, cell_formatter=None):
+    """把结果集按 ResultSet/Columns/Rows/Row/Cell 结构写入 writer，每批行写完产出一次已生成的片段（str）
+
+    result_sets 的每一项为 (description, batches, row_count)：description 为 cursor.description，
+    batches 为按批产出行序列的迭代器，row_count 为已知行数（流式读取时为 None，此时 ResultSet 不输出 row_count 属性）。
+    单元格文本由按列类型生成的转换表得到（指定 cell_formatter 时所有列都使用它）。
+    没有数据行的结果集不输出（序号照常递增）。
+    """
+    for set_idx, (description, batches, row_count) in enumerate(result_sets, 1):
+        first, batches = peek_batches(batches) if row_count != 0 else ([], iter(()))
+        if not first:
+            # 空结果集：消费掉剩余批次后跳过
+            for _ in batches:
+                pass
+            continue
+
+        columns = [col[0] for col in description]
+        if cell_formatter is None:
+            formatters = text_converters(description, resolve_kinds(column_kinds(description), first))
+        else:
+            formatters = [cell_formatter] * len(columns)
+
+        set_attrs = {'id': str(set_idx)}
+        if row_count is not None:
+            set_attrs['row_count'] = str(row_count)
+        set_attrs['column_count'] = str(len(columns))
+        writer.start('ResultSet', set_attrs)
+
+        writer.start('Columns')
+        for col in columns:
+            writer.element('Column', col)
+        writer.end('Columns')
+
+        writer.start('Rows')
+        cell_attrs = [XmlWriter._attrs({'column': col, 'column_index': str(col_idx)})
+                      for col_idx, col in enumerate(columns)]
+        explicit = cell_formatter is not None
+        row_idx = 0
+        for rows in batches:
+            for row in rows:
+                row_idx += 1
+                writer.start('Row', {'index': str(row_idx)})
+                for attrs, format_value, value in zip(cell_attrs, formatters, row):
+                    if value is not None or explicit:
+                        value = format_value(value)
+                    writer.element('Cell', value, attrs)
+                writer.end('Row')
+            yield writer.flush()
+        writer.end('Rows')
+        writer.end('ResultSet')
+
+
+def iter_xml_result_sets(result_sets, total_sets=None, encoding='utf-8', indent='  ',
+                         cell_formatter=None):
+    """按 ResultSets/ResultSet/Columns/Rows/Row/Cell 结构增量生成XML片段（字节）
+
+    result_sets 的格式见 write_result_sets；total_sets 为 None 时根节点不输出 total_sets 属性。
+    """
+    writer = XmlWriter(indent, declaration=f'<?xml version="1.0" encoding="{encoding}"?>')
+    root_attrs = {'generated_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+    if total_sets is not None:
+        root_attrs['total_sets'] = str(total_sets)
+    writer.start('ResultSets', root_attrs)
+
+    for text in write_result_sets(writer, result_sets, cell_formatter):
+        yield text.encode(encoding, 'xmlcharrefreplace')
+
+    writer.end('ResultSets')
+    yield writer.flush().encode(encoding, 'xmlcharrefreplace')
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# 被测模块在仓库根目录（平铺的 dm_*.py），直接运行 pytest 时也能导入；模拟驱动 fake_dmPython 在 benchmarks 目录
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_ROOT, 'benchmarks'))
+sys.path.insert(0, _ROOT)
+
+# 服务模块在导入时加载驱动：测试中一律使用模拟驱动
+os.environ.setdefault('DM_DRIVER_MODULE', 'fake_dmPython')
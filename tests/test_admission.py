@@ -0,0 +1,230 @@
+import contextvars
+import threading
+import time
+
+import pytest
+
+from dm_admission import (BATCH, INTERACTIVE, Admission, AdmissionRejected, RateLimiter, TokenBucket, parse_rates,
+                          parse_weights, set_request_client)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def _as_client(client, priority, func, *args):
+    """在设置了客户端与优先级的独立 contextvars 上下文中调用"""
+    def run():
+        set_request_client(client, priority)
+        return func(*args)
+    return contextvars.copy_context().run(run)
+
+
+def test_parse_weights():
+    assert parse_weights('interactive=4, batch=2') == {INTERACTIVE: 4, BATCH: 2}
+    assert parse_weights('batch=0,interactive=x,other=3') == {INTERACTIVE: 1, BATCH: 1}
+
+
+def test_parse_rates():
+    assert parse_rates('jzx.rpt_*=2:5, JZX.GET_*=50,bad,JZX.X=0,=3') == [('JZX.RPT_*', 2.0, 5.0),
+                                                                           ('JZX.GET_*', 50.0, 50.0)]
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(rate=2, burst=3, now=0.0)
+    assert [bucket.take(0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take(0.0) == pytest.approx(0.5)
+    assert bucket.take(0.25) == pytest.approx(0.25)
+    assert bucket.take(0.5) == 0.0
+    # 空闲再久也不超过 burst
+    assert [bucket.take(100.0) for _ in range(4)][-1] > 0
+
+
+def test_rate_limiter_evicts_least_recently_used():
+    limiter = RateLimiter(max_buckets=2)
+    limiter.take('a', 1, 1, 0.0)
+    limiter.take('b', 1, 1, 0.0)
+    limiter.take('a', 1, 1, 0.0)
+    limiter.take('c', 1, 1, 0.0)
+    assert len(limiter) == 2
+    # b 被淘汰，重新建桶时令牌是满的
+    assert limiter.take('b', 1, 1, 0.0) == 0.0
+    assert limiter.take('c', 1, 1, 0.0) > 0
+
+
+def test_client_rate_limit():
+    clock = Clock()
+    admission = Admission(max_in_flight=10, client_rate=1, client_burst=2, clock=clock)
+    for _ in range(2):
+        admission.release(_as_client('c1', INTERACTIVE, admission.admit, 'JZX.P'))
+    with pytest.raises(AdmissionRejected) as info:
+        _as_client('c1', INTERACTIVE, admission.admit, 'JZX.P')
+    assert (info.value.status, info.value.reason) == (429, 'client_rate')
+    assert info.value.retry_after == pytest.approx(1.0)
+    # 其他客户端不受影响，时间过去后恢复
+    admission.release(_as_client('c2', INTERACTIVE, admission.admit, 'JZX.P'))
+    clock.now += 1
+    admission.release(_as_client('c1', INTERACTIVE, admission.admit, 'JZX.P'))
+    assert admission.stats()['rejected']['client_rate'] == 1
+
+
+def test_procedure_rate_limit():
+    admission = Admission(max_in_flight=10, proc_rates=[('JZX.RPT_*', 1.0, 1.0)], clock=Clock())
+    admission.release(admission.admit('jzx.rpt_daily'))
+    with pytest.raises(AdmissionRejected) as info:
+        admission.admit('JZX.RPT_DAILY')
+    assert (info.value.status, info.value.reason) == (429, 'procedure_rate')
+    admission.release(admission.admit('JZX.GET_TEST0'))
+
+
+def test_disabled_admission_grants_everything():
+    admission = Admission(enabled=False, max_in_flight=1, client_rate=1)
+    tickets = [_as_client('c1', INTERACTIVE, admission.admit, 'JZX.P') for _ in range(5)]
+    assert all(ticket.granted for ticket in tickets)
+    assert admission.stats()['in_flight'] == 0
+
+
+def _wait_queued(admission, count):
+    deadline = time.monotonic() + 5
+    while sum(admission.stats()['queued_now'].values()) < count:
+        assert time.monotonic() < deadline, '等待排队超时'
+        time.sleep(0.001)
+
+
+def test_weighted_round_robin_order():
+    admission = Admission(max_in_flight=1, max_queue=20, queue_timeout=10, weights={INTERACTIVE: 3, BATCH: 1})
+    held = admission.admit()
+    granted = []
+    tickets = []
+    threads = []
+
+    def wait(name, priority):
+        ticket = _as_client(None, priority, admission.admit)
+        granted.append(name)
+        tickets.append(ticket)
+
+    # 先排 4 个 batch，再排 4 个 interactive：分配顺序只取决于权重，与排队先后无关
+    for priority, count in ((BATCH, 4), (INTERACTIVE, 4)):
+        for number in range(count):
+            thread = threading.Thread(target=wait, args=(f'{priority[0]}{number}', priority))
+            thread.start()
+            threads.append(thread)
+            _wait_queued(admission, len(threads))
+
+    admission.release(held)
+    for expected in range(1, 9):
+        while len(tickets) < expected:
+            time.sleep(0.001)
+        admission.release(tickets[expected - 1])
+    for thread in threads:
+        thread.join()
+    assert granted == ['i0', 'i1', 'b0', 'i2', 'i3', 'b1', 'b2', 'b3']
+    stats = admission.stats()
+    assert stats['in_flight'] == 0 and stats['queued'] == 8 and stats['admitted'] == 9
+
+
+def test_queue_full_is_rejected():
+    admission = Admission(max_in_flight=1, max_queue=0, queue_timeout=10)
+    held = admission.admit()
+    with pytest.raises(AdmissionRejected) as info:
+        admission.admit()
+    assert (info.value.status, info.value.reason) == (503, 'queue_full')
+    assert info.value.retry_after >= 1
+    admission.release(held)
+    admission.release(admission.admit())
+
+
+def test_queue_timeout():
+    admission = Admission(max_in_flight=1, queue_timeout=0.05)
+    held = admission.admit()
+    with pytest.raises(AdmissionRejected) as info:
+        admission.admit()
+    assert info.value.reason == 'queue_timeout'
+    # 请求截止时间比排队超时短时抛出 TimeoutError
+    with pytest.raises(TimeoutError):
+        admission.admit(timeout=0.01)
+    stats = admission.stats()
+    assert stats['queued_now'] == {INTERACTIVE: 0, BATCH: 0} and stats['rejected']['queue_timeout'] == 1
+    admission.release(held)
+    assert admission.stats()['in_flight'] == 0
+
+
+def test_release_is_idempotent():
+    admission = Admission(max_in_flight=2)
+    ticket = admission.admit()
+    admission.release(ticket)
+    admission.release(ticket)
+    admission.release(None)
+    assert admission.stats()['in_flight'] == 0
+
+
+def test_resume_does_not_wait_or_count_rate_limits():
+    admission = Admission(max_in_flight=1, max_queue=10, queue_timeout=10, client_rate=1, client_burst=1,
+                          clock=Clock())
+    suspended = _as_client('c1', INTERACTIVE, admission.admit, 'JZX.P')
+    admission.release(suspended)
+    held = admission.admit()
+    waiter = []
+    thread = threading.Thread(target=lambda: waiter.append(admission.admit()))
+    thread.start()
+    _wait_queued(admission, 1)
+
+    resumed = _as_client('c1', INTERACTIVE, admission.resume, suspended)
+    assert resumed.granted and resumed.priority == INTERACTIVE
+    assert admission.stats()['in_flight'] == 2
+    # 超出上限期间交回的名额不转给排队的调用
+    admission.release(held)
+    assert admission.stats()['queued_now'][BATCH] == 1 and not waiter
+    admission.release(resumed)
+    thread.join()
+    assert waiter[0].granted
+    admission.release(waiter[0])
+    stats = admission.stats()
+    assert stats['resumed'] == 1 and stats['rejected']['client_rate'] == 0 and stats['in_flight'] == 0
+
+
+def test_suspended_call_holding_connection_does_not_stall():
+    """名额数等于连接数：暂停的调用持有唯一的连接，新调用取得名额后等待连接，暂停的调用必须能继续并归还连接"""
+    admission = Admission(max_in_flight=1, max_queue=10, queue_timeout=1)
+    pool = threading.BoundedSemaphore(1)
+
+    def call():
+        ticket = admission.admit()
+        try:
+            if not pool.acquire(timeout=3):
+                raise TimeoutError('借出连接超时')
+        except BaseException:
+            admission.release(ticket)
+            raise
+        return ticket
+
+    suspended = call()
+    admission.release(suspended)  # 如分页游标放回登记表：交回名额，保留连接
+    result = []
+
+    def new_call():
+        try:
+            ticket = call()
+        except Exception as e:
+            result.append(e)
+            return
+        result.append('ok')
+        pool.release()
+        admission.release(ticket)
+
+    thread = threading.Thread(target=new_call)
+    thread.start()
+    while admission.stats()['in_flight'] == 0:
+        time.sleep(0.001)
+    started = time.monotonic()
+    resumed = admission.resume(suspended)
+    assert time.monotonic() - started < 0.5
+    pool.release()
+    admission.release(resumed)
+    thread.join()
+    assert result == ['ok']
+    assert admission.stats()['in_flight'] == 0 and admission.stats()['rejected']['queue_timeout'] == 0
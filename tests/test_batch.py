@@ -0,0 +1,123 @@
+import contextvars
+import json
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from dm_batch import BatchError, BatchResult, iter_json_batch, iter_xml_batch, parse_batch_items, run_batch
+from dm_resultset import ResultSet
+
+
+class INT:
+    pass
+
+
+class VARCHAR:
+    pass
+
+
+DESCRIPTION = [('ID', INT, 10, 10, 10, 0, 0), ('NAME', VARCHAR, 50, 50, 50, 0, 1)]
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+
+
+def test_parse_batch_items():
+    items = parse_batch_items({'items': [
+        {'id': 'a', 'procedure': 'JZX.P1', 'params': 'x'},
+        {'param1': 'JZX.P2', 'param2': ['1', None, 2]},
+        {'procedure': 'JZX.P3', 'params': None},
+    ]})
+    assert [(item.index, item.id, item.procedure, item.params) for item in items] == [
+        (0, 'a', 'JZX.P1', 'x'), (1, '1', 'JZX.P2', ('1', '', 2)), (2, '2', 'JZX.P3', '')]
+    # 直接为数组
+    assert parse_batch_items([{'procedure': 'JZX.P'}])[0].params == ''
+
+
+@pytest.mark.parametrize('payload, message', [
+    ({}, '非空数组'),
+    ({'items': []}, '非空数组'),
+    ([{'procedure': 'P'}] * 3, '最多 2 项'),
+    (['P'], '第 0 项必须是对象'),
+    ([{'params': 'x'}], '缺少存储过程名'),
+    ([{'procedure': 'P', 'id': 1}, {'procedure': 'Q', 'id': '1'}], 'id 重复：1'),
+])
+def test_invalid_batch_is_rejected(payload, message):
+    with pytest.raises(BatchError, match=message):
+        parse_batch_items(payload, max_items=2)
+
+
+def test_run_batch_bounds_parallelism_and_keeps_context():
+    items = parse_batch_items([{'procedure': f'P{i}'} for i in range(6)], max_items=6)
+    lock = threading.Lock()
+    running = [0, 0]  # 当前、最大
+
+    def run_item(item):
+        with lock:
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        return BatchResult(item, True, data=_request_id.get())
+
+    _request_id.set('r1')
+    try:
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            results = list(run_batch(items, run_item, max_parallel=2, executor=executor))
+    finally:
+        _request_id.set(None)
+    assert sorted(result.item.id for result in results) == [str(i) for i in range(6)]
+    assert all(result.data == 'r1' for result in results)
+    assert running[1] == 2
+
+
+def test_closing_run_batch_stops_submitting():
+    items = parse_batch_items([{'procedure': f'P{i}'} for i in range(5)], max_items=5)
+    started = []
+
+    def run_item(item):
+        started.append(item.id)
+        return BatchResult(item, True)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        results = run_batch(items, run_item, max_parallel=1, executor=executor)
+        next(results)
+        results.close()
+    assert len(started) <= 2
+
+
+def _results():
+    ok, failed = parse_batch_items([{'id': 'ok', 'procedure': 'JZX.P1'}, {'id': 'bad', 'procedure': 'JZX.P2'}])
+    return [BatchResult(ok, True, data=[ResultSet(DESCRIPTION, [(1, '张三'), (2, None)])], cache='miss',
+                        duration_ms=1.23456),
+            BatchResult(failed, False, error_code='DB_ERROR', message='调用失败 <x>', duration_ms=2)]
+
+
+def test_json_batch():
+    data = json.loads(''.join(iter_json_batch(_results())))
+    assert data == {
+        'success': True,
+        'results': {
+            'ok': {'success': True, 'procedure': 'JZX.P1', 'duration_ms': 1.235, 'cache': 'miss',
+                   'data': [[{'ID': 1, 'NAME': '张三'}, {'ID': 2, 'NAME': None}]]},
+            'bad': {'success': False, 'procedure': 'JZX.P2', 'duration_ms': 2, 'error_code': 'DB_ERROR',
+                    'message': '调用失败 <x>'},
+        },
+        'total_items': 2, 'failed_items': 1,
+    }
+    assert json.loads(''.join(iter_json_batch([]))) == {'success': True, 'results': {}, 'total_items': 0,
+                                                        'failed_items': 0}
+
+
+def test_xml_batch():
+    root = ET.fromstring(b''.join(iter_xml_batch(_results())))
+    ok, bad = root.findall('Item')
+    assert ok.attrib == {'id': 'ok', 'success': 'true', 'procedure': 'JZX.P1', 'duration_ms': '1.235',
+                         'cache': 'miss', 'total_sets': '1'}
+    assert [cell.text for cell in ok.iter('Cell')] == ['1', '张三', '2', None]
+    assert bad.attrib == {'id': 'bad', 'success': 'false', 'procedure': 'JZX.P2', 'duration_ms': '2',
+                          'error_code': 'DB_ERROR'}
+    assert bad.find('Error').text == '调用失败 <x>'
@@ -0,0 +1,102 @@
+import io
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+from dm_binary import is_available, iter_arrow_result_sets, iter_msgpack_result_sets
+
+
+class INT:
+    pass
+
+
+class DECIMAL:
+    pass
+
+
+class VARCHAR:
+    pass
+
+
+class DATETIME:
+    pass
+
+
+class DATE:
+    pass
+
+
+class BLOB:
+    pass
+
+
+DESCRIPTION = [('ID', INT, 10, 10, 10, 0, 0), ('PRICE', DECIMAL, 10, 10, 10, 2, 1),
+               ('NAME', VARCHAR, 50, 50, 50, 0, 1), ('CREATED', DATETIME, 19, 19, 19, 0, 1),
+               ('DAY', DATE, 10, 10, 10, 0, 1), ('DATA', BLOB, None, None, None, None, 1)]
+
+ROWS = [(1, Decimal('1.50'), '张三', datetime(2024, 1, 2, 3, 4, 5, 123456), date(2024, 1, 2), b'\x00\x01'),
+        (2, None, None, None, None, None)]
+
+OTHER_DESCRIPTION = [('CODE', VARCHAR, 10, 10, 10, 0, 1)]
+
+
+def _sets():
+    return [(DESCRIPTION, iter([ROWS[:1], ROWS[1:]])), (OTHER_DESCRIPTION, iter(()))]
+
+
+def test_msgpack_stream():
+    msgpack = pytest.importorskip('msgpack')
+    assert is_available('msgpack')
+    unpacker = msgpack.Unpacker(raw=False, timestamp=3)
+    for chunk in iter_msgpack_result_sets(_sets()):
+        unpacker.feed(chunk)
+    items = list(unpacker)
+    assert items[0] == {'set': 1, 'columns': ['ID', 'PRICE', 'NAME', 'CREATED', 'DAY', 'DATA'],
+                        'types': ['int', 'decimal', 'str', 'datetime', 'date', 'bytes']}
+    assert items[1] == [[1, '1.50', '张三', datetime(2024, 1, 2, 3, 4, 5, 123456, tzinfo=timezone.utc),
+                         datetime(2024, 1, 2, tzinfo=timezone.utc), b'\x00\x01']]
+    assert items[2] == [[2, None, None, None, None, None]]
+    assert items[3] is None
+    assert items[4:] == [{'set': 2, 'columns': ['CODE'], 'types': ['str']}, None]
+
+
+def test_msgpack_large_integers_become_strings():
+    msgpack = pytest.importorskip('msgpack')
+    chunks = iter_msgpack_result_sets([([('N', INT, 38, 38, 38, 0, 1)], iter([[(2 ** 70,), (5,)]]))])
+    unpacker = msgpack.Unpacker(raw=False)
+    for chunk in chunks:
+        unpacker.feed(chunk)
+    assert list(unpacker)[1] == [[str(2 ** 70)], [5]]
+
+
+def test_arrow_stream():
+    pa = pytest.importorskip('pyarrow')
+    assert is_available('arrow')
+    source = io.BytesIO(b''.join(iter_arrow_result_sets(_sets())))
+
+    table = pa.ipc.open_stream(source).read_all()
+    assert table.schema.types == [pa.int64(), pa.decimal128(38, 2), pa.string(), pa.timestamp('us'),
+                                  pa.date32(), pa.binary()]
+    assert table.to_pylist() == [
+        {'ID': 1, 'PRICE': Decimal('1.50'), 'NAME': '张三', 'CREATED': datetime(2024, 1, 2, 3, 4, 5, 123456),
+         'DAY': date(2024, 1, 2), 'DATA': b'\x00\x01'},
+        {'ID': 2, 'PRICE': None, 'NAME': None, 'CREATED': None, 'DAY': None, 'DATA': None},
+    ]
+    # 多个结果集首尾相接，依次打开即可读出
+    second = pa.ipc.open_stream(source).read_all()
+    assert second.column_names == ['CODE'] and second.num_rows == 0
+
+
+def test_arrow_converts_values_that_do_not_match_the_column_type():
+    pa = pytest.importorskip('pyarrow')
+    rows = [(Decimal('3'), 1.234, 7)]
+    description = [('ID', INT, 10, 10, 10, 0, 0), ('PRICE', DECIMAL, 10, 10, 10, 2, 1),
+                   ('NAME', VARCHAR, 50, 50, 50, 0, 1)]
+    source = io.BytesIO(b''.join(iter_arrow_result_sets([(description, iter([rows]))])))
+    assert pa.ipc.open_stream(source).read_all().to_pylist() == [
+        {'ID': 3, 'PRICE': Decimal('1.23'), 'NAME': '7'}]
+
+
+def test_unknown_format_is_not_available():
+    assert not is_available('xml')
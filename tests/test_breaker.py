@@ -0,0 +1,120 @@
+import pytest
+
+from dm_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _breaker(clock, **kwargs):
+    options = dict(window=10, min_calls=4, error_rate=0.5, slow_call=1, slow_rate=0.8, open_seconds=5,
+                   half_open_calls=2, clock=clock)
+    options.update(kwargs)
+    return CircuitBreaker(**options)
+
+
+def _calls(breaker, results, duration=0.0):
+    for success in results:
+        breaker.record(success, duration)
+
+
+def test_opens_when_error_rate_reached():
+    clock = _Clock()
+    breaker = _breaker(clock)
+    _calls(breaker, [False, False, True])
+    assert breaker.state() == CLOSED  # 调用数未达到 min_calls
+    _calls(breaker, [True])
+    assert breaker.state() == OPEN
+    snapshot = breaker.snapshot()
+    assert (snapshot['opened'], snapshot['reason']) == (1, '失败率 2/4')
+
+
+def test_opens_on_slow_calls():
+    clock = _Clock()
+    breaker = _breaker(clock)
+    _calls(breaker, [True] * 3, duration=1.5)
+    _calls(breaker, [True])
+    assert breaker.state() == CLOSED  # 3/4 低于慢调用阈值
+    _calls(breaker, [True] * 4, duration=2)
+    assert breaker.state() == OPEN
+    assert breaker.snapshot()['reason'].startswith('慢调用')
+
+
+def test_old_calls_leave_the_window():
+    clock = _Clock()
+    breaker = _breaker(clock)
+    _calls(breaker, [False, False, False])
+    clock.now += 11
+    _calls(breaker, [True, True, True, False])
+    assert breaker.state() == CLOSED
+    assert breaker.snapshot()['window_calls'] == 4
+
+
+def test_open_rejects_with_retry_after():
+    clock = _Clock()
+    breaker = _breaker(clock)
+    _calls(breaker, [False] * 4)
+    clock.now += 2
+    with pytest.raises(CircuitOpenError) as exc_info:
+        breaker.begin()
+    assert exc_info.value.retry_after == pytest.approx(3)
+    assert '3 秒后重试' in str(exc_info.value)
+    assert breaker.snapshot()['rejected'] == 1
+
+
+def test_half_open_probes_close_the_breaker():
+    clock = _Clock()
+    breaker = _breaker(clock)
+    _calls(breaker, [False] * 4)
+    clock.now += 5
+    assert breaker.state() == HALF_OPEN
+
+    probes = [breaker.begin(), breaker.begin()]
+    assert all(call.probe for call in probes)
+    with pytest.raises(CircuitOpenError):
+        breaker.begin()  # 探测数已满
+    # 半开期间非探测调用的结果不影响状态
+    breaker.record(False, 0)
+    for call in probes:
+        call.finish()
+    assert breaker.state() == CLOSED
+    assert breaker.snapshot()['window_calls'] == 0
+    assert not breaker.begin().probe
+
+
+def test_failed_probe_reopens():
+    clock = _Clock()
+    breaker = _breaker(clock)
+    _calls(breaker, [False] * 4)
+    clock.now += 5
+    call = breaker.begin()
+    call.fail()
+    call.finish()
+    call.finish()  # 重复 finish 只记录一次
+    assert breaker.state() == OPEN
+    snapshot = breaker.snapshot()
+    assert (snapshot['opened'], snapshot['reason'], snapshot['calls']) == (2, '恢复探测失败', 5)
+    with pytest.raises(CircuitOpenError):
+        breaker.begin()
+
+
+def test_calls_started_before_opening_are_ignored():
+    clock = _Clock()
+    breaker = _breaker(clock)
+    late = breaker.begin()
+    _calls(breaker, [False] * 4)
+    late.finish()
+    clock.now += 5
+    assert breaker.state() == HALF_OPEN
+
+
+def test_disabled_breaker_never_rejects():
+    clock = _Clock()
+    breaker = _breaker(clock, enabled=False)
+    _calls(breaker, [False] * 10)
+    breaker.begin().finish()
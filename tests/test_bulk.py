@@ -0,0 +1,224 @@
+import io
+
+import pytest
+
+from dm_bulk import (CSV, JSONL, BodyReadError, BulkError, BulkLoader, body_format, call_sql, insert_sql, iter_csv_rows,
+                     iter_jsonl_rows, iter_text_lines, parse_columns, read_csv_header)
+
+
+def _lines(text):
+    return iter_text_lines(io.BytesIO(text.encode('utf-8')))
+
+
+def test_text_lines_strip_bom_and_keep_newlines():
+    assert list(_lines('﻿a,b\n1,2\n')) == ['a,b\n', '1,2\n']
+
+
+def test_jsonl_objects_fill_columns_from_first_row():
+    columns = []
+    rows = list(iter_jsonl_rows(_lines('{"ID": 1, "NAME": "a"}\n\n{"NAME": "b", "ID": 2}\n{"ID": 3}\n'), columns))
+    assert columns == ['ID', 'NAME']
+    assert rows == [(1, (1, 'a'), None), (3, (2, 'b'), None), (4, (3, None), None)]
+
+
+def test_jsonl_arrays_and_bad_lines():
+    rows = list(iter_jsonl_rows(_lines('[1, "a"]\n{bad\n42\n'), ['ID', 'NAME']))
+    assert rows[0] == (1, (1, 'a'), None)
+    assert rows[1][0] == 2 and rows[1][1] is None and rows[1][2].startswith('JSON')
+    assert rows[2][0] == 3 and rows[2][1] is None
+
+
+def test_jsonl_rejects_bad_column_names():
+    with pytest.raises(BulkError):
+        list(iter_jsonl_rows(_lines('{"ID; DROP": 1}\n'), []))
+
+
+def test_csv_header_and_rows():
+    columns, lines = read_csv_header(_lines('ID,NAME\n1,"a,b"\n2,\n3,"多\n行"\n'))
+    assert columns == ['ID', 'NAME']
+    assert list(iter_csv_rows(lines, first_line=2)) == [
+        (2, ('1', 'a,b'), None), (3, ('2', None), None), (5, ('3', '多\n行'), None)]
+
+
+def test_csv_bad_record_is_rejected_and_parsing_continues():
+    rows = list(iter_csv_rows(_lines('1,a\n2,' + 'x' * 200000 + '\n3,c\n4,d\n')))
+    assert rows[0] == (1, ('1', 'a'), None)
+    assert rows[1][:2] == (2, None) and rows[1][2].startswith('CSV 格式错误')
+    assert rows[2:] == [(3, ('3', 'c'), None), (4, ('4', 'd'), None)]
+
+
+def test_invalid_encoding_stops_reading():
+    lines = iter_text_lines(io.BytesIO('1,a\n'.encode('utf-8') + b'2,\xff\xfe\n3,c\n'))
+    assert next(lines) == '1,a\n'
+    with pytest.raises(BodyReadError) as info:
+        next(lines)
+    assert info.value.line == 2
+
+
+def test_csv_header_of_empty_body():
+    columns, lines = read_csv_header(_lines(''))
+    assert columns == [] and list(lines) == []
+
+
+def test_parse_columns():
+    assert parse_columns(' ID, NAME ,,CREATED') == ['ID', 'NAME', 'CREATED']
+    with pytest.raises(BulkError):
+        parse_columns('ID,NAME)')
+
+
+@pytest.mark.parametrize('fmt, content_type, expected', [
+    ('jsonl', None, JSONL), ('ndjson', 'text/csv', JSONL), ('CSV', None, CSV),
+    ('', 'application/x-ndjson; charset=utf-8', JSONL), (None, 'text/csv', CSV),
+])
+def test_body_format(fmt, content_type, expected):
+    assert body_format(fmt, content_type) == expected
+
+
+@pytest.mark.parametrize('fmt, content_type', [('xml', None), ('', 'application/octet-stream'), ('', None)])
+def test_body_format_rejected(fmt, content_type):
+    with pytest.raises(BulkError):
+        body_format(fmt, content_type)
+
+
+def test_statements():
+    assert call_sql('JZX.LOAD', 3) == 'CALL JZX.LOAD(?, ?, ?)'
+    assert insert_sql('JZX.T', ['ID', 'NAME'], 2) == 'INSERT INTO JZX.T (ID, NAME) VALUES (?, ?)'
+    assert insert_sql('JZX.T', [], 2) == 'INSERT INTO JZX.T VALUES (?, ?)'
+    with pytest.raises(BulkError):
+        insert_sql('JZX.T', ['ID'], 2)
+
+
+class DatabaseError(Exception):
+    pass
+
+
+class _Connection:
+    """记录 executemany/commit/rollback；fail_chunks 中的批（从 1 开始）执行失败，fail_commits 中的提交失败"""
+
+    def __init__(self, fail_chunks=(), fail_commits=()):
+        self.fail_chunks = set(fail_chunks)
+        self.fail_commits = set(fail_commits)
+        self.chunks = 0
+        self.commits = 0
+        self.pending = []
+        self.stored = []
+        self.rollbacks = 0
+        self.sql = None
+
+    def cursor(self):
+        return self
+
+    def executemany(self, sql, rows):
+        self.sql = sql
+        self.chunks += 1
+        if self.chunks in self.fail_chunks:
+            raise DatabaseError(-6602, '违反唯一性约束')
+        self.pending.extend(rows)
+
+    def commit(self):
+        self.commits += 1
+        if self.commits in self.fail_commits:
+            raise DatabaseError(-7000, '提交失败')
+        self.stored.extend(self.pending)
+        self.pending = []
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.pending = []
+
+    def close(self):
+        pass
+
+
+def _loader(conn, **options):
+    return BulkLoader(conn, lambda count: call_sql('JZX.LOAD', count), DatabaseError, lambda e: e.args, **options)
+
+
+def _rows(count, width=2):
+    return [(i, tuple(range(i, i + width)), None) for i in range(1, count + 1)]
+
+
+def test_loader_commits_every_commit_rows():
+    conn = _Connection()
+    report = _loader(conn, chunk_rows=3, commit_rows=6).run(_rows(14))
+    assert conn.sql == 'CALL JZX.LOAD(?, ?)'
+    assert (report.rows, report.committed_rows, report.chunks, report.commits) == (14, 14, 5, 3)
+    assert len(conn.stored) == 14 and report.error_count == 0 and not report.aborted
+
+
+def test_commit_rows_rounds_up_to_whole_chunks():
+    conn = _Connection()
+    report = _loader(conn, chunk_rows=4, commit_rows=5).run(_rows(16))
+    assert report.commits == 2 and report.committed_rows == 16
+
+
+def test_failed_chunk_rolls_back_open_transaction_and_continues():
+    conn = _Connection(fail_chunks={3})
+    report = _loader(conn, chunk_rows=2, commit_rows=6).run(_rows(12))
+    # 第 1、2 批未提交，随第 3 批回滚
+    assert (report.committed_rows, report.failed_rows, report.failed_chunks) == (6, 6, 1)
+    assert report.error_count == 1
+    error = report.errors[0]
+    assert (error['chunk'], error['first_line'], error['last_line'], error['rows'], error['rolled_back_rows'],
+            error['error_code']) == (3, 5, 6, 2, 4, -6602)
+    assert [row[0] for row in conn.stored] == [7, 8, 9, 10, 11, 12]
+
+
+def test_failed_commit_counts_all_pending_rows():
+    conn = _Connection(fail_commits={1})
+    report = _loader(conn, chunk_rows=2, commit_rows=4).run(_rows(8))
+    assert (report.committed_rows, report.failed_rows, report.commits) == (4, 4, 1)
+    assert report.errors[0]['chunks'] == [1, 2] and report.errors[0]['rolled_back_rows'] == 4
+
+
+def test_rejected_rows_are_not_executed():
+    conn = _Connection()
+    rows = [(1, (1, 2), None), (2, None, 'JSON 格式错误'), (3, (3,), None), (4, (4, 5), None)]
+    report = _loader(conn, chunk_rows=10).run(rows)
+    assert (report.rows, report.rejected_rows, report.committed_rows) == (4, 2, 2)
+    assert [error['line'] for error in report.errors] == [2, 3]
+
+
+def test_loader_keeps_loading_after_bad_csv_record():
+    conn = _Connection()
+    report = _loader(conn, chunk_rows=2).run(iter_csv_rows(_lines('1,a\n2,' + 'x' * 200000 + '\n3,c\n4,d\n')))
+    assert (report.rows, report.rejected_rows, report.committed_rows) == (4, 1, 3)
+    assert not report.aborted and report.errors[0]['line'] == 2
+    assert [row[0] for row in conn.stored] == ['1', '3', '4']
+
+
+def test_loader_aborts_on_unreadable_body_and_keeps_rows_read():
+    conn = _Connection()
+    body = io.BytesIO('1,a\n2,b\n3,c\n'.encode('utf-8') + b'\xff\n5,e\n')
+    report = _loader(conn, chunk_rows=2).run(iter_csv_rows(iter_text_lines(body)))
+    assert report.aborted and report.committed_rows == 3
+    assert report.errors == [{'line': 4, 'message': report.errors[0]['message']}]
+    assert [row[0] for row in conn.stored] == ['1', '2', '3']
+
+
+def test_loader_aborts_after_max_errors():
+    conn = _Connection(fail_chunks={1, 2, 3, 4})
+    report = _loader(conn, chunk_rows=1, max_errors=1).run(_rows(10))
+    assert report.aborted and report.error_count == 2 and report.chunks == 2
+    assert report.committed_rows == 0
+
+
+def test_unexpected_error_rolls_back_and_propagates():
+    conn = _Connection()
+
+    def rows():
+        yield from _rows(3)
+        raise TimeoutError('截止时间已到')
+
+    loader = _loader(conn, chunk_rows=2, commit_rows=100)
+    with pytest.raises(TimeoutError):
+        loader.run(rows())
+    assert conn.rollbacks == 1 and conn.stored == []
+    assert loader.report.failed_rows == 2
+
+
+def test_report_to_dict():
+    report = _loader(_Connection(), chunk_rows=5).run(_rows(5))
+    data = report.to_dict()
+    assert data['committed_rows'] == 5 and data['commits'] == 1 and data['errors'] == []
+    assert data['rows_per_sec'] >= 0
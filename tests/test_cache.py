@@ -0,0 +1,127 @@
+import types
+
+import pytest
+
+import dm_cache
+from dm_cache import ResultCache, parse_proc_ttls
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可手动推进的 time.monotonic"""
+    now = [1000.0]
+    monkeypatch.setattr(dm_cache, 'time', types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def _cache(max_bytes=100, **ttls):
+    return ResultCache(ttls or {'P': 10}, max_bytes=max_bytes, size_func=lambda value: value[1])
+
+
+def test_parse_proc_ttls():
+    assert parse_proc_ttls(' jzx.get_test0=30, JZX.GET_TEST1 ,=5,bad=x,') == {
+        'JZX.GET_TEST0': 30.0, 'JZX.GET_TEST1': dm_cache.CACHE_DEFAULT_TTL}
+    assert parse_proc_ttls(None) == {}
+
+
+def test_hit_and_miss_counts(clock):
+    cache = _cache()
+    key = cache.make_key('p', ['a', 'b'])
+    assert key == ('P', ('a', 'b'))
+    assert cache.get(key) is None
+    assert cache.put(key, ('v', 10))
+    assert cache.get(key) == ('v', 10)
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['stores'], stats['bytes']) == (1, 1, 1, 10)
+
+
+def test_entry_expires_after_ttl(clock):
+    cache = _cache(P=10)
+    key = cache.make_key('P', [])
+    cache.put(key, ('v', 10))
+    clock[0] += 9.9
+    assert cache.get(key) == ('v', 10)
+    clock[0] += 0.1
+    assert cache.get(key) is None
+    stats = cache.stats()
+    assert (stats['expirations'], stats['entries'], stats['bytes']) == (1, 0, 0)
+
+
+def test_only_listed_procedures_are_cached(clock):
+    cache = _cache(P=10, OFF=0)
+    assert not cache.put(cache.make_key('OTHER', []), ('v', 1))
+    assert not cache.put(cache.make_key('OFF', []), ('v', 1))
+    assert cache.stats()['entries'] == 0
+
+    calls = []
+    value, hit = cache.get_or_load('OTHER', [], lambda: calls.append(1) or ('v', 1))
+    assert (value, hit) == (('v', 1), False)
+    cache.get_or_load('OTHER', [], lambda: calls.append(1) or ('v', 1))
+    assert len(calls) == 2
+
+
+def test_get_or_load_hits_after_first_load(clock):
+    cache = _cache()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return ('v', 10)
+
+    assert cache.get_or_load('p', ['x'], loader) == (('v', 10), False)
+    assert cache.get_or_load('P', ['x'], loader) == (('v', 10), True)
+    assert cache.get_or_load('P', ['y'], loader) == (('v', 10), False)
+    assert len(calls) == 2
+
+
+def test_lru_eviction_by_size(clock):
+    cache = _cache(max_bytes=30)
+    keys = [cache.make_key('P', [str(i)]) for i in range(3)]
+    for key in keys:
+        cache.put(key, (key, 10))
+    cache.get(keys[0])  # keys[0] 变为最近使用，keys[1] 最久未用
+    cache.put(cache.make_key('P', ['new']), ('new', 10))
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[2]) is not None
+    stats = cache.stats()
+    assert (stats['evictions'], stats['entries'], stats['bytes']) == (1, 3, 30)
+
+
+def test_oversized_value_is_rejected(clock):
+    cache = _cache(max_bytes=30)
+    key = cache.make_key('P', [])
+    cache.put(key, ('small', 10))
+    assert not cache.put(cache.make_key('P', ['big']), ('big', 31))
+    assert cache.get(key) == ('small', 10)
+    assert cache.stats()['rejected_too_large'] == 1
+
+
+def test_replacing_entry_updates_size(clock):
+    cache = _cache()
+    key = cache.make_key('P', [])
+    cache.put(key, ('a', 10))
+    cache.put(key, ('b', 25))
+    assert cache.get(key) == ('b', 25)
+    assert (cache.stats()['entries'], cache.stats()['bytes']) == (1, 25)
+
+
+def test_invalidate(clock):
+    cache = _cache(P=10, Q=10)
+    for proc, param in (('P', 'a'), ('P', 'b'), ('Q', 'a')):
+        cache.put(cache.make_key(proc, [param]), (param, 1))
+
+    assert cache.invalidate('p', ['a']) == 1
+    assert cache.invalidate('p', ['a']) == 0
+    assert cache.get(cache.make_key('P', ['b'])) is not None
+    assert cache.invalidate('p') == 1
+    assert cache.get(cache.make_key('Q', ['a'])) is not None
+    assert cache.invalidate() == 1
+    stats = cache.stats()
+    assert (stats['invalidations'], stats['entries'], stats['bytes']) == (3, 0, 0)
+
+
+def test_estimate_size_counts_nested_values():
+    rows = [{'ID': 1, 'NAME': 'x' * 1000}]
+    assert dm_cache.estimate_size(rows) > 1000
+    assert dm_cache.estimate_size(types.SimpleNamespace(estimated_size=lambda: 42)) == 42
@@ -0,0 +1,91 @@
+import gzip
+import zlib
+
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+from werkzeug.wrappers import Response
+
+from dm_compress import StreamCompressor, compress_response, is_compressible, iter_compressed, negotiate_encoding
+
+
+def _accept(value):
+    return parse_accept_header(value, Accept)
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding(_accept('gzip, deflate')) == 'gzip'
+    assert negotiate_encoding(_accept('deflate, gzip;q=0.5')) == 'deflate'
+    assert negotiate_encoding(_accept('br')) is None
+    assert negotiate_encoding(_accept('*')) == 'gzip'
+    assert negotiate_encoding(_accept('')) is None
+
+
+def test_is_compressible():
+    assert is_compressible(Response('{}', mimetype='application/json'))
+    assert not is_compressible(Response('x', mimetype='image/png'))
+    assert not is_compressible(Response(status=304, mimetype='application/json'))
+    encoded = Response('{}', mimetype='application/json', headers={'Content-Encoding': 'gzip'})
+    assert not is_compressible(encoded)
+
+
+def test_gzip_round_trip_of_buffered_response():
+    body = ('{"rows": [%s]}' % ','.join(str(i) for i in range(2000))).encode()
+    response = Response(body, mimetype='application/json')
+    stats = []
+    assert compress_response(response, 'gzip', min_size=100, on_done=stats.append)
+    assert response.headers['Content-Encoding'] == 'gzip' and 'Accept-Encoding' in response.vary
+    assert gzip.decompress(response.get_data()) == body
+    assert stats[0]['raw_bytes'] == len(body) and stats[0]['compressed_bytes'] == len(response.get_data())
+
+
+def test_small_buffered_response_is_not_compressed():
+    response = Response(b'{}', mimetype='application/json')
+    assert not compress_response(response, 'gzip', min_size=100)
+    assert 'Content-Encoding' not in response.headers and response.get_data() == b'{}'
+
+
+def test_streamed_response_is_not_read_until_sent():
+    produced = []
+    closed = []
+
+    def body():
+        try:
+            for i in range(5):
+                produced.append(i)
+                yield b'[%d]' % i
+        finally:
+            closed.append(True)
+
+    response = Response(body(), mimetype='application/json')
+    stats = []
+    assert compress_response(response, 'deflate', min_size=10 ** 6, on_done=stats.append)
+    # 包装时不读取任何片段，小响应同样压缩
+    assert produced == [] and response.headers['Content-Encoding'] == 'deflate'
+    data = b''.join(response.response)
+    assert zlib.decompress(data) == b'[0][1][2][3][4]'
+    assert closed == [True] and stats[0]['raw_bytes'] == 15
+
+
+def test_stream_flushes_so_client_can_decode_incrementally():
+    compressor = StreamCompressor('gzip')
+    chunks = iter_compressed(iter([b'a' * 100, b'b' * 100, b'c' * 100]), compressor, flush_size=100)
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    assert decoder.decompress(next(chunks)) == b'a' * 100
+    assert decoder.decompress(next(chunks)) == b'b' * 100
+
+
+def test_closing_compressed_stream_closes_body():
+    closed = []
+
+    def body():
+        try:
+            yield b'x' * 10
+            yield b'y' * 10
+        finally:
+            closed.append(True)
+
+    stats = []
+    chunks = iter_compressed(body(), StreamCompressor('gzip'), on_done=stats.append)
+    next(chunks)
+    chunks.close()
+    assert closed == [True] and len(stats) == 1
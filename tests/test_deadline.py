@@ -0,0 +1,107 @@
+import contextvars
+import threading
+import time
+
+import pytest
+
+import dm_deadline
+from dm_deadline import (Deadline, DeadlineExceeded, current_deadline, parse_timeouts, resolve_timeout,
+                         start_deadline, statement_deadline)
+
+
+class _Connection:
+    """cancel() 中断正在执行的语句"""
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def execute(self, seconds):
+        if self.cancelled.wait(seconds):
+            raise RuntimeError('语句已取消')
+
+
+def test_parse_timeouts():
+    assert parse_timeouts(' /xmlService=60, jzx.get_big=120 ,bad=x,=5,') == {
+        '/xmlService': 60.0, 'JZX.GET_BIG': 120.0}
+
+
+def test_resolve_timeout(monkeypatch):
+    monkeypatch.setattr(dm_deadline, 'QUERY_TIMEOUT', 60)
+    monkeypatch.setattr(dm_deadline, 'MAX_TIMEOUT', 300)
+    monkeypatch.setattr(dm_deadline, 'ROUTE_TIMEOUTS', {'/xmlService': 90})
+    monkeypatch.setattr(dm_deadline, 'PROC_TIMEOUTS', {'JZX.GET_BIG': 120})
+
+    assert resolve_timeout('/jsonService', 'JZX.P') == 60
+    assert resolve_timeout('/jsonService', 'JZX.P', default=0) == 0
+    assert resolve_timeout('/xmlService', 'JZX.P') == 90
+    assert resolve_timeout('/xmlService', 'jzx.get_big') == 120
+    assert resolve_timeout('/xmlService', 'jzx.get_big', requested='5') == 5
+    assert resolve_timeout(requested='1000') == 300
+    # 无效或不大于 0 的请求参数被忽略
+    assert resolve_timeout('/xmlService', requested='abc') == 90
+    assert resolve_timeout('/xmlService', requested='0') == 90
+
+
+def test_deadline_bound():
+    deadline = Deadline(10)
+    assert 9 < deadline.remaining() <= 10
+    assert deadline.bound(3) == 3
+    assert 9 < deadline.bound(30) <= 10
+    assert Deadline(-1).expired()
+    assert Deadline(-1).bound(3) == 0
+
+
+def test_nested_deadline_never_extends_outer():
+    def run():
+        outer = start_deadline(1)
+        assert start_deadline(10) is outer
+        inner = start_deadline(0.5)
+        assert inner is not outer and current_deadline() is inner
+        assert start_deadline(0) is inner
+        return current_deadline()
+
+    assert contextvars.copy_context().run(run) is not None
+    assert contextvars.copy_context().run(lambda: start_deadline(0)) is None
+
+
+def test_statement_without_deadline_runs_unbounded():
+    conn = _Connection()
+    with statement_deadline(conn):
+        conn.execute(0)
+    assert not conn.cancelled.is_set()
+
+
+def test_expired_deadline_skips_the_statement():
+    conn = _Connection()
+    with pytest.raises(DeadlineExceeded):
+        with statement_deadline(conn, Deadline(-1)):
+            pytest.fail('截止时间已过时不应执行语句')
+
+
+def test_statement_is_cancelled_at_deadline():
+    conn = _Connection()
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded) as exc_info:
+        with statement_deadline(conn, Deadline(0.05)):
+            conn.execute(5)
+    assert time.monotonic() - started < 2
+    assert conn.cancelled.is_set()
+    assert isinstance(exc_info.value.__cause__, RuntimeError)
+
+
+def test_finished_statement_is_not_cancelled():
+    conn = _Connection()
+    with statement_deadline(conn, Deadline(0.05)):
+        conn.execute(0)
+    time.sleep(0.1)
+    assert not conn.cancelled.is_set()
+
+
+def test_errors_before_deadline_pass_through():
+    conn = _Connection()
+    with pytest.raises(ValueError):
+        with statement_deadline(conn, Deadline(5)):
+            raise ValueError('语句错误')
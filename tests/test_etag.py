@@ -0,0 +1,119 @@
+import types
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from dm_etag import (Fingerprint, change_token_etag, fingerprint_enabled, parse_name_list, parse_proc_map,
+                     result_sets_etag)
+
+
+class INT:
+    pass
+
+
+class VARCHAR:
+    pass
+
+
+DESCRIPTION = [('ID', INT, 10, 10, 10, 0, 0), ('NAME', VARCHAR, 50, 50, 50, 0, 1)]
+
+
+def _digest(description, batches):
+    fingerprint = Fingerprint(description)
+    for rows in batches:
+        fingerprint.update(rows)
+    return fingerprint.digest()
+
+
+def test_fingerprint_depends_only_on_values():
+    rows = [(1, 'a'), (2, None)]
+    copied = [(int('1'), ''.join(['a'])), (2, None)]
+    assert _digest(DESCRIPTION, [rows]) == _digest(DESCRIPTION, [copied])
+    assert _digest(DESCRIPTION, [rows]) != _digest(DESCRIPTION, [[(1, 'a'), (3, None)]])
+    # 空批不影响指纹
+    assert _digest(DESCRIPTION, [rows, []]) == _digest(DESCRIPTION, [rows])
+
+
+def test_fingerprint_covers_column_names_and_types():
+    rows = [(1, 'a')]
+    renamed = [('ID', INT, 10, 10, 10, 0, 0), ('TITLE', VARCHAR, 50, 50, 50, 0, 1)]
+    retyped = [('ID', VARCHAR, 10, 10, 10, 0, 0), ('NAME', VARCHAR, 50, 50, 50, 0, 1)]
+    assert _digest(DESCRIPTION, [rows]) != _digest(renamed, [rows])
+    assert _digest(DESCRIPTION, [rows]) != _digest(retyped, [rows])
+
+
+def test_fingerprint_handles_driver_values_and_unpicklable_objects():
+    rows = [(Decimal('1.50'), datetime(2024, 1, 2, 3, 4, 5), b'\x00\x01')]
+    assert _digest(DESCRIPTION, [rows]) == _digest(DESCRIPTION, [list(rows)])
+
+    class Lob:
+        def __reduce__(self):
+            raise TypeError('LOB 对象不能序列化')
+
+        def __repr__(self):
+            return '<Lob>'
+
+    assert len(_digest(DESCRIPTION, [[(1, Lob())]])) == 16
+
+
+def test_result_sets_etag():
+    first = types.SimpleNamespace(digest=b'1' * 16)
+    second = types.SimpleNamespace(digest=b'2' * 16)
+    etag = result_sets_etag([first, second], 'json')
+    assert etag.endswith('-json')
+    assert etag == result_sets_etag([first, second], 'json')
+    assert etag != result_sets_etag([second, first], 'json')
+    assert etag[:-5] == result_sets_etag([first, second], 'xml')[:-4]
+    assert result_sets_etag([first, types.SimpleNamespace(digest=None)], 'json') is None
+    assert result_sets_etag([first, object()], 'json') is None
+
+
+def test_change_token_etag():
+    etag = change_token_etag('jzx.p', 'a', (7,), 'json')
+    assert etag.startswith('v') and etag.endswith('-json')
+    assert etag == change_token_etag('JZX.P', 'a', (7,), 'json')
+    assert etag != change_token_etag('JZX.P', 'a', (8,), 'json')
+    assert etag != change_token_etag('JZX.P', 'b', (7,), 'json')
+
+
+def test_config_parsing():
+    assert parse_proc_map(' jzx.data = JZX.DATA_VERSION ,bad,=x,y=') == {'JZX.DATA': 'JZX.DATA_VERSION'}
+    assert parse_name_list(' jzx.p1, ,JZX.P2') == {'JZX.P1', 'JZX.P2'}
+    assert fingerprint_enabled('jzx.p1', {'JZX.P1'})
+    assert not fingerprint_enabled('jzx.p2', {'JZX.P1'})
+    assert fingerprint_enabled('anything', {'*'})
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    """使用模拟驱动的服务（加密库为占位文件），所有过程都计算指纹"""
+    import PythonDMService as service
+    for lib in service.preflight.required_libs:
+        (tmp_path / lib).write_bytes(b'\0')
+    monkeypatch.setenv('DM_LIBS_DIR', str(tmp_path))
+    monkeypatch.setattr(service.preflight, '_missing_libs', None)
+    monkeypatch.setattr(service, 'fingerprint_enabled', lambda procedure: True)
+    return service.app.test_client()
+
+
+def _get(client, url, etag=None):
+    """请求并关闭响应（流式响应关闭时才结束请求日志等）"""
+    response = client.get(url, headers={'If-None-Match': etag} if etag else None)
+    with response:
+        return response.status_code, response.headers.get('ETag'), response.get_data()
+
+
+def test_if_none_match_returns_304(client):
+    url = '/jsonService?param1=JZX.P&param2=rows=3'
+    status, etag, _ = _get(client, url)
+    assert status == 200
+    assert etag.startswith('W/"') and etag.endswith('-json"')
+
+    assert _get(client, url, etag) == (304, etag, b'')
+
+    # 数据不同或表示不同（XML）时 ETag 不匹配，正常返回
+    assert _get(client, '/jsonService?param1=JZX.P&param2=rows=4', etag)[0] == 200
+    status, xml_etag, _ = _get(client, '/xmlService?param1=JZX.P&param2=rows=3', etag)
+    assert status == 200
+    assert xml_etag.endswith('-xml"')
@@ -0,0 +1,142 @@
+from decimal import Decimal
+
+import fake_dmPython
+import pytest
+
+from dm_export import ExportError, ExportPlan, ParallelExport, Partition, parse_columns, parse_table, plan_export, \
+    split_range
+
+
+@pytest.fixture
+def fake_table(monkeypatch):
+    """模拟驱动的表：ID（主键 1..500）、INT_2、DECIMAL_3（i × 0.37）、STR_4"""
+    monkeypatch.setattr(fake_dmPython, '_table', fake_dmPython._Table(500, 'int,decimal,str'))
+    return 500
+
+
+def _covering(segments, value):
+    """value 落在的分区序号（应恰好一个）"""
+    return [index for index, (start, end, inclusive) in enumerate(segments)
+            if start <= value and (value <= end if inclusive else value < end)]
+
+
+def test_integer_range():
+    assert split_range(1, 10, 3) == [(1, 4, False), (4, 7, False), (7, 11, False)]
+
+
+def test_integer_range_is_not_split_finer_than_values():
+    assert split_range(5, 6, 8) == [(5, 6, False), (6, 7, False)]
+    assert split_range(7, 7, 4) == [(7, 8, False)]
+
+
+def test_integral_decimals_split_as_integers():
+    segments = split_range(Decimal('1'), Decimal('100.00'), 4)
+    assert all(isinstance(value, int) for start, end, _ in segments for value in (start, end))
+    assert segments[-1] == (76, 101, False)
+
+
+def test_empty_table():
+    assert split_range(None, None, 4) == []
+
+
+def test_decimal_range_is_exact():
+    segments = split_range(Decimal('0.10'), Decimal('0.99'), 4)
+    assert [start for start, _, _ in segments] == [Decimal('0.10'), Decimal('0.32'), Decimal('0.54'), Decimal('0.77')]
+    assert segments[-1] == (Decimal('0.77'), Decimal('0.99'), True)
+    assert all(isinstance(value, Decimal) for start, end, _ in segments for value in (start, end))
+
+
+def test_decimal_range_covers_every_value_once():
+    low, high = Decimal('-12.345'), Decimal('98765.432')
+    segments = split_range(low, high, 7)
+    assert segments[0][0] == low and segments[-1][1] == high
+    for value in (low, high, Decimal('0.000'), Decimal('-0.001'), Decimal('14101.068'), Decimal('98765.431')):
+        assert len(_covering(segments, value)) == 1
+    for _, end, inclusive in segments[:-1]:
+        assert not inclusive and len(_covering(segments, end)) == 1
+
+
+def test_decimal_range_narrower_than_scale():
+    assert split_range(Decimal('0.01'), Decimal('0.02'), 5) == [(Decimal('0.01'), Decimal('0.02'), True)]
+
+
+def test_equal_decimal_bounds():
+    assert split_range(Decimal('2.5'), Decimal('2.5'), 3) == [(Decimal('2.5'), Decimal('2.5'), True)]
+
+
+def test_float_range():
+    segments = split_range(0.0, 1.0, 4)
+    assert [start for start, _, _ in segments] == [0.0, 0.25, 0.5, 0.75]
+    assert segments[-1] == (0.75, 1.0, True)
+    for value in (0.0, 0.25, 0.999, 1.0):
+        assert len(_covering(segments, value)) == 1
+
+
+def test_float_range_drops_empty_segments():
+    low = 1.0
+    high = low + 2.220446049250313e-16
+    segments = split_range(low, high, 8)
+    assert segments[-1][1] == high and segments[-1][2]
+    assert all(start < end for start, end, _ in segments)
+
+
+def test_parse_table():
+    assert parse_table('jzx.t1') == ('JZX', 'T1')
+    for name in ('JZX.T1;DROP', 'A.B.C', '', 'JZX.'):
+        with pytest.raises(ExportError):
+            parse_table(name)
+
+
+def test_parse_columns():
+    assert parse_columns(' ID , NAME ,') == ['ID', 'NAME']
+    with pytest.raises(ExportError):
+        parse_columns('ID,NAME)')
+
+
+def test_plan_query():
+    plan = ExportPlan('JZX.T1', 'ID', ['ID', 'NAME'], (), [Partition(0, 'ID >= ? AND ID < ?', (1, 5))], ordered=True)
+    assert plan.query(plan.partitions[0]) == 'SELECT ID, NAME FROM JZX.T1 WHERE ID >= ? AND ID < ? ORDER BY ID'
+
+
+def _export(plan, parallel):
+    connections = []
+
+    def acquire():
+        conn = fake_dmPython.connect()
+        connections.append(conn)
+        return conn
+
+    def release(conn, error):
+        conn.close()
+
+    export = ParallelExport(plan, acquire, release, parallel=parallel, batch_size=7)
+    rows = [row for batch in export.iter_batches() for row in batch]
+    assert export.rows == len(rows) and len(connections) <= parallel
+    return rows
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_plan_and_scan_with_primary_key(fake_table, ordered):
+    plan = plan_export(fake_dmPython.connect(), 'JZX.T1', partitions=6, ordered=ordered)
+    assert plan.key == 'ID' and len(plan.partitions) == 6
+    ids = [row[0] for row in _export(plan, 3)]
+    assert sorted(ids) == list(range(1, fake_table + 1))
+    if ordered:
+        assert ids == sorted(ids)
+
+
+def test_plan_and_scan_with_decimal_key(fake_table):
+    plan = plan_export(fake_dmPython.connect(), 'JZX.T1', key='DECIMAL_3', columns='ID,DECIMAL_3', partitions=5,
+                       ordered=True)
+    # 键列不是主键：5 个范围分区加一个 IS NULL 分区
+    assert len(plan.partitions) == 6 and plan.partitions[-1].condition == 'DECIMAL_3 IS NULL'
+    assert plan.partitions[0].params[0] == Decimal('0.37') and plan.partitions[4].params[1] == Decimal('185.00')
+    assert all(isinstance(value, Decimal) for partition in plan.partitions for value in partition.params)
+    rows = _export(plan, 2)
+    assert sorted(row[0] for row in rows) == list(range(1, fake_table + 1))
+    assert [row[1] for row in rows] == sorted(row[1] for row in rows)
+
+
+def test_plan_rejects_non_numeric_key(fake_table):
+    with pytest.raises(ExportError):
+        plan_export(fake_dmPython.connect(), 'JZX.T1', key='STR_4')
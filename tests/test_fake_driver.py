@@ -0,0 +1,56 @@
+import threading
+
+import fake_dmPython
+import pytest
+
+from dm_types import column_kinds
+
+
+def test_parse_options():
+    options = fake_dmPython.parse_options('rows=5; sets=2;cols=int:decimal,clob;error=-6602')
+    assert (options['rows'], options['sets'], options['cols'], options['error']) == (
+        5, 2, ['int', 'decimal', 'clob'], '-6602')
+    # 不含 '=' 的参数（如真实业务参数）按默认配置处理
+    assert fake_dmPython.parse_options('abc')['rows'] == fake_dmPython.DEFAULT_ROWS
+    assert fake_dmPython.parse_options(None)['sets'] == fake_dmPython.DEFAULT_SETS
+
+
+def test_callproc_returns_configured_result_sets():
+    conn = fake_dmPython.connect(server='fake')
+    cursor = conn.cursor()
+    cursor.callproc('JZX.P', ('rows=5;sets=2;cols=int,str,datetime,decimal,clob,bool',))
+    first = cursor.description
+    assert [col[0] for col in first] == ['INT_1', 'STR_2', 'DATETIME_3', 'DECIMAL_4', 'CLOB_5', 'BOOL_6']
+    # 类型对象与 dmPython 一样可被服务识别
+    assert column_kinds(first) == ['int', 'str', 'datetime', 'decimal', 'clob', 'bool']
+    assert [len(rows) for rows in iter(lambda: cursor.fetchmany(2), [])] == [2, 2, 1]
+    assert cursor.nextset()
+    second = cursor.fetchall()
+    assert len(second) == 5 and second[0][0] == 100000
+    assert cursor.nextset() is None
+
+
+def test_forced_error_and_unknown_column():
+    cursor = fake_dmPython.connect().cursor()
+    with pytest.raises(fake_dmPython.DatabaseError):
+        cursor.callproc('JZX.P', ('error=-6602',))
+    with pytest.raises(fake_dmPython.ProgrammingError):
+        cursor.callproc('JZX.P', ('cols=geometry',))
+
+
+def test_cancel_interrupts_a_slow_call():
+    conn = fake_dmPython.connect()
+    cursor = conn.cursor()
+    threading.Timer(0.05, conn.cancel).start()
+    with pytest.raises(fake_dmPython.OperationalError):
+        cursor.callproc('JZX.P', ('query_latency=5',))
+    # 取消状态只作用于被中断的语句
+    cursor.callproc('JZX.P', ('rows=1',))
+    assert len(cursor.fetchall()) == 1
+
+
+def test_closed_connection_rejects_cursors():
+    conn = fake_dmPython.connect()
+    conn.close()
+    with pytest.raises(fake_dmPython.InterfaceError):
+        conn.cursor()
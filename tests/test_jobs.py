@@ -0,0 +1,122 @@
+import os
+import pickle
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from dm_jobs import FAILED, SUCCEEDED, JobStore, SpoolWriter, iter_spooled_result_sets
+
+
+class INT:
+    pass
+
+
+class CLOB:
+    pass
+
+
+class _Lob:
+    def __init__(self, text):
+        self.text = text
+
+    def read(self):
+        return self.text
+
+
+DESCRIPTION = [('ID', INT, 10, 10, 10, 0, 0), ('NOTE', CLOB, None, None, None, None, 1)]
+
+
+def _read_all(path, row_counts=None):
+    return [(description, [list(batch) for batch in batches], count)
+            for description, batches, count in iter_spooled_result_sets(open(path, 'rb'), row_counts)]
+
+
+def test_spool_records(tmp_path):
+    path = str(tmp_path / 'job.spool')
+    spool = SpoolWriter(path)
+    assert spool.write_result_set(DESCRIPTION, [[(1, 'a'), (2, None)], [(3, 'c')]]) == 3
+    assert spool.write_result_set([('N', INT, 10, 10, 10, 0, 0)], []) == 0
+    assert not os.path.exists(path)
+    spool.commit()
+    records = []
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                records.append(pickle.load(f))
+            except EOFError:
+                break
+    assert [kind for kind, _ in records] == ['set', 'rows', 'rows', 'end', 'set', 'end']
+    assert records[3] == ('end', 3) and spool.row_counts == [3, 0]
+    assert os.listdir(tmp_path) == ['job.spool']
+
+
+def test_spool_round_trip_reads_lobs_and_keeps_types(tmp_path):
+    path = str(tmp_path / 'job.spool')
+    spool = SpoolWriter(path)
+    created = datetime(2024, 5, 6, 7, 8, 9)
+    spool.write_result_set(DESCRIPTION, [[(1, _Lob('长文本' * 100))], [(2, 'x')]])
+    spool.write_result_set([('AMOUNT', INT, 18, 18, 18, 2, 1), ('CREATED', INT, 19, 19, 19, 0, 1)],
+                           [[(Decimal('12.30'), created)]])
+    spool.commit()
+    result = _read_all(path, row_counts=[2, 1])
+    assert [count for _, _, count in result] == [2, 1]
+    assert result[0][0][0][0] == 'ID' and result[0][1] == [[(1, '长文本' * 100)], [(2, 'x')]]
+    assert result[1][1] == [[(Decimal('12.30'), created)]]
+
+
+def test_unread_batches_are_skipped(tmp_path):
+    path = str(tmp_path / 'job.spool')
+    spool = SpoolWriter(path)
+    spool.write_result_set(DESCRIPTION, [[(1, 'a')], [(2, 'b')]])
+    spool.write_result_set(DESCRIPTION, [[(3, 'c')]])
+    spool.commit()
+    sets = iter_spooled_result_sets(open(path, 'rb'))
+    _, batches, count = next(sets)
+    assert count is None and next(batches) == [(1, 'a')]
+    _, batches, _ = next(sets)
+    assert list(batches) == [[(3, 'c')]]
+
+
+def test_abort_removes_temporary_file(tmp_path):
+    spool = SpoolWriter(str(tmp_path / 'job.spool'))
+    spool.write_result_set(DESCRIPTION, [[(1, 'a')]])
+    spool.abort()
+    assert os.listdir(tmp_path) == []
+
+
+def _job(job_id, status, **fields):
+    return dict({'id': job_id, 'status': status, 'pid': os.getpid(), 'procedure': 'JZX.P'}, **fields)
+
+
+def test_job_store_save_and_load(tmp_path):
+    store = JobStore(str(tmp_path), ttl=60)
+    job_id = 'a' * 32
+    store.save(_job(job_id, SUCCEEDED, row_counts=[3]))
+    assert store.load(job_id)['row_counts'] == [3]
+    assert store.load('b' * 32) is None
+    assert store.load('../etc/passwd') is None
+
+
+def test_job_of_exited_worker_is_failed(tmp_path):
+    store = JobStore(str(tmp_path), ttl=60)
+    job_id = 'c' * 32
+    store.save(_job(job_id, 'running', pid=2 ** 22 + 12345))
+    job = store.load(job_id)
+    assert job['status'] == FAILED and job['error_code'] == 'WORKER_EXITED'
+    assert store.load(job_id)['status'] == FAILED
+
+
+def test_cleanup_removes_expired_jobs_and_orphans(tmp_path):
+    store = JobStore(str(tmp_path), ttl=60)
+    now = time.time()
+    expired, fresh, running = 'd' * 32, 'e' * 32, 'f' * 32
+    store.save(_job(expired, SUCCEEDED, expires=now - 1))
+    store.save(_job(fresh, SUCCEEDED, expires=now + 60))
+    store.save(_job(running, 'running'))
+    for job_id in (expired, fresh, running, '0' * 32):
+        open(store.spool_path(job_id), 'wb').close()
+    orphan = store.spool_path('0' * 32)
+    os.utime(orphan, (now - 120, now - 120))
+    assert store.cleanup(now) == 1
+    assert sorted(os.listdir(tmp_path)) == sorted(f'{job_id}.{suffix}' for job_id in (fresh, running)
+                                                  for suffix in ('json', 'spool'))
@@ -0,0 +1,161 @@
+import contextvars
+import json
+import logging
+import queue
+import sys
+import types
+
+import pytest
+
+import dm_log
+from dm_log import (JsonLinesFormatter, RequestLog, _DroppingQueueHandler, annotate, begin_request,
+                    current_request, phase, timed_iter)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def perf_counter(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(dm_log, 'time', types.SimpleNamespace(perf_counter=clock.perf_counter))
+    return clock
+
+
+class _Capture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def captured():
+    logger = logging.getLogger('dm.test_log')
+    handler = _Capture()
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    yield logger, handler.records
+    logger.removeHandler(handler)
+
+
+def _record(msg='消息 %s', args=('参数',), **attrs):
+    record = logging.LogRecord('dm.service', logging.INFO, __file__, 1, msg, args, None)
+    record.__dict__.update(attrs)
+    return record
+
+
+def test_json_lines_formatter():
+    record = _record(request_id='abc', fields={'procedure': 'JZX.P', 'rows': 3})
+    entry = json.loads(JsonLinesFormatter().format(record))
+    assert entry['level'] == 'INFO'
+    assert entry['logger'] == 'dm.service'
+    assert entry['request_id'] == 'abc'
+    assert entry['msg'] == '消息 参数'
+    assert (entry['procedure'], entry['rows']) == ('JZX.P', 3)
+
+
+def test_queue_handler_drops_when_full_and_reports_later():
+    log_queue = queue.Queue(maxsize=4)
+    handler = _DroppingQueueHandler(log_queue, logging.NullHandler())
+    for _ in range(5):
+        handler.emit(_record())
+    assert (handler.enqueued, handler.dropped) == (4, 1)
+
+    prepared = log_queue.get_nowait()
+    assert (prepared.msg, prepared.args) == ('消息 参数', None)
+    # 队列腾出一半空间后补记丢弃数
+    while not log_queue.empty():
+        log_queue.get_nowait()
+    handler.emit(_record())
+    assert log_queue.qsize() == 2
+    warning = log_queue.queue[-1]
+    assert warning.levelno == logging.WARNING
+    assert warning.msg == '日志队列已满，丢弃了 1 条记录'
+    handler.emit(_record())
+    assert log_queue.qsize() == 3  # 只补记一次
+    handler.close()
+
+
+def test_prepare_renders_exception_text():
+    handler = _DroppingQueueHandler(queue.Queue(), logging.NullHandler())
+    try:
+        raise ValueError('出错了')
+    except ValueError:
+        record = logging.LogRecord('dm', logging.ERROR, __file__, 1, 'x', None, sys.exc_info())
+    prepared = handler.prepare(record)
+    assert prepared.exc_info is None
+    assert 'ValueError: 出错了' in prepared.exc_text
+
+
+def test_phases_are_exclusive_and_accumulate(clock):
+    request_log = RequestLog('r1')
+    with request_log.phase('fetch'):
+        clock.now += 0.010
+        with request_log.phase('serialize'):
+            clock.now += 0.005
+        clock.now += 0.001
+    with request_log.phase('serialize'):
+        clock.now += 0.002
+    assert request_log.phases == pytest.approx({'fetch': 11.0, 'serialize': 7.0})
+
+
+def test_finish_logs_summary_once(clock, captured):
+    logger, records = captured
+
+    def run():
+        request_log = begin_request('r1', route='/jsonService')
+        assert current_request() is request_log
+        annotate(procedure='JZX.P')
+        with phase('callproc'):
+            clock.now += 0.003
+        clock.now += 0.001
+        request_log.finish(logger, 503, rows=0)
+        request_log.finish(logger, 200)
+        return current_request()
+
+    assert contextvars.Context().run(run) is None
+    assert len(records) == 1
+    record = records[0]
+    assert (record.levelno, record.request_id) == (logging.ERROR, 'r1')
+    assert record.fields == {'route': '/jsonService', 'procedure': 'JZX.P', 'rows': 0, 'status': 503,
+                             'duration_ms': 4.0, 'phases': {'callproc': 3.0}}
+
+
+def test_outside_a_request_nothing_is_recorded():
+    def run():
+        annotate(procedure='JZX.P')
+        with phase('callproc'):
+            pass
+        assert list(timed_iter([1, 2], 'fetch')) == [1, 2]
+        return current_request()
+
+    assert contextvars.Context().run(run) is None
+
+
+def test_timed_iter_times_items_and_closes_source(clock):
+    closed = []
+
+    def source():
+        try:
+            for item in range(3):
+                clock.now += 0.002
+                yield item
+        finally:
+            closed.append(True)
+
+    request_log = RequestLog('r1')
+    items = timed_iter(source(), 'fetch', request_log)
+    assert next(items) == 0
+    clock.now += 1  # 调用方处理的时间不计入
+    assert next(items) == 1
+    items.close()
+    assert closed == [True]
+    assert request_log.phases == pytest.approx({'fetch': 4.0})
@@ -0,0 +1,102 @@
+import json
+import os
+
+import pytest
+
+from dm_metrics import LabelLimiter, Registry
+
+
+def test_counter_and_gauge_render():
+    registry = Registry(directory='')
+    requests = registry.counter('dm_requests_total', '请求数', ('route', 'status'))
+    in_flight = registry.gauge('dm_in_flight', '在途请求数')
+    requests.inc('/jsonService', 200)
+    requests.inc('/jsonService', 200, amount=2)
+    requests.inc('/xml"Service\n', 500)
+    in_flight.inc()
+    in_flight.inc(amount=3)
+    in_flight.dec()
+    assert registry.render().splitlines() == [
+        '# HELP dm_requests_total 请求数',
+        '# TYPE dm_requests_total counter',
+        'dm_requests_total{route="/jsonService",status="200"} 3',
+        'dm_requests_total{route="/xml\\"Service\\n",status="500"} 1',
+        '# HELP dm_in_flight 在途请求数',
+        '# TYPE dm_in_flight gauge',
+        'dm_in_flight 3',
+    ]
+
+
+def test_wrong_label_count_is_rejected():
+    counter = Registry(directory='').counter('dm_total', '计数', ('route',))
+    with pytest.raises(ValueError):
+        counter.inc()
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry(directory='')
+    latency = registry.histogram('dm_latency_seconds', '耗时', ('route',), buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        latency.observe('/x', value=value)
+    assert registry.render().splitlines()[2:] == [
+        'dm_latency_seconds_bucket{route="/x",le="0.1"} 2',
+        'dm_latency_seconds_bucket{route="/x",le="1"} 3',
+        'dm_latency_seconds_bucket{route="/x",le="+Inf"} 4',
+        'dm_latency_seconds_sum{route="/x"} 3.65',
+        'dm_latency_seconds_count{route="/x"} 4',
+    ]
+
+
+def test_collectors_are_rendered():
+    registry = Registry(directory='')
+    registry.register_collector(lambda: [('dm_pool_size', 'gauge', '连接数', [({'node': 'primary'}, 2.0)])])
+    assert registry.render().splitlines() == [
+        '# HELP dm_pool_size 连接数', '# TYPE dm_pool_size gauge', 'dm_pool_size{node="primary"} 2']
+
+
+def _registry(directory):
+    registry = Registry(directory=str(directory))
+    counter = registry.counter('dm_total', '计数', ('route',))
+    gauge = registry.gauge('dm_in_flight', '在途请求数')
+    latency = registry.histogram('dm_latency_seconds', '耗时', buckets=(1,))
+    return registry, counter, gauge, latency
+
+
+def test_snapshots_of_other_processes_are_merged(tmp_path, monkeypatch):
+    other, counter, gauge, latency = _registry(tmp_path)
+    counter.inc('/a', amount=5)
+    gauge.set(value=4)
+    latency.observe(value=2)
+    other.write_snapshot()
+    # 当作另一个进程写出的快照
+    os.replace(tmp_path / f'metrics-{os.getpid()}.json', tmp_path / 'metrics-1.json')
+    data = json.loads((tmp_path / 'metrics-1.json').read_text(encoding='utf-8'))
+    data['pid'] = 1
+    (tmp_path / 'metrics-1.json').write_text(json.dumps(data), encoding='utf-8')
+    (tmp_path / 'metrics-2.json').write_text('{broken', encoding='utf-8')
+
+    registry, counter, gauge, latency = _registry(tmp_path)
+    counter.inc('/a')
+    counter.inc('/b')
+    gauge.set(value=1)
+    latency.observe(value=0.5)
+
+    monkeypatch.setattr(Registry, '_is_alive', staticmethod(lambda pid: True))
+    text = registry.render()
+    assert 'dm_total{route="/a"} 6' in text
+    assert 'dm_total{route="/b"} 1' in text
+    assert 'dm_in_flight 5' in text
+    assert 'dm_latency_seconds_bucket{le="1"} 1' in text
+    assert 'dm_latency_seconds_count 2' in text
+
+    # 已退出进程的仪表不再计入，计数与直方图保留
+    monkeypatch.setattr(Registry, '_is_alive', staticmethod(lambda pid: False))
+    text = registry.render()
+    assert 'dm_in_flight 1' in text
+    assert 'dm_total{route="/a"} 6' in text
+
+
+def test_label_limiter():
+    limiter = LabelLimiter(limit=2)
+    assert [limiter(name) for name in ('jzx.a', 'JZX.B', 'jzx.c', 'JZX.A', None)] == [
+        'JZX.A', 'JZX.B', 'other', 'JZX.A', 'other']
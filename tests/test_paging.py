@@ -0,0 +1,111 @@
+import base64
+import json
+
+import pytest
+
+from dm_paging import PageRequest, PagingError, parse_page_request, skip_rows
+
+
+def test_token_round_trip():
+    page = PageRequest('JZX.GET_TEST0', '参数,1', set_index=2, offset=300, limit=100, cursor_id='abc123')
+    restored = PageRequest.from_token(page.to_token())
+    assert (restored.procedure, restored.params, restored.set_index, restored.offset, restored.limit,
+            restored.cursor_id) == ('JZX.GET_TEST0', '参数,1', 2, 300, 100, 'abc123')
+
+
+def test_token_is_url_safe_without_padding():
+    token = PageRequest('JZX.P', '?&=/+' * 7, offset=1).to_token()
+    assert '=' not in token and '+' not in token and '/' not in token
+    assert PageRequest.from_token(token).params == '?&=/+' * 7
+
+
+def test_token_without_cursor():
+    restored = PageRequest.from_token(PageRequest('JZX.P', '', limit=10).to_token())
+    assert restored.cursor_id is None
+
+
+def test_token_with_null_params():
+    assert PageRequest.from_token(_raw_token({'p': 'JZX.P', 'a': None, 's': 1, 'o': 0, 'l': 10})).params == ''
+
+
+def test_next_page_advances_offset_and_keeps_position():
+    page = PageRequest('JZX.P', 'x', set_index=3, offset=20, limit=10)
+    following = page.next(10, cursor_id='c1')
+    assert (following.set_index, following.offset, following.limit, following.cursor_id) == (3, 30, 10, 'c1')
+
+
+def _raw_token(data):
+    text = json.dumps(data)
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+@pytest.mark.parametrize('token', [
+    'not-a-token!',
+    _raw_token([1, 2]),
+    _raw_token({'p': 'JZX.P', 's': 1, 'o': 0}),
+    _raw_token({'p': 'JZX.P', 's': 0, 'o': 0, 'l': 10}),
+    _raw_token({'p': 'JZX.P', 's': 1, 'o': -1, 'l': 10}),
+    _raw_token({'p': 'JZX.P', 's': 1, 'o': 0, 'l': 'x'}),
+    _raw_token({'p': 'JZX.P', 'a': ['x'], 's': 1, 'o': 0, 'l': 10}),
+    _raw_token({'p': 'JZX.P', 'a': {'k': 1}, 's': 1, 'o': 0, 'l': 10}),
+    _raw_token({'p': 'JZX.P', 'a': 'x', 's': 1, 'o': 0, 'l': 10, 'c': ['id']}),
+])
+def test_invalid_token(token):
+    with pytest.raises(PagingError):
+        PageRequest.from_token(token)
+
+
+def test_no_paging_without_limit_or_token():
+    assert parse_page_request({}, 'JZX.P', '') is None
+    assert parse_page_request({'limit': ''}, 'JZX.P', '') is None
+
+
+def test_parse_first_page():
+    page = parse_page_request({'limit': '50', 'set': '2', 'offset': '10'}, 'JZX.P', 'a')
+    assert (page.procedure, page.params, page.set_index, page.offset, page.limit) == ('JZX.P', 'a', 2, 10, 50)
+
+
+def test_limit_is_capped():
+    assert parse_page_request({'limit': '500'}, 'JZX.P', '', max_limit=100).limit == 100
+
+
+@pytest.mark.parametrize('data', [{'limit': 'x'}, {'limit': '0'}, {'limit': '5', 'set': '0'},
+                                  {'limit': '5', 'offset': '-1'}])
+def test_parse_rejects_bad_values(data):
+    with pytest.raises(PagingError):
+        parse_page_request(data, 'JZX.P', '')
+
+
+def test_parse_token_overrides_position_and_allows_new_limit():
+    token = PageRequest('JZX.P', 'a', set_index=2, offset=40, limit=20, cursor_id='c1').to_token()
+    page = parse_page_request({'token': token, 'limit': '5', 'offset': '999'}, 'jzx.p', 'ignored')
+    assert (page.params, page.set_index, page.offset, page.limit, page.cursor_id) == ('a', 2, 40, 5, 'c1')
+    assert parse_page_request({'token': token}, '', '').limit == 20
+
+
+def test_parse_token_for_other_procedure():
+    token = PageRequest('JZX.P', '').to_token()
+    with pytest.raises(PagingError):
+        parse_page_request({'token': token}, 'JZX.OTHER', '')
+
+
+class _Cursor:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.sizes = []
+
+    def fetchmany(self, size):
+        self.sizes.append(size)
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+
+def test_skip_rows_in_batches():
+    cursor = _Cursor(range(25))
+    assert skip_rows(cursor, 23, batch_size=10) == 23
+    assert cursor.sizes == [10, 10, 3]
+    assert cursor.rows == [23, 24]
+
+
+def test_skip_rows_past_end():
+    assert skip_rows(_Cursor(range(5)), 10, batch_size=4) == 5
@@ -0,0 +1,130 @@
+import threading
+import time
+
+import fake_dmPython
+import pytest
+
+from dm_pool import ConnectionPool, PoolTimeoutError
+
+
+def _pool(**options):
+    options.setdefault('min_size', 0)
+    options.setdefault('max_size', 2)
+    options.setdefault('checkout_timeout', 0.2)
+    options.setdefault('ping_after', 60)
+    options.setdefault('idle_timeout', 600)
+    options.setdefault('max_lifetime', 3600)
+    options.setdefault('validation_sql', 'SELECT 1')
+    return ConnectionPool(fake_dmPython, {'server': 'fake', 'user': 'JZX'}, **options)
+
+
+def test_connections_are_reused():
+    pool = _pool()
+    conn = pool.acquire()
+    assert conn.params == {'server': 'fake', 'user': 'JZX'}
+    pool.release(conn)
+    assert pool.acquire() is conn
+    stats = pool.stats()
+    assert (stats['created'], stats['checkouts'], stats['in_use'], stats['idle']) == (1, 2, 1, 0)
+
+
+def test_checkout_times_out_when_pool_is_full():
+    pool = _pool(max_size=1, checkout_timeout=0.05)
+    pool.acquire()
+    started = time.monotonic()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    assert 0.04 <= time.monotonic() - started < 1
+    assert pool.stats()['timeouts'] == 1
+
+
+def test_waiting_checkout_gets_released_connection():
+    pool = _pool(max_size=1, checkout_timeout=5)
+    conn = pool.acquire()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(pool.acquire()))
+    thread.start()
+    while pool.stats()['waiting'] == 0:
+        time.sleep(0.001)
+    pool.release(conn)
+    thread.join()
+    assert result == [conn] and pool.stats()['created'] == 1
+
+
+def test_discarded_connection_is_closed_and_replaced():
+    pool = _pool(max_size=1)
+    conn = pool.acquire()
+    pool.release(conn, discard=True)
+    assert conn.closed and pool.stats()['size'] == 0
+    assert pool.acquire() is not conn
+
+
+def test_idle_connection_is_validated_before_checkout():
+    pool = _pool(ping_after=0)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.close()  # 模拟连接在空闲期间被服务器断开：校验语句失败
+    fresh = pool.acquire()
+    assert fresh is not conn and not fresh.closed
+    stats = pool.stats()
+    assert stats['validation_failures'] == 1 and stats['created'] == 2 and stats['size'] == 1
+
+
+def test_connection_past_max_lifetime_is_recycled():
+    pool = _pool(max_lifetime=0.01)
+    conn = pool.acquire()
+    time.sleep(0.02)
+    pool.release(conn)
+    assert conn.closed and pool.stats()['recycled_lifetime'] == 1
+
+
+def test_reap_evicts_idle_connections_above_min_size():
+    pool = _pool(min_size=1, max_size=3, idle_timeout=0.01)
+    conns = [pool.acquire() for _ in range(3)]
+    for conn in conns:
+        pool.release(conn)
+    time.sleep(0.02)
+    assert pool.reap() == 2
+    stats = pool.stats()
+    assert stats['size'] == 1 and stats['evicted_idle'] == 2
+
+
+def test_fill_creates_min_size_connections():
+    pool = _pool(min_size=2, max_size=4)
+    pool.fill()
+    assert pool.stats()['idle'] == 2 and pool.stats()['created'] == 2
+
+
+def test_connect_failure_frees_reserved_slot():
+    class FailingDriver:
+        DatabaseError = fake_dmPython.DatabaseError
+
+        @staticmethod
+        def connect(**params):
+            raise fake_dmPython.DatabaseError(-70019, '连接失败')
+
+    pool = ConnectionPool(FailingDriver, {}, min_size=0, max_size=1, checkout_timeout=0.05)
+    for _ in range(2):
+        with pytest.raises(fake_dmPython.DatabaseError):
+            pool.acquire()
+    assert pool.stats()['size'] == 0
+
+
+def test_connection_context_rolls_back_on_error():
+    pool = _pool()
+    rollbacks = []
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            conn.rollback = lambda: rollbacks.append(True)
+            raise ValueError('失败')
+    assert rollbacks == [True] and pool.stats()['idle'] == 1
+
+
+def test_close_rejects_new_checkouts():
+    pool = _pool()
+    conn = pool.acquire()
+    pool.close()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    pool.release(conn)
+    assert conn.closed
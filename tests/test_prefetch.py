@@ -0,0 +1,82 @@
+import contextvars
+
+import pytest
+
+from dm_prefetch import Prefetcher, parse_targets
+
+
+def test_empty_config():
+    assert parse_targets('') == [] and parse_targets(None) == [] and parse_targets('  ') == []
+
+
+def test_short_form():
+    assert parse_targets('JZX.GET_TEST0=30, JZX.GET_TEST1:参数=60,JZX.GET_TEST2', default_interval=15) == [
+        ('JZX.GET_TEST0', '', 30.0), ('JZX.GET_TEST1', '参数', 60.0), ('JZX.GET_TEST2', '', 15.0)]
+
+
+def test_short_form_params_may_contain_equals_sign():
+    assert parse_targets('JZX.P:a=1=45') == [('JZX.P', 'a=1', 45.0)]
+
+
+def test_short_form_skips_invalid_items():
+    assert parse_targets('JZX.P=abc,=30,,JZX.Q=5') == [('JZX.Q', '', 5.0)]
+
+
+def test_json_form():
+    text = '[{"procedure": "JZX.GET_TEST0", "params": "a,b", "interval": 10}, {"procedure": "JZX.P", "params": 7}]'
+    assert parse_targets(text, default_interval=20) == [('JZX.GET_TEST0', 'a,b', 10.0), ('JZX.P', '7', 20.0)]
+
+
+def test_invalid_json_raises():
+    with pytest.raises(ValueError):
+        parse_targets('[{"procedure": ')
+
+
+_marker = contextvars.ContextVar('marker', default=None)
+
+
+def test_snapshot_lifecycle():
+    calls = []
+
+    def loader(procedure, params):
+        calls.append((procedure, params, _marker.get()))
+        return f'{procedure}:{params}:{len(calls)}'
+
+    refreshed = []
+    prefetcher = Prefetcher(loader, [('JZX.P', 'a', 10)], max_stale=5,
+                            on_refresh=lambda procedure, seconds, success: refreshed.append((procedure, success)))
+    target = prefetcher._targets[prefetcher.make_key('jzx.p', 'a')]
+    assert prefetcher.get('JZX.P', 'a') is None
+    assert prefetcher.get('JZX.OTHER', 'a') is None
+
+    _marker.set('request')
+    prefetcher.refresh(target)
+    # loader 在全新的上下文中执行，不继承调用方的 contextvars
+    assert calls == [('JZX.P', 'a', None)] and refreshed == [('JZX.P', True)]
+    assert prefetcher.get('jzx.p', 'a') == ('JZX.P:a:1', True)
+
+    # 超过刷新间隔：返回旧快照（不新鲜）并安排立即刷新
+    target.next_due = float('inf')
+    target.snapshot.loaded_at -= 12
+    assert prefetcher.get('JZX.P', 'a') == ('JZX.P:a:1', False)
+    assert target.next_due == 0.0
+    # 超过刷新间隔 + max_stale：不再返回
+    target.snapshot.loaded_at -= 10
+    assert prefetcher.get('JZX.P', 'a') is None
+
+    status = prefetcher.status()
+    assert status['hits'] == 1 and status['stale_hits'] == 1 and status['too_stale'] == 1
+
+
+def test_failed_refresh_keeps_old_snapshot():
+    results = iter(['first'])
+
+    def loader(procedure, params):
+        return next(results)
+
+    prefetcher = Prefetcher(loader, [('JZX.P', '', 60)], retry_interval=2)
+    target = prefetcher._targets[prefetcher.make_key('JZX.P', '')]
+    prefetcher.refresh(target)
+    prefetcher.refresh(target)
+    assert prefetcher.get('JZX.P', '') == ('first', True)
+    assert target.failures == 1 and target.refreshes == 2 and target.last_error is not None
@@ -0,0 +1,89 @@
+import types
+
+import fake_dmPython
+import pytest
+
+from dm_pool import ConnectionPool
+from dm_preflight import Preflight, check_libs
+
+LIBS = ['liba.so', 'libb.so']
+
+
+def _pool(driver=fake_dmPython, min_size=1):
+    return ConnectionPool(driver, {'server': 'fake'}, min_size=min_size, max_size=2, checkout_timeout=0.2,
+                          ping_after=60, idle_timeout=600, max_lifetime=3600, validation_sql='SELECT 1')
+
+
+@pytest.fixture
+def lib_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('DM_LIBS_DIR', str(tmp_path))
+    return tmp_path
+
+
+def test_check_libs_finds_first_non_empty_file(tmp_path):
+    first, second = tmp_path / 'a', tmp_path / 'b'
+    first.mkdir()
+    second.mkdir()
+    (first / 'liba.so').write_bytes(b'')
+    (second / 'liba.so').write_bytes(b'abc')
+    (first / 'libb.so').write_bytes(b'x')
+    assert check_libs(LIBS + ['libc.so'], [str(first), str(second)]) == {
+        'liba.so': {'path': str(second / 'liba.so'), 'size': 3},
+        'libb.so': {'path': str(first / 'libb.so'), 'size': 1},
+        'libc.so': {'path': None, 'size': 0},
+    }
+
+
+def test_ready_when_libs_present_and_database_reachable(lib_dir):
+    for lib in LIBS:
+        (lib_dir / lib).write_bytes(b'\0')
+    pool = _pool()
+    preflight = Preflight(pool, LIBS, refresh_interval=0)
+    state = preflight.run(verbose=False)
+    assert state['ready']
+    assert state['checks']['libs'] == {'ok': True, 'missing': []}
+    assert state['checks']['database']['ok']
+    assert state['checks']['pool'] == {'ok': True, 'size': 1, 'min_size': 1}
+    assert preflight.readiness() == state
+    preflight.require_libs()
+
+
+def test_missing_libs_skip_database_check(lib_dir):
+    (lib_dir / 'liba.so').write_bytes(b'\0')
+    pool = _pool()
+    preflight = Preflight(pool, LIBS, refresh_interval=0)
+    state = preflight.run(verbose=False)
+    assert not state['ready']
+    assert state['checks']['libs'] == {'ok': False, 'missing': ['libb.so']}
+    assert not state['checks']['database']['ok']
+    assert pool.stats()['created'] == 0
+    with pytest.raises(Exception, match='缺失加密库：libb.so'):
+        preflight.require_libs()
+
+
+def test_require_libs_checks_once_and_uses_cached_result(lib_dir):
+    preflight = Preflight(_pool(), LIBS, refresh_interval=0)
+    with pytest.raises(Exception, match='liba.so, libb.so'):
+        preflight.require_libs()
+    for lib in LIBS:
+        (lib_dir / lib).write_bytes(b'\0')
+    # 请求路径只读缓存的检查结果，刷新后才生效
+    with pytest.raises(Exception):
+        preflight.require_libs()
+    preflight.refresh()
+    preflight.require_libs()
+
+
+def test_database_error_is_reported(lib_dir):
+    for lib in LIBS:
+        (lib_dir / lib).write_bytes(b'\0')
+
+    def connect(**params):
+        raise fake_dmPython.OperationalError(-70019, '网络通信异常')
+
+    preflight = Preflight(_pool(types.SimpleNamespace(connect=connect)), LIBS, refresh_interval=0)
+    state = preflight.refresh()
+    assert not state['ready']
+    assert '网络通信异常' in state['checks']['database']['error']
+    assert not state['checks']['pool']['ok']
+    assert preflight.liveness()['status'] == 'ok'
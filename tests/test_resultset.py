@@ -0,0 +1,142 @@
+import gc
+
+import pytest
+
+from dm_buffer import MemoryBudget, RowBuffer, SpilledRows
+from dm_resultset import ResultSet
+
+
+class INT:
+    pass
+
+
+class CLOB:
+    pass
+
+
+class BLOB:
+    pass
+
+
+class _Connection:
+    def __init__(self):
+        self.in_pool = False
+
+
+class _Lob:
+    """驱动的 LOB 对象：只能在连接归还连接池之前读取"""
+
+    def __init__(self, conn, value):
+        self.conn = conn
+        self.value = value
+
+    def read(self):
+        if self.conn.in_pool:
+            raise RuntimeError('连接已归还连接池，无法读取 LOB')
+        return self.value
+
+
+class _Cursor:
+    def __init__(self, description, rows):
+        self.description = description
+        self.rows = list(rows)
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+
+DESCRIPTION = [('ID', INT, 10, 10, 10, 0, 0), ('NOTE', CLOB, None, None, None, None, 1),
+               ('DATA', BLOB, None, None, None, None, 1)]
+
+
+def _lob_rows(conn, count):
+    return [(i, _Lob(conn, f'说明{i}'), _Lob(conn, bytes([i % 256]) * 3)) for i in range(count)]
+
+
+def _expected(count):
+    return [(i, f'说明{i}', bytes([i % 256]) * 3) for i in range(count)]
+
+
+def test_rows_are_kept_as_tuples_with_columns_once():
+    description = [('ID', INT, 10, 10, 10, 0, 0), ('NAME', CLOB, None, None, None, None, 1)]
+    rows = [(1, 'a'), (2, None), (3, 'c')]
+    result_set = ResultSet.from_cursor(_Cursor(description, rows), batch_size=2)
+    assert result_set.columns == ['ID', 'NAME'] and result_set.description == tuple(description)
+    assert result_set.rows == rows and result_set.digest is None
+    assert (result_set.row_count, result_set.column_count, len(result_set)) == (3, 2, 3)
+    assert result_set.to_dicts() == [{'ID': 1, 'NAME': 'a'}, {'ID': 2, 'NAME': None}, {'ID': 3, 'NAME': 'c'}]
+    assert result_set.column_arrays() == [[1, 2, 3], ['a', None, 'c']]
+    assert result_set.to_columnar() == {'columns': ['ID', 'NAME'], 'data': [[1, 'a'], [2, None], [3, 'c']]}
+    assert list(result_set.iter_batches(2)) == [rows[:2], rows[2:]]
+    assert result_set.estimated_size() > 0
+
+
+def test_empty_result_set():
+    result_set = ResultSet([('ID', INT, 10, 10, 10, 0, 0)])
+    assert result_set.row_count == 0
+    assert result_set.column_arrays() == [[]]
+    assert result_set.to_columnar() == {'columns': ['ID'], 'data': []}
+    assert list(result_set.iter_batches()) == []
+
+
+@pytest.mark.parametrize('limit', [0, 1])
+def test_lobs_are_read_while_fetching(limit):
+    """内存中（limit=0 不限）与溢出到临时文件（limit=1）两种情况下，LOB 都在读取时读出"""
+    conn = _Connection()
+    budget = MemoryBudget(limit)
+    result_set = ResultSet.from_cursor(_Cursor(DESCRIPTION, _lob_rows(conn, 50)), batch_size=16, budget=budget)
+    conn.in_pool = True
+    assert isinstance(result_set.rows, SpilledRows) == (limit == 1)
+    assert list(result_set.rows) == _expected(50)
+    assert result_set.to_dicts()[3] == {'ID': 3, 'NOTE': '说明3', 'DATA': b'\x03\x03\x03'}
+
+
+def test_fingerprint_of_lob_rows_is_stable():
+    digests = set()
+    for _ in range(2):
+        conn = _Connection()
+        result_set = ResultSet.from_cursor(_Cursor(DESCRIPTION, _lob_rows(conn, 10)), fingerprint=True)
+        digests.add(result_set.digest)
+    assert len(digests) == 1
+
+
+def test_in_memory_rows_return_budget_when_collected():
+    budget = MemoryBudget(10 ** 9)
+    description = [('ID', INT, 10, 10, 10, 0, 0)]
+    result_set = ResultSet.from_cursor(_Cursor(description, [(i,) for i in range(100)]), batch_size=30, budget=budget)
+    assert budget.used > 0 and result_set.spilled_bytes == 0
+    del result_set
+    gc.collect()
+    assert budget.used == 0 and budget.peak > 0
+
+
+def test_spill_releases_budget_and_keeps_rows():
+    description = [('ID', INT, 10, 10, 10, 0, 0)]
+    first = ResultSet.from_cursor(_Cursor(description, [(i,) for i in range(100)]), budget=MemoryBudget(0))
+    budget = MemoryBudget(first.estimated_size() // 3)
+    result_set = ResultSet.from_cursor(_Cursor(description, [(i,) for i in range(100)]), batch_size=10, budget=budget)
+    assert isinstance(result_set.rows, SpilledRows) and result_set.spilled_bytes > 0
+    assert budget.used == 0 and budget.rejected == 1
+    assert len(result_set) == 100 and list(result_set.rows) == [(i,) for i in range(100)]
+    assert [len(batch) for batch in result_set.iter_batches(40)] == [40, 40, 20]
+    assert result_set.estimated_size() >= result_set.spilled_bytes
+
+
+def test_failed_read_releases_budget():
+    class _FailingCursor(_Cursor):
+        def fetchmany(self, size):
+            if not self.rows:
+                raise RuntimeError('读取失败')
+            return super().fetchmany(size)
+
+    budget = MemoryBudget(10 ** 9)
+    with pytest.raises(RuntimeError):
+        ResultSet.from_cursor(_FailingCursor([('ID', INT, 10, 10, 10, 0, 0)], [(1,), (2,)]), budget=budget)
+    assert budget.used == 0
+
+
+def test_row_buffer_without_budget_keeps_rows_in_memory():
+    buffer = RowBuffer()
+    buffer.extend([(1,), (2,)])
+    assert buffer.finish() == [(1,), (2,)] and not buffer.spilled and buffer.reserved == 0
@@ -0,0 +1,107 @@
+import types
+
+import fake_dmPython
+import pytest
+
+from dm_breaker import CircuitBreaker
+from dm_pool import ConnectionPool
+from dm_router import PRIMARY, REPLICA, STANDBY, NodeRouter, parse_nodes, parse_patterns
+
+CONN_PARAMS = {'server': 'localhost', 'port': 5236, 'user': 'JZX'}
+NODES = 'dm1=primary@10.0.0.1,dm2=standby@10.0.0.2:5237,replica@10.0.0.3'
+
+
+def _pool(driver, conn_params):
+    return ConnectionPool(driver, conn_params, min_size=0, max_size=2, checkout_timeout=0.2, ping_after=60,
+                          idle_timeout=600, max_lifetime=3600, validation_sql='SELECT 1')
+
+
+def _router(nodes=NODES, driver=fake_dmPython, **kwargs):
+    kwargs.setdefault('readonly', ['JZX.RPT_*', 'JZX.GET_DATA'])
+    kwargs.setdefault('readwrite', ['JZX.RPT_SAVE'])
+    return NodeRouter(driver, nodes, CONN_PARAMS, check_interval=0, pool_factory=_pool, **kwargs)
+
+
+def test_parse_nodes():
+    assert parse_nodes(NODES, default_port=5236) == [
+        ('dm1', PRIMARY, '10.0.0.1', 5236), ('dm2', STANDBY, '10.0.0.2', 5237),
+        ('10.0.0.3:5236', REPLICA, '10.0.0.3', 5236)]
+    assert parse_nodes(' , ') == []
+    for text in ('dm1=master@10.0.0.1', 'dm1=primary@', 'primary@10.0.0.1:port'):
+        with pytest.raises(ValueError):
+            parse_nodes(text)
+
+
+def test_parse_patterns():
+    assert parse_patterns(' jzx.rpt_*, ,JZX.GET_DATA') == ['JZX.RPT_*', 'JZX.GET_DATA']
+
+
+def test_exactly_one_primary_is_required():
+    with pytest.raises(ValueError, match='只有一个主库'):
+        _router('standby@10.0.0.2')
+    with pytest.raises(ValueError, match='当前 2 个'):
+        _router('primary@10.0.0.1,primary@10.0.0.2')
+    router = _router('')
+    assert [node.name for node in router.nodes] == ['localhost:5236']
+    assert router.select('JZX.RPT_DAILY') is router.primary
+
+
+def test_read_only_procedures_go_to_replicas():
+    router = _router()
+    primary, standby, replica = router.nodes
+    assert router.is_read_only('jzx.rpt_daily')
+    assert not router.is_read_only('JZX.RPT_SAVE')
+    assert router.candidates('JZX.SAVE') == [primary]
+
+    first = router.candidates('JZX.RPT_DAILY')
+    second = router.candidates('JZX.RPT_DAILY')
+    assert first[-1] is primary and {first[0], second[0]} == {standby, replica}  # 在途数相同时轮流
+
+    conn = router.acquire(standby)
+    assert conn.params['server'] == '10.0.0.2' and conn.params['port'] == 5237
+    assert router.node_of(conn) is standby
+    assert all(router.select('JZX.GET_DATA') is replica for _ in range(3))  # 选在途请求最少的节点
+    router.release(conn)
+    assert standby.outstanding == 0
+    assert standby.pool.stats()['idle'] == 1
+
+    stats = router.stats()
+    assert (stats['routed_primary'], stats['routed_replica']) == (1, 5)
+    assert stats['nodes']['dm2']['role'] == STANDBY
+
+
+def test_unavailable_replicas_fall_back_to_primary():
+    router = _router()
+    primary, standby, replica = router.nodes
+    router.mark_down(standby, '连接失败')
+    replica.breaker = CircuitBreaker(min_calls=1, error_rate=0.5, open_seconds=60)
+    replica.breaker.record(False, 0)
+    assert router.candidates('JZX.RPT_DAILY') == [primary]
+    assert router.stats()['fallback_primary'] == 1
+    status = router.status()
+    assert (status['dm2']['healthy'], status['dm2']['last_error']) == (False, '连接失败')
+    assert (status['10.0.0.3:5236']['available'], status['10.0.0.3:5236']['breaker']) == (False, 'open')
+
+
+def test_connect_failure_marks_node_down_until_check_passes():
+    fail = [True]
+
+    def connect(**params):
+        if fail[0]:
+            raise fake_dmPython.OperationalError(-70019, '网络通信异常')
+        return fake_dmPython.connect(**params)
+
+    driver = types.SimpleNamespace(connect=connect, DatabaseError=fake_dmPython.DatabaseError)
+    router = _router(driver=driver)
+    standby = router.nodes[1]
+    with pytest.raises(fake_dmPython.OperationalError):
+        router.acquire(standby)
+    assert not standby.healthy and standby.outstanding == 0
+    assert '网络通信异常' in standby.last_error
+    assert standby not in router.candidates('JZX.RPT_DAILY')
+
+    assert not router.check(standby)
+    fail[0] = False
+    assert router.check(standby)
+    assert standby.healthy and standby.last_error is None and standby.checked_at
+    assert standby in router.candidates('JZX.RPT_DAILY')
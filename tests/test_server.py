@@ -0,0 +1,78 @@
+import pytest
+
+import dm_server
+from dm_server import _RequestCounter, parse_serve_options, resolve_server
+
+
+def test_parse_serve_options():
+    options = parse_serve_options(['--serve', 'dev', '--port', '8080', '--workers', '2', '--unknown', 'x'])
+    assert (options.serve, options.port, options.workers) == ('dev', 8080, 2)
+    assert options.host == dm_server.HTTP_HOST
+    assert options.server == dm_server.WSGI_SERVER
+
+
+@pytest.mark.parametrize('installed, can_fork, expected', [
+    ({'gunicorn', 'waitress'}, True, 'gunicorn'),
+    ({'gunicorn', 'waitress'}, False, 'waitress'),
+    ({'waitress'}, True, 'waitress'),
+    (set(), True, 'werkzeug'),
+])
+def test_resolve_auto_server(monkeypatch, installed, can_fork, expected):
+    monkeypatch.setattr(dm_server, '_available', lambda module: module in installed)
+    assert resolve_server('auto', can_fork) == expected
+
+
+def test_resolve_explicit_server(monkeypatch):
+    monkeypatch.setattr(dm_server, '_available', lambda module: module == 'waitress')
+    assert resolve_server('waitress') == 'waitress'
+    assert resolve_server('werkzeug') == 'werkzeug'
+    with pytest.raises(RuntimeError, match='未安装 gunicorn'):
+        resolve_server('gunicorn', True)
+    with pytest.raises(RuntimeError, match='fork'):
+        resolve_server('gunicorn', False)
+
+
+def _app(body):
+    def app(environ, start_response):
+        start_response('200 OK', [])
+        return body
+    return app
+
+
+def test_request_counter_tracks_streamed_responses_until_closed():
+    limits = []
+    counter = _RequestCounter(_app(iter([b'a', b'b'])), 2, lambda: limits.append(counter.handled))
+
+    result = counter({}, lambda status, headers: None)
+    assert (counter.in_flight, counter.handled) == (1, 1)
+    assert list(result) == [b'a', b'b']
+    assert counter.in_flight == 1  # 服务器关闭响应后才算结束
+    result.close()
+    result.close()
+    assert counter.in_flight == 0
+
+    counter({}, lambda status, headers: None).close()
+    assert limits == [2]
+    counter({}, lambda status, headers: None).close()
+    assert limits == [2]  # 只在达到上限时通知一次
+
+
+def test_request_counter_closes_body_and_handles_errors():
+    class Body(list):
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    body = Body([b'x'])
+    counter = _RequestCounter(_app(body), 0, lambda: pytest.fail('max_requests 为 0 时不回收'))
+    counter({}, lambda status, headers: None).close()
+    assert body.closed
+
+    def failing(environ, start_response):
+        raise ValueError('应用错误')
+
+    counter = _RequestCounter(failing, 0, None)
+    with pytest.raises(ValueError):
+        counter({}, lambda status, headers: None)
+    assert counter.in_flight == 0
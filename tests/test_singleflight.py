@@ -0,0 +1,120 @@
+import contextvars
+import threading
+import time
+
+import pytest
+
+from dm_deadline import DeadlineExceeded, start_deadline
+from dm_singleflight import SingleFlight, parse_name_list
+
+
+def test_parse_name_list():
+    assert parse_name_list(' jzx.p1, JZX.P2 ,,') == {'JZX.P1', 'JZX.P2'}
+
+
+def _wait_followers(flight, count):
+    deadline = time.monotonic() + 5
+    while flight.stats()['waiting'] < count:
+        assert time.monotonic() < deadline, '等待跟随者超时'
+        time.sleep(0.001)
+
+
+def _run_concurrently(flight, count, fn, key=('JZX.P', 'a'), before_release=None):
+    """一个领导者执行 fn（阻塞到放行），count - 1 个跟随者等待；返回各调用的 (结果, 是否共享) 或异常"""
+    release = threading.Event()
+    results = []
+
+    def leader_fn():
+        release.wait(5)
+        return fn()
+
+    def call():
+        try:
+            results.append(flight.do(key[0], [key[1]], leader_fn))
+        except Exception as e:
+            results.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    _wait_followers(flight, count - 1)
+    if before_release is not None:
+        before_release()
+    release.set()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight(exclude=())
+    executions = []
+    results = _run_concurrently(flight, 4, lambda: executions.append(1) or [1, 2, 3])
+    assert len(executions) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True]
+    assert all(value == [1, 2, 3] for value, _ in results)
+    stats = flight.stats()
+    assert (stats['executions'], stats['coalesced'], stats['max_followers'], stats['waiting'],
+            stats['in_flight']) == (1, 3, 3, 0, 0)
+
+
+def test_error_is_shared_with_followers():
+    flight = SingleFlight(exclude=())
+
+    def fail():
+        raise ValueError('过程执行失败')
+
+    results = _run_concurrently(flight, 3, fail)
+    assert len(results) == 3 and all(isinstance(result, ValueError) for result in results)
+    assert flight.stats()['shared_errors'] == 2
+
+
+def test_calls_after_completion_execute_again():
+    flight = SingleFlight(exclude=())
+    assert flight.do('JZX.P', ['a'], lambda: 1) == (1, False)
+    assert flight.do('JZX.P', ['a'], lambda: 2) == (2, False)
+
+
+def test_different_keys_and_users_are_not_coalesced():
+    flight = SingleFlight(exclude=())
+    assert SingleFlight.make_key('jzx.p', ['a'], 'u1') == ('JZX.P', ('a',), 'u1')
+    assert SingleFlight.make_key('JZX.P', ['a'], 'u1') != SingleFlight.make_key('JZX.P', ['a'], 'u2')
+    assert flight.make_key('JZX.P', ['a']) != flight.make_key('JZX.P', ['b'])
+
+
+def test_excluded_and_disabled_calls_bypass():
+    flight = SingleFlight(exclude=['jzx.write'])
+    assert not flight.is_coalescable('JZX.WRITE') and flight.is_coalescable('JZX.READ')
+    assert flight.do('JZX.WRITE', [], lambda: 'x') == ('x', False)
+    assert not SingleFlight(exclude=(), enabled=False).is_coalescable('JZX.READ')
+    assert flight.stats()['bypassed'] == 1
+
+
+def test_follower_runs_itself_after_wait_timeout():
+    flight = SingleFlight(exclude=(), wait_timeout=0.05)
+    results = _run_concurrently(flight, 2, lambda: 'leader', before_release=lambda: time.sleep(0.2))
+    assert sorted(results) == [('leader', False), ('leader', False)]
+    stats = flight.stats()
+    assert stats['wait_timeouts'] == 1 and stats['coalesced'] == 0
+    # 不再等待的跟随者不计入 max_followers / waiting
+    assert stats['max_followers'] == 0 and stats['waiting'] == 0
+
+
+def test_follower_wait_is_bounded_by_request_deadline():
+    flight = SingleFlight(exclude=())
+
+    def with_deadline():
+        start_deadline(0.05)
+        return flight.do('JZX.P', ['a'], lambda: 'follower')
+
+    release = threading.Event()
+    leader = threading.Thread(target=lambda: flight.do('JZX.P', ['a'], lambda: release.wait(5)))
+    leader.start()
+    while flight.stats()['in_flight'] == 0:
+        time.sleep(0.001)
+    with pytest.raises(DeadlineExceeded):
+        contextvars.copy_context().run(with_deadline)
+    release.set()
+    leader.join()
+    stats = flight.stats()
+    assert stats['deadline_timeouts'] == 1 and stats['max_followers'] == 0 and stats['waiting'] == 0
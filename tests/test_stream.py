@@ -0,0 +1,106 @@
+import json
+from datetime import datetime
+
+from dm_stream import (iter_columnar_json_result_sets, iter_described_result_sets, iter_json_result_sets,
+                       iter_result_sets)
+
+
+class INT:
+    pass
+
+
+class VARCHAR:
+    pass
+
+
+class TIMESTAMP:
+    pass
+
+
+class _Cursor:
+    """按顺序返回多个结果集的游标（nextset() 切换到下一个）"""
+
+    def __init__(self, result_sets):
+        self._sets = list(result_sets)
+        self.description, self._rows = self._sets.pop(0)
+
+    def fetchmany(self, size):
+        batch, self._rows = self._rows[:size], self._rows[size:]
+        return batch
+
+    def nextset(self):
+        if not self._sets:
+            return None
+        self.description, self._rows = self._sets.pop(0)
+        return True
+
+
+DESCRIPTION = [('ID', INT, 10, 10, 10, 0, 0), ('NAME', VARCHAR, 50, 50, 50, 0, 1),
+               ('CREATED', TIMESTAMP, 19, 19, 19, 0, 1)]
+
+ROWS = [(1, '张三', datetime(2024, 1, 2, 3, 4, 5)),
+        (2, 'say "hi"\n<tab>\t', None),
+        (3, None, datetime(2024, 12, 31, 23, 59, 59, 999999))]
+
+OTHER_DESCRIPTION = [('CODE', VARCHAR, 10, 10, 10, 0, 1)]
+
+
+def _convert_datetime(obj):
+    """原 /jsonService 使用的 default"""
+    if isinstance(obj, datetime):
+        return obj.strftime('%Y-%m-%d %H:%M:%S')
+    raise TypeError(f"类型 {type(obj)} 不支持JSON序列化")
+
+
+def _sets():
+    return [(DESCRIPTION, ROWS), (OTHER_DESCRIPTION, []), (OTHER_DESCRIPTION, [('a',), ('b',)])]
+
+
+def _expected_data(sets):
+    return [[dict(zip([col[0] for col in description], row)) for row in rows] for description, rows in sets]
+
+
+def _render(sets, batch_size=2, **kwargs):
+    return ''.join(iter_json_result_sets(iter_described_result_sets(_Cursor(sets), batch_size), **kwargs))
+
+
+def test_indented_output_matches_json_dumps():
+    expected = json.dumps(_expected_data(_sets()), default=_convert_datetime, ensure_ascii=False, indent=4)
+    assert _render(_sets(), indent=4) == expected
+
+
+def test_compact_output_matches_json_dumps():
+    expected = json.dumps(_expected_data(_sets()), default=_convert_datetime, ensure_ascii=False,
+                          separators=(',', ':'))
+    assert _render(_sets()) == expected
+
+
+def test_output_does_not_depend_on_batch_size():
+    for batch_size in (1, 2, 100):
+        assert _render(_sets(), batch_size, indent=4) == _render(_sets(), 1, indent=4)
+        assert _render(_sets(), batch_size) == _render(_sets(), 1)
+
+
+def test_no_result_sets():
+    assert ''.join(iter_json_result_sets(iter(()))) == json.dumps([])
+    assert ''.join(iter_json_result_sets(iter(()), indent=4)) == json.dumps([], indent=4)
+    assert ''.join(iter_columnar_json_result_sets(iter(()))) == '[]'
+
+
+def test_columnar_output():
+    text = ''.join(iter_columnar_json_result_sets(iter_described_result_sets(_Cursor(_sets()), 2)))
+    assert json.loads(text) == [
+        {'columns': ['ID', 'NAME', 'CREATED'],
+         'data': [[1, '张三', '2024-01-02 03:04:05'], [2, 'say "hi"\n<tab>\t', None],
+                  [3, None, '2024-12-31 23:59:59']]},
+        {'columns': ['CODE'], 'data': []},
+        {'columns': ['CODE'], 'data': [['a'], ['b']]},
+    ]
+    # 每行数据占一行
+    assert '\n[1,"张三","2024-01-02 03:04:05"],\n' in text
+
+
+def test_iter_result_sets_yields_column_names():
+    cursor = _Cursor(_sets())
+    seen = [(columns, [row for rows in batches for row in rows]) for columns, batches in iter_result_sets(cursor, 2)]
+    assert seen == [(['ID', 'NAME', 'CREATED'], ROWS), (['CODE'], []), (['CODE'], [('a',), ('b',)])]
@@ -0,0 +1,125 @@
+import json
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+from dm_types import (column_kind, decimal_converter, format_datetime, json_default, json_ready_batches,
+                      peek_batches, resolve_kinds, row_converter, text_converters, type_name)
+
+
+class NUMBER:
+    pass
+
+
+class DECIMAL:
+    pass
+
+
+class VARCHAR:
+    pass
+
+
+class TIMESTAMP:
+    pass
+
+
+class CLOB:
+    pass
+
+
+class UNKNOWN:
+    pass
+
+
+class _Lob:
+    def __init__(self, value):
+        self.value = value
+
+    def read(self):
+        return self.value
+
+
+def _col(name, type_code, precision=None, scale=None):
+    return (name, type_code, None, None, precision, scale, 1)
+
+
+def test_column_kind():
+    assert type_name(VARCHAR) == 'VARCHAR'
+    assert type_name("<class 'dmPython.TIMESTAMP'>") == 'TIMESTAMP'
+    assert column_kind(_col('N', NUMBER, 10, 0)) == 'int'
+    assert column_kind(_col('N', NUMBER, 10, 2)) == 'decimal'
+    assert column_kind(_col('T', TIMESTAMP)) == 'datetime'
+    assert column_kind(_col('I', 'INTERVAL_DAY_TO_SECOND')) == 'str'
+    assert column_kind(_col('U', UNKNOWN)) is None
+
+
+def test_unknown_kinds_are_inferred_from_first_non_null_value():
+    rows = [(None, None, None), (True, Decimal('1'), None)]
+    assert resolve_kinds([None, None, None], rows) == ['bool', 'decimal', 'str']
+    assert resolve_kinds(['int', None], [(1, b'x')]) == ['int', 'bytes']
+
+
+def test_peek_batches_keeps_all_batches():
+    first, batches = peek_batches(iter([[1], [2]]))
+    assert first == [1]
+    assert list(batches) == [[1], [2]]
+    first, batches = peek_batches(iter(()))
+    assert (first, list(batches)) == ([], [])
+
+
+def test_format_datetime():
+    assert format_datetime(datetime(2024, 1, 2, 3, 4, 5, 999999)) == '2024-01-02 03:04:05'
+    early = datetime(999, 1, 2, 3, 4, 5)
+    assert format_datetime(early) == early.strftime('%Y-%m-%d %H:%M:%S')
+    aware = datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone(timedelta(hours=8)))
+    assert format_datetime(aware) == '2024-01-02 03:04:05'
+
+
+@pytest.mark.parametrize('precision, scale, mode, value, expected', [
+    (10, 0, 'string', Decimal('12'), 12),
+    (10, 0, 'string', Decimal('NaN'), 'NaN'),
+    (10, 2, 'string', Decimal('1.1'), '1.10'),
+    (10, 2, 'string', 3, '3.00'),
+    (10, 2, 'number', Decimal('1.10'), 1.1),
+    (20, 2, 'number', Decimal('1.10'), '1.10'),
+    (None, None, 'string', Decimal('1E+3'), '1000'),
+])
+def test_decimal_converter(precision, scale, mode, value, expected):
+    assert decimal_converter(precision, scale, mode)(value) == expected
+
+
+def test_json_default_fallback():
+    assert json_default(datetime(2024, 1, 2, 3, 4, 5)) == '2024-01-02 03:04:05'
+    assert json_default(date(2024, 1, 2)) == '2024-01-02'
+    assert json_default(time(3, 4, 5)) == '03:04:05'
+    assert json_default(Decimal('1.50')) == '1.50'
+    assert json_default(b'\x00\x01') == 'AAE='
+    assert json_default(_Lob('长文本')) == '长文本'
+    with pytest.raises(TypeError):
+        json_default(object())
+
+
+def test_json_ready_batches_convert_by_column():
+    description = [_col('ID', NUMBER, 10, 0), _col('QTY', DECIMAL, 10, 0), _col('PRICE', NUMBER, 10, 2),
+                   _col('NAME', VARCHAR), _col('CREATED', TIMESTAMP), _col('NOTE', CLOB)]
+    rows = [(1, Decimal('3'), Decimal('2.5'), 'a', datetime(2024, 1, 2, 3, 4, 5), _Lob('x')),
+            (2, None, None, None, None, None)]
+    converted = [row for rows in json_ready_batches(description, iter([rows])) for row in rows]
+    assert json.dumps(converted, ensure_ascii=False) == json.dumps(
+        [[1, 3, '2.50', 'a', '2024-01-02 03:04:05', 'x'], [2, None, None, None, None, None]])
+
+
+def test_rows_without_conversions_are_passed_through():
+    description = [_col('NAME', VARCHAR)]
+    batches = [[('a',)]]
+    assert list(json_ready_batches(description, iter(batches))) == batches
+    assert row_converter([None, None]) is None
+
+
+def test_text_converters():
+    description = [_col('ID', NUMBER, 10, 0), _col('CREATED', TIMESTAMP), _col('NOTE', CLOB)]
+    converters = text_converters(description, ['int', 'datetime', 'clob'])
+    values = (5, datetime(2024, 1, 2, 3, 4, 5), _Lob('x'))
+    assert [convert(value) for convert, value in zip(converters, values)] == ['5', '2024-01-02 03:04:05', 'x']
+
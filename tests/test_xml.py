@@ -0,0 +1,119 @@
+import re
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from xml.dom import minidom
+
+from dm_xml import XmlWriter, escape_attr, escape_text, iter_xml_result_sets
+
+
+class INT:
+    pass
+
+
+class VARCHAR:
+    pass
+
+
+class TIMESTAMP:
+    pass
+
+
+DESCRIPTION = [('ID', INT, 10, 10, 10, 0, 0), ('NAME', VARCHAR, 50, 50, 50, 0, 1),
+               ('CREATED', TIMESTAMP, 19, 19, 19, 0, 1)]
+
+ROWS = [(1, '张三 & <李四>', datetime(2024, 1, 2, 3, 4, 5)),
+        (2, 'say "hi"', None),
+        (3, '', datetime(2024, 12, 31, 23, 59, 59, 999999))]
+
+OTHER_DESCRIPTION = [('CODE', VARCHAR, 10, 10, 10, 0, 1)]
+
+SETS = [(DESCRIPTION, ROWS), (OTHER_DESCRIPTION, []), (OTHER_DESCRIPTION, [('a',), ('b',)])]
+
+
+def _minidom_xml(sets, encoding='utf-8'):
+    """原 /xmlService 的生成方式：ElementTree 建树后用 minidom 美化并去掉空行"""
+    root = ET.Element("ResultSets")
+    root.set("generated_time", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    root.set("total_sets", str(len(sets)))
+    for set_idx, (description, rows) in enumerate(sets, 1):
+        if not rows:
+            continue
+        columns = [col[0] for col in description]
+        set_node = ET.SubElement(root, "ResultSet")
+        set_node.set("id", str(set_idx))
+        set_node.set("row_count", str(len(rows)))
+        set_node.set("column_count", str(len(columns)))
+        cols_node = ET.SubElement(set_node, "Columns")
+        for col in columns:
+            ET.SubElement(cols_node, "Column").text = col
+        rows_node = ET.SubElement(set_node, "Rows")
+        for row_idx, row in enumerate(rows, 1):
+            row_node = ET.SubElement(rows_node, "Row")
+            row_node.set("index", str(row_idx))
+            for col_idx, (col_name, cell_value) in enumerate(zip(columns, row)):
+                cell_text = cell_value.strftime('%Y-%m-%d %H:%M:%S') if isinstance(cell_value, datetime) else (
+                    str(cell_value) if cell_value is not None else "")
+                cell_node = ET.SubElement(row_node, "Cell")
+                cell_node.set("column", col_name)
+                cell_node.set("column_index", str(col_idx))
+                cell_node.text = cell_text
+    rough_xml = ET.tostring(root, encoding=encoding)
+    pretty_xml = minidom.parseString(rough_xml).toprettyxml(indent="  ", encoding=encoding)
+    return "\n".join([line for line in pretty_xml.decode(encoding).split("\n") if line.strip()])
+
+
+def _writer_xml(sets, batch_size=2, **kwargs):
+    result_sets = ((description, (rows[i:i + batch_size] for i in range(0, len(rows), batch_size)), len(rows))
+                   for description, rows in sets)
+    return b''.join(iter_xml_result_sets(result_sets, total_sets=len(sets), **kwargs)).decode('utf-8')
+
+
+def _without_time(text):
+    return re.sub(r'generated_time="[^"]*"', 'generated_time=""', text)
+
+
+def test_output_matches_minidom():
+    assert _without_time(_writer_xml(SETS)) == _without_time(_minidom_xml(SETS))
+
+
+def test_output_does_not_depend_on_batch_size():
+    assert _without_time(_writer_xml(SETS, 1)) == _without_time(_writer_xml(SETS, 100))
+
+
+def test_streamed_result_sets_omit_row_count():
+    result_sets = [(OTHER_DESCRIPTION, iter([[('a',)], [('b',)]]), None)]
+    text = b''.join(iter_xml_result_sets(result_sets)).decode('utf-8')
+    assert '<ResultSet id="1" column_count="1">' in text
+    assert 'total_sets' not in text
+    root = ET.fromstring(text.encode('utf-8'))
+    assert [cell.text for cell in root.iter('Cell')] == ['a', 'b']
+
+
+def test_unencodable_characters_become_char_refs():
+    result_sets = [(OTHER_DESCRIPTION, iter([[('中文',)]]), 1)]
+    text = b''.join(iter_xml_result_sets(result_sets, encoding='ascii'))
+    assert b'&#20013;&#25991;' in text
+    assert ET.fromstring(text).find('.//Cell').text == '中文'
+
+
+def test_escape_matches_minidom():
+    text = 'a & b < c > d "e" \'f\''
+    node = minidom.Document().createTextNode(text)
+    assert escape_text(text) == node.toxml()
+
+
+def test_escaped_attributes_round_trip():
+    value = 'x & "y"\n\t<z>\r'
+    root = ET.fromstring(f'<a v="{escape_attr(value)}"/>')
+    assert root.get('v') == value
+
+
+def test_writer_empty_and_text_elements():
+    writer = XmlWriter(declaration=None)
+    writer.start('A', {'k': 'v'})
+    writer.element('B', '')
+    writer.element('C', 'text')
+    writer.start('D')
+    writer.end('D')
+    writer.end('A')
+    assert writer.flush() == '<A k="v">\n  <B/>\n  <C>text</C>\n  <D/>\n</A>'